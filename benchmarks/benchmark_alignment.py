@@ -0,0 +1,150 @@
+"""Peri-stimulus alignment of imaging responses read from a file, batched versus a per-trial loop.
+
+The file holds a 1 h session imaged at 30 Hz, stored in gzip-compressed chunks
+of 1000 frames like most imaging data, and a stimulation series with one
+interval every 3.6 s, on each of 50 targets in turn. ``Alignment`` follows the
+airspeed velocity convention; run directly to print a table without asv::
+
+    python benchmarks/benchmark_alignment.py
+"""
+import os
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+from hdmf.backends.hdf5 import H5DataIO
+from pynwb import NWBHDF5IO
+from pynwb.testing.mock.device import mock_Device
+from pynwb.testing.mock.file import mock_NWBFile
+from pynwb.testing.mock.ophys import mock_ImagingPlane, mock_PlaneSegmentation, mock_RoiResponseSeries
+
+from ndx_holographic_stimulation import (
+    LightSource,
+    PatternedOptogeneticSeries,
+    PatternedOptogeneticStimulusSite,
+    SpatialLightModulator,
+    SpiralScanning,
+)
+from ndx_holographic_stimulation.alignment import align_responses, iter_peri_stimulus_responses
+
+NUM_ROIS = 500
+NUM_TARGETS = 50
+IMAGING_RATE = 30.0
+DURATION = 3600.0
+WINDOW = (1.0, 3.0)
+
+
+def write_file(path):
+    nwbfile = mock_NWBFile()
+    device = mock_Device(name="device", nwbfile=nwbfile)
+    plane_segmentation = mock_PlaneSegmentation(
+        imaging_plane=mock_ImagingPlane(device=device, nwbfile=nwbfile), n_rois=NUM_ROIS, nwbfile=nwbfile
+    )
+    num_frames = int(DURATION * IMAGING_RATE)
+    nwbfile.processing["ophys"].add(mock_RoiResponseSeries(
+        name="RoiResponseSeries",
+        data=H5DataIO(np.random.default_rng(0).random((num_frames, NUM_ROIS), dtype=np.float32),
+                      chunks=(1000, NUM_ROIS), compression="gzip"),
+        rate=IMAGING_RATE,
+        rois=plane_segmentation.create_roi_table_region(region=list(range(NUM_ROIS)), description="all"),
+    ))
+
+    pattern = SpiralScanning(
+        name="stimulus_pattern", description="spiral", diameter=15e-6, height=10e-6, number_of_revolutions=5,
+        duration=10e-3, number_of_stimulus_presentation=10, inter_stimulus_interval=20e-3,
+    )
+    nwbfile.add_lab_meta_data(pattern)
+    site = PatternedOptogeneticStimulusSite(
+        name="site", description="site", excitation_lambda=600.0, effector="ChR2", location="VISrl", device=device
+    )
+    nwbfile.add_ogen_site(site)
+    slm = SpatialLightModulator(name="spatial_light_modulator", description="slm")
+    light_source = LightSource(name="light_source", description="laser", stimulation_wavelength=600.0)
+    nwbfile.add_device(slm)
+    nwbfile.add_device(light_source)
+    # run-length encoded power: one target is switched on for one interval every 3.6 s, targets take turns
+    onsets = np.arange(0.0, DURATION, 3.6)
+    data = np.zeros((2 * len(onsets), NUM_TARGETS), dtype=np.float32)
+    data[0::2][np.arange(len(onsets)), np.arange(len(onsets)) % NUM_TARGETS] = 0.05
+    nwbfile.add_stimulus(PatternedOptogeneticSeries(
+        name="PatternedOptogeneticSeries",
+        description="benchmark",
+        data=data,
+        timestamps=np.column_stack([onsets, onsets + 0.29]).ravel(),
+        continuity="step",
+        unit="watts",
+        rois=plane_segmentation.create_roi_table_region(region=list(range(NUM_TARGETS)), description="targets"),
+        site=site,
+        device=device,
+        stimulus_pattern=pattern,
+        spatial_light_modulator=slm,
+        light_source=light_source,
+    ))
+    with NWBHDF5IO(path, mode="w") as io:
+        io.write(nwbfile, cache_spec=False)
+
+
+def per_trial_loop(series, response):
+    """The usual hand-written alignment: one read per trial."""
+    schedule = series.get_stimulus_schedule()
+    onsets = schedule.onset[schedule.presentation == 0]
+    num_samples = int(round(sum(WINDOW) * IMAGING_RATE))
+    out = np.full((len(onsets), NUM_ROIS, num_samples), np.nan)
+    for trial, onset in enumerate(onsets):
+        start = int(np.ceil((onset - WINDOW[0]) * IMAGING_RATE))
+        window = response.data[max(start, 0):max(start + num_samples, 0)]
+        out[trial, :, max(-start, 0):max(-start, 0) + len(window)] = window.T
+    return out
+
+
+def run(path, method):
+    with NWBHDF5IO(path, mode="r") as io:
+        nwbfile = io.read()
+        series = nwbfile.stimulus["PatternedOptogeneticSeries"]
+        response = nwbfile.processing["ophys"]["RoiResponseSeries"]
+        if method == "loop":
+            return per_trial_loop(series, response).shape[0]
+        if method == "batched":
+            return align_responses(series, response, WINDOW).data.shape[0]
+        # streamed: reduce each batch to its mean response, never holding the whole tensor
+        return sum(len(batch.onset) for batch in iter_peri_stimulus_responses(series, response, WINDOW)
+                   if batch.data.mean(axis=0) is not None)
+
+
+class Alignment:
+    params = ["loop", "batched", "streamed"]
+    param_names = ["method"]
+    timeout = 900
+
+    def setup_cache(self):
+        path = os.path.join(tempfile.mkdtemp(), "alignment.nwb")
+        write_file(path)
+        return path
+
+    def time_align(self, path, method):
+        run(path, method)
+
+    def peakmem_align(self, path, method):
+        run(path, method)
+
+
+def main():
+    print("%d ROIs imaged at %.0f Hz for %.0f s, window %s s" % (NUM_ROIS, IMAGING_RATE, DURATION, WINDOW))
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "alignment.nwb")
+        write_file(path)
+        print("%10s %8s %10s %12s" % ("method", "trials", "seconds", "peak MiB"))
+        for method in Alignment.params:
+            t0 = time.perf_counter()
+            num_trials = run(path, method)
+            seconds = time.perf_counter() - t0
+            tracemalloc.start()
+            run(path, method)
+            peak = tracemalloc.get_traced_memory()[1] / 1024 ** 2
+            tracemalloc.stop()
+            print("%10s %8d %10.2f %12.1f" % (method, num_trials, seconds, peak))
+
+
+if __name__ == "__main__":
+    main()
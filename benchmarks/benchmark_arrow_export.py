@@ -0,0 +1,192 @@
+"""Export of the stimulation events of many sessions to partitioned Parquet: row by row versus Arrow batches.
+
+``NUM_SESSIONS`` session files each hold ``SERIES_PER_SESSION`` series of
+``NUM_TIMES`` samples of ``NUM_ROIS`` float32 at 1 kHz, where every ROI gets an
+interval of ``PRESENTATIONS`` pulses every second. ``rows`` builds one dict per
+event, with its pattern and light source parameters, then a ``pandas.DataFrame``
+per session written with ``DataFrame.to_parquet(partition_cols=["session"])``;
+``arrow`` is ``write_session_events``. Both first compute the stimulus schedule
+and presentation energy of every series (``schedule s``, two passes over its
+data, the same for both); the table reports that time apart from the time spent
+flattening the events and writing Parquet (``flatten s``). ``ArrowExport`` follows the
+airspeed velocity convention; run directly to print a table without asv::
+
+    python benchmarks/benchmark_arrow_export.py
+"""
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+from pynwb import NWBHDF5IO
+from pynwb.testing.mock.device import mock_Device
+from pynwb.testing.mock.file import mock_NWBFile
+from pynwb.testing.mock.ophys import mock_ImagingPlane, mock_PlaneSegmentation
+
+from ndx_holographic_stimulation import (
+    LightSource,
+    PatternedOptogeneticSeries,
+    PatternedOptogeneticStimulusSite,
+    SpatialLightModulator,
+    SpiralScanning,
+)
+from ndx_holographic_stimulation.arrow_export import write_session_events
+from ndx_holographic_stimulation.dose import compute_delivered_dose
+
+NUM_SESSIONS, SERIES_PER_SESSION, NUM_TIMES, NUM_ROIS = 6, 4, 120_000, 32
+DURATION_MS, ISI_MS, PRESENTATIONS = 10, 20, 10
+METHODS = ["rows", "arrow"]
+
+
+def pulses(seed):
+    """One interval of ``PRESENTATIONS`` pulses per ROI and second, with a random power per ROI."""
+    t = np.arange(NUM_TIMES)[:, np.newaxis]
+    phase = (t - 20 * np.arange(NUM_ROIS)) % 1000
+    on = (phase < PRESENTATIONS * (DURATION_MS + ISI_MS)) & (phase % (DURATION_MS + ISI_MS) < DURATION_MS)
+    power = np.random.default_rng(seed).uniform(0.01, 0.05, NUM_ROIS).astype(np.float32)
+    return on * power
+
+
+def write_session(path, session):
+    nwbfile = mock_NWBFile(session_start_time=datetime(2024, 1, 1, tzinfo=timezone.utc) + timedelta(days=session))
+    device = mock_Device(name="device", nwbfile=nwbfile)
+    plane_segmentation = mock_PlaneSegmentation(
+        imaging_plane=mock_ImagingPlane(device=device, nwbfile=nwbfile), n_rois=NUM_ROIS, nwbfile=nwbfile
+    )
+    site = PatternedOptogeneticStimulusSite(
+        name="site", description="site", excitation_lambda=600.0, effector="ChR2", location="VISrl", device=device
+    )
+    nwbfile.add_ogen_site(site)
+    slm = SpatialLightModulator(name="spatial_light_modulator", description="slm")
+    light_source = LightSource(name="light_source", description="laser", stimulation_wavelength=1040.0,
+                               peak_power=2.0)
+    nwbfile.add_device(slm)
+    nwbfile.add_device(light_source)
+    pattern = SpiralScanning(name="stimulus_pattern", description="spiral", diameter=15e-6, height=10e-6,
+                             number_of_revolutions=5, duration=DURATION_MS / 1000,
+                             number_of_stimulus_presentation=PRESENTATIONS, inter_stimulus_interval=ISI_MS / 1000)
+    nwbfile.add_lab_meta_data(pattern)
+    rois = plane_segmentation.create_roi_table_region(region=list(range(NUM_ROIS)), description="all rois")
+    for i in range(SERIES_PER_SESSION):
+        nwbfile.add_stimulus(PatternedOptogeneticSeries(
+            name="series_%d" % i,
+            description="benchmark",
+            data=pulses(session * SERIES_PER_SESSION + i),
+            rate=1000.0,
+            unit="watts",
+            rois=rois,
+            site=site,
+            device=device,
+            stimulus_pattern=pattern,
+            spatial_light_modulator=slm,
+            light_source=light_source,
+        ))
+    with NWBHDF5IO(path, mode="w") as io:
+        io.write(nwbfile)
+
+
+def write_sessions(directory):
+    paths = [os.path.join(directory, "session_%02d.nwb" % session) for session in range(NUM_SESSIONS)]
+    for session, path in enumerate(paths):
+        write_session(path, session)
+    return paths
+
+
+def _series(nwbfile):
+    return sorted((obj for obj in nwbfile.objects.values() if isinstance(obj, PatternedOptogeneticSeries)),
+                  key=lambda s: s.name)
+
+
+def event_rows(nwbfile, session):
+    """One dict per event, with the parameters of its pattern and light source."""
+    rows = []
+    for series in _series(nwbfile):
+        pattern, light_source = series.get_stimulus_pattern(), series.light_source
+        schedule = series.get_stimulus_schedule()
+        energy = series.delivered_dose.presentation_energy[:]
+        roi_ids = np.asarray(series.rois.table.id.data[:])
+        for roi, interval, presentation, onset, offset, e in zip(
+            schedule.rois, schedule.interval, schedule.presentation, schedule.onset, schedule.offset, energy
+        ):
+            rows.append(dict(
+                session=session, series=series.name, roi=int(roi), roi_id=int(roi_ids[roi]),
+                interval=int(interval), presentation=int(presentation), onset=float(onset),
+                offset=float(offset), energy=float(e), mean_power=float(e / (offset - onset)),
+                pattern_type=pattern.neurodata_type, duration=pattern.duration,
+                number_of_stimulus_presentation=pattern.number_of_stimulus_presentation,
+                inter_stimulus_interval=pattern.inter_stimulus_interval,
+                diameter=pattern.diameter, height=pattern.height,
+                number_of_revolutions=pattern.number_of_revolutions,
+                stimulation_wavelength=light_source.stimulation_wavelength,
+                peak_power=light_source.peak_power,
+            ))
+    return rows
+
+
+def export(paths, root, method):
+    """Export the events of every session; returns the seconds spent computing the schedules and
+    presentation energy, the seconds spent flattening and writing the events, and the number of events."""
+    shutil.rmtree(root, ignore_errors=True)
+    schedule_seconds = flatten_seconds = 0.0
+    num_events = 0
+    for path in paths:
+        session = os.path.splitext(os.path.basename(path))[0]
+        with NWBHDF5IO(path, mode="r") as io:
+            nwbfile = io.read()
+            t0 = time.perf_counter()
+            for series in _series(nwbfile):
+                series.delivered_dose = compute_delivered_dose(series, schedule=series.get_stimulus_schedule())
+            t1 = time.perf_counter()
+            if method == "rows":
+                rows = event_rows(nwbfile, session)
+                pd.DataFrame(rows).to_parquet(root, partition_cols=["session"], compression="zstd")
+                num_events += len(rows)
+            else:
+                num_events += write_session_events(nwbfile, root, session=session)
+            t2 = time.perf_counter()
+        schedule_seconds += t1 - t0
+        flatten_seconds += t2 - t1
+    return schedule_seconds, flatten_seconds, num_events
+
+
+def directory_size(root):
+    return sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(root) for f in files)
+
+
+class ArrowExport:
+    params = METHODS
+    param_names = ["method"]
+    timeout = 1800
+
+    def setup_cache(self):
+        directory = tempfile.mkdtemp()
+        write_sessions(directory)
+        return directory
+
+    def _paths(self, directory):
+        return [os.path.join(directory, "session_%02d.nwb" % session) for session in range(NUM_SESSIONS)]
+
+    def time_export(self, directory, method):
+        export(self._paths(directory), os.path.join(directory, "events_%s" % method), method)
+
+
+def main():
+    print("%d sessions x %d series of %d x %d float32"
+          % (NUM_SESSIONS, SERIES_PER_SESSION, NUM_TIMES, NUM_ROIS))
+    print("%10s %10s %12s %12s %12s %10s"
+          % ("method", "events", "schedule s", "flatten s", "events/s", "size MB"))
+    with tempfile.TemporaryDirectory() as tmpdir:
+        paths = write_sessions(tmpdir)
+        for method in METHODS:
+            root = os.path.join(tmpdir, "events_%s" % method)
+            schedule_seconds, flatten_seconds, num_events = export(paths, root, method)
+            print("%10s %10d %12.2f %12.2f %12.0f %10.2f"
+                  % (method, num_events, schedule_seconds, flatten_seconds, num_events / flatten_seconds,
+                     directory_size(root) / 1e6))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Creating one PatternedOptogeneticSeries per trial: per-object loop vs ``build_series_batch``.
+
+``SeriesConstruction`` follows the airspeed velocity convention; run directly
+to print a table without asv::
+
+    python benchmarks/benchmark_batch.py
+"""
+import time
+
+import numpy as np
+from pynwb.testing.mock.device import mock_Device
+from pynwb.testing.mock.file import mock_NWBFile
+from pynwb.testing.mock.ophys import mock_ImagingPlane, mock_PlaneSegmentation
+
+from ndx_holographic_stimulation import (
+    LightSource,
+    PatternedOptogeneticSeries,
+    PatternedOptogeneticStimulusSite,
+    SpatialLightModulator,
+    SpiralScanning,
+)
+from ndx_holographic_stimulation.batch import build_series_batch
+
+NUM_TIMES, NUM_ROIS = 50, 10
+
+
+def shared_objects():
+    """An NWBFile, the links shared by all trials and the ROI region."""
+    nwbfile = mock_NWBFile()
+    device = mock_Device(name="device", nwbfile=nwbfile)
+    plane_segmentation = mock_PlaneSegmentation(
+        imaging_plane=mock_ImagingPlane(device=device, nwbfile=nwbfile), n_rois=NUM_ROIS, nwbfile=nwbfile
+    )
+    rois = plane_segmentation.create_roi_table_region(region=list(range(NUM_ROIS)), description="all rois")
+    site = PatternedOptogeneticStimulusSite(
+        name="site", description="site", excitation_lambda=600.0, effector="ChR2", location="VISrl", device=device
+    )
+    nwbfile.add_ogen_site(site)
+    pattern = SpiralScanning(
+        name="stimulus_pattern", description="spiral", diameter=15e-6, height=10e-6, number_of_revolutions=5,
+        duration=10e-3, number_of_stimulus_presentation=10, inter_stimulus_interval=20e-3,
+    )
+    nwbfile.add_lab_meta_data(pattern)
+    slm = SpatialLightModulator(name="spatial_light_modulator", description="slm")
+    light_source = LightSource(name="light_source", description="laser", stimulation_wavelength=600.0)
+    nwbfile.add_device(slm)
+    nwbfile.add_device(light_source)
+    links = dict(site=site, device=device, stimulus_pattern=pattern, spatial_light_modulator=slm,
+                 light_source=light_source)
+    return nwbfile, rois, links
+
+
+def build_loop(nwbfile, rois, links, data, starting_times):
+    for trial, (trial_data, start) in enumerate(zip(data, starting_times)):
+        nwbfile.add_stimulus(
+            PatternedOptogeneticSeries(
+                name="PatternedOptogeneticSeries_%d" % trial,
+                description="trial",
+                data=trial_data,
+                unit="watts",
+                rate=1000.0,
+                starting_time=float(start),
+                rois=rois.table.create_roi_table_region(region=list(rois.data), description=rois.description),
+                **links,
+            )
+        )
+
+
+def build_batch(nwbfile, rois, links, data, starting_times):
+    build_series_batch(data, rois, rate=1000.0, starting_time=starting_times, description="trial",
+                       nwbfile=nwbfile, **links)
+
+
+class SeriesConstruction:
+    params = ([1_000, 10_000], ["loop", "batch"])
+    param_names = ["num_trials", "method"]
+    timeout = 300
+
+    def setup(self, num_trials, method):
+        self.data = np.random.default_rng(0).random((num_trials, NUM_TIMES, NUM_ROIS))
+        self.starting_times = np.arange(num_trials) * 0.1
+        self.nwbfile, self.rois, self.links = shared_objects()
+        self.build = build_loop if method == "loop" else build_batch
+
+    def time_construct_and_add(self, num_trials, method):
+        self.build(self.nwbfile, self.rois, self.links, self.data, self.starting_times)
+
+
+def main():
+    print("%10s %10s %10s %8s" % ("num_trials", "loop s", "batch s", "speedup"))
+    for num_trials in SeriesConstruction.params[0]:
+        times = []
+        for build in (build_loop, build_batch):
+            data = np.random.default_rng(0).random((num_trials, NUM_TIMES, NUM_ROIS))
+            nwbfile, rois, links = shared_objects()
+            t0 = time.perf_counter()
+            build(nwbfile, rois, links, data, np.arange(num_trials) * 0.1)
+            times.append(time.perf_counter() - t0)
+        print("%10d %10.2f %10.2f %7.1fx" % (num_trials, times[0], times[1], times[0] / times[1]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""Size and cost of a summary file over many sessions: copied data versus external links and virtual datasets.
+
+``NUM_SESSIONS`` session files each hold ``SERIES_PER_SESSION`` series of
+``NUM_TIMES`` samples of ``NUM_ROIS`` float32. ``copy`` writes their series
+into one file with ``h5py.Group.copy`` (the cheapest way of copying the data,
+without the site, devices, patterns or ROI tables); ``links`` and ``virtual``
+are ``consolidate_sessions`` with external links and virtual datasets. For each
+summary the table reports the time to write it, its size, the time to read the
+data of every series through it with h5py, on a warm page cache, and the time
+to read the summary with ``NWBHDF5IO`` (``copy`` has no NWB metadata).
+``Consolidate`` follows the airspeed velocity convention; run directly to print
+a table without asv::
+
+    python benchmarks/benchmark_consolidate.py
+"""
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+import h5py
+import numpy as np
+from pynwb import NWBHDF5IO
+from pynwb.testing.mock.device import mock_Device
+from pynwb.testing.mock.file import mock_NWBFile
+from pynwb.testing.mock.ophys import mock_ImagingPlane, mock_PlaneSegmentation
+
+from ndx_holographic_stimulation import (
+    LightSource,
+    PatternedOptogeneticSeries,
+    PatternedOptogeneticStimulusSite,
+    SpatialLightModulator,
+    SpiralScanning,
+)
+from ndx_holographic_stimulation.consolidate import consolidate_sessions
+
+NUM_SESSIONS, SERIES_PER_SESSION, NUM_TIMES, NUM_ROIS = 12, 2, 250_000, 16
+METHODS = ["copy", "links", "virtual"]
+
+
+def write_session(path, session):
+    nwbfile = mock_NWBFile(session_start_time=datetime(2024, 1, 1, tzinfo=timezone.utc) + timedelta(days=session))
+    device = mock_Device(name="device", nwbfile=nwbfile)
+    plane_segmentation = mock_PlaneSegmentation(
+        imaging_plane=mock_ImagingPlane(device=device, nwbfile=nwbfile), n_rois=NUM_ROIS, nwbfile=nwbfile
+    )
+    site = PatternedOptogeneticStimulusSite(
+        name="site", description="site", excitation_lambda=600.0, effector="ChR2", location="VISrl", device=device
+    )
+    nwbfile.add_ogen_site(site)
+    slm = SpatialLightModulator(name="spatial_light_modulator", description="slm")
+    light_source = LightSource(name="light_source", description="laser", stimulation_wavelength=600.0)
+    nwbfile.add_device(slm)
+    nwbfile.add_device(light_source)
+    pattern = SpiralScanning(name="stimulus_pattern", description="spiral", diameter=15e-6, height=10e-6,
+                             number_of_revolutions=5, duration=0.01, number_of_stimulus_presentation=5,
+                             inter_stimulus_interval=0.02)
+    nwbfile.add_lab_meta_data(pattern)
+    rois = plane_segmentation.create_roi_table_region(region=list(range(NUM_ROIS)), description="all rois")
+    rng = np.random.default_rng(session)
+    for i in range(SERIES_PER_SESSION):
+        nwbfile.add_stimulus(PatternedOptogeneticSeries(
+            name="series_%d" % i,
+            description="benchmark",
+            data=rng.random((NUM_TIMES, NUM_ROIS), dtype=np.float32),
+            timestamps=np.arange(NUM_TIMES) / 1000.0,
+            unit="watts",
+            rois=rois,
+            site=site,
+            device=device,
+            stimulus_pattern=pattern,
+            spatial_light_modulator=slm,
+            light_source=light_source,
+        ))
+    with NWBHDF5IO(path, mode="w") as io:
+        io.write(nwbfile)
+
+
+def write_sessions(directory):
+    paths = [os.path.join(directory, "session_%02d.nwb" % session) for session in range(NUM_SESSIONS)]
+    for session, path in enumerate(paths):
+        write_session(path, session)
+    return paths
+
+
+def copy_series(paths, output):
+    with h5py.File(output, "w") as summary:
+        presentation = summary.create_group("stimulus/presentation")
+        for path in paths:
+            session = os.path.splitext(os.path.basename(path))[0]
+            with h5py.File(path, "r") as source:
+                for name, group in source["stimulus/presentation"].items():
+                    source.copy(group, presentation, name="%s_%s" % (session, name), without_attrs=False)
+
+
+def consolidate(paths, output, method):
+    t0 = time.perf_counter()
+    if method == "copy":
+        copy_series(paths, output)
+    else:
+        consolidate_sessions(paths, output, virtual=method == "virtual")
+    return time.perf_counter() - t0
+
+
+def read_all(output):
+    """Seconds to read the data of every series of a summary with h5py, through the links."""
+    t0 = time.perf_counter()
+    with h5py.File(output, "r") as summary:
+        for group in summary["stimulus/presentation"].values():
+            group["data"][:]
+    return time.perf_counter() - t0
+
+
+def open_summary(output):
+    """Seconds to read a summary with ``NWBHDF5IO``."""
+    t0 = time.perf_counter()
+    with NWBHDF5IO(output, mode="r") as io:
+        io.read()
+    return time.perf_counter() - t0
+
+
+class Consolidate:
+    params = METHODS
+    param_names = ["method"]
+    timeout = 1800
+
+    def setup_cache(self):
+        directory = tempfile.mkdtemp()
+        write_sessions(directory)
+        return directory
+
+    def _paths(self, directory):
+        return [os.path.join(directory, "session_%02d.nwb" % session) for session in range(NUM_SESSIONS)]
+
+    def time_consolidate(self, directory, method):
+        consolidate(self._paths(directory), os.path.join(directory, "summary_%s.nwb" % method), method)
+
+    def track_size(self, directory, method):
+        output = os.path.join(directory, "summary_%s.nwb" % method)
+        consolidate(self._paths(directory), output, method)
+        return os.path.getsize(output)
+
+
+def main():
+    print("%d sessions x %d series of %d x %d float32 (%.0f MB of series data)"
+          % (NUM_SESSIONS, SERIES_PER_SESSION, NUM_TIMES, NUM_ROIS,
+             NUM_SESSIONS * SERIES_PER_SESSION * NUM_TIMES * NUM_ROIS * 4 / 1e6))
+    print("%10s %12s %12s %12s %12s" % ("method", "write s", "size MB", "read data s", "NWB read s"))
+    with tempfile.TemporaryDirectory() as tmpdir:
+        paths = write_sessions(tmpdir)
+        for method in METHODS:
+            output = os.path.join(tmpdir, "summary_%s.nwb" % method)
+            seconds = consolidate(paths, output, method)
+            read_seconds = read_all(output)
+            open_seconds = "-" if method == "copy" else "%.2f" % open_summary(output)
+            print("%10s %12.2f %12.3f %12.2f %12s"
+                  % (method, seconds, os.path.getsize(output) / 1e6, read_seconds, open_seconds))
+
+
+if __name__ == "__main__":
+    main()
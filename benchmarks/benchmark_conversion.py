@@ -0,0 +1,95 @@
+"""Throughput of ``convert_sessions`` as the number of worker processes grows.
+
+A directory of sessions in the reference log format (see
+``ndx_holographic_stimulation.conversion``) is converted with 1, 2 and 4
+workers. ``ConvertSessions`` follows the airspeed velocity convention; run
+directly to print a table without asv::
+
+    python benchmarks/benchmark_conversion.py
+"""
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from ndx_holographic_stimulation.conversion import convert_sessions
+
+NUM_SESSIONS, NUM_TIMES, NUM_ROIS = 8, 100_000, 64  # 51 MB of float64 per session
+WORKERS = [1, 2, 4]
+
+METADATA = {
+    "session_description": "benchmark",
+    "session_start_time": "2024-03-01T10:00:00+00:00",
+    "spatial_light_modulator": {"description": "SLM", "model": "model", "resolution": 1.0},
+    "light_source": {"description": "laser", "stimulation_wavelength": 1030.0},
+    "site": {"description": "site", "excitation_lambda": 1030.0, "effector": "ChRmine", "location": "V1"},
+    "pattern": {"type": "SpiralScanning", "description": "spiral", "duration": 0.01,
+                "number_of_stimulus_presentation": 10, "inter_stimulus_interval": 0.02,
+                "diameter": 15e-6, "height": 10e-6, "number_of_revolutions": 5},
+}
+
+
+def make_sessions(root):
+    rng = np.random.default_rng(0)
+    for index in range(NUM_SESSIONS):
+        session = os.path.join(root, "session_%02d" % index)
+        os.makedirs(session)
+        metadata = dict(METADATA, identifier="session_%02d" % index,
+                        roi_centers=rng.integers(0, 512, (NUM_ROIS, 2)).tolist())
+        with open(os.path.join(session, "session.json"), "w") as f:
+            json.dump(metadata, f)
+        power = np.repeat(rng.random((NUM_TIMES // 50, NUM_ROIS)), 50, axis=0)
+        np.savez(os.path.join(session, "stimulation.npz"), timestamps=np.arange(NUM_TIMES) / 1000.0, power=power)
+
+
+class ConvertSessions:
+    params = WORKERS
+    param_names = ["max_workers"]
+    timeout = 600
+    number = 1
+    repeat = 3
+
+    def setup(self, max_workers):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self.tmpdir.name, "logs")
+        self.output_dir = os.path.join(self.tmpdir.name, "nwb")
+        make_sessions(self.root)
+
+    def teardown(self, max_workers):
+        self.tmpdir.cleanup()
+
+    def time_convert(self, max_workers):
+        convert_sessions(self.root, self.output_dir, max_workers=max_workers, overwrite=True)
+
+    def track_throughput(self, max_workers):
+        t0 = time.perf_counter()
+        reports = convert_sessions(self.root, self.output_dir, max_workers=max_workers, overwrite=True)
+        return sum(report.num_bytes for report in reports) / 1e6 / (time.perf_counter() - t0)
+
+    track_throughput.unit = "MB/s"
+
+
+def main():
+    size_mb = NUM_SESSIONS * NUM_TIMES * NUM_ROIS * 8 / 1e6
+    print("%d sessions of %d x %d float64 (%.0f MB), %d CPUs"
+          % (NUM_SESSIONS, NUM_TIMES, NUM_ROIS, size_mb, os.cpu_count()))
+    print("%8s %10s %10s %16s" % ("workers", "seconds", "MB/s", "session MB/s"))
+    with tempfile.TemporaryDirectory() as tmpdir:
+        root = os.path.join(tmpdir, "logs")
+        make_sessions(root)
+        for max_workers in WORKERS:
+            output_dir = os.path.join(tmpdir, "nwb")
+            t0 = time.perf_counter()
+            reports = convert_sessions(root, output_dir, max_workers=max_workers)
+            seconds = time.perf_counter() - t0
+            shutil.rmtree(output_dir)
+            assert all(report.succeeded for report in reports)
+            session_throughput = np.mean([report.throughput for report in reports]) / 1e6
+            print("%8d %10.2f %10.1f %16.1f" % (max_workers, seconds, size_mb / seconds, session_throughput))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""Cost of per-ROI dose queries on a file, with and without the stored DeliveredDose.
+
+Without a stored ``DeliveredDose``, every query integrates the whole
+``num_times x num_rois`` matrix read from the file; with it, a query reads
+O(num_rois) values. ``DoseQuery`` follows the airspeed velocity convention; run
+directly to print a table without asv::
+
+    python benchmarks/benchmark_dose.py
+"""
+import os
+import tempfile
+import time
+
+import numpy as np
+from pynwb import NWBHDF5IO
+from pynwb.testing.mock.device import mock_Device
+from pynwb.testing.mock.file import mock_NWBFile
+from pynwb.testing.mock.ophys import mock_ImagingPlane, mock_PlaneSegmentation
+
+from ndx_holographic_stimulation import (
+    LightSource,
+    PatternedOptogeneticSeries,
+    PatternedOptogeneticStimulusSite,
+    SpatialLightModulator,
+    SpiralScanning,
+)
+from ndx_holographic_stimulation.dose import compute_delivered_dose
+
+NUM_TIMES = [10_000, 100_000, 1_000_000]
+NUM_ROIS = 100
+RATE = 1000.0
+
+
+def make_data(num_times, num_rois):
+    """Pulses of 10 ms every 30 ms, 10 per interval, one interval per ROI every 2 s."""
+    data = np.zeros((num_times, num_rois), dtype=np.float32)
+    t = np.arange(num_times) / RATE
+    for roi in range(num_rois):
+        phase = (t - roi * 0.02) % 2.0
+        data[:, roi] = ((phase < 0.3) & (phase % 0.03 < 0.01)) * 0.05
+    return data
+
+
+def build_nwbfile(data, with_dose):
+    num_times, num_rois = data.shape
+    nwbfile = mock_NWBFile()
+    device = mock_Device(name="device", nwbfile=nwbfile)
+    plane_segmentation = mock_PlaneSegmentation(
+        imaging_plane=mock_ImagingPlane(device=device, nwbfile=nwbfile), n_rois=num_rois, nwbfile=nwbfile
+    )
+    pattern = SpiralScanning(
+        name="stimulus_pattern", description="spiral", diameter=15e-6, height=10e-6, number_of_revolutions=5,
+        duration=10e-3, number_of_stimulus_presentation=10, inter_stimulus_interval=20e-3,
+    )
+    nwbfile.add_lab_meta_data(pattern)
+    site = PatternedOptogeneticStimulusSite(
+        name="site", description="site", excitation_lambda=600.0, effector="ChR2", location="VISrl", device=device
+    )
+    nwbfile.add_ogen_site(site)
+    slm = SpatialLightModulator(name="spatial_light_modulator", description="slm")
+    light_source = LightSource(name="light_source", description="laser", stimulation_wavelength=600.0)
+    nwbfile.add_device(slm)
+    nwbfile.add_device(light_source)
+    series = PatternedOptogeneticSeries(
+        name="PatternedOptogeneticSeries",
+        description="benchmark",
+        data=data,
+        unit="watts",
+        rate=RATE,
+        rois=plane_segmentation.create_roi_table_region(region=list(range(num_rois)), description="all rois"),
+        site=site,
+        device=device,
+        stimulus_pattern=pattern,
+        spatial_light_modulator=slm,
+        light_source=light_source,
+    )
+    nwbfile.add_stimulus(series)
+    if with_dose:
+        series.get_delivered_dose(store=True)
+    return nwbfile
+
+
+def query(path, stored):
+    """Energy per ROI and per presentation, from a freshly opened file."""
+    with NWBHDF5IO(path, mode="r") as io:
+        series = io.read().stimulus["PatternedOptogeneticSeries"]
+        dose = series.get_delivered_dose() if stored else compute_delivered_dose(series)
+        return dose.energy[:], dose.get_presentation_dose().energy
+
+
+class DoseQuery:
+    params = (NUM_TIMES, [False, True])
+    param_names = ["num_times", "stored"]
+    timeout = 600
+
+    def setup(self, num_times, stored):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "dose.nwb")
+        with NWBHDF5IO(self.path, mode="w") as io:
+            io.write(build_nwbfile(make_data(num_times, NUM_ROIS), with_dose=stored), cache_spec=False)
+
+    def teardown(self, num_times, stored):
+        self.tmpdir.cleanup()
+
+    def time_query(self, num_times, stored):
+        query(self.path, stored)
+
+
+def main():
+    print("%9s %8s %14s %14s %10s" % ("num_times", "num_rois", "recompute s", "stored s", "speedup"))
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for num_times in NUM_TIMES:
+            data = make_data(num_times, NUM_ROIS)
+            seconds = []
+            for stored in (False, True):
+                path = os.path.join(tmpdir, "dose_%s.nwb" % stored)
+                with NWBHDF5IO(path, mode="w") as io:
+                    io.write(build_nwbfile(data, with_dose=stored), cache_spec=False)
+                t0 = time.perf_counter()
+                query(path, stored)
+                seconds.append(time.perf_counter() - t0)
+            print("%9d %8d %14.3f %14.3f %9.0fx" % (num_times, NUM_ROIS, seconds[0], seconds[1],
+                                                    seconds[0] / seconds[1]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Estimated off-target excitation of a ROI table by many stimulation targets.
+
+A 512 x 512 plane of 1 um pixels holds ``NUM_ROIS`` round ROIs of about 80
+pixels. A session stimulates ``NUM_STIMULATIONS`` times, each time one of
+``NUM_TARGETS`` distinct targets placed on ROI centers, at depths up to
++/- 20 um from the plane; the PSF is 9 um laterally and 32 um axially.
+``per target`` evaluates the profile of each distinct target on every mask
+pixel with numpy, one target at a time; ``batched`` is
+``ExcitationModel.excitation`` on a new model, computing each distinct target
+once in batches of nearby targets; ``cached`` is the same call again, served
+from the model's cache. ``Excitation`` follows the airspeed velocity
+convention; run directly to print a table without asv::
+
+    python benchmarks/benchmark_excitation.py
+"""
+import time
+
+import numpy as np
+from pynwb.ophys import PlaneSegmentation
+from pynwb.testing.mock.ophys import mock_ImagingPlane
+
+from ndx_holographic_stimulation.excitation import ExcitationModel
+from ndx_holographic_stimulation.temporal_focusing import PointSpreadFunction
+
+SIZE, PIXEL_SIZE = 512, 1e-6
+NUM_ROIS, NUM_TARGETS, NUM_STIMULATIONS = 2_000, 1_000, 20_000
+PSF = PointSpreadFunction(lateral=9e-6, axial=32e-6)
+ROI_RADIUS = 5
+
+
+def make_plane_segmentation():
+    rng = np.random.default_rng(0)
+    plane_segmentation = PlaneSegmentation(name="PlaneSegmentation", description="rois",
+                                           imaging_plane=mock_ImagingPlane())
+    dx, dy = np.mgrid[-ROI_RADIUS:ROI_RADIUS + 1, -ROI_RADIUS:ROI_RADIUS + 1]
+    inside = dx ** 2 + dy ** 2 <= ROI_RADIUS ** 2
+    centers = rng.integers(ROI_RADIUS, SIZE - ROI_RADIUS, (NUM_ROIS, 2))
+    for cx, cy in centers:
+        plane_segmentation.add_roi(pixel_mask=[(int(cx + x), int(cy + y), 1.0) for x, y in zip(dx[inside], dy[inside])])
+    return plane_segmentation, centers
+
+
+def make_session(centers):
+    rng = np.random.default_rng(1)
+    rois = rng.choice(len(centers), NUM_TARGETS, replace=False)
+    targets = np.column_stack([centers[rois] * PIXEL_SIZE, rng.uniform(-20e-6, 20e-6, NUM_TARGETS)])
+    stimulated = rng.integers(0, NUM_TARGETS, NUM_STIMULATIONS)
+    return targets[stimulated], rois[stimulated]
+
+
+def per_target(plane_segmentation, stimulations):
+    pixels = np.concatenate(plane_segmentation["pixel_mask"][:])
+    counts = np.array([len(mask) for mask in plane_segmentation["pixel_mask"][:]])
+    roi = np.repeat(np.arange(NUM_ROIS), counts)
+    x, y = pixels[:, 0] * PIXEL_SIZE, pixels[:, 1] * PIXEL_SIZE
+    weight = pixels[:, 2] / counts[roi]
+    targets, inverse = np.unique(stimulations, axis=0, return_inverse=True)
+    rows = np.empty((len(targets), NUM_ROIS), dtype=np.float32)
+    for i, (tx, ty, tz) in enumerate(targets):
+        d2 = ((x - tx) ** 2 + (y - ty) ** 2) / PSF.lateral ** 2 + (tz / PSF.axial) ** 2
+        rows[i] = np.bincount(roi, weights=weight * np.exp(-4 * np.log(2) * d2), minlength=NUM_ROIS)
+    return rows[inverse.reshape(-1)]
+
+
+class Excitation:
+    params = ["per target", "batched", "cached"]
+    param_names = ["method"]
+    timeout = 900
+
+    def setup(self, method):
+        self.plane_segmentation, centers = make_plane_segmentation()
+        self.stimulations, _ = make_session(centers)
+        self.model = ExcitationModel(self.plane_segmentation, PSF, pixel_size=PIXEL_SIZE)
+        if method == "cached":
+            self.model.excitation(self.stimulations)
+
+    def time_excitation(self, method):
+        if method == "per target":
+            per_target(self.plane_segmentation, self.stimulations)
+        else:
+            self.model.excitation(self.stimulations)
+
+
+def main():
+    plane_segmentation, centers = make_plane_segmentation()
+    stimulations, rois = make_session(centers)  # the ROI each stimulation is aimed at
+    print("%d ROIs, %d stimulations of %d distinct targets" % (NUM_ROIS, NUM_STIMULATIONS, NUM_TARGETS))
+    print("%12s %10s %14s" % ("method", "s", "stims/s"))
+
+    t0 = time.perf_counter()
+    expected = per_target(plane_segmentation, stimulations)
+    seconds = time.perf_counter() - t0
+    print("%12s %10.3f %14.0f" % ("per target", seconds, NUM_STIMULATIONS / seconds))
+
+    t0 = time.perf_counter()
+    model = ExcitationModel(plane_segmentation, PSF, pixel_size=PIXEL_SIZE)
+    excitation = model.excitation(stimulations)
+    seconds = time.perf_counter() - t0
+    print("%12s %10.3f %14.0f" % ("batched", seconds, NUM_STIMULATIONS / seconds))
+    t0 = time.perf_counter()
+    model.excitation(stimulations)
+    seconds = time.perf_counter() - t0
+    print("%12s %10.3f %14.0f" % ("cached", seconds, NUM_STIMULATIONS / seconds))
+    print("largest difference to per target: %.2e" % np.abs(excitation - expected).max())
+
+    off_target = model.off_target(stimulations, rois, threshold=0.1)
+    print("stimulations exciting another ROI above 0.1: %.0f%%" % (100 * np.mean(off_target.num_off_target > 0)))
+
+
+if __name__ == "__main__":
+    main()
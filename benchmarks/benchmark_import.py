@@ -0,0 +1,67 @@
+"""Startup cost of ``import ndx_holographic_stimulation``.
+
+The ``timeraw_*`` functions follow the airspeed velocity convention: they
+return the code to time, which is run in a fresh interpreter. pynwb is imported
+in the setup code so only the extension's own import is measured.
+
+Run directly to compare the import modes without asv::
+
+    python benchmarks/benchmark_import.py
+"""
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+SETUP = "import pynwb"
+LAZY_SETUP = "import os; os.environ['NDX_HOLOGRAPHIC_STIMULATION_LAZY_IMPORT'] = '1'; import pynwb"
+IMPORT = "import ndx_holographic_stimulation"
+ACCESS = "import ndx_holographic_stimulation; ndx_holographic_stimulation.PatternedOptogeneticSeries"
+
+
+def timeraw_import_eager():
+    return IMPORT, SETUP
+
+
+def timeraw_import_lazy():
+    return IMPORT, LAZY_SETUP
+
+
+def timeraw_import_lazy_then_access():
+    return ACCESS, LAZY_SETUP
+
+
+def _time_in_subprocess(statement, env, repeat):
+    code = (
+        "import time; {setup}; t0 = time.perf_counter(); {statement}; "
+        "print(time.perf_counter() - t0)".format(setup=SETUP, statement=statement)
+    )
+    times = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", code], env=env, check=True, capture_output=True, text=True)
+        times.append(float(out.stdout.strip().splitlines()[-1]))
+    return statistics.median(times)
+
+
+def main(repeat=7):
+    src = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "pynwb")
+    with tempfile.TemporaryDirectory() as cache_dir:
+        base_env = dict(os.environ, PYTHONPATH=os.pathsep.join([src, os.environ.get("PYTHONPATH", "")]),
+                        NDX_HOLOGRAPHIC_STIMULATION_CACHE_DIR=cache_dir, NDX_HOLOGRAPHIC_STIMULATION_SPEC_CACHE="1")
+        cases = [
+            ("eager, spec cache disabled (default)", IMPORT, dict(NDX_HOLOGRAPHIC_STIMULATION_SPEC_CACHE="0")),
+            ("eager, spec cache warm", IMPORT, {}),
+            ("lazy, no class accessed", IMPORT, dict(NDX_HOLOGRAPHIC_STIMULATION_LAZY_IMPORT="1")),
+            ("lazy, then access PatternedOptogeneticSeries", ACCESS, dict(NDX_HOLOGRAPHIC_STIMULATION_LAZY_IMPORT="1")),
+        ]
+        # warm the spec cache
+        _time_in_subprocess(IMPORT, base_env, 1)
+        print("%-50s %10s" % ("import mode", "median ms"))
+        for label, statement, env in cases:
+            seconds = _time_in_subprocess(statement, dict(base_env, **env), repeat)
+            print("%-50s %10.1f" % (label, seconds * 1000))
+
+
+if __name__ == "__main__":
+    main()
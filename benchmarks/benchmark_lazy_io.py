@@ -0,0 +1,146 @@
+"""Reading one series from a file of many PatternedOptogeneticSeries, eagerly versus lazily.
+
+A file holds ``NUM_SERIES`` short series that share their site, devices,
+stimulus pattern and ROI table. ``eager`` is ``NWBHDF5IO.read`` followed by
+the lookup of one series; ``lazy`` is ``LazyNWBHDF5IO.read`` followed by
+``io.series[name]``; ``lazy, 1000 series`` then reads 1000 random series
+through the default cache of 256 series. Each case runs in a fresh interpreter
+and reports its wall time and its peak resident memory above the interpreter
+after imports. ``LazyRead`` follows the airspeed velocity convention; run
+directly to print a table without asv::
+
+    python benchmarks/benchmark_lazy_io.py
+"""
+import os
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+from pynwb import NWBHDF5IO
+from pynwb.testing.mock.device import mock_Device
+from pynwb.testing.mock.file import mock_NWBFile
+from pynwb.testing.mock.ophys import mock_ImagingPlane, mock_PlaneSegmentation
+
+from ndx_holographic_stimulation import (
+    LightSource,
+    PatternedOptogeneticSeries,
+    PatternedOptogeneticStimulusSite,
+    SpatialLightModulator,
+    SpiralScanning,
+)
+from ndx_holographic_stimulation.lazy_io import LazyNWBHDF5IO
+
+NUM_SERIES, NUM_ROIS = 10_000, 8
+
+CASES = {
+    "eager": "with NWBHDF5IO(path, mode='r') as io:\n"
+             "    io.read().stimulus['series_04242'].data[:]\n",
+    "lazy": "with LazyNWBHDF5IO(path, mode='r') as io:\n"
+            "    io.read()\n"
+            "    io.series['series_04242'].data[:]\n",
+    "lazy, 1000 series": "rng = np.random.default_rng(0)\n"
+                         "with LazyNWBHDF5IO(path, mode='r') as io:\n"
+                         "    io.read()\n"
+                         "    for i in rng.integers(0, NUM_SERIES, 1000):\n"
+                         "        io.series['series_%05d' % i].data[:]\n",
+}
+
+# run in a fresh interpreter: print the seconds and the peak RSS above the RSS after the imports, in MB
+_CODE = """
+import resource, sys, time
+import numpy as np
+from pynwb import NWBHDF5IO
+from ndx_holographic_stimulation.lazy_io import LazyNWBHDF5IO
+NUM_SERIES = {num_series}
+path = sys.argv[1]
+def rss():
+    return int(open('/proc/self/statm').read().split()[1]) * resource.getpagesize()
+before = rss()
+t0 = time.perf_counter()
+{case}seconds = time.perf_counter() - t0
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+print(seconds, (peak - before) / 1e6)
+"""
+
+
+def write_file(path):
+    nwbfile = mock_NWBFile()
+    device = mock_Device(name="device", nwbfile=nwbfile)
+    plane_segmentation = mock_PlaneSegmentation(
+        imaging_plane=mock_ImagingPlane(device=device, nwbfile=nwbfile), n_rois=NUM_ROIS, nwbfile=nwbfile
+    )
+    site = PatternedOptogeneticStimulusSite(
+        name="site", description="site", excitation_lambda=600.0, effector="ChR2", location="VISrl", device=device
+    )
+    nwbfile.add_ogen_site(site)
+    slm = SpatialLightModulator(name="spatial_light_modulator", description="slm")
+    light_source = LightSource(name="light_source", description="laser", stimulation_wavelength=600.0)
+    nwbfile.add_device(slm)
+    nwbfile.add_device(light_source)
+    pattern = SpiralScanning(name="stimulus_pattern", description="spiral", diameter=15e-6, height=10e-6,
+                             number_of_revolutions=5, duration=0.01, number_of_stimulus_presentation=5,
+                             inter_stimulus_interval=0.02)
+    nwbfile.add_lab_meta_data(pattern)
+    for i in range(NUM_SERIES):
+        nwbfile.add_stimulus(PatternedOptogeneticSeries(
+            name="series_%05d" % i,
+            description="benchmark",
+            data=np.full((10, 2), float(i)),
+            timestamps=np.arange(10) * 1e-3,
+            unit="watts",
+            rois=plane_segmentation.create_roi_table_region(region=[i % NUM_ROIS, (i + 1) % NUM_ROIS],
+                                                            description="stimulated rois"),
+            site=site,
+            device=device,
+            stimulus_pattern=pattern,
+            spatial_light_modulator=slm,
+            light_source=light_source,
+        ))
+    with NWBHDF5IO(path, mode="w") as io:
+        io.write(nwbfile)
+
+
+def run_case(path, case):
+    code = _CODE.format(num_series=NUM_SERIES, case=CASES[case])
+    src = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "pynwb")
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([src, os.environ.get("PYTHONPATH", "")]))
+    out = subprocess.run([sys.executable, "-c", code, path], env=env, check=True, capture_output=True, text=True)
+    seconds, megabytes = map(float, out.stdout.split())
+    return seconds, megabytes
+
+
+class LazyRead:
+    params = ["eager", "lazy"]
+    param_names = ["mode"]
+    timeout = 1800
+
+    def setup_cache(self):
+        directory = tempfile.mkdtemp()
+        write_file(os.path.join(directory, "many_series.nwb"))
+        return directory
+
+    def time_read_one_series(self, directory, mode):
+        path = os.path.join(directory, "many_series.nwb")
+        if mode == "eager":
+            with NWBHDF5IO(path, mode="r") as io:
+                io.read().stimulus["series_04242"].data[:]
+        else:
+            with LazyNWBHDF5IO(path, mode="r") as io:
+                io.read()
+                io.series["series_04242"].data[:]
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "many_series.nwb")
+        write_file(path)
+        print("%d series (%.0f MB file)" % (NUM_SERIES, os.path.getsize(path) / 1e6))
+        print("%20s %10s %12s" % ("case", "s", "peak MB"))
+        for case in CASES:
+            seconds, megabytes = run_case(path, case)
+            print("%20s %10.2f %12.1f" % (case, seconds, megabytes))
+
+
+if __name__ == "__main__":
+    main()
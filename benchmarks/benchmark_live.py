@@ -0,0 +1,109 @@
+"""Latency and throughput of live recording with ``LiveSeriesWriter``.
+
+A producer appends ``NUM_ROWS`` power commands of ``NUM_ROIS`` ROIs one at a
+time, as fast as it can, for several flush intervals, with and without fsync
+at each durability point. The table reports the append latency percentiles
+seen by the producer, the rows recorded per second and the longest lag
+between the append of a row and its durability. ``LiveRecording`` follows the
+airspeed velocity convention; run directly to print a table without asv::
+
+    python benchmarks/benchmark_live.py
+"""
+import os
+import tempfile
+import time
+
+import numpy as np
+from pynwb.testing.mock.device import mock_Device
+from pynwb.testing.mock.file import mock_NWBFile
+from pynwb.testing.mock.ophys import mock_ImagingPlane, mock_PlaneSegmentation
+
+from ndx_holographic_stimulation import (
+    LightSource,
+    PatternedOptogeneticSeries,
+    PatternedOptogeneticStimulusSite,
+    SpatialLightModulator,
+)
+from ndx_holographic_stimulation.live import LiveSeriesWriter, live_data_io
+
+NUM_ROWS, NUM_ROIS = 100_000, 64
+FLUSH_INTERVALS = [0.01, 0.1, 0.5]
+FSYNC = [False, True]
+
+
+def make_nwbfile():
+    nwbfile = mock_NWBFile()
+    device = mock_Device(name="device", nwbfile=nwbfile)
+    plane_segmentation = mock_PlaneSegmentation(
+        imaging_plane=mock_ImagingPlane(device=device, nwbfile=nwbfile), n_rois=NUM_ROIS, nwbfile=nwbfile
+    )
+    site = PatternedOptogeneticStimulusSite(
+        name="site", description="site", excitation_lambda=600.0, effector="ChR2", location="VISrl", device=device
+    )
+    nwbfile.add_ogen_site(site)
+    slm = SpatialLightModulator(name="spatial_light_modulator", description="slm")
+    light_source = LightSource(name="light_source", description="laser", stimulation_wavelength=600.0)
+    nwbfile.add_device(slm)
+    nwbfile.add_device(light_source)
+    series = PatternedOptogeneticSeries(
+        name="PatternedOptogeneticSeries",
+        description="benchmark",
+        data=live_data_io(NUM_ROIS),
+        timestamps=live_data_io(dtype=np.float64),
+        unit="watts",
+        rois=plane_segmentation.create_roi_table_region(region=list(range(NUM_ROIS)), description="all rois"),
+        site=site,
+        device=device,
+        spatial_light_modulator=slm,
+        light_source=light_source,
+    )
+    nwbfile.add_stimulus(series)
+    return nwbfile, series
+
+
+def record(path, flush_interval, fsync):
+    nwbfile, series = make_nwbfile()
+    rows = np.random.default_rng(0).random((NUM_ROWS, NUM_ROIS), dtype=np.float32)
+    latencies = np.empty(NUM_ROWS)
+    with LiveSeriesWriter(path, nwbfile, series, flush_interval=flush_interval, fsync=fsync) as writer:
+        start = time.perf_counter()
+        for i in range(NUM_ROWS):
+            t0 = time.perf_counter()
+            writer.append(i * 1e-3, rows[i])
+            latencies[i] = time.perf_counter() - t0
+        writer.flush()
+        seconds = time.perf_counter() - start
+    return latencies, seconds, writer.stats()
+
+
+class LiveRecording:
+    params = (FLUSH_INTERVALS, FSYNC)
+    param_names = ["flush_interval", "fsync"]
+    timeout = 900
+
+    def setup(self, flush_interval, fsync):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def teardown(self, flush_interval, fsync):
+        self.directory.cleanup()
+
+    def time_record(self, flush_interval, fsync):
+        record(os.path.join(self.directory.name, "live.nwb"), flush_interval, fsync)
+
+
+def main():
+    print("%d rows of %d float32, appended one at a time" % (NUM_ROWS, NUM_ROIS))
+    print("%8s %6s %10s %10s %10s %12s %10s %8s"
+          % ("interval", "fsync", "p50 us", "p99 us", "max ms", "rows/s", "max lag s", "writes"))
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for flush_interval in FLUSH_INTERVALS:
+            for fsync in FSYNC:
+                latencies, seconds, stats = record(os.path.join(tmpdir, "live.nwb"), flush_interval, fsync)
+                p50, p99 = np.percentile(latencies, [50, 99]) * 1e6
+                print("%8.2f %6s %10.1f %10.1f %10.2f %12.0f %10.3f %8d"
+                      % (flush_interval, fsync, p50, p99, latencies.max() * 1e3, NUM_ROWS / seconds, stats.max_lag,
+                         stats.writes))
+
+
+if __name__ == "__main__":
+    main()
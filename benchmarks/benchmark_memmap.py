@@ -0,0 +1,144 @@
+"""Random-access reads of contiguous series data through h5py versus ``numpy.memmap``.
+
+A series of ``NUM_TIMES`` samples of ``NUM_ROIS`` float32 is written
+contiguous and uncompressed, then read back with ``NWBHDF5IO`` through the
+h5py datasets (``h5py``) or after ``PatternedOptogeneticSeries.use_memmap``
+(``memmap``). Each access pattern is timed over ``NUM_READS`` random
+positions on a warm page cache: single rows, windows of 100 rows, 64 sorted
+scattered rows, and the whole trace of one ROI, plus a ``get_window`` time
+query. Slices of a memmap are views, so every read is copied to an array to
+time the actual read. ``MemmapReads`` follows the airspeed velocity
+convention; run directly to print a table without asv::
+
+    python benchmarks/benchmark_memmap.py
+"""
+import os
+import tempfile
+import time
+
+import numpy as np
+from pynwb import NWBHDF5IO
+from pynwb.testing.mock.device import mock_Device
+from pynwb.testing.mock.file import mock_NWBFile
+from pynwb.testing.mock.ophys import mock_ImagingPlane, mock_PlaneSegmentation
+
+from ndx_holographic_stimulation import (
+    LightSource,
+    PatternedOptogeneticSeries,
+    PatternedOptogeneticStimulusSite,
+    SpatialLightModulator,
+)
+
+NUM_TIMES, NUM_ROIS = 2_000_000, 32
+RATE = 1000.0
+NUM_READS = 2000
+METHODS = ["h5py", "memmap"]
+
+
+def write_file(path):
+    nwbfile = mock_NWBFile()
+    device = mock_Device(name="device", nwbfile=nwbfile)
+    plane_segmentation = mock_PlaneSegmentation(
+        imaging_plane=mock_ImagingPlane(device=device, nwbfile=nwbfile), n_rois=NUM_ROIS, nwbfile=nwbfile
+    )
+    site = PatternedOptogeneticStimulusSite(
+        name="site", description="site", excitation_lambda=600.0, effector="ChR2", location="VISrl", device=device
+    )
+    nwbfile.add_ogen_site(site)
+    slm = SpatialLightModulator(name="spatial_light_modulator", description="slm")
+    light_source = LightSource(name="light_source", description="laser", stimulation_wavelength=600.0)
+    nwbfile.add_device(slm)
+    nwbfile.add_device(light_source)
+    nwbfile.add_stimulus(PatternedOptogeneticSeries(
+        name="PatternedOptogeneticSeries",
+        description="benchmark",
+        data=np.random.default_rng(0).random((NUM_TIMES, NUM_ROIS), dtype=np.float32),
+        timestamps=np.arange(NUM_TIMES) / RATE,
+        unit="watts",
+        rois=plane_segmentation.create_roi_table_region(region=list(range(NUM_ROIS)), description="all rois"),
+        site=site,
+        device=device,
+        spatial_light_modulator=slm,
+        light_source=light_source,
+    ))
+    with NWBHDF5IO(path, mode="w") as io:
+        io.write(nwbfile)
+
+
+def _rows(series, starts):
+    for i in starts:
+        np.array(series.data[i])
+
+
+def _windows(series, starts):
+    for i in starts:
+        np.array(series.data[i:i + 100])
+
+
+def _scattered(series, starts):
+    rng = np.random.default_rng(2)
+    for _ in starts:
+        np.array(series.data[np.sort(rng.choice(NUM_TIMES, 64, replace=False))])
+
+
+def _roi_traces(series, starts):
+    for i in starts[:4]:
+        np.array(series.data[:, i % NUM_ROIS])
+
+
+def _time_windows(series, starts):
+    for i in starts:
+        series.get_window(i / RATE, (i + 100) / RATE, rois=[3, 7])
+
+
+PATTERNS = {
+    "row": _rows,
+    "100 rows": _windows,
+    "64 scattered": _scattered,
+    "roi trace": _roi_traces,
+    "get_window": _time_windows,
+}
+
+
+def read(path, method, pattern):
+    starts = np.random.default_rng(1).integers(0, NUM_TIMES - 100, NUM_READS)
+    with NWBHDF5IO(path, mode="r") as io:
+        series = io.read().stimulus["PatternedOptogeneticSeries"]
+        if method == "memmap":
+            series.use_memmap()
+        series.data[:1]  # open the dataset
+        t0 = time.perf_counter()
+        PATTERNS[pattern](series, starts)
+        return time.perf_counter() - t0
+
+
+class MemmapReads:
+    params = (METHODS, list(PATTERNS))
+    param_names = ["method", "pattern"]
+    timeout = 900
+
+    def setup_cache(self):
+        directory = tempfile.mkdtemp()
+        write_file(os.path.join(directory, "contiguous.nwb"))
+        return directory
+
+    def time_reads(self, directory, method, pattern):
+        read(os.path.join(directory, "contiguous.nwb"), method, pattern)
+
+
+def main():
+    print("%d x %d float32 contiguous (%.0f MB), %d random reads per pattern (4 for roi trace)"
+          % (NUM_TIMES, NUM_ROIS, NUM_TIMES * NUM_ROIS * 4 / 1e6, NUM_READS))
+    print("%14s %12s %12s %10s" % ("pattern", "h5py ms", "memmap ms", "speedup"))
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "contiguous.nwb")
+        write_file(path)
+        for pattern in PATTERNS:
+            read(path, "h5py", pattern)  # warm the page cache
+            seconds = {method: read(path, method, pattern) for method in METHODS}
+            print("%14s %12.1f %12.1f %9.1fx" % (pattern, seconds["h5py"] * 1e3, seconds["memmap"] * 1e3,
+                                                 seconds["h5py"] / seconds["memmap"]))
+
+
+if __name__ == "__main__":
+    main()
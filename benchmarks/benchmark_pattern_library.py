@@ -0,0 +1,109 @@
+"""Storing stimulus patterns as one LabMetaData group each vs one OptogeneticStimulusPatternLibrary table.
+
+Each session uses ``num_patterns`` patterns drawn from a grid of about
+``num_patterns / 4`` distinct parameter sets. ``PatternStorage`` follows the
+airspeed velocity convention; run directly to print a table without asv::
+
+    python benchmarks/benchmark_pattern_library.py
+"""
+import os
+import tempfile
+import time
+
+import h5py
+from pynwb import NWBHDF5IO
+from pynwb.testing.mock.file import mock_NWBFile
+
+from ndx_holographic_stimulation import OptogeneticStimulusPatternLibrary, SpiralScanning
+
+
+def make_patterns(num_patterns):
+    num_unique = max(num_patterns // 4, 1)
+    return [
+        SpiralScanning(
+            name="spiral_scanning_%d" % i,
+            description="spiral scanning pattern",
+            diameter=(10 + (i % num_unique) % 10) * 1e-6,
+            height=10e-6,
+            number_of_revolutions=5,
+            duration=(1 + (i % num_unique) // 10) * 1e-3,
+            number_of_stimulus_presentation=10,
+            inter_stimulus_interval=0.02,
+        )
+        for i in range(num_patterns)
+    ]
+
+
+def build_nwbfile(patterns, storage):
+    nwbfile = mock_NWBFile()
+    if storage == "groups":
+        for pattern in patterns:
+            nwbfile.add_lab_meta_data(pattern)
+    else:
+        library = OptogeneticStimulusPatternLibrary()
+        for pattern in patterns:
+            library.add_pattern(pattern)
+        nwbfile.add_lab_meta_data(library)
+    return nwbfile
+
+
+def write(nwbfile, path):
+    with NWBHDF5IO(path, mode="w") as io:
+        io.write(nwbfile, cache_spec=False)
+
+
+def read(path):
+    with NWBHDF5IO(path, mode="r") as io:
+        return len(io.read().lab_meta_data)
+
+
+def count_objects(path):
+    """Number of HDF5 groups and datasets in the file."""
+    names = []
+    with h5py.File(path, "r") as f:
+        f.visit(names.append)
+    return len(names)
+
+
+class PatternStorage:
+    params = ([100, 1_000, 5_000], ["groups", "table"])
+    param_names = ["num_patterns", "storage"]
+    timeout = 600
+
+    def setup(self, num_patterns, storage):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "patterns.nwb")
+        self.patterns = make_patterns(num_patterns)
+        write(build_nwbfile(make_patterns(num_patterns), storage), self.path)
+
+    def teardown(self, num_patterns, storage):
+        self.tmpdir.cleanup()
+
+    def time_build_and_write(self, num_patterns, storage):
+        write(build_nwbfile(self.patterns, storage), os.path.join(self.tmpdir.name, "written.nwb"))
+
+    def time_read(self, num_patterns, storage):
+        read(self.path)
+
+    def track_hdf5_objects(self, num_patterns, storage):
+        return count_objects(self.path)
+
+    track_hdf5_objects.unit = "objects"
+
+
+def main():
+    print("%12s %8s %12s %10s %10s" % ("num_patterns", "storage", "hdf5 objects", "write s", "read s"))
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "patterns.nwb")
+        for num_patterns in PatternStorage.params[0]:
+            for storage in PatternStorage.params[1]:
+                t0 = time.perf_counter()
+                write(build_nwbfile(make_patterns(num_patterns), storage), path)
+                t1 = time.perf_counter()
+                read(path)
+                t2 = time.perf_counter()
+                print("%12d %8s %12d %10.3f %10.3f" % (num_patterns, storage, count_objects(path), t1 - t0, t2 - t1))
+
+
+if __name__ == "__main__":
+    main()
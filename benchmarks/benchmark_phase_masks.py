@@ -0,0 +1,129 @@
+"""File size and random-access read latency of SLM phase masks, stored per display versus deduplicated.
+
+A session displays ``NUM_DISPLAYS`` masks of 1920 x 1152 8-bit pixels, drawn
+from ``NUM_DISTINCT`` distinct masks: half of them smooth (one or two targets:
+a wrapped lens and grating) and half speckle-like (holograms of 20 targets).
+``dense`` stores every display (one chunk per mask, uncompressed);
+``dedup-*`` stores each distinct mask once with ``SLMPhaseMasks``, uncompressed
+or with a gzip level. Latency is that of ``get_displayed_mask`` at random
+times on an open file. pynwb opens files with a 32 MiB chunk cache, which
+holds the few distinct masks once read: the median is mostly cache hits and
+the 99th percentile the first read (and decompression) of a mask.
+``PhaseMaskStorage`` follows the airspeed velocity convention; run directly
+to print a table without asv::
+
+    python benchmarks/benchmark_phase_masks.py
+"""
+import os
+import tempfile
+import time
+
+import numpy as np
+from hdmf.backends.hdf5 import H5DataIO
+from pynwb import NWBHDF5IO
+from pynwb.testing.mock.file import mock_NWBFile
+
+from ndx_holographic_stimulation import SLMPhaseMasks, SpatialLightModulator
+from ndx_holographic_stimulation.phase_masks import deduplicate_phase_masks, mask_hash
+
+HEIGHT, WIDTH = 1152, 1920
+NUM_DISTINCT, NUM_DISPLAYS = 10, 200
+NUM_READS = 100
+METHODS = {
+    "dense": None,
+    "dedup-none": "none",
+    "dedup-gzip4": "balanced",
+    "dedup-gzip9": "max",
+}
+
+
+def hologram(rng, num_targets):
+    """Wrapped phase of the sum of one lens-and-grating field per target, in gray levels."""
+    y, x = np.mgrid[:HEIGHT, :WIDTH].astype(np.float32)
+    field = np.zeros((HEIGHT, WIDTH), dtype=np.complex64)
+    for _ in range(num_targets):
+        kx, ky, focus = rng.uniform(-0.3, 0.3), rng.uniform(-0.3, 0.3), rng.uniform(-2e-5, 2e-5)
+        field += np.exp(1j * (kx * x + ky * y + focus * ((x - WIDTH / 2) ** 2 + (y - HEIGHT / 2) ** 2)
+                              + rng.uniform(0, 2 * np.pi)))
+    return ((np.angle(field) + np.pi) / (2 * np.pi) * 255).astype(np.uint8)
+
+
+def make_session():
+    rng = np.random.default_rng(0)
+    distinct = [hologram(rng, 1 + (k % 2) if k < NUM_DISTINCT // 2 else 20) for k in range(NUM_DISTINCT)]
+    sequence = rng.integers(0, NUM_DISTINCT, NUM_DISPLAYS)
+    timestamps = np.arange(NUM_DISPLAYS) * 2.0  # one display per 2 s trial
+    return distinct, sequence, timestamps
+
+
+def write_file(path, method, session):
+    distinct, sequence, timestamps = session
+    nwbfile = mock_NWBFile()
+    slm = SpatialLightModulator(name="spatial_light_modulator", description="slm")
+    if METHODS[method] is None:
+        # every display stored as its own mask
+        dense = np.stack([distinct[k] for k in sequence])
+        slm.phase_masks = SLMPhaseMasks(
+            unit="gray levels",
+            masks=H5DataIO(dense, chunks=(1, HEIGHT, WIDTH)),
+            mask_hash=[mask_hash(mask) for mask in dense],
+            timestamps=timestamps,
+            mask_index=np.arange(NUM_DISPLAYS, dtype=np.uint32),
+        )
+    else:
+        slm.phase_masks = deduplicate_phase_masks(timestamps, (distinct[k] for k in sequence),
+                                                  compression=METHODS[method])
+    nwbfile.add_device(slm)
+    with NWBHDF5IO(path, mode="w") as io:
+        io.write(nwbfile, cache_spec=False)
+
+
+def read_random(path, times):
+    with NWBHDF5IO(path, mode="r") as io:
+        phase_masks = io.read().devices["spatial_light_modulator"].phase_masks
+        latencies = []
+        for t in times:
+            t0 = time.perf_counter()
+            phase_masks.get_displayed_mask(t)
+            latencies.append(time.perf_counter() - t0)
+        return np.array(latencies)
+
+
+class PhaseMaskStorage:
+    params = list(METHODS)
+    param_names = ["method"]
+    timeout = 900
+
+    def setup_cache(self):
+        directory = tempfile.mkdtemp()
+        session = make_session()
+        for method in METHODS:
+            write_file(os.path.join(directory, "%s.nwb" % method), method, session)
+        return directory
+
+    def time_random_reads(self, directory, method):
+        read_random(os.path.join(directory, "%s.nwb" % method), np.linspace(0, 2.0 * NUM_DISPLAYS, NUM_READS))
+
+    def track_file_size(self, directory, method):
+        return os.path.getsize(os.path.join(directory, "%s.nwb" % method))
+
+
+def main():
+    print("%d displays of %d distinct %d x %d uint8 masks (%.0f MB as displayed)"
+          % (NUM_DISPLAYS, NUM_DISTINCT, WIDTH, HEIGHT, NUM_DISPLAYS * HEIGHT * WIDTH / 1e6))
+    session = make_session()
+    times = np.random.default_rng(1).uniform(0, 2.0 * NUM_DISPLAYS, NUM_READS)
+    print("%12s %10s %10s %12s %12s" % ("method", "write s", "MB", "median ms", "p99 ms"))
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for method in METHODS:
+            path = os.path.join(tmpdir, "%s.nwb" % method)
+            t0 = time.perf_counter()
+            write_file(path, method, session)
+            seconds = time.perf_counter() - t0
+            latencies = read_random(path, times) * 1e3
+            print("%12s %10.2f %10.1f %12.2f %12.2f"
+                  % (method, seconds, os.path.getsize(path) / 1e6, np.median(latencies), np.percentile(latencies, 99)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Overhead of ``profile`` on writing and reading a file of many PatternedOptogeneticSeries.
+
+``NUM_SERIES`` series sharing their links are constructed, written and read
+back, without ``profile`` (``off``), inside ``profile(enabled=False)``
+(``disabled``) and inside ``profile()`` (``enabled``). The time spent in each
+phase by the profiled run is printed after the table. ``Profiling`` follows the
+airspeed velocity convention; run directly to print a table without asv::
+
+    python benchmarks/benchmark_profiling.py
+"""
+import contextlib
+import os
+import tempfile
+import time
+
+import numpy as np
+from pynwb import NWBHDF5IO
+from pynwb.testing.mock.device import mock_Device
+from pynwb.testing.mock.file import mock_NWBFile
+from pynwb.testing.mock.ophys import mock_ImagingPlane, mock_PlaneSegmentation
+
+from ndx_holographic_stimulation import (
+    LightSource,
+    PatternedOptogeneticSeries,
+    PatternedOptogeneticStimulusSite,
+    SpatialLightModulator,
+    SpiralScanning,
+)
+from ndx_holographic_stimulation.profiling import profile
+
+NUM_SERIES, NUM_TIMES, NUM_ROIS = 200, 1000, 8
+MODES = ["off", "disabled", "enabled"]
+
+
+def make_nwbfile():
+    nwbfile = mock_NWBFile()
+    device = mock_Device(name="device", nwbfile=nwbfile)
+    plane_segmentation = mock_PlaneSegmentation(
+        imaging_plane=mock_ImagingPlane(device=device, nwbfile=nwbfile), n_rois=NUM_ROIS, nwbfile=nwbfile
+    )
+    site = PatternedOptogeneticStimulusSite(
+        name="site", description="site", excitation_lambda=600.0, effector="ChR2", location="VISrl", device=device
+    )
+    nwbfile.add_ogen_site(site)
+    slm = SpatialLightModulator(name="spatial_light_modulator", description="slm")
+    light_source = LightSource(name="light_source", description="laser", stimulation_wavelength=600.0)
+    nwbfile.add_device(slm)
+    nwbfile.add_device(light_source)
+    pattern = SpiralScanning(name="stimulus_pattern", description="spiral", diameter=15e-6, height=10e-6,
+                             number_of_revolutions=5, duration=0.01, number_of_stimulus_presentation=5,
+                             inter_stimulus_interval=0.02)
+    nwbfile.add_lab_meta_data(pattern)
+    rois = plane_segmentation.create_roi_table_region(region=list(range(NUM_ROIS)), description="all rois")
+    for i in range(NUM_SERIES):
+        nwbfile.add_stimulus(PatternedOptogeneticSeries(
+            name="series_%d" % i,
+            description="benchmark",
+            data=np.random.default_rng(i).random((NUM_TIMES, NUM_ROIS), dtype=np.float32),
+            rate=1000.0,
+            unit="watts",
+            rois=rois,
+            site=site,
+            device=device,
+            stimulus_pattern=pattern,
+            spatial_light_modulator=slm,
+            light_source=light_source,
+        ))
+    return nwbfile
+
+
+def round_trip(path, mode):
+    """Construct, write and read the file; returns the seconds and the ``ProfileReport`` (None when ``off``)."""
+    context = contextlib.nullcontext() if mode == "off" else profile(enabled=mode == "enabled")
+    t0 = time.perf_counter()
+    with context as report:
+        nwbfile = make_nwbfile()
+        with NWBHDF5IO(path, mode="w") as io:
+            io.write(nwbfile)
+        with NWBHDF5IO(path, mode="r") as io:
+            io.read()
+    return time.perf_counter() - t0, report
+
+
+class Profiling:
+    params = MODES
+    param_names = ["mode"]
+    timeout = 600
+
+    def setup(self, mode):
+        self.directory = tempfile.mkdtemp()
+
+    def time_round_trip(self, mode):
+        round_trip(os.path.join(self.directory, "%s.nwb" % mode), mode)
+
+
+def main():
+    print("%d series of %d x %d float32: construct, write and read" % (NUM_SERIES, NUM_TIMES, NUM_ROIS))
+    print("%10s %10s %10s" % ("mode", "s", "overhead"))
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "profile.nwb")
+        round_trip(path, "off")  # warm up
+        seconds, reports = dict(), dict()
+        for mode in MODES:
+            # best of 3
+            runs = [round_trip(path, mode) for _ in range(3)]
+            seconds[mode], reports[mode] = min(runs, key=lambda run: run[0])
+            print("%10s %10.3f %9.1f%%" % (mode, seconds[mode], 100 * (seconds[mode] / seconds["off"] - 1)))
+        print()
+        print("%10s %10s %10s %10s" % ("phase", "count", "MB", "s"))
+        for phase, stats in reports["enabled"].by_phase().items():
+            print("%10s %10d %10.1f %10.3f" % (phase, stats.count, stats.bytes / 1e6, stats.seconds))
+
+
+if __name__ == "__main__":
+    main()
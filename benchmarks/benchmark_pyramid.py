@@ -0,0 +1,128 @@
+"""Cost of drawing a time range of a long PatternedOptogeneticSeries, with and without a PowerPyramid.
+
+Without a pyramid the whole range is read and reduced in memory; with one, the
+coarsest level that still has ``WIDTH`` bins over the range is read.
+``DownsampledRead`` follows the airspeed velocity convention; run directly to
+print a table without asv::
+
+    python benchmarks/benchmark_pyramid.py
+"""
+import os
+import tempfile
+import time
+
+import numpy as np
+from pynwb import NWBHDF5IO
+from pynwb.testing.mock.device import mock_Device
+from pynwb.testing.mock.file import mock_NWBFile
+from pynwb.testing.mock.ophys import mock_ImagingPlane, mock_PlaneSegmentation
+
+from ndx_holographic_stimulation import (
+    LightSource,
+    PatternedOptogeneticSeries,
+    PatternedOptogeneticStimulusSite,
+    SpatialLightModulator,
+)
+from ndx_holographic_stimulation.pyramid import PyramidBuilder
+from ndx_holographic_stimulation.streaming import stream_data_io
+
+NUM_TIMES, NUM_ROIS = 2_000_000, 64  # 33 min at 1 kHz, 512 MB of float32
+RATE = 1000.0
+WIDTH = 2000
+RANGES = [60.0, 600.0, NUM_TIMES / RATE]  # s, from the start of the session
+
+
+def make_blocks(block_rows=65536):
+    rng = np.random.default_rng(0)
+    for start in range(0, NUM_TIMES, block_rows):
+        rows = min(block_rows, NUM_TIMES - start)
+        yield np.repeat(rng.random((rows // 16 + 1, NUM_ROIS), dtype=np.float32), 16, axis=0)[:rows]
+
+
+def write_file(path, with_pyramid):
+    nwbfile = mock_NWBFile()
+    device = mock_Device(name="device", nwbfile=nwbfile)
+    plane_segmentation = mock_PlaneSegmentation(
+        imaging_plane=mock_ImagingPlane(device=device, nwbfile=nwbfile), n_rois=NUM_ROIS, nwbfile=nwbfile
+    )
+    site = PatternedOptogeneticStimulusSite(
+        name="site", description="site", excitation_lambda=600.0, effector="ChR2", location="VISrl", device=device
+    )
+    nwbfile.add_ogen_site(site)
+    slm = SpatialLightModulator(name="spatial_light_modulator", description="slm")
+    light_source = LightSource(name="light_source", description="laser", stimulation_wavelength=600.0)
+    nwbfile.add_device(slm)
+    nwbfile.add_device(light_source)
+    builder = PyramidBuilder()
+    blocks = builder.tap(make_blocks(), (0.0, RATE)) if with_pyramid else make_blocks()
+    series = PatternedOptogeneticSeries(
+        name="PatternedOptogeneticSeries",
+        description="benchmark",
+        data=stream_data_io(blocks, num_times=NUM_TIMES, compression="none"),
+        unit="watts",
+        rate=RATE,
+        rois=plane_segmentation.create_roi_table_region(region=list(range(NUM_ROIS)), description="all rois"),
+        site=site,
+        device=device,
+        spatial_light_modulator=slm,
+        light_source=light_source,
+    )
+    nwbfile.add_stimulus(series)
+    with NWBHDF5IO(path, mode="w") as io:
+        io.write(nwbfile, cache_spec=False)
+    if with_pyramid:
+        with NWBHDF5IO(path, mode="a") as io:
+            nwbfile = io.read()
+            nwbfile.stimulus["PatternedOptogeneticSeries"].power_pyramid = builder.finish()
+            io.write(nwbfile)
+
+
+def draw(path, duration, with_pyramid):
+    with NWBHDF5IO(path, mode="r") as io:
+        series = io.read().stimulus["PatternedOptogeneticSeries"]
+        if with_pyramid:
+            return series.get_downsampled(0.0, duration, WIDTH)
+        data = series.get_window(0.0, duration).data
+        bins = np.array_split(data, WIDTH)
+        return [(b.min(axis=0), b.max(axis=0), b.mean(axis=0)) for b in bins]
+
+
+class DownsampledRead:
+    params = (RANGES, [False, True])
+    param_names = ["duration", "pyramid"]
+    timeout = 900
+
+    def setup_cache(self):
+        directory = tempfile.mkdtemp()
+        for with_pyramid in (False, True):
+            write_file(os.path.join(directory, "pyramid_%s.nwb" % with_pyramid), with_pyramid)
+        return directory
+
+    def time_draw(self, directory, duration, pyramid):
+        draw(os.path.join(directory, "pyramid_%s.nwb" % pyramid), duration, pyramid)
+
+
+def main():
+    print("%d x %d float32 (%.0f MB), %d pixels" % (NUM_TIMES, NUM_ROIS, NUM_TIMES * NUM_ROIS * 4 / 1e6, WIDTH))
+    with tempfile.TemporaryDirectory() as tmpdir:
+        paths = {}
+        for with_pyramid in (False, True):
+            paths[with_pyramid] = os.path.join(tmpdir, "pyramid_%s.nwb" % with_pyramid)
+            t0 = time.perf_counter()
+            write_file(paths[with_pyramid], with_pyramid)
+            label = "with pyramid" if with_pyramid else "without pyramid"
+            size_mb = os.path.getsize(paths[with_pyramid]) / 1e6
+            print("write %-15s %8.2f s %8.1f MB" % (label, time.perf_counter() - t0, size_mb))
+        print("%10s %14s %14s %10s" % ("range s", "full read s", "pyramid s", "decimation"))
+        for duration in RANGES:
+            t0 = time.perf_counter()
+            draw(paths[False], duration, False)
+            full = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            trace = draw(paths[True], duration, True)
+            pyramid = time.perf_counter() - t0
+            print("%10.0f %14.3f %14.3f %10d" % (duration, full, pyramid, trace.decimation))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Write and read cost of a PatternedOptogeneticSeries as the number of ROIs grows.
+
+``RoiScaling`` follows the airspeed velocity convention (``params``, ``setup``,
+``time_*`` and ``track_*`` methods). Run directly to print a table without asv::
+
+    python benchmarks/benchmark_scaling.py
+"""
+import os
+import tempfile
+import time
+
+import numpy as np
+from pynwb import NWBHDF5IO
+from pynwb.testing.mock.device import mock_Device
+from pynwb.testing.mock.file import mock_NWBFile
+from pynwb.testing.mock.ophys import mock_ImagingPlane, mock_PlaneSegmentation
+
+from ndx_holographic_stimulation import (
+    LightSource,
+    PatternedOptogeneticSeries,
+    PatternedOptogeneticStimulusSite,
+    SpatialLightModulator,
+    SpiralScanning,
+)
+
+NUM_TIMES = 100
+
+
+def build_nwbfile(num_rois, num_times=NUM_TIMES):
+    """An in-memory file holding one series over ``num_rois`` ROIs."""
+    nwbfile = mock_NWBFile()
+    device = mock_Device(name="device", nwbfile=nwbfile)
+    plane_segmentation = mock_PlaneSegmentation(
+        imaging_plane=mock_ImagingPlane(device=device, nwbfile=nwbfile), n_rois=num_rois, nwbfile=nwbfile
+    )
+    pattern = SpiralScanning(
+        name="stimulus_pattern", description="spiral", diameter=15e-6, height=10e-6, number_of_revolutions=5,
+        duration=10e-3, number_of_stimulus_presentation=1000, inter_stimulus_interval=20e-3,
+    )
+    nwbfile.add_lab_meta_data(pattern)
+    site = PatternedOptogeneticStimulusSite(
+        name="site", description="site", excitation_lambda=600.0, effector="ChR2", location="VISrl", device=device
+    )
+    nwbfile.add_ogen_site(site)
+    slm = SpatialLightModulator(name="spatial_light_modulator", description="slm", model="model", resolution=1.0)
+    light_source = LightSource(
+        name="light_source", description="laser", stimulation_wavelength=600.0, filter_description="600/50",
+        peak_power=8.0, intensity=100.0, exposure_time=1e-6, pulse_rate=1e6,
+    )
+    nwbfile.add_device(slm)
+    nwbfile.add_device(light_source)
+    nwbfile.add_stimulus(
+        PatternedOptogeneticSeries(
+            name="PatternedOptogeneticSeries",
+            description="scaling benchmark",
+            data=np.random.default_rng(0).random((num_times, num_rois), dtype=np.float32),
+            unit="watts",
+            rate=1000.0,
+            rois=plane_segmentation.create_roi_table_region(region=list(range(num_rois)), description="all rois"),
+            site=site,
+            device=device,
+            stimulus_pattern=pattern,
+            spatial_light_modulator=slm,
+            light_source=light_source,
+        )
+    )
+    return nwbfile
+
+
+def write(nwbfile, path):
+    with NWBHDF5IO(path, mode="w") as io:
+        io.write(nwbfile, cache_spec=False)
+
+
+def read_rois(path):
+    with NWBHDF5IO(path, mode="r") as io:
+        return io.read().stimulus["PatternedOptogeneticSeries"].rois.data[:]
+
+
+class RoiScaling:
+    params = [100, 1_000, 10_000, 50_000]
+    param_names = ["num_rois"]
+    timeout = 300
+
+    def setup(self, num_rois):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "scaling.nwb")
+        self.nwbfile = build_nwbfile(num_rois)
+        write(build_nwbfile(num_rois), self.path)
+
+    def teardown(self, num_rois):
+        self.tmpdir.cleanup()
+
+    def time_write(self, num_rois):
+        write(self.nwbfile, os.path.join(self.tmpdir.name, "written.nwb"))
+
+    def time_read_rois(self, num_rois):
+        read_rois(self.path)
+
+    def track_rois_itemsize(self, num_rois):
+        return read_rois(self.path).dtype.itemsize
+
+    track_rois_itemsize.unit = "bytes"
+
+
+def main():
+    print("%10s %12s %12s %14s" % ("num_rois", "write s", "read s", "rois dtype"))
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "scaling.nwb")
+        for num_rois in RoiScaling.params:
+            nwbfile = build_nwbfile(num_rois)
+            t0 = time.perf_counter()
+            write(nwbfile, path)
+            t1 = time.perf_counter()
+            rois = read_rois(path)
+            t2 = time.perf_counter()
+            print("%10d %12.3f %12.3f %14s" % (num_rois, t1 - t0, t2 - t1, rois.dtype))
+
+
+if __name__ == "__main__":
+    main()
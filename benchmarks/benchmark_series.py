@@ -0,0 +1,179 @@
+"""Construct, write and read a PatternedOptogeneticSeries over a grid of session sizes and compression settings.
+
+``SeriesSuite`` follows the airspeed velocity convention: ``time_*`` methods
+report wall time, ``peakmem_*`` methods the peak resident memory of the process
+and ``track_*`` methods the value they return. With the ``asv.conf.json`` at the
+root of the repository the suite runs in the current environment, without
+network access::
+
+    asv run --python=same --quick
+
+Run directly to print the same grid with ``tracemalloc`` peaks and without asv::
+
+    python benchmarks/benchmark_series.py
+"""
+import gc
+import itertools
+import os
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+from pynwb import NWBHDF5IO
+from pynwb.testing.mock.device import mock_Device
+from pynwb.testing.mock.file import mock_NWBFile
+from pynwb.testing.mock.ophys import mock_ImagingPlane, mock_PlaneSegmentation
+
+from ndx_holographic_stimulation import (
+    LightSource,
+    PatternedOptogeneticSeries,
+    PatternedOptogeneticStimulusSite,
+    SpatialLightModulator,
+    SpiralScanning,
+    TemporalFocusing,
+)
+from ndx_holographic_stimulation.streaming import iter_blocks, stream_data_io
+
+NUM_TIMES = [1_000, 10_000, 100_000]
+NUM_ROIS = [10, 100, 1_000]
+COMPRESSION = ["none", "fast", "balanced"]
+PATTERNS = ["SpiralScanning", "TemporalFocusing"]
+# grid points with more samples than this are skipped, to keep a full run within a few minutes
+MAX_ELEMENTS = 10_000_000
+RATE = 1000.0
+
+
+def make_pattern(pattern_type):
+    common = dict(name="stimulus_pattern", description="pattern", duration=10e-3,
+                  number_of_stimulus_presentation=10, inter_stimulus_interval=20e-3)
+    if pattern_type == "SpiralScanning":
+        return SpiralScanning(diameter=15e-6, height=10e-6, number_of_revolutions=5, **common)
+    return TemporalFocusing(lateral_point_spread_function="9e-6 m ± 0.7e-6 m",
+                            axial_point_spread_function="32e-6 m ± 1.6e-6 m", **common)
+
+
+def make_data(num_times, num_rois):
+    return np.random.default_rng(0).random((num_times, num_rois), dtype=np.float32)
+
+
+def build_nwbfile(data, pattern_type, compression=None):
+    """An in-memory file with one series over ``data``; written through the streaming path if ``compression``."""
+    num_times, num_rois = data.shape
+    nwbfile = mock_NWBFile()
+    device = mock_Device(name="device", nwbfile=nwbfile)
+    plane_segmentation = mock_PlaneSegmentation(
+        imaging_plane=mock_ImagingPlane(device=device, nwbfile=nwbfile), n_rois=num_rois, nwbfile=nwbfile
+    )
+    pattern = make_pattern(pattern_type)
+    nwbfile.add_lab_meta_data(pattern)
+    site = PatternedOptogeneticStimulusSite(
+        name="site", description="site", excitation_lambda=600.0, effector="ChR2", location="VISrl", device=device
+    )
+    nwbfile.add_ogen_site(site)
+    slm = SpatialLightModulator(name="spatial_light_modulator", description="slm")
+    light_source = LightSource(name="light_source", description="laser", stimulation_wavelength=600.0)
+    nwbfile.add_device(slm)
+    nwbfile.add_device(light_source)
+    if compression is not None:
+        data = stream_data_io(iter_blocks(data, 4096), num_times=num_times, compression=compression)
+    nwbfile.add_stimulus(
+        PatternedOptogeneticSeries(
+            name="PatternedOptogeneticSeries",
+            description="benchmark",
+            data=data,
+            unit="watts",
+            rate=RATE,
+            rois=plane_segmentation.create_roi_table_region(region=list(range(num_rois)), description="all rois"),
+            site=site,
+            device=device,
+            stimulus_pattern=pattern,
+            spatial_light_modulator=slm,
+            light_source=light_source,
+        )
+    )
+    return nwbfile
+
+
+def write(nwbfile, path):
+    with NWBHDF5IO(path, mode="w") as io:
+        io.write(nwbfile, cache_spec=False)
+
+
+def read(path):
+    with NWBHDF5IO(path, mode="r") as io:
+        return io.read().stimulus["PatternedOptogeneticSeries"].data[:]
+
+
+class SeriesSuite:
+    params = (NUM_TIMES, NUM_ROIS, COMPRESSION, PATTERNS)
+    param_names = ["num_times", "num_rois", "compression", "pattern"]
+    timeout = 600
+
+    def setup(self, num_times, num_rois, compression, pattern):
+        if num_times * num_rois > MAX_ELEMENTS:
+            raise NotImplementedError("grid point skipped")  # asv convention for skipping a parameter combination
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "series.nwb")
+        self.data = make_data(num_times, num_rois)
+        write(build_nwbfile(self.data, pattern, compression), self.path)
+
+    def teardown(self, num_times, num_rois, compression, pattern):
+        self.tmpdir.cleanup()
+
+    def time_construct(self, num_times, num_rois, compression, pattern):
+        build_nwbfile(self.data, pattern, compression)
+
+    def time_write(self, num_times, num_rois, compression, pattern):
+        write(build_nwbfile(self.data, pattern, compression), os.path.join(self.tmpdir.name, "written.nwb"))
+
+    def time_read(self, num_times, num_rois, compression, pattern):
+        read(self.path)
+
+    def peakmem_write(self, num_times, num_rois, compression, pattern):
+        write(build_nwbfile(self.data, pattern, compression), os.path.join(self.tmpdir.name, "written.nwb"))
+
+    def peakmem_read(self, num_times, num_rois, compression, pattern):
+        read(self.path)
+
+    def track_file_size(self, num_times, num_rois, compression, pattern):
+        return os.path.getsize(self.path)
+
+    track_file_size.unit = "bytes"
+
+
+def _measure(func, *args):
+    """Wall time, in s, and peak traced memory, in MiB, of ``func(*args)``.
+
+    The two are measured in separate calls, as tracing slows down allocation-heavy code severalfold.
+    """
+    gc.collect()
+    t0 = time.perf_counter()
+    func(*args)
+    seconds = time.perf_counter() - t0
+    gc.collect()
+    tracemalloc.start()
+    func(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak / 1024 ** 2
+
+
+def main():
+    header = ("num_times", "num_rois", "compression", "pattern", "write s", "write MiB", "read s", "read MiB", "MiB")
+    print("%9s %8s %11s %16s %8s %9s %7s %8s %7s" % header)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "series.nwb")
+        for num_times, num_rois, compression, pattern in itertools.product(*SeriesSuite.params):
+            if num_times * num_rois > MAX_ELEMENTS:
+                continue
+            data = make_data(num_times, num_rois)
+            write_s, write_mib = _measure(lambda: write(build_nwbfile(data, pattern, compression), path))
+            read_s, read_mib = _measure(read, path)
+            print("%9d %8d %11s %16s %8.3f %9.1f %7.3f %8.1f %7.1f" % (
+                num_times, num_rois, compression, pattern, write_s, write_mib, read_s, read_mib,
+                os.path.getsize(path) / 1024 ** 2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Spatial queries of stimulation targets: KD-tree index versus brute force.
+
+``NUM_TARGETS`` targets are spread in a 1 x 1 x 0.5 mm volume and queried with
+``NUM_QUERIES`` points (e.g. the centroids of a ROI table): all the targets
+within ``RADIUS`` of each point, and the ``K`` nearest targets of each point.
+``index`` answers both with one batch call on the table's ``TargetIndex``,
+including the time to build the tree; ``brute force`` computes the distances
+from each point to every target with numpy, one point at a time.
+``TargetQueries`` follows the airspeed velocity convention; run directly to
+print a table without asv::
+
+    python benchmarks/benchmark_targets.py
+"""
+import time
+
+import numpy as np
+import scipy.spatial  # noqa: F401  imported here to keep it out of the timings
+
+from ndx_holographic_stimulation import StimulationTargetTable
+
+NUM_TARGETS = [1_000, 10_000, 100_000]
+NUM_QUERIES = 10_000
+RADIUS = 20e-6
+K = 5
+VOLUME = np.array([1e-3, 1e-3, 0.5e-3])
+
+
+def make_points(num, seed):
+    return np.random.default_rng(seed).random((num, 3)) * VOLUME
+
+
+def index_queries(coordinates, points):
+    table = StimulationTargetTable.from_coordinates(coordinates)
+    within = table.query_radius(points, RADIUS)
+    _, nearest = table.query_nearest(points, k=K)
+    return within, nearest
+
+
+def brute_force_queries(coordinates, points):
+    within, nearest = [], np.empty((len(points), K), dtype=np.int64)
+    for i, point in enumerate(points):
+        distances = np.linalg.norm(coordinates - point, axis=1)
+        within.append(np.flatnonzero(distances <= RADIUS))
+        candidates = np.argpartition(distances, K)[:K]
+        nearest[i] = candidates[np.argsort(distances[candidates])]
+    return within, nearest
+
+
+METHODS = {"index": index_queries, "brute force": brute_force_queries}
+
+
+class TargetQueries:
+    params = (NUM_TARGETS, list(METHODS))
+    param_names = ["num_targets", "method"]
+    timeout = 900
+
+    def setup(self, num_targets, method):
+        self.coordinates = make_points(num_targets, 0)
+        self.points = make_points(NUM_QUERIES, 1)
+
+    def time_queries(self, num_targets, method):
+        METHODS[method](self.coordinates, self.points)
+
+
+def main():
+    print("%d query points, radius %g um, %d nearest" % (NUM_QUERIES, RADIUS * 1e6, K))
+    print("%12s %12s %10s %12s" % ("targets", "method", "s", "queries/s"))
+    points = make_points(NUM_QUERIES, 1)
+    for num_targets in NUM_TARGETS:
+        coordinates = make_points(num_targets, 0)
+        results = []
+        for method, queries in METHODS.items():
+            t0 = time.perf_counter()
+            results.append(queries(coordinates, points))
+            seconds = time.perf_counter() - t0
+            print("%12d %12s %10.3f %12.0f" % (num_targets, method, seconds, NUM_QUERIES / seconds))
+        (within, nearest), (expected_within, expected_nearest) = results
+        assert all(np.array_equal(a, b) for a, b in zip(within, expected_within))
+        assert np.array_equal(nearest, expected_nearest)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""Validation of the PatternedOptogeneticSeries of a file, streamed in blocks versus loaded whole.
+
+The file holds ``NUM_SERIES`` series of ``NUM_TIMES x NUM_ROIS`` float32 power
+with dense 10 ms pulses. ``whole`` reads each series in a single block, as a
+check written against in-memory arrays would; ``streamed`` reads blocks of
+65536 samples; ``parallel`` also validates the series in a pool of worker
+processes (peak memory is then spread over the workers and not reported).
+``Validation`` follows the airspeed velocity convention; run directly to
+print a table without asv::
+
+    python benchmarks/benchmark_validation.py
+"""
+import os
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+from pynwb import NWBHDF5IO
+from pynwb.testing.mock.device import mock_Device
+from pynwb.testing.mock.file import mock_NWBFile
+from pynwb.testing.mock.ophys import mock_ImagingPlane, mock_PlaneSegmentation
+
+from ndx_holographic_stimulation import (
+    LightSource,
+    PatternedOptogeneticSeries,
+    PatternedOptogeneticStimulusSite,
+    SpatialLightModulator,
+    SpiralScanning,
+)
+from ndx_holographic_stimulation.streaming import stream_data_io
+from ndx_holographic_stimulation.validation import validate_file
+
+NUM_SERIES = 4
+NUM_TIMES, NUM_ROIS = 2_000_000, 16  # 33 min at 1 kHz, 128 MB of float32 per series
+RATE = 1000.0
+METHODS = {"whole": (0, NUM_TIMES), "streamed": (0, 65536), "parallel": (None, 65536)}
+
+
+def make_blocks(roi_offset, block_rows=65536):
+    # 10 ms pulses every 30 ms, 10 per interval, one interval per ROI every second
+    samples = np.arange(NUM_TIMES)
+    for start in range(0, NUM_TIMES, block_rows):
+        block = samples[start:start + block_rows, np.newaxis]
+        phase = (block - 40 * (np.arange(NUM_ROIS) + roi_offset)) % 1000
+        yield ((phase < 300) & (phase % 30 < 10)).astype(np.float32) * 0.05
+
+
+def write_file(path):
+    nwbfile = mock_NWBFile()
+    device = mock_Device(name="device", nwbfile=nwbfile)
+    plane_segmentation = mock_PlaneSegmentation(
+        imaging_plane=mock_ImagingPlane(device=device, nwbfile=nwbfile), n_rois=NUM_ROIS, nwbfile=nwbfile
+    )
+    pattern = SpiralScanning(
+        name="stimulus_pattern", description="spiral", diameter=15e-6, height=10e-6, number_of_revolutions=5,
+        duration=10e-3, number_of_stimulus_presentation=10, inter_stimulus_interval=20e-3,
+    )
+    nwbfile.add_lab_meta_data(pattern)
+    site = PatternedOptogeneticStimulusSite(
+        name="site", description="site", excitation_lambda=600.0, effector="ChR2", location="VISrl", device=device
+    )
+    nwbfile.add_ogen_site(site)
+    slm = SpatialLightModulator(name="spatial_light_modulator", description="slm")
+    light_source = LightSource(name="light_source", description="laser", stimulation_wavelength=600.0,
+                               peak_power=1.0)
+    nwbfile.add_device(slm)
+    nwbfile.add_device(light_source)
+    rois = plane_segmentation.create_roi_table_region(region=list(range(NUM_ROIS)), description="all rois")
+    for i in range(NUM_SERIES):
+        nwbfile.add_stimulus(PatternedOptogeneticSeries(
+            name="PatternedOptogeneticSeries%d" % i,
+            description="benchmark",
+            data=stream_data_io(make_blocks(i), num_times=NUM_TIMES, compression="none"),
+            unit="watts",
+            rate=RATE,
+            rois=rois,
+            site=site,
+            device=device,
+            stimulus_pattern=pattern,
+            spatial_light_modulator=slm,
+            light_source=light_source,
+        ))
+    with NWBHDF5IO(path, mode="w") as io:
+        io.write(nwbfile, cache_spec=False)
+
+
+def run(path, method):
+    max_workers, block_rows = METHODS[method]
+    findings = validate_file(path, max_workers=max_workers, block_rows=block_rows)
+    assert findings == [], findings
+    return findings
+
+
+class Validation:
+    params = list(METHODS)
+    param_names = ["method"]
+    timeout = 900
+
+    def setup_cache(self):
+        path = os.path.join(tempfile.mkdtemp(), "validation.nwb")
+        write_file(path)
+        return path
+
+    def time_validate(self, path, method):
+        run(path, method)
+
+    def peakmem_validate(self, path, method):
+        run(path, method)
+
+
+def main():
+    print("%d series of %d x %d float32 (%.0f MB each), %d CPUs"
+          % (NUM_SERIES, NUM_TIMES, NUM_ROIS, NUM_TIMES * NUM_ROIS * 4 / 1e6, os.cpu_count()))
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "validation.nwb")
+        write_file(path)
+        print("%10s %10s %10s %12s" % ("method", "seconds", "MB/s", "peak MiB"))
+        for method in METHODS:
+            t0 = time.perf_counter()
+            run(path, method)
+            seconds = time.perf_counter() - t0
+            peak = "-"
+            if METHODS[method][0] == 0:
+                tracemalloc.start()
+                run(path, method)
+                peak = "%.1f" % (tracemalloc.get_traced_memory()[1] / 1024 ** 2)
+                tracemalloc.stop()
+            throughput = NUM_SERIES * NUM_TIMES * NUM_ROIS * 4 / 1e6 / seconds
+            print("%10s %10.2f %10.1f %12s" % (method, seconds, throughput, peak))
+
+
+if __name__ == "__main__":
+    main()
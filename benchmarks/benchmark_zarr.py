@@ -0,0 +1,149 @@
+"""Write throughput of PatternedOptogeneticSeries.data to Zarr as the number of worker processes grows.
+
+The data is read from a ``.npy`` file through ``MemmapDataChunkIterator`` and
+written with ``NWBZarrIO.write(number_of_jobs=...)``; HDF5 with the same
+compression level is included as the single-writer baseline. ``ZarrWrite``
+follows the airspeed velocity convention; run directly to print a table
+without asv::
+
+    python benchmarks/benchmark_zarr.py
+"""
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+from hdmf_zarr.nwb import NWBZarrIO
+from pynwb import NWBHDF5IO
+from pynwb.testing.mock.device import mock_Device
+from pynwb.testing.mock.file import mock_NWBFile
+from pynwb.testing.mock.ophys import mock_ImagingPlane, mock_PlaneSegmentation
+
+from ndx_holographic_stimulation import (
+    LightSource,
+    PatternedOptogeneticSeries,
+    PatternedOptogeneticStimulusSite,
+    SpatialLightModulator,
+    SpiralScanning,
+)
+from ndx_holographic_stimulation.streaming import iter_blocks, stream_data_io
+from ndx_holographic_stimulation.zarr_io import zarr_data_io
+
+NUM_TIMES, NUM_ROIS = 200_000, 256  # 200 MB of float32
+JOBS = [1, 2, 4, 8]
+
+
+def build_nwbfile(data, num_rois):
+    nwbfile = mock_NWBFile()
+    device = mock_Device(name="device", nwbfile=nwbfile)
+    plane_segmentation = mock_PlaneSegmentation(
+        imaging_plane=mock_ImagingPlane(device=device, nwbfile=nwbfile), n_rois=num_rois, nwbfile=nwbfile
+    )
+    pattern = SpiralScanning(
+        name="stimulus_pattern", description="spiral", diameter=15e-6, height=10e-6, number_of_revolutions=5,
+        duration=10e-3, number_of_stimulus_presentation=10, inter_stimulus_interval=20e-3,
+    )
+    nwbfile.add_lab_meta_data(pattern)
+    site = PatternedOptogeneticStimulusSite(
+        name="site", description="site", excitation_lambda=600.0, effector="ChR2", location="VISrl", device=device
+    )
+    nwbfile.add_ogen_site(site)
+    slm = SpatialLightModulator(name="spatial_light_modulator", description="slm")
+    light_source = LightSource(name="light_source", description="laser", stimulation_wavelength=600.0)
+    nwbfile.add_device(slm)
+    nwbfile.add_device(light_source)
+    nwbfile.add_stimulus(
+        PatternedOptogeneticSeries(
+            name="PatternedOptogeneticSeries",
+            description="benchmark",
+            data=data,
+            unit="watts",
+            rate=1000.0,
+            rois=plane_segmentation.create_roi_table_region(region=list(range(num_rois)), description="all rois"),
+            site=site,
+            device=device,
+            stimulus_pattern=pattern,
+            spatial_light_modulator=slm,
+            light_source=light_source,
+        )
+    )
+    return nwbfile
+
+
+def write_zarr(source, path, number_of_jobs):
+    nwbfile = build_nwbfile(zarr_data_io(source, compression="balanced"), NUM_ROIS)
+    with NWBZarrIO(path, mode="w") as io:
+        io.write(nwbfile, number_of_jobs=number_of_jobs)
+
+
+def write_hdf5(source, path):
+    data = np.load(source, mmap_mode="r")
+    nwbfile = build_nwbfile(stream_data_io(iter_blocks(data, 16384), num_times=len(data), compression="balanced"),
+                            NUM_ROIS)
+    with NWBHDF5IO(path, mode="w") as io:
+        io.write(nwbfile, cache_spec=False)
+
+
+def make_source(directory):
+    source = os.path.join(directory, "data.npy")
+    data = np.lib.format.open_memmap(source, mode="w+", dtype=np.float32, shape=(NUM_TIMES, NUM_ROIS))
+    rng = np.random.default_rng(0)
+    for start in range(0, NUM_TIMES, 16384):
+        # piecewise-constant power compresses like real stimulation data
+        block = data[start:start + 16384]
+        block[:] = np.repeat(rng.random((len(block) // 64 + 1, NUM_ROIS), dtype=np.float32), 64, axis=0)[:len(block)]
+    data.flush()
+    return source
+
+
+class ZarrWrite:
+    params = JOBS
+    param_names = ["number_of_jobs"]
+    timeout = 600
+    number = 1
+    repeat = 3
+
+    def setup(self, number_of_jobs):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.source = make_source(self.tmpdir.name)
+        self.path = os.path.join(self.tmpdir.name, "written.nwb.zarr")
+
+    def teardown(self, number_of_jobs):
+        self.tmpdir.cleanup()
+
+    def time_write(self, number_of_jobs):
+        write_zarr(self.source, self.path, number_of_jobs)
+        shutil.rmtree(self.path)
+
+    def track_throughput(self, number_of_jobs):
+        t0 = time.perf_counter()
+        write_zarr(self.source, self.path, number_of_jobs)
+        seconds = time.perf_counter() - t0
+        shutil.rmtree(self.path)
+        return NUM_TIMES * NUM_ROIS * 4 / 1e6 / seconds
+
+    track_throughput.unit = "MB/s"
+
+
+def main():
+    size_mb = NUM_TIMES * NUM_ROIS * 4 / 1e6
+    print("%d x %d float32 (%.0f MB), %d CPUs" % (NUM_TIMES, NUM_ROIS, size_mb, os.cpu_count()))
+    print("%-16s %10s %10s" % ("writer", "seconds", "MB/s"))
+    with tempfile.TemporaryDirectory() as tmpdir:
+        source = make_source(tmpdir)
+        t0 = time.perf_counter()
+        write_hdf5(source, os.path.join(tmpdir, "written.nwb"))
+        seconds = time.perf_counter() - t0
+        print("%-16s %10.2f %10.1f" % ("hdf5", seconds, size_mb / seconds))
+        for number_of_jobs in JOBS:
+            path = os.path.join(tmpdir, "written.nwb.zarr")
+            t0 = time.perf_counter()
+            write_zarr(source, path, number_of_jobs)
+            seconds = time.perf_counter() - t0
+            shutil.rmtree(path)
+            print("%-16s %10.2f %10.1f" % ("zarr, %d jobs" % number_of_jobs, seconds, size_mb / seconds))
+
+
+if __name__ == "__main__":
+    main()
@@ -22,7 +22,7 @@ except Exception:
 
 setup_args = {
     'name': 'ndx-holographic-stimulation',
-    'version': '0.1.0',
+    'version': '0.2.0',
     'description': 'My NWB extension',
     'long_description': readme,
     'long_description_content_type': readme_type,
@@ -31,9 +31,24 @@ setup_args = {
     'url': '',
     'license': 'BSD-3',
     'install_requires': [
-        'pynwb>=1.5.0,<3',
-        'hdmf>=2.5.6,<4',
+        # the oldest versions the extension is tested with; lazy_io builds on the builder classes of hdmf 3, and
+        # the opt-in spec cache (spec_cache.py) loads the namespace into the private pynwb.__TYPE_MAP of pynwb 2
+        'pynwb>=2.5.0,<3',
+        'hdmf>=3.11.0,<4',
     ],
+    'extras_require': {
+        # hdmf-zarr 0.5 cannot write some datasets with zarr>=2.18
+        'zarr': ['hdmf-zarr>=0.5.0', 'zarr>=2.11,<2.18'],
+        'spatial': ['scipy>=1.6'],
+        'arrow': ['pyarrow>=14'],
+    },
+    'entry_points': {
+        'console_scripts': [
+            'ndx-holographic-convert=ndx_holographic_stimulation.conversion:main',
+            'ndx-holographic-validate=ndx_holographic_stimulation.validation:main',
+            'ndx-holographic-consolidate=ndx_holographic_stimulation.consolidate:main',
+        ],
+    },
     'packages': find_packages('src/pynwb', exclude=["tests", "tests.*"]),
     'package_dir': {'': 'src/pynwb'},
     'package_data': {'ndx_holographic_stimulation': [
@@ -1,5 +1,8 @@
+import importlib
 import os
-from pynwb import load_namespaces, get_class
+from pynwb import get_class
+
+from .spec_cache import load_namespaces
 
 # Set path of the namespace.yaml file to the expected install location
 ndx_holographic_stimulation_specpath = os.path.join(
@@ -18,15 +21,63 @@ if not os.path.exists(ndx_holographic_stimulation_specpath):
         'ndx-holographic-stimulation.namespace.yaml'
     ))
 
-# Load the namespace
-load_namespaces(ndx_holographic_stimulation_specpath)
-
-# TODO: import your classes here or define your class using get_class to make
-# them accessible at the package level
-PatternedOptogeneticSeries = get_class('PatternedOptogeneticSeries', 'ndx-holographic-stimulation')
-OptogeneticStimulusPattern = get_class('OptogeneticStimulusPattern', 'ndx-holographic-stimulation')
-PatternedOptogeneticStimulusSite = get_class('PatternedOptogeneticStimulusSite', 'ndx-holographic-stimulation')
-SpiralScanning = get_class('SpiralScanning', 'ndx-holographic-stimulation')
-TemporalFocusing = get_class('TemporalFocusing', 'ndx-holographic-stimulation')
-SpatialLightModulator = get_class('SpatialLightModulator', 'ndx-holographic-stimulation')
-LightSource = get_class('LightSource', 'ndx-holographic-stimulation')
\ No newline at end of file
+# Classes generated from the spec with get_class, and classes defined in python on top of the spec
+_GENERATED_CLASSES = (
+    'OptogeneticStimulusPattern',
+    'PatternedOptogeneticStimulusSite',
+    'SpiralScanning',
+    'SpatialLightModulator',
+    'LightSource',
+    'PowerPyramidLevel',
+)
+_DEFINED_CLASSES = {
+    'PatternedOptogeneticSeries': 'series',
+    'OptogeneticStimulusPatternTable': 'pattern_library',
+    'OptogeneticStimulusPatternLibrary': 'pattern_library',
+    'DeliveredDose': 'dose',
+    'PowerPyramid': 'pyramid',
+    'SLMPhaseMasks': 'phase_masks',
+    'StimulationTargetTable': 'targets',
+    'TemporalFocusing': 'temporal_focusing',
+}
+
+__all__ = [*_DEFINED_CLASSES, *_GENERATED_CLASSES]
+
+# With NDX_HOLOGRAPHIC_STIMULATION_LAZY_IMPORT=1 the namespace is only loaded, and the classes only
+# resolved, when one of them is first accessed. This keeps the import cheap for processes that never
+# touch stimulation data, but classes must then be accessed before reading a file, otherwise the
+# objects read are instances of classes pynwb generated for that file and not of the ones exported here.
+LAZY_IMPORT = os.environ.get('NDX_HOLOGRAPHIC_STIMULATION_LAZY_IMPORT', '0') == '1'
+
+_namespace_loaded = False
+
+
+def _load_namespace():
+    global _namespace_loaded
+    if not _namespace_loaded:
+        load_namespaces(ndx_holographic_stimulation_specpath)
+        _namespace_loaded = True
+
+
+def __getattr__(name):
+    if name in _GENERATED_CLASSES:
+        _load_namespace()
+        cls = get_class(name, 'ndx-holographic-stimulation')
+    elif name in _DEFINED_CLASSES:
+        _load_namespace()
+        module = importlib.import_module(f'.{_DEFINED_CLASSES[name]}', __name__)
+        cls = getattr(module, name)
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals()[name] = cls
+    return cls
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
+
+
+if not LAZY_IMPORT:
+    for _name in __all__:
+        __getattr__(_name)
+    del _name
@@ -0,0 +1,207 @@
+"""Peri-stimulus alignment of imaging responses to PatternedOptogeneticSeries.
+
+The ``rois`` region of a ``PatternedOptogeneticSeries`` and of a
+``RoiResponseSeries`` point into the same ``PlaneSegmentation``, so the
+responses of any ROI around each stimulation can be cut out of the imaging
+data. ``iter_peri_stimulus_responses`` does so for batches of trials (by
+default the stimulation intervals of the stimulus schedule) and
+``align_responses`` stacks the batches into a single ``trial x roi x window``
+tensor.
+
+Each window is a fixed number of imaging samples starting at the first sample
+at or after ``onset - pre``. Trials are processed in onset order, ``batch_size``
+at a time; within a batch, windows closer than one window length are merged
+and read as one hyperslab, so only the imaging samples inside windows are read
+and memory is bounded by the batch size. Samples outside the imaging data are
+NaN.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+from .query import TimestampIndex
+
+PeriStimulusResponses = namedtuple(
+    "PeriStimulusResponses", ["onset", "stimulated_rois", "rois", "times", "data"]
+)
+PeriStimulusResponses.__doc__ = """Responses around each trial.
+
+``onset`` and ``stimulated_rois`` (row of the ROI table stimulated) have one
+entry per trial, ``rois`` are the rows of the ROI table whose responses are in
+``data`` and ``times`` the time of each window sample relative to the onset, in
+s. ``data`` is ``num_trials x len(rois) x len(times)``.
+"""
+
+DEFAULT_BATCH_SIZE = 256
+
+
+def _trials(series, onsets, stimulated_rois, event):
+    if onsets is not None:
+        onsets = np.atleast_1d(np.asarray(onsets, dtype=float))
+        if stimulated_rois is None:
+            stimulated_rois = np.full(len(onsets), -1)
+        stimulated_rois = np.atleast_1d(np.asarray(stimulated_rois))
+        if len(stimulated_rois) != len(onsets):
+            raise ValueError("got %d onsets but %d stimulated_rois" % (len(onsets), len(stimulated_rois)))
+        order = np.argsort(onsets, kind="stable")
+        return onsets[order], stimulated_rois[order]
+    if event not in ("interval", "presentation"):
+        raise ValueError("event must be 'interval' or 'presentation', got '%s'" % event)
+    schedule = series.get_stimulus_schedule()
+    keep = schedule.presentation == 0 if event == "interval" else slice(None)
+    return schedule.onset[keep], schedule.rois[keep]  # the schedule is sorted by onset
+
+
+def _response_columns(series, response, rois):
+    if series.rois.table is not response.rois.table:
+        raise ValueError("series '%s' and response '%s' do not reference the same ROI table"
+                         % (series.name, response.name))
+    region = np.asarray(response.rois.data[:])
+    if rois is None:
+        return region, slice(None)
+    rois = np.atleast_1d(np.asarray(rois))
+    order = np.argsort(region, kind="stable")
+    positions = np.searchsorted(region, rois, sorter=order)
+    positions = np.minimum(positions, len(region) - 1)
+    columns = order[positions]
+    missing = region[columns] != rois
+    if np.any(missing):
+        raise ValueError("ROIs %s are not in response '%s'" % (rois[missing].tolist(), response.name))
+    return rois, columns
+
+
+class _ResponseClock:
+    """Map times to sample indices of the response, from ``rate`` or ``timestamps``.
+
+    With timestamps, times before the first or after the last timestamp map to
+    indices outside ``[0, num_times)``, extrapolated at the median sampling rate.
+    """
+
+    def __init__(self, response):
+        self.num_times = len(response.data)
+        if response.timestamps is None:
+            self.starting_time = response.starting_time or 0.0
+            self.rate = float(response.rate)
+            self.index = None
+        else:
+            head = np.asarray(response.timestamps[:min(self.num_times, 1001)])
+            if len(head) < 2:
+                raise ValueError("response '%s' needs at least two timestamps" % response.name)
+            self.rate = 1.0 / float(np.median(np.diff(head)))
+            timestamps = response.timestamps
+            self.first, self.last = float(head[0]), float(timestamps[self.num_times - 1])
+            self.index = timestamps if isinstance(timestamps, np.ndarray) else TimestampIndex(timestamps)
+
+    def _samples_from(self, start, times):
+        # round before taking the ceiling so that times on the sampling grid map to their own sample
+        return np.ceil(np.round((times - start) * self.rate, 9)).astype(np.int64)
+
+    def first_sample_at_or_after(self, times):
+        if self.index is None:
+            return self._samples_from(self.starting_time, times)
+        times = np.asarray(times, dtype=float)
+        if isinstance(self.index, np.ndarray):
+            samples = np.searchsorted(self.index, times, side="left").astype(np.int64)
+        else:
+            samples = np.array([self.index.searchsorted(t) for t in times], dtype=np.int64)
+        before, after = times < self.first, times > self.last
+        samples[before] = self._samples_from(self.first, times[before])
+        samples[after] = self.num_times - 1 + self._samples_from(self.last, times[after])
+        return samples
+
+
+def _read_windows(data, starts, num_samples, columns, num_columns, num_times):
+    """Read ``num_samples`` rows from each of ``starts`` (sorted), merging nearby windows into single reads.
+
+    Returns ``len(starts) x num_samples x num_columns``, NaN outside ``[0, num_times)``.
+    """
+    stops = starts + num_samples
+    # a new read starts where the gap to the previous window is at least one window long
+    new_read = np.ones(len(starts), dtype=bool)
+    new_read[1:] = starts[1:] >= stops[:-1] + num_samples
+    read_first = np.flatnonzero(new_read)
+    read_last = np.append(read_first[1:], len(starts)) - 1
+
+    # NaN needs a float type; float32 data and small integers stay in single precision
+    dtype = np.result_type(getattr(data, "dtype", np.float64), np.float32)
+    out = np.full((len(starts), num_samples, num_columns), np.nan, dtype=dtype)
+    offsets = np.arange(num_samples)
+    for first, last in zip(read_first, read_last):
+        lo = min(max(int(starts[first]), 0), num_times)
+        hi = min(max(int(stops[last]), lo), num_times)
+        if hi == lo:
+            continue
+        slab = np.asarray(data[lo:hi] if isinstance(columns, slice) else data[lo:hi, columns]).reshape(hi - lo, -1)
+        rows = starts[first:last + 1, np.newaxis] + offsets - lo
+        trial, sample = np.nonzero((rows >= 0) & (rows < hi - lo))
+        out[first + trial, sample] = slab[rows[trial, sample]]
+    return out
+
+
+def iter_peri_stimulus_responses(series, response, window, rois=None, onsets=None, stimulated_rois=None,
+                                 event="interval", batch_size=DEFAULT_BATCH_SIZE):
+    """Yield the responses around batches of trials, as ``PeriStimulusResponses``.
+
+    Parameters
+    ----------
+    series : PatternedOptogeneticSeries
+    response : RoiResponseSeries
+        Imaging responses whose ``rois`` reference the same ROI table as ``series.rois``.
+    window : tuple of float
+        ``(pre, post)``: the window spans ``onset - pre`` to ``onset + post``, in s.
+    rois : array-like of int, optional
+        Rows of the ROI table whose responses are read. Defaults to all the ROIs of ``response``.
+    onsets : array-like of float, optional
+        Trial onsets, in s. Defaults to the stimulus schedule of ``series``.
+    stimulated_rois : array-like of int, optional
+        ROI stimulated by each of ``onsets``; -1 if not given.
+    event : str
+        With the stimulus schedule, align to the start of each stimulation
+        interval (``"interval"``) or to every presentation (``"presentation"``).
+    batch_size : int
+        Number of trials read at a time.
+    """
+    pre, post = map(float, window)
+    if pre + post <= 0:
+        raise ValueError("window (%s, %s) is empty" % (pre, post))
+    onsets, stimulated = _trials(series, onsets, stimulated_rois, event)
+    rois, columns = _response_columns(series, response, rois)
+    num_columns = len(rois)
+    if not isinstance(columns, slice):
+        # h5py point selection needs increasing, unique indices; read those and reorder in memory
+        unique_columns, inverse = np.unique(columns, return_inverse=True)
+        columns, num_columns = unique_columns.tolist(), len(unique_columns)
+    clock = _ResponseClock(response)
+    num_samples = int(round((pre + post) * clock.rate))
+    times = np.arange(num_samples) / clock.rate - pre
+    starts = clock.first_sample_at_or_after(onsets - pre)
+
+    # without trials, a single empty batch still carries the rois and times
+    for first in range(0, max(len(onsets), 1), batch_size):
+        batch = slice(first, first + batch_size)
+        data = _read_windows(response.data, starts[batch], num_samples, columns, num_columns, clock.num_times)
+        if not isinstance(columns, slice):
+            data = data[:, :, inverse]
+        yield PeriStimulusResponses(
+            onset=onsets[batch],
+            stimulated_rois=stimulated[batch],
+            rois=rois,
+            times=times,
+            data=np.ascontiguousarray(data.transpose(0, 2, 1)),
+        )
+
+
+def align_responses(series, response, window, **kwargs):
+    """Return the responses around every trial as one ``PeriStimulusResponses``.
+
+    Takes the arguments of ``iter_peri_stimulus_responses``; the batches are
+    concatenated, so the tensor must fit in memory.
+    """
+    batches = list(iter_peri_stimulus_responses(series, response, window, **kwargs))
+    return PeriStimulusResponses(
+        onset=np.concatenate([batch.onset for batch in batches]),
+        stimulated_rois=np.concatenate([batch.stimulated_rois for batch in batches]),
+        rois=batches[0].rois,
+        times=batches[0].times,
+        data=np.concatenate([batch.data for batch in batches]),
+    )
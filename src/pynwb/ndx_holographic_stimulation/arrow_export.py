@@ -0,0 +1,205 @@
+"""Columnar export of the stimulation events of PatternedOptogeneticSeries to Arrow and Parquet.
+
+Requires pyarrow (``pip install ndx-holographic-stimulation[arrow]``). Each
+event is one presentation of the stimulus schedule (see
+``ndx_holographic_stimulation.schedule``) to one ROI, with the columns of
+``EVENT_SCHEMA``: the session and series, the ROI (row of the ROI table and its
+id), the stimulation interval and presentation, onset and offset (s, relative
+to the start of the session), energy (J) and mean power (W) of the
+presentation, the type and parameters of the stimulus pattern and the
+wavelength and peak power of the light source. Parameters that a pattern does
+not have, e.g. the diameter of a ``TemporalFocusing`` pattern, are null.
+
+``iter_event_batches`` yields one ``pyarrow.RecordBatch`` per series of an open
+NWB file. Per-event columns wrap the NumPy arrays of the schedule without
+copying them; the session, series, pattern and light source columns are the
+same for the whole batch and are dictionary encoded or repeated scalars, so
+no per-event Python object is created. ``write_session_events`` streams these
+batches into a Parquet dataset partitioned by session
+(``root/session=<name>/events.parquet``), and ``write_events_parquet`` does so
+for many files, reading one at a time. ``pyarrow.dataset.dataset(root,
+partitioning="hive")`` or ``pandas.read_parquet(root)`` read the dataset back.
+"""
+import os
+from urllib.parse import quote
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pynwb import NWBHDF5IO
+
+from .dose import compute_delivered_dose
+from .series import PatternedOptogeneticSeries
+
+_STRING = pa.dictionary(pa.int32(), pa.string())
+
+# parameters of the stimulus pattern, by attribute name; null for patterns without them
+_PATTERN_FIELDS = (
+    ('duration', pa.float64()),
+    ('number_of_stimulus_presentation', pa.int64()),
+    ('inter_stimulus_interval', pa.float64()),
+    ('diameter', pa.float64()),
+    ('height', pa.float64()),
+    ('number_of_revolutions', pa.int64()),
+    ('lateral_point_spread_function', _STRING),
+    ('axial_point_spread_function', _STRING),
+    ('lateral_point_spread_function_mean', pa.float64()),
+    ('lateral_point_spread_function_sd', pa.float64()),
+    ('axial_point_spread_function_mean', pa.float64()),
+    ('axial_point_spread_function_sd', pa.float64()),
+)
+
+# attributes of the light source, by attribute name
+_LIGHT_SOURCE_FIELDS = (
+    ('stimulation_wavelength', pa.float64()),
+    ('peak_power', pa.float64()),
+)
+
+EVENT_SCHEMA = pa.schema([
+    ('session', _STRING),
+    ('series', _STRING),
+    ('roi', pa.int64()),
+    ('roi_id', pa.int64()),
+    ('interval', pa.int64()),
+    ('presentation', pa.int64()),
+    ('onset', pa.float64()),
+    ('offset', pa.float64()),
+    ('energy', pa.float64()),
+    ('mean_power', pa.float64()),
+    ('pattern_type', _STRING),
+    *_PATTERN_FIELDS,
+    *_LIGHT_SOURCE_FIELDS,
+])
+
+# the session is in the path of the files of a dataset partitioned by session
+_FILE_SCHEMA = EVENT_SCHEMA.remove(EVENT_SCHEMA.get_field_index('session'))
+
+
+def _constant(value, arrow_type, length):
+    """Column of ``length`` times ``value``, or of nulls if ``value`` is None."""
+    if value is None:
+        return pa.nulls(length, type=arrow_type)
+    if pa.types.is_dictionary(arrow_type):
+        return pa.DictionaryArray.from_arrays(
+            pa.array(np.zeros(length, dtype=np.int32)), pa.array([str(value)], type=arrow_type.value_type)
+        )
+    return pa.repeat(pa.scalar(value, type=arrow_type), length)
+
+
+def _column(values, arrow_type):
+    """Wrap a NumPy array without copying it when it already has the dtype of ``arrow_type``."""
+    return pa.array(np.ascontiguousarray(values, dtype=arrow_type.to_pandas_dtype()), type=arrow_type)
+
+
+def _presentation_energy(series, schedule, threshold):
+    """Energy of each presentation of ``schedule``, from the stored ``delivered_dose`` if it describes them."""
+    stored = series.delivered_dose
+    if stored is not None and float(stored.threshold) == threshold and stored.is_current(series):
+        dose = stored.get_presentation_dose()
+        if (dose is not None and np.array_equal(dose.onset, schedule.onset)
+                and np.array_equal(dose.rois, schedule.rois)):
+            return dose.energy
+    return compute_delivered_dose(series, threshold=threshold, schedule=schedule).presentation_energy
+
+
+def series_event_batch(series, session="", threshold=0.0):
+    """Return the events of ``series`` as a ``pyarrow.RecordBatch`` with ``EVENT_SCHEMA``.
+
+    Computes the stimulus schedule of the series and the energy of its
+    presentations, each in one chunked pass over ``data`` unless already
+    memoized or stored; the schedule is not memoized on the series, the batch
+    holds it. Returns None if the series has no stimulus pattern.
+    """
+    pattern = series.get_stimulus_pattern()
+    if pattern is None:
+        return None
+    schedule = series.get_stimulus_schedule(threshold=threshold, memoize=False)
+    energy = _presentation_energy(series, schedule, threshold)
+    duration = schedule.offset - schedule.onset
+    mean_power = np.divide(energy, duration, out=np.zeros_like(energy), where=duration > 0)
+    roi_ids = np.asarray(series.rois.table.id.data[:])[schedule.rois]
+    length = len(schedule.onset)
+
+    columns = dict(
+        session=_constant(session, _STRING, length),
+        series=_constant(series.name, _STRING, length),
+        roi=_column(schedule.rois, pa.int64()),
+        roi_id=_column(roi_ids, pa.int64()),
+        interval=_column(schedule.interval, pa.int64()),
+        presentation=_column(schedule.presentation, pa.int64()),
+        onset=_column(schedule.onset, pa.float64()),
+        offset=_column(schedule.offset, pa.float64()),
+        energy=_column(energy, pa.float64()),
+        mean_power=_column(mean_power, pa.float64()),
+        pattern_type=_constant(pattern.neurodata_type, _STRING, length),
+    )
+    for name, arrow_type in _PATTERN_FIELDS:
+        columns[name] = _constant(getattr(pattern, name, None), arrow_type, length)
+    for name, arrow_type in _LIGHT_SOURCE_FIELDS:
+        columns[name] = _constant(getattr(series.light_source, name, None), arrow_type, length)
+    return pa.RecordBatch.from_arrays([columns[name] for name in EVENT_SCHEMA.names], schema=EVENT_SCHEMA)
+
+
+def iter_event_batches(nwbfile, session=None, threshold=0.0, series_type=PatternedOptogeneticSeries):
+    """Yield a ``series_event_batch`` for each ``series_type`` of ``nwbfile``, in order of name.
+
+    ``session`` defaults to the ``session_id`` of the file, or its identifier.
+    Series without a stimulus pattern are skipped. Schedules are not memoized
+    on the series, so only the schedule of the series being exported is held
+    in memory, besides the batches kept by the caller.
+    """
+    if session is None:
+        session = nwbfile.session_id or nwbfile.identifier
+    series = sorted((obj for obj in nwbfile.objects.values() if isinstance(obj, series_type)), key=lambda s: s.name)
+    for s in series:
+        batch = series_event_batch(s, session=session, threshold=threshold)
+        if batch is not None:
+            yield batch
+
+
+def get_events_table(nwbfile, session=None, threshold=0.0):
+    """Return the events of every series of ``nwbfile`` as one ``pyarrow.Table``."""
+    return pa.Table.from_batches(
+        list(iter_event_batches(nwbfile, session=session, threshold=threshold)), schema=EVENT_SCHEMA
+    )
+
+
+def write_session_events(nwbfile, root, session=None, threshold=0.0, compression="zstd"):
+    """Write the events of an open ``nwbfile`` to ``root/session=<session>/events.parquet``.
+
+    Series are written as they are exported, one row group per series; the
+    ``session`` column is stored in the directory name only. ``session``
+    defaults as in ``iter_event_batches``. Returns the number of events.
+    """
+    if session is None:
+        session = nwbfile.session_id or nwbfile.identifier
+    directory = os.path.join(root, "session=%s" % quote(session, safe=""))
+    os.makedirs(directory, exist_ok=True)
+    num_events = 0
+    with pq.ParquetWriter(os.path.join(directory, "events.parquet"), _FILE_SCHEMA, compression=compression) as writer:
+        for batch in iter_event_batches(nwbfile, session=session, threshold=threshold):
+            writer.write_batch(batch.drop_columns(['session']))
+            num_events += batch.num_rows
+    return num_events
+
+
+def write_events_parquet(paths, root, session_names=None, threshold=0.0, compression="zstd"):
+    """Write the events of the NWB files at ``paths`` to a Parquet dataset in ``root``, partitioned by session.
+
+    Files are read with ``NWBHDF5IO`` one at a time and written with
+    ``write_session_events``. Session names default to the names of the files
+    without extension. Returns the number of events of each session.
+    """
+    paths = [os.fspath(path) for path in paths]
+    if session_names is None:
+        session_names = [os.path.splitext(os.path.basename(path))[0] for path in paths]
+    if len(set(session_names)) != len(session_names):
+        raise ValueError("session names must be unique, got %s" % session_names)
+
+    num_events = dict()
+    for path, session in zip(paths, session_names):
+        with NWBHDF5IO(path, mode='r', load_namespaces=True) as io:
+            num_events[session] = write_session_events(
+                io.read(), root, session=session, threshold=threshold, compression=compression
+            )
+    return num_events
@@ -0,0 +1,194 @@
+"""Build many PatternedOptogeneticSeries that share their links, e.g. one series per trial.
+
+Constructing series one by one spends most of its time in docval: every
+series re-validates the same links through three constructors (this package's
+subclass, the class generated from the spec and ``TimeSeries``). The batch
+builder checks the links, ROI indices, shapes and timestamps of all trials once,
+in vectorized form, and then only runs the ``TimeSeries`` constructor per trial,
+followed by the same normalization as ``PatternedOptogeneticSeries.__init__``.
+"""
+import numpy as np
+from hdmf.common import DynamicTableRegion
+from hdmf.utils import get_docval
+from pynwb import TimeSeries, get_class
+
+from .series import PatternedOptogeneticSeries
+from .utils import compact_indices
+
+# links shared by all series of a batch and the type each must have
+_LINKS = {
+    'site': get_class('PatternedOptogeneticStimulusSite', 'ndx-holographic-stimulation'),
+    'device': get_class('Device', 'core'),
+    'stimulus_pattern': get_class('OptogeneticStimulusPattern', 'ndx-holographic-stimulation'),
+    'spatial_light_modulator': get_class('SpatialLightModulator', 'ndx-holographic-stimulation'),
+    'light_source': get_class('LightSource', 'ndx-holographic-stimulation'),
+}
+# links the spec requires
+_REQUIRED_LINKS = ('site', 'device')
+
+_TIMESERIES_ARGS = {arg['name'] for arg in get_docval(TimeSeries.__init__)}
+# fields of PatternedOptogeneticSeries that TimeSeries does not have and the batch builder does not set itself,
+# e.g. dense_rate: set on each series after the TimeSeries constructor. Child groups (delivered_dose,
+# power_pyramid) cannot be shared by several series.
+_SERIES_FIELDS = (
+    {arg['name'] for arg in get_docval(PatternedOptogeneticSeries.__init__)} - _TIMESERIES_ARGS
+    - {'rois', 'stimulus_pattern_index', 'delivered_dose', 'power_pyramid', *_LINKS}
+)
+
+
+def _as_trials(values, name):
+    """Split a stacked ``trial x ...`` array, or a sequence of per-trial arrays, into a list of arrays."""
+    if isinstance(values, np.ndarray):
+        if values.ndim < 2:
+            raise ValueError("%s must be stacked as trial x ..., got shape %s" % (name, values.shape))
+        return list(values)
+    return [np.asarray(value) for value in values]
+
+
+def _check_timestamps(timestamps, lengths):
+    if len(timestamps) != len(lengths):
+        raise ValueError("got timestamps for %d trials but data for %d" % (len(timestamps), len(lengths)))
+    if any(ts.ndim != 1 for ts in timestamps):
+        raise ValueError("timestamps of each trial must be one-dimensional")
+    mismatched = np.flatnonzero(np.array([len(ts) for ts in timestamps]) != lengths)
+    if mismatched.size:
+        raise ValueError("timestamps and data of trial %d have different lengths" % mismatched[0])
+    flat = np.concatenate(timestamps) if timestamps else np.empty(0)
+    if not np.all(np.isfinite(flat)):
+        raise ValueError("timestamps must be finite")
+    # ignore the steps between the last timestamp of a trial and the first one of the next
+    decreasing = np.diff(flat) < 0
+    decreasing[np.cumsum(lengths)[:-1] - 1] = False
+    if decreasing.any():
+        trial = np.searchsorted(np.cumsum(lengths), np.flatnonzero(decreasing)[0], side='right')
+        raise ValueError("timestamps of trial %d are not sorted" % trial)
+
+
+def build_series_batch(
+    data,
+    rois,
+    site,
+    device,
+    timestamps=None,
+    rate=None,
+    starting_time=None,
+    names=None,
+    name_prefix='PatternedOptogeneticSeries',
+    description='no description',
+    unit='watts',
+    stimulus_pattern=None,
+    stimulus_pattern_index=None,
+    spatial_light_modulator=None,
+    light_source=None,
+    nwbfile=None,
+    **kwargs
+):
+    """Create one ``PatternedOptogeneticSeries`` per trial, all linking the same site, devices and pattern.
+
+    Parameters
+    ----------
+    data : array-like
+        ``trial x time x roi`` array, or a sequence of ``time x roi`` arrays when
+        trials have different lengths.
+    rois : DynamicTableRegion
+        ROI table rows of the ``roi`` axis, shared by all trials. Each series
+        gets its own region over the same rows.
+    site, device, stimulus_pattern, spatial_light_modulator, light_source
+        Links shared by all series; see ``PatternedOptogeneticSeries``.
+    stimulus_pattern_index : DynamicTableRegion, optional
+        Pattern-table row shared by all trials, as an alternative to
+        ``stimulus_pattern``. Each series gets its own region over the row.
+    timestamps : array-like, optional
+        ``trial x time`` array, or a sequence of per-trial arrays.
+    rate : float, optional
+        Sampling rate, if ``timestamps`` is not given.
+    starting_time : float or array-like, optional
+        Start time of each trial (a scalar is shared by all), with ``rate``.
+    names : sequence of str, optional
+        Name of each series. Defaults to ``'<name_prefix>_<trial>'``.
+    nwbfile : NWBFile, optional
+        If given, the series are added to its stimulus group.
+    **kwargs
+        Other ``PatternedOptogeneticSeries`` arguments, shared by all series
+        (e.g. ``comments``, ``continuity``, ``dense_rate``).
+
+    Returns
+    -------
+    list of PatternedOptogeneticSeries
+    """
+    data = _as_trials(data, 'data')
+    num_trials = len(data)
+
+    # links: checked once for the whole batch
+    links = dict(
+        site=site,
+        device=device,
+        stimulus_pattern=stimulus_pattern,
+        spatial_light_modulator=spatial_light_modulator,
+        light_source=light_source,
+    )
+    for name, value in links.items():
+        if (value is not None or name in _REQUIRED_LINKS) and not isinstance(value, _LINKS[name]):
+            raise TypeError("%s must be a %s, got %s" % (name, _LINKS[name].__name__, type(value).__name__))
+    unknown = set(kwargs) - _TIMESERIES_ARGS - _SERIES_FIELDS
+    if unknown:
+        raise TypeError("build_series_batch: unrecognized arguments: %s" % sorted(unknown))
+    fields = {name: kwargs.pop(name) for name in _SERIES_FIELDS.intersection(kwargs)}
+
+    # ROI indices: range-checked and compacted once, then shared (read-only) by all regions
+    roi_indices = compact_indices(np.array(rois.data[:]))
+    if roi_indices.size and (roi_indices.min() < 0 or roi_indices.max() >= len(rois.table)):
+        raise IndexError("rois reference rows outside of table '%s' (%d rows)" % (rois.table.name, len(rois.table)))
+    roi_indices.setflags(write=False)
+
+    # data: every trial is time x roi over the same ROIs
+    if any(trial.ndim != 2 or trial.shape[1] != len(roi_indices) for trial in data):
+        raise ValueError("data of every trial must be time x roi with %d rois" % len(roi_indices))
+    if any(trial.dtype.kind not in 'biuf' for trial in data):
+        raise ValueError("data must be numeric")
+    lengths = np.array([len(trial) for trial in data], dtype=np.int64)
+
+    if timestamps is not None:
+        timestamps = _as_trials(timestamps, 'timestamps')
+        _check_timestamps(timestamps, lengths)
+        timing = [dict(timestamps=ts) for ts in timestamps]
+    elif rate is not None:
+        starts = np.broadcast_to(np.asarray(0.0 if starting_time is None else starting_time, dtype=float),
+                                 (num_trials,))
+        timing = [dict(rate=float(rate), starting_time=float(start)) for start in starts]
+    else:
+        raise ValueError("either timestamps or rate must be given")
+
+    names = ['%s_%d' % (name_prefix, trial) for trial in range(num_trials)] if names is None else list(names)
+    if len(names) != num_trials:
+        raise ValueError("got %d names for %d trials" % (len(names), num_trials))
+    existing = set(nwbfile.stimulus) if nwbfile is not None else set()
+    if len(set(names)) != num_trials or existing.intersection(names):
+        raise ValueError("series names must be unique and not already used in the stimulus group")
+
+    series = list()
+    for name, trial_data, trial_timing in zip(names, data, timing):
+        # equivalent to PatternedOptogeneticSeries(...): the links, ROIs and shapes were validated above, so only
+        # the TimeSeries constructor runs, the other fields are set like the generated __init__ does and the
+        # series is normalized like PatternedOptogeneticSeries.__init__ does
+        obj = PatternedOptogeneticSeries.__new__(PatternedOptogeneticSeries)
+        TimeSeries.__init__(obj, name=name, data=trial_data, unit=unit, description=description,
+                            **trial_timing, **kwargs)
+        obj.rois = DynamicTableRegion(name='rois', data=roi_indices, description=rois.description,
+                                      table=rois.table)
+        if stimulus_pattern_index is not None:
+            obj.stimulus_pattern_index = DynamicTableRegion(
+                name='stimulus_pattern_index',
+                data=stimulus_pattern_index.data,
+                description=stimulus_pattern_index.description,
+                table=stimulus_pattern_index.table,
+            )
+        for field, value in {**links, **fields}.items():
+            if value is not None:
+                setattr(obj, field, value)
+        obj._normalize()
+        series.append(obj)
+    if nwbfile is not None:
+        for obj in series:
+            nwbfile.add_stimulus(obj)
+    return series
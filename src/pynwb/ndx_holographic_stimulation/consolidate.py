@@ -0,0 +1,215 @@
+"""Summary NWB file over the PatternedOptogeneticSeries of many session files.
+
+``consolidate_sessions`` writes one NWB file holding every
+``PatternedOptogeneticSeries`` of the source files, together with everything
+they link to: site, devices, stimulus pattern (or pattern library), spatial
+light modulator, light source and ROI table with its imaging plane. Metadata
+and ROI indices are copied, but every other array dataset (series data and
+timestamps, ROI table columns) is an HDF5 external link to the source file, or
+with ``virtual=True`` a virtual dataset mapping it. The summary is a few kilobytes
+per series whatever the size of the sessions, and reads stream from the source
+files, which must stay next to the summary: links are stored relative to it.
+
+Objects keep their name prefixed by the session name (by default the name of
+the source file without extension), e.g. ``mouse1-day3_PatternedOptogeneticSeries``
+in ``stimulus``. Times stay relative to the start of their session: the
+``sessions`` table in ``scratch`` holds the source, identifier, start time and
+``time_offset`` (the start of the session from the start of the summary, in s)
+of each session.
+"""
+import argparse
+import os
+import uuid
+from contextlib import ExitStack
+
+import h5py
+import numpy as np
+from hdmf.common import DynamicTable, DynamicTableRegion, VectorData
+from hdmf.container import AbstractContainer
+from hdmf.utils import get_docval
+from pynwb import NWBHDF5IO, NWBFile
+from pynwb.base import ProcessingModule
+
+from .series import PatternedOptogeneticSeries
+
+# where objects linked by the series may live in a file, with the method adding them to a file
+_LOCATIONS = (
+    ('stimulus', 'add_stimulus'),
+    ('acquisition', 'add_acquisition'),
+    ('devices', 'add_device'),
+    ('ogen_sites', 'add_ogen_site'),
+    ('imaging_planes', 'add_imaging_plane'),
+    ('lab_meta_data', 'add_lab_meta_data'),
+)
+
+
+def _root(container):
+    """The ancestor of ``container`` held by its file or by a processing module of its file."""
+    while not isinstance(container.parent, (NWBFile, ProcessingModule)):
+        container = container.parent
+    return container
+
+
+class _SessionCopy:
+    """Copies of the objects of one source file, with the array datasets left as the h5py datasets to link."""
+
+    def __init__(self, source, name):
+        self.source = source
+        self.name = name
+        self._copies = dict()  # id of the source container -> copy
+        self._copying = set()
+        self._roots = []
+
+    def copy(self, container):
+        key = id(container)
+        if key not in self._copies:
+            root = _root(container)
+            if root is not container and id(root) not in self._copying:
+                self.copy(root)  # copies container with the rest of the root
+            if key not in self._copies:
+                self._copying.add(key)
+                self._copies[key] = self._copy(container, root is container)
+                if root is container:
+                    self._roots.append(container)
+        return self._copies[key]
+
+    def _copy(self, container, is_root):
+        kwargs = dict()
+        for arg in get_docval(type(container).__init__):
+            try:
+                value = getattr(container, arg['name'])
+            except AttributeError:
+                continue
+            if value is not None:
+                kwargs[arg['name']] = self._copy_value(value)
+        if isinstance(container, DynamicTableRegion):
+            kwargs['data'] = container.data[:]  # the dataset references the table of the source file
+        if is_root:
+            kwargs['name'] = "%s_%s" % (self.name, container.name)
+        return type(container)(**kwargs)
+
+    def _copy_value(self, value):
+        if isinstance(value, AbstractContainer):
+            return self.copy(value)
+        if isinstance(value, (list, tuple)) and any(isinstance(item, AbstractContainer) for item in value):
+            return type(value)(self.copy(item) for item in value)
+        if isinstance(value, dict) and any(isinstance(item, AbstractContainer) for item in value.values()):
+            return [self.copy(item) for item in value.values()]
+        return value
+
+    def add_to(self, summary):
+        """Add the copies of the objects held by the source file to the same place in ``summary``."""
+        for root in self._roots:
+            copy = self._copies[id(root)]
+            if isinstance(root.parent, ProcessingModule):
+                module = root.parent
+                if module.name not in summary.processing:
+                    summary.create_processing_module(name=module.name, description=module.description)
+                summary.processing[module.name].add(copy)
+                continue
+            for attr, add in _LOCATIONS:
+                if getattr(self.source, attr).get(root.name) is root:
+                    getattr(summary, add)(copy)
+                    break
+            else:
+                raise ValueError("cannot consolidate %s '%s' of %s, it is not in stimulus, acquisition, devices, "
+                                 "ogen_sites, imaging_planes, lab_meta_data or a processing module"
+                                 % (type(root).__name__, root.name, self.name))
+
+
+def _to_virtual(file):
+    """Replace the external links to datasets of an h5py ``file`` open for writing by virtual datasets."""
+    links = []
+
+    def visit(group):
+        for name in group:
+            link = group.get(name, getlink=True)
+            if isinstance(link, h5py.ExternalLink):
+                links.append((group, name, link))
+            elif isinstance(link, h5py.HardLink) and isinstance(group[name], h5py.Group):
+                visit(group[name])
+
+    visit(file)
+    directory = os.path.dirname(os.path.abspath(file.filename))
+    for group, name, link in links:
+        with h5py.File(os.path.join(directory, link.filename), 'r') as source_file:
+            source = source_file[link.path]
+            if not isinstance(source, h5py.Dataset) or source.shape is None or source.dtype.kind == 'O':
+                continue  # groups, empty datasets and strings stay links
+            layout = h5py.VirtualLayout(shape=source.shape, dtype=source.dtype, maxshape=source.shape)
+            layout[...] = h5py.VirtualSource(link.filename, link.path, shape=source.shape, dtype=source.dtype)
+            attrs = dict(source.attrs)
+        del group[name]
+        dataset = group.create_virtual_dataset(name, layout)
+        for key, value in attrs.items():
+            if not isinstance(value, h5py.Reference):
+                dataset.attrs[key] = value
+
+
+def consolidate_sessions(paths, output, session_names=None, virtual=False, series_type=PatternedOptogeneticSeries):
+    """Write a summary NWB file to ``output`` holding every ``series_type`` of the files at ``paths``.
+
+    The summary links to the datasets of the source files, see the module
+    documentation. Returns the names of the series in the summary, by session.
+    """
+    paths = [os.fspath(path) for path in paths]
+    if session_names is None:
+        session_names = [os.path.splitext(os.path.basename(path))[0] for path in paths]
+    if len(set(session_names)) != len(session_names):
+        raise ValueError("session names must be unique, got %s" % session_names)
+
+    with ExitStack() as stack:
+        sources = [stack.enter_context(NWBHDF5IO(path, mode='r', load_namespaces=True)).read() for path in paths]
+        start = min(source.session_start_time for source in sources)
+        summary = NWBFile(
+            session_description="PatternedOptogeneticSeries of sessions %s" % ", ".join(session_names),
+            identifier=str(uuid.uuid4()),
+            session_start_time=start,
+        )
+        names = dict()
+        for source, name in zip(sources, session_names):
+            session = _SessionCopy(source, name)
+            series = [obj for obj in source.objects.values() if isinstance(obj, series_type)]
+            names[name] = sorted(session.copy(s).name for s in series)
+            session.add_to(summary)
+
+        sessions = DynamicTable(name="sessions", description="source of the objects of each session", columns=[
+            VectorData(name="session", description="prefix of the names of the objects of the session",
+                       data=list(session_names)),
+            VectorData(name="source", description="path of the source file, relative to the summary",
+                       data=[os.path.relpath(path, os.path.dirname(os.path.abspath(output))) for path in paths]),
+            VectorData(name="identifier", description="identifier of the source file",
+                       data=[source.identifier for source in sources]),
+            VectorData(name="session_start_time", description="start of the session, in ISO 8601",
+                       data=[source.session_start_time.isoformat() for source in sources]),
+            VectorData(name="time_offset", description="start of the session from the start of this file, in s",
+                       data=np.array([(source.session_start_time - start).total_seconds() for source in sources])),
+        ])
+        summary.add_scratch(sessions)
+        with NWBHDF5IO(output, mode='w') as io:
+            io.write(summary, link_data=True)
+    if virtual:
+        with h5py.File(output, 'r+') as file:
+            _to_virtual(file)
+    return names
+
+
+def main(argv=None):
+    """Command line entry point, see ``--help``."""
+    arg_parser = argparse.ArgumentParser(
+        description="Write a summary NWB file linking to the PatternedOptogeneticSeries of session files."
+    )
+    arg_parser.add_argument("output", help="path of the summary NWB file")
+    arg_parser.add_argument("paths", nargs="+", help="session NWB files")
+    arg_parser.add_argument("--names", nargs="+", default=None, help="session names, by default the file names")
+    arg_parser.add_argument("--virtual", action="store_true", help="virtual datasets instead of external links")
+    args = arg_parser.parse_args(argv)
+
+    names = consolidate_sessions(args.paths, args.output, session_names=args.names, virtual=args.virtual)
+    for session, series in names.items():
+        print("%s: %d series" % (session, len(series)))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
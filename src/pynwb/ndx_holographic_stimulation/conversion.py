@@ -0,0 +1,450 @@
+"""Batch conversion of holographic stimulation logs to NWB files.
+
+``convert_sessions`` converts every session found under a directory, one NWB
+file per session, in a pool of worker processes. The power log of each session
+is parsed once and streamed into the file block by block (see
+``streaming.stream_data_io``), so memory use does not depend on session length.
+Each conversion returns a ``SessionReport`` with its throughput or the error
+that made it fail; a failed session does not stop the others. When a session
+kills its worker process, the sessions left unfinished by the broken pool are
+converted again, each in a process of its own, so only that session fails.
+
+Reading the logs is delegated to a parser (see ``SessionParser``).
+``LogDirectoryParser`` reads the reference format, where each session is a
+directory holding
+
+``session.json``
+    the metadata of the session, e.g.::
+
+        {
+          "session_description": "holographic stimulation of V1",
+          "identifier": "mouse1-day3",
+          "session_start_time": "2024-03-01T10:00:00+00:00",
+          "roi_centers": [[120, 64], [80, 200]],
+          "imaging_plane": {"imaging_rate": 30.0, "excitation_lambda": 920.0, "indicator": "GCaMP6s",
+                            "location": "V1"},
+          "spatial_light_modulator": {"description": "SLM", "model": "model", "resolution": 1.0},
+          "light_source": {"description": "laser", "stimulation_wavelength": 1030.0, "peak_power": 8.0},
+          "site": {"description": "site", "excitation_lambda": 1030.0, "effector": "ChRmine", "location": "V1"},
+          "pattern": {"type": "SpiralScanning", "description": "spiral", "duration": 0.01,
+                      "number_of_stimulus_presentation": 10, "inter_stimulus_interval": 0.02,
+                      "diameter": 15e-6, "height": 10e-6, "number_of_revolutions": 5}
+        }
+
+    ``roi_centers`` are the (x, y) pixel coordinates of the targeted ROIs, in
+    the order of the power columns; ``imaging_plane`` is optional.
+
+``stimulation.csv`` or ``stimulation.npz``
+    the power delivered to each ROI, in W. The CSV has a header row and one row
+    per sample: the sample time in s followed by one column per ROI
+    (``time,roi_0,roi_1,...``). The NPZ holds a ``timestamps`` array
+    (``num_times``) and a ``power`` array (``num_times x num_rois``), read
+    ``block_rows`` rows at a time from the archive (compressed or not); only
+    arrays saved in Fortran order are loaded whole.
+"""
+import argparse
+import functools
+import importlib
+import itertools
+import json
+import os
+import tempfile
+import time
+import traceback
+import zipfile
+from collections import namedtuple
+from datetime import datetime
+
+import numpy as np
+from pynwb import NWBHDF5IO, NWBFile
+from pynwb.ophys import OpticalChannel, PlaneSegmentation
+
+from .streaming import iter_blocks, stream_data_io
+from .utils import imap_processes
+
+DEFAULT_BLOCK_ROWS = 65536
+
+SessionReport = namedtuple(
+    "SessionReport", ["session", "output", "succeeded", "num_samples", "num_bytes", "seconds", "error"]
+)
+SessionReport.__doc__ = """Outcome of the conversion of one session. ``num_bytes`` is the size of the power data
+converted and ``error`` the formatted traceback of a failed conversion (None otherwise)."""
+SessionReport.throughput = property(
+    lambda self: self.num_bytes / self.seconds if self.succeeded and self.seconds > 0 else 0.0,
+    doc="Power data converted per second, in bytes/s.",
+)
+
+
+class SessionParser:
+    """Interface of the parsers used by ``convert_sessions``.
+
+    Parsers are sent to the worker processes, so they must be picklable.
+    """
+
+    def discover(self, root):
+        """Return the sessions under ``root``, as paths (or any picklable keys understood by the other methods)."""
+        raise NotImplementedError
+
+    def session_name(self, session):
+        """Name of the NWB file of ``session``, without extension."""
+        return os.path.basename(os.path.normpath(str(session)))
+
+    def read_metadata(self, session):
+        """Return the metadata of ``session``, with the keys of the ``session.json`` of the reference format."""
+        raise NotImplementedError
+
+    def iter_log(self, session, block_rows):
+        """Yield the log of ``session`` as ``(timestamps, power)`` blocks of at most ``block_rows`` samples.
+
+        ``timestamps`` are the sample times in s (1D) and ``power`` the power of
+        each ROI in W (``num_times x num_rois``); both blocks of a pair have the
+        same number of samples. The log should be parsed only once.
+        """
+        raise NotImplementedError
+
+
+class LogDirectoryParser(SessionParser):
+    """Parser of the reference format: one directory per session, see the module documentation."""
+
+    metadata_file = "session.json"
+
+    def discover(self, root):
+        return sorted(
+            entry.path for entry in os.scandir(root)
+            if entry.is_dir() and os.path.exists(os.path.join(entry.path, self.metadata_file))
+        )
+
+    def read_metadata(self, session):
+        with open(os.path.join(session, self.metadata_file)) as f:
+            return json.load(f)
+
+    def _log(self, session):
+        for name in ("stimulation.npz", "stimulation.csv"):
+            path = os.path.join(session, name)
+            if os.path.exists(path):
+                return path
+        raise FileNotFoundError("no stimulation.npz or stimulation.csv in %s" % session)
+
+    def iter_log(self, session, block_rows):
+        path = self._log(session)
+        if path.endswith(".npz"):
+            yield from _iter_npz_log(path, block_rows)
+            return
+        with open(path) as f:
+            next(f)  # header
+            while True:
+                lines = list(itertools.islice(f, block_rows))
+                if not lines:
+                    return
+                block = np.loadtxt(lines, delimiter=",", ndmin=2)
+                yield block[:, 0], block[:, 1:]
+
+
+def _iter_npy_rows(file, block_rows):
+    """Return the shape of the ``.npy`` array in the open binary ``file`` and an iterator over blocks of its rows.
+
+    Rows are read ``block_rows`` at a time from ``file``, which may be a member of a zip archive. Arrays stored in
+    Fortran order have no contiguous rows and are read whole.
+    """
+    version = np.lib.format.read_magic(file)
+    if version == (1, 0):
+        shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(file)
+    elif version == (2, 0):
+        shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(file)
+    else:
+        raise ValueError("unsupported .npy format version %d.%d" % version)
+    if dtype.hasobject:
+        raise ValueError("cannot read an array of Python objects")
+    if fortran_order and len(shape) > 1:
+        array = np.frombuffer(file.read(), dtype=dtype).reshape(shape, order="F")
+        return shape, iter_blocks(array, block_rows)
+
+    row_shape = tuple(shape[1:])
+    row_bytes = dtype.itemsize * int(np.prod(row_shape, dtype=np.int64))
+
+    def rows():
+        for start in range(0, shape[0], block_rows):
+            num_rows = min(block_rows, shape[0] - start)
+            buffer = file.read(num_rows * row_bytes)
+            if len(buffer) != num_rows * row_bytes:
+                raise ValueError("truncated .npy array: expected %d rows" % shape[0])
+            yield np.frombuffer(buffer, dtype=dtype).reshape((num_rows,) + row_shape)
+
+    return shape, rows()
+
+
+def _iter_npz_log(path, block_rows):
+    """Yield ``(timestamps, power)`` blocks of the ``timestamps`` and ``power`` arrays of an NPZ log."""
+    with zipfile.ZipFile(path) as archive, archive.open("timestamps.npy") as timestamps_file, \
+            archive.open("power.npy") as power_file:
+        timestamps_shape, timestamps = _iter_npy_rows(timestamps_file, block_rows)
+        power_shape, power = _iter_npy_rows(power_file, block_rows)
+        if timestamps_shape[:1] != power_shape[:1]:
+            raise ValueError("%s has %d timestamps but %d power samples"
+                             % (path, timestamps_shape[0], power_shape[0]))
+        yield from zip(timestamps, power)
+
+
+def build_nwbfile(metadata):
+    """Return an ``NWBFile`` with the devices, pattern, site and ROIs described by ``metadata``.
+
+    Also returns the keyword arguments linking a ``PatternedOptogeneticSeries`` to them.
+    """
+    from . import LightSource, PatternedOptogeneticStimulusSite, SpatialLightModulator
+    from pynwb import get_class
+
+    nwbfile = NWBFile(
+        session_description=metadata["session_description"],
+        identifier=metadata["identifier"],
+        session_start_time=datetime.fromisoformat(metadata["session_start_time"]),
+    )
+    device = nwbfile.create_device(name="device", description="holographic stimulation microscope")
+    imaging = dict(imaging_rate=30.0, excitation_lambda=np.nan, indicator="unknown", location="unknown")
+    imaging.update(metadata.get("imaging_plane", {}))
+    imaging_plane = nwbfile.create_imaging_plane(
+        name="ImagingPlane",
+        optical_channel=OpticalChannel(name="OpticalChannel", description="optical channel", emission_lambda=np.nan),
+        description=imaging.pop("description", "imaging plane of the targeted ROIs"),
+        device=device,
+        **imaging,
+    )
+    plane_segmentation = PlaneSegmentation(
+        name="PlaneSegmentation", description="targeted ROIs", imaging_plane=imaging_plane
+    )
+    for x, y in metadata["roi_centers"]:
+        plane_segmentation.add_roi(pixel_mask=[(int(x), int(y), 1.0)])
+    nwbfile.create_processing_module("ophys", "targeted ROIs").add(plane_segmentation)
+    num_rois = len(metadata["roi_centers"])
+
+    spatial_light_modulator = SpatialLightModulator(name="spatial_light_modulator",
+                                                    **metadata["spatial_light_modulator"])
+    light_source = LightSource(name="light_source", **metadata["light_source"])
+    nwbfile.add_device(spatial_light_modulator)
+    nwbfile.add_device(light_source)
+    site = PatternedOptogeneticStimulusSite(name="site", device=device, **metadata["site"])
+    nwbfile.add_ogen_site(site)
+    pattern_kwargs = dict(metadata["pattern"])
+    pattern_cls = get_class(pattern_kwargs.pop("type", "OptogeneticStimulusPattern"), "ndx-holographic-stimulation")
+    stimulus_pattern = pattern_cls(name="stimulus_pattern", **pattern_kwargs)
+    nwbfile.add_lab_meta_data(stimulus_pattern)
+
+    links = dict(
+        rois=plane_segmentation.create_roi_table_region(region=list(range(num_rois)), description="targeted ROIs"),
+        site=site,
+        device=device,
+        stimulus_pattern=stimulus_pattern,
+        spatial_light_modulator=spatial_light_modulator,
+        light_source=light_source,
+    )
+    return nwbfile, links
+
+
+class _CountingBlocks:
+    """Pass blocks through, counting the samples and bytes that went by."""
+
+    def __init__(self, blocks):
+        self.blocks = blocks
+        self.num_samples = 0
+        self.num_bytes = 0
+
+    def __iter__(self):
+        for block in self.blocks:
+            self.num_samples += len(block)
+            self.num_bytes += block.nbytes
+            yield block
+
+
+class _SpilledQueue:
+    """First-in first-out queue of arrays kept in a temporary file."""
+
+    def __init__(self):
+        self._file = tempfile.TemporaryFile()
+        self._read_position = 0
+        self.size = 0
+
+    def put(self, block):
+        self._file.seek(0, os.SEEK_END)
+        np.save(self._file, block, allow_pickle=False)
+        self.size += 1
+
+    def get(self):
+        self._file.seek(self._read_position)
+        block = np.load(self._file, allow_pickle=False)
+        self._read_position = self._file.tell()
+        self.size -= 1
+        return block
+
+    def close(self):
+        self._file.close()
+
+
+class _LogStreams:
+    """The timestamps and power streams of a log parsed once, as ``(timestamps, power)`` blocks.
+
+    ``NWBHDF5IO`` writes the power dataset before the timestamps dataset: the
+    blocks of the stream that lags behind are queued in a temporary file, so
+    memory use stays at one block. Raises ValueError when a pair of blocks has
+    different numbers of samples.
+    """
+
+    def __init__(self, pairs):
+        self._pairs = iter(pairs)
+        self._queues = (_SpilledQueue(), _SpilledQueue())
+
+    def stream(self, index):
+        """Iterator over the blocks of the timestamps (``index=0``) or power (``index=1``) stream."""
+        queue, other = self._queues[index], self._queues[1 - index]
+        while True:
+            if queue.size:
+                yield queue.get()
+                continue
+            pair = next(self._pairs, None)
+            if pair is None:
+                return
+            timestamps, power = pair
+            if len(timestamps) != len(power):
+                raise ValueError("a block of the log has %d timestamps but %d power samples"
+                                 % (len(timestamps), len(power)))
+            other.put(pair[1 - index])
+            yield pair[index]
+
+    def close(self):
+        for queue in self._queues:
+            queue.close()
+
+
+def convert_session(session, output_dir, parser=None, compression="balanced", block_rows=DEFAULT_BLOCK_ROWS,
+                    overwrite=False):
+    """Convert one session to ``<output_dir>/<session name>.nwb`` and return its ``SessionReport``.
+
+    Exceptions are caught and reported, so that a batch carries on past a broken session.
+    """
+    from . import PatternedOptogeneticSeries
+
+    parser = parser if parser is not None else LogDirectoryParser()
+    output = os.path.join(output_dir, parser.session_name(session) + ".nwb")
+    start = time.perf_counter()
+    writing = False
+    try:
+        if os.path.exists(output) and not overwrite:
+            raise FileExistsError("%s already exists" % output)
+        metadata = parser.read_metadata(session)
+        nwbfile, links = build_nwbfile(metadata)
+        streams = _LogStreams(parser.iter_log(session, block_rows))
+        try:
+            power = _CountingBlocks(streams.stream(1))
+            nwbfile.add_stimulus(
+                PatternedOptogeneticSeries(
+                    name="PatternedOptogeneticSeries",
+                    description=metadata.get("series_description", "holographic stimulation"),
+                    data=stream_data_io(power, compression=compression),
+                    timestamps=stream_data_io(streams.stream(0), compression=compression),
+                    unit="watts",
+                    **links,
+                )
+            )
+            writing = True
+            with NWBHDF5IO(output, mode="w") as io:
+                io.write(nwbfile)
+        finally:
+            streams.close()
+    except Exception:
+        if writing and os.path.exists(output):
+            os.remove(output)  # do not leave a truncated file behind
+        return SessionReport(str(session), output, False, 0, 0, time.perf_counter() - start, traceback.format_exc())
+    return SessionReport(str(session), output, True, power.num_samples, power.num_bytes,
+                         time.perf_counter() - start, None)
+
+
+def convert_sessions(root, output_dir, parser=None, max_workers=None, compression="balanced",
+                     block_rows=DEFAULT_BLOCK_ROWS, overwrite=False, callback=None):
+    """Convert every session under ``root`` into ``output_dir``, in a pool of ``max_workers`` processes.
+
+    Parameters
+    ----------
+    root : str
+        Directory searched for sessions by ``parser.discover``.
+    output_dir : str
+        Directory of the NWB files, created if needed.
+    parser : SessionParser, optional
+        Defaults to ``LogDirectoryParser()``.
+    max_workers : int, optional
+        Number of worker processes; defaults to the number of CPUs. With
+        ``max_workers=0`` sessions are converted in the calling process.
+    compression : str
+        Compression preset of the streamed datasets, see ``streaming.COMPRESSION_PRESETS``.
+    block_rows : int
+        Number of samples parsed and written at a time.
+    overwrite : bool
+        Replace existing NWB files instead of reporting the session as failed.
+    callback : callable, optional
+        Called with each ``SessionReport`` as soon as its session is done.
+
+    Returns
+    -------
+    list of SessionReport
+        In the order of ``parser.discover(root)``.
+    """
+    parser = parser if parser is not None else LogDirectoryParser()
+    os.makedirs(output_dir, exist_ok=True)
+    sessions = parser.discover(root)
+    kwargs = dict(output_dir=output_dir, parser=parser, compression=compression, block_rows=block_rows,
+                  overwrite=overwrite)
+    reports = dict()
+    if max_workers == 0:
+        for session in sessions:
+            reports[session] = convert_session(session, **kwargs)
+            if callback is not None:
+                callback(reports[session])
+    else:
+        jobs = [(session,) for session in sessions]
+        for (session,), report, error in imap_processes(functools.partial(convert_session, **kwargs), jobs,
+                                                        max_workers):
+            if error is not None:
+                # the worker died, or the report could not be sent back
+                output = os.path.join(output_dir, parser.session_name(session) + ".nwb")
+                report = SessionReport(str(session), output, False, 0, 0, 0.0, error)
+            reports[session] = report
+            if callback is not None:
+                callback(report)
+    return [reports[session] for session in sessions]
+
+
+def format_report(report):
+    if report.succeeded:
+        return "ok      %-40s %10d samples %8.2f s %8.1f MB/s" % (
+            report.session, report.num_samples, report.seconds, report.throughput / 1e6)
+    return "FAILED  %-40s %s" % (report.session, report.error.strip().splitlines()[-1])
+
+
+def _load_parser(spec):
+    module, _, name = spec.partition(":")
+    return getattr(importlib.import_module(module), name)()
+
+
+def main(argv=None):
+    """Command line entry point, see ``--help``."""
+    arg_parser = argparse.ArgumentParser(description="Convert holographic stimulation logs to NWB files.")
+    arg_parser.add_argument("root", help="directory containing one entry per session")
+    arg_parser.add_argument("output_dir", help="directory for the NWB files")
+    arg_parser.add_argument("--workers", type=int, default=None, help="number of worker processes")
+    arg_parser.add_argument("--compression", default="balanced", help="compression preset")
+    arg_parser.add_argument("--parser", default=None, help="parser class, as module:Class")
+    arg_parser.add_argument("--overwrite", action="store_true", help="replace existing NWB files")
+    arg_parser.add_argument("--report", default=None, help="write the reports to this JSON file")
+    args = arg_parser.parse_args(argv)
+
+    parser = _load_parser(args.parser) if args.parser else None
+    reports = convert_sessions(args.root, args.output_dir, parser=parser, max_workers=args.workers,
+                               compression=args.compression, overwrite=args.overwrite,
+                               callback=lambda report: print(format_report(report), flush=True))
+    failed = [report for report in reports if not report.succeeded]
+    print("%d sessions converted, %d failed" % (len(reports) - len(failed), len(failed)))
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump([dict(report._asdict(), throughput=report.throughput) for report in reports], f, indent=2)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,187 @@
+"""Energy and power delivered to each ROI, computed once and stored with the series.
+
+``compute_delivered_dose`` integrates the power in ``data`` (W) over time in a
+single pass of ``block_rows`` samples and returns a ``DeliveredDose`` with, for
+each ROI, the energy delivered (J), the peak and time-weighted mean power and
+the time spent above ``threshold``. If the series has a stimulus pattern, the
+energy of every presentation of its stimulus schedule is computed in the same
+pass. Power is integrated with the trapezoidal rule, or as a step function
+(each sample holding until the next one) for series whose ``continuity`` is
+``"step"``, over the span from the first to the last sample.
+
+Added to its series (``series.delivered_dose``, or
+``series.get_delivered_dose(store=True)``), the ``DeliveredDose`` is
+written with it, and later queries only read O(num_rois) values instead of the
+whole ``num_times x num_rois`` matrix. It records the number of samples and a
+CRC-32 of ``data``: ``DeliveredDose.is_current`` compares the former, and
+optionally recomputes the latter, to tell whether the data changed since.
+"""
+import zlib
+from collections import namedtuple
+
+import numpy as np
+from pynwb import get_class, register_class
+
+from .run_length import STEP_CONTINUITY
+from .schedule import _sample_times
+
+PresentationDose = namedtuple("PresentationDose", ["rois", "onset", "offset", "energy"])
+PresentationDose.__doc__ = """Energy delivered by each presentation of the stimulus schedule, sorted by onset."""
+
+_DeliveredDose = get_class('DeliveredDose', 'ndx-holographic-stimulation')
+
+
+@register_class('DeliveredDose', 'ndx-holographic-stimulation')
+class DeliveredDose(_DeliveredDose):
+
+    @property
+    def total_energy(self):
+        """Energy delivered to all ROIs, in J."""
+        return float(np.sum(self.energy[:]))
+
+    def get_presentation_dose(self):
+        """The ``PresentationDose`` of the stimulus schedule, or None if it was not computed."""
+        if self.presentation_energy is None:
+            return None
+        return PresentationDose(
+            rois=np.asarray(self.presentation_rois[:]),
+            onset=np.asarray(self.presentation_onset[:]),
+            offset=np.asarray(self.presentation_offset[:]),
+            energy=np.asarray(self.presentation_energy[:]),
+        )
+
+    def is_current(self, series, verify=False):
+        """Whether these aggregates describe the current ``data`` of ``series``.
+
+        Compares the number of samples, which catches appended data at no cost;
+        with ``verify=True`` the checksum of ``data`` is recomputed as well,
+        which reads the whole dataset.
+        """
+        if len(series.data) != int(self.source_num_times):
+            return False
+        return not verify or data_checksum(series.data) == int(self.source_checksum)
+
+
+def data_checksum(data, block_rows=65536):
+    """CRC-32 of the bytes of ``data``, read ``block_rows`` samples at a time."""
+    checksum = 0
+    for start in range(0, len(data), block_rows):
+        checksum = zlib.crc32(np.ascontiguousarray(data[start:start + block_rows]), checksum)
+    return checksum
+
+
+def _boundary_columns(series, rois):
+    """Column of ``data`` holding each of ``rois`` (rows of the ROI table)."""
+    region = np.asarray(series.rois.data[:])
+    order = np.argsort(region, kind="stable")
+    return order[np.searchsorted(region, rois, sorter=order)]
+
+
+def compute_delivered_dose(series, threshold=0.0, schedule=None, block_rows=65536, name="delivered_dose"):
+    """Return the ``DeliveredDose`` of ``series``, computed in one pass over ``data``.
+
+    Parameters
+    ----------
+    series : PatternedOptogeneticSeries
+        A series whose ``data`` (and ``timestamps``) can be sliced, e.g. arrays or datasets read from a file.
+    threshold : float
+        Power, in W, above which a ROI counts as stimulated.
+    schedule : StimulusSchedule, optional
+        Presentations whose energy is computed. Defaults to
+        ``series.get_stimulus_schedule(threshold)`` if the series has a stimulus
+        pattern; computing it costs a pass over ``data`` unless it is memoized.
+    block_rows : int
+        Number of samples of ``data`` read at a time.
+    name : str
+        Name of the returned ``DeliveredDose``.
+
+    Returns
+    -------
+    DeliveredDose
+    """
+    if schedule is None and series.get_stimulus_pattern() is not None:
+        schedule = series.get_stimulus_schedule(threshold=threshold)
+    step = series.continuity == STEP_CONTINUITY
+    data = series.data
+    num_times = len(data)
+    if num_times == 0:
+        raise ValueError("series '%s' has no data to aggregate" % series.name)
+
+    # presentation boundaries, sorted by time: energy is cumulated up to each onset and offset
+    if schedule is not None:
+        num_presentations = len(schedule.onset)
+        boundary_times = np.concatenate([schedule.onset, schedule.offset])
+        boundary_cols = np.tile(_boundary_columns(series, schedule.rois), 2)
+        boundary_order = np.argsort(boundary_times, kind="stable")
+        boundary_times, boundary_cols = boundary_times[boundary_order], boundary_cols[boundary_order]
+        boundary_energy = np.zeros(len(boundary_times))
+
+    checksum = 0
+    previous_time = previous_power = None
+    for start in range(0, num_times, block_rows):
+        block = np.asarray(data[start:start + block_rows])
+        checksum = zlib.crc32(np.ascontiguousarray(block), checksum)
+        power = block.reshape(len(block), -1).astype(float, copy=False)
+        times = _sample_times(series, start, start + len(block))
+        if previous_time is None:
+            first_time = times[0]
+            energy = np.zeros(power.shape[1])
+            stimulated_time = np.zeros(power.shape[1])
+            peak_power = np.full(power.shape[1], -np.inf)
+            previous_time, previous_power = times[:1], power[:1]
+        # the last sample of the previous block starts the first segment of this one
+        seg_times = np.concatenate([previous_time, times])
+        seg_power = np.vstack([previous_power, power])
+        dt = np.diff(seg_times)[:, np.newaxis]
+        left = seg_power[:-1]
+        seg_energy = left * dt if step else (left + seg_power[1:]) * 0.5 * dt
+        cumulative = np.vstack([energy, energy + np.cumsum(seg_energy, axis=0)])
+        stimulated_time += np.sum(np.where(left > threshold, dt, 0.0), axis=0)
+        peak_power = np.maximum(peak_power, power.max(axis=0))
+
+        if schedule is not None:
+            # boundaries in (seg_times[0], seg_times[-1]]: cumulated energy at the left sample plus the partial segment
+            lo, hi = np.searchsorted(boundary_times, [seg_times[0], seg_times[-1]], side="right")
+            if hi > lo:
+                b_times, b_cols = boundary_times[lo:hi], boundary_cols[lo:hi]
+                k = np.maximum(np.searchsorted(seg_times, b_times, side="left"), 1)
+                partial = b_times - seg_times[k - 1]
+                p_left = seg_power[k - 1, b_cols]
+                if step:
+                    partial_energy = p_left * partial
+                else:
+                    width = seg_times[k] - seg_times[k - 1]
+                    fraction = np.divide(partial, width, out=np.zeros_like(partial), where=width > 0)
+                    partial_energy = (2 * p_left + fraction * (seg_power[k, b_cols] - p_left)) * 0.5 * partial
+                boundary_energy[lo:hi] = cumulative[k - 1, b_cols] + partial_energy
+
+        energy = cumulative[-1]
+        previous_time, previous_power = times[-1:], power[-1:]
+
+    last_time = previous_time[0]
+    duration = last_time - first_time
+    presentations = dict()
+    if schedule is not None:
+        # boundaries after the last sample have received the whole energy of their ROI
+        after = boundary_times > last_time
+        boundary_energy[after] = energy[boundary_cols[after]]
+        cumulated = np.empty_like(boundary_energy)
+        cumulated[boundary_order] = boundary_energy
+        presentations = dict(
+            presentation_rois=np.asarray(schedule.rois, dtype=np.int32),
+            presentation_onset=np.asarray(schedule.onset, dtype=float),
+            presentation_offset=np.asarray(schedule.offset, dtype=float),
+            presentation_energy=cumulated[num_presentations:] - cumulated[:num_presentations],
+        )
+    return DeliveredDose(
+        name=name,
+        integration="step" if step else "trapezoid",
+        threshold=float(threshold),
+        source_num_times=np.int64(num_times),
+        source_checksum=np.int64(checksum),
+        energy=energy,
+        peak_power=peak_power,
+        mean_power=energy / duration if duration > 0 else np.zeros_like(energy),
+        stimulated_time=stimulated_time,
+        **presentations,
+    )
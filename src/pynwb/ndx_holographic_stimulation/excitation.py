@@ -0,0 +1,216 @@
+"""Estimated excitation of every ROI of a PlaneSegmentation by stimulation targets.
+
+The excitation profile of a target is modelled as a 3D Gaussian centered on
+the target, with the lateral and axial full widths at half maximum of the
+``PointSpreadFunction`` of the pattern (see ``TemporalFocusing``). The
+excitation of a ROI is the mean of that profile over its mask, weighted by the
+mask: 1 for a ROI concentrated on the focus of the target, near 0 for a ROI
+far from it. Off-target activation is the excitation of ROIs other than the
+one a target is aimed at.
+
+``ExcitationModel`` reads the masks once, as a list of pixels sorted by y.
+``excitation`` computes the ``num_targets x num_rois`` matrix in batches of
+spatially close targets, those within a square cell of ``cutoff`` lateral
+FWHM, so that each batch only evaluates the pixels within ``cutoff`` FWHM of
+its targets, as one vectorized ``batch x pixels`` product. Sessions
+stimulate the same targets over and over: the excitation of each distinct
+target is computed once and kept in an LRU cache.
+
+Target coordinates are in m, in the frame of the imaging plane: pixel
+``(x, y)`` of the masks is at ``origin + (x, y, 0) * pixel_size``, with the
+``origin_coords`` and ``grid_spacing`` of the imaging plane by default.
+"""
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+
+from .temporal_focusing import PointSpreadFunction, _unit_scale
+
+DEFAULT_CUTOFF = 2.5
+DEFAULT_BATCH_SIZE = 256
+DEFAULT_CACHE_SIZE = 65536
+
+# exp(-_FWHM_SCALE * (d / fwhm) ** 2) is a Gaussian of full width at half maximum fwhm
+_FWHM_SCALE = 4 * np.log(2)
+
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "size", "maxsize"])
+
+OffTargetExcitation = namedtuple("OffTargetExcitation", ["on_target", "max_off_target", "num_off_target"])
+OffTargetExcitation.__doc__ = """For each target, the excitation of its own ROI, the largest excitation of another
+ROI, and the number of other ROIs excited above the threshold."""
+
+
+def _mask_pixels(plane_segmentation):
+    """ROI, x, y and normalized weight of every pixel of the masks."""
+    if 'pixel_mask' in plane_segmentation.colnames:
+        column = plane_segmentation['pixel_mask']
+        pixels = np.asarray(column.target.data[:])
+        counts = np.diff(np.concatenate([[0], np.asarray(column.data[:], dtype=np.int64)]))
+        roi = np.repeat(np.arange(len(counts), dtype=np.int64), counts)
+        if pixels.dtype.names is None:  # a list of (x, y, weight) tuples, before the table is written
+            pixels = np.rec.fromarrays(pixels.reshape(-1, 3).T, names='x,y,weight')
+        x, y, weight = (np.asarray(pixels[field], dtype=np.float64) for field in ('x', 'y', 'weight'))
+    elif 'image_mask' in plane_segmentation.colnames:
+        data = plane_segmentation['image_mask'].data
+        parts = []
+        for i in range(len(plane_segmentation)):  # one mask at a time, to bound memory
+            mask = np.asarray(data[i], dtype=np.float64)
+            if mask.ndim != 2:
+                raise ValueError("only 2D image masks are supported, got a mask of shape %s" % (mask.shape,))
+            x, y = np.nonzero(mask)
+            parts.append((np.full(len(x), i, dtype=np.int64), x, y, mask[x, y]))
+        roi, x, y, weight = (np.concatenate(part) for part in zip(*parts))
+    else:
+        raise ValueError("%r has no pixel_mask or image_mask" % plane_segmentation.name)
+    totals = np.bincount(roi, weights=weight, minlength=len(plane_segmentation))
+    weight = np.divide(weight, totals[roi], out=np.zeros_like(weight), where=totals[roi] != 0)
+    keep = weight != 0
+    return roi[keep], x[keep], y[keep], weight[keep]
+
+
+class ExcitationModel:
+    """Excitation of the ROIs of a ``PlaneSegmentation`` by stimulation targets.
+
+    Parameters
+    ----------
+    plane_segmentation : PlaneSegmentation
+        ROIs with a 2D ``pixel_mask`` or ``image_mask``.
+    point_spread_function : PointSpreadFunction or TemporalFocusing
+        Lateral and axial FWHM of the excitation profile, in m.
+    pixel_size : float or (float, float), optional
+        Size of a pixel along x and y, in m. Defaults to the ``grid_spacing``
+        of the imaging plane.
+    origin : (float, float, float), optional
+        Position of pixel (0, 0), in m. Defaults to the ``origin_coords`` of the
+        imaging plane, or to 0.
+    cutoff : float
+        Pixels farther than ``cutoff`` lateral FWHM from a target, and targets
+        farther than ``cutoff`` axial FWHM from the plane, do not contribute
+        (the profile is below 3e-8 of its peak at 2.5 FWHM).
+    batch_size : int
+        Largest number of targets evaluated together; bounds memory to about
+        ``batch_size x pixels near the batch`` floats.
+    cache_size : int
+        Number of distinct targets whose excitation is cached.
+    """
+
+    def __init__(self, plane_segmentation, point_spread_function, pixel_size=None, origin=None,
+                 cutoff=DEFAULT_CUTOFF, batch_size=DEFAULT_BATCH_SIZE, cache_size=DEFAULT_CACHE_SIZE):
+        if not isinstance(point_spread_function, PointSpreadFunction):
+            point_spread_function = point_spread_function.point_spread_function
+        self.point_spread_function = PointSpreadFunction(*map(float, point_spread_function))
+        imaging_plane = getattr(plane_segmentation, 'imaging_plane', None)
+        if pixel_size is None:
+            if imaging_plane is None or imaging_plane.grid_spacing is None:
+                raise ValueError("pixel_size is required when the imaging plane has no grid_spacing")
+            pixel_size = np.asarray(imaging_plane.grid_spacing[:2], dtype=np.float64) * _unit_scale(
+                imaging_plane.grid_spacing_unit)
+        if origin is None:
+            origin = np.zeros(3)
+            if imaging_plane is not None and imaging_plane.origin_coords is not None:
+                coords = np.asarray(imaging_plane.origin_coords, dtype=np.float64)
+                origin[:len(coords)] = coords[:3] * _unit_scale(imaging_plane.origin_coords_unit)
+        self.pixel_size = np.broadcast_to(np.asarray(pixel_size, dtype=np.float64), (2,)).copy()
+        self.origin = np.asarray(origin, dtype=np.float64)
+        self.cutoff = float(cutoff)
+        self.batch_size = int(batch_size)
+        self.num_rois = len(plane_segmentation)
+
+        # pixels sorted by y, so the pixels near a batch of targets are within one slice
+        roi, x, y, weight = _mask_pixels(plane_segmentation)
+        order = np.argsort(y, kind='stable')
+        self._roi, self._weight = roi[order], weight[order]
+        self._x = self.origin[0] + x[order] * self.pixel_size[0]
+        self._y = self.origin[1] + y[order] * self.pixel_size[1]
+
+        self.cache_size = int(cache_size)
+        self._cache = OrderedDict()
+        self._hits = self._misses = 0
+
+    def cache_info(self):
+        return CacheInfo(self._hits, self._misses, len(self._cache), self.cache_size)
+
+    def cache_clear(self):
+        self._cache.clear()
+        self._hits = self._misses = 0
+
+    def _compute(self, targets):
+        """``len(targets) x num_rois`` excitation of targets, without the cache."""
+        lateral, axial = self.point_spread_function
+        radius = self.cutoff * lateral
+        result = np.zeros((len(targets), self.num_rois), dtype=np.float32)
+        in_range = np.abs(targets[:, 2] - self.origin[2]) <= self.cutoff * axial
+        rows = np.flatnonzero(in_range)
+        if rows.size == 0 or self._roi.size == 0:
+            return result
+        # batches are the targets of one square cell of one cutoff radius
+        cells = np.floor((targets[rows, :2] - targets[rows, :2].min(axis=0)) / radius).astype(np.int64)
+        keys = cells[:, 1] * (cells[:, 0].max() + 1) + cells[:, 0]
+        order = np.argsort(keys, kind='stable')
+        rows, keys = rows[order], keys[order]
+        starts = np.flatnonzero(np.concatenate([[True], keys[1:] != keys[:-1]]))
+        bounds = sorted(set(starts.tolist()) | set(range(0, len(rows), self.batch_size)) | {len(rows)})
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            batch = rows[start:stop]
+            tx, ty, tz = targets[batch].T
+            first, last = np.searchsorted(self._y, [ty.min() - radius, ty.max() + radius], side='left')
+            pixels = first + np.flatnonzero((self._x[first:last] >= tx.min() - radius)
+                                            & (self._x[first:last] <= tx.max() + radius))
+            if pixels.size == 0:
+                continue
+            pixels = pixels[np.argsort(self._roi[pixels], kind='stable')]
+            d2 = (np.subtract.outer(tx, self._x[pixels]) ** 2 + np.subtract.outer(ty, self._y[pixels]) ** 2)
+            d2 /= lateral ** 2
+            d2 += (((tz - self.origin[2]) / axial) ** 2)[:, None]
+            profile = np.exp(-_FWHM_SCALE * d2)
+            profile *= self._weight[pixels]
+            rois = self._roi[pixels]
+            starts = np.flatnonzero(np.concatenate([[True], rois[1:] != rois[:-1]]))
+            result[np.ix_(batch, rois[starts])] = np.add.reduceat(profile, starts, axis=1)
+        return result
+
+    def excitation(self, targets):
+        """``num_targets x num_rois`` estimated excitation of each ROI by each target.
+
+        ``targets`` is ``num_targets x 3`` (x, y, z) coordinates in m, or a
+        ``StimulationTargetTable``. Repeated targets, within and across calls,
+        are computed once.
+        """
+        if hasattr(targets, 'coordinates'):
+            targets = targets.coordinates
+        targets = np.asarray(targets, dtype=np.float64).reshape(-1, 3)
+        unique, inverse = np.unique(targets, axis=0, return_inverse=True)
+        rows = np.empty((len(unique), self.num_rois), dtype=np.float32)
+        missing = []
+        for i, target in enumerate(map(tuple, unique)):
+            cached = self._cache.get(target)
+            if cached is None:
+                missing.append(i)
+            else:
+                self._cache.move_to_end(target)
+                rows[i] = cached
+        self._hits += len(unique) - len(missing)
+        self._misses += len(missing)
+        if missing:
+            rows[missing] = self._compute(unique[missing])
+            for i in missing:
+                self._cache[tuple(unique[i])] = rows[i].copy()
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return rows[inverse.reshape(-1)]
+
+    def off_target(self, targets, target_rois=None, threshold=0.1):
+        """``OffTargetExcitation`` of each target, aimed at the ROI of ``target_rois`` (-1 for none).
+
+        ``target_rois`` defaults to the ``roi`` column of a ``StimulationTargetTable``.
+        """
+        if target_rois is None:
+            target_rois = targets['roi'].data[:]
+        target_rois = np.asarray(target_rois, dtype=np.int64)
+        excitation = self.excitation(targets)
+        rows = np.arange(len(excitation))
+        aimed = target_rois >= 0
+        on_target = np.where(aimed, excitation[rows, np.maximum(target_rois, 0)], np.nan).astype(np.float32)
+        off = excitation.copy()
+        off[rows[aimed], target_rois[aimed]] = 0
+        return OffTargetExcitation(on_target, off.max(axis=1, initial=0), (off > threshold).sum(axis=1))
@@ -0,0 +1,295 @@
+"""Lazy reading of files with many PatternedOptogeneticSeries.
+
+``NWBHDF5IO.read`` reads the builder of every group of a file and constructs
+every container, so a file with thousands of series costs seconds per
+thousand series even to look at one of them. ``LazyNWBHDF5IO`` reads
+everything except the ``PatternedOptogeneticSeries`` groups, which it only
+lists; ``io.series`` maps the path of each series to the series, read and
+constructed on first access and kept in a bounded LRU cache.
+
+The devices, sites, patterns and ROI tables that series link to are read once
+with the rest of the file, so every series resolves its links to the same
+objects as ``nwbfile``. Series read lazily are not children of ``nwbfile``
+(e.g. ``nwbfile.stimulus`` does not list them), and the file is read-only:
+writing or exporting it would drop the series that were never read.
+
+``HDF5IO`` keeps the builder of every group and dataset it reads until the
+file is closed, and has no public method to read a single group. The file is
+therefore read into builders here, with the public builder classes of hdmf:
+the builders of a series are only referenced by the series, so a series
+dropped from the cache is freed with them and memory is bounded by
+``cache_size``.
+"""
+import os
+import warnings
+from collections import ChainMap, OrderedDict
+from collections.abc import Mapping
+
+import h5py
+from hdmf.backends.hdf5.h5_utils import BuilderH5ReferenceDataset, BuilderH5RegionDataset, BuilderH5TableDataset
+from hdmf.backends.hdf5.h5tools import ROOT_NAME, SPEC_LOC_ATTR
+from hdmf.backends.warnings import BrokenLinkWarning
+from hdmf.build import BuildManager, DatasetBuilder, GroupBuilder, LinkBuilder, ReferenceBuilder, RegionBuilder
+from hdmf.utils import StrDataset, docval, get_docval, popargs
+from pynwb import NWBHDF5IO
+
+from .utils import decode_attr
+
+SERIES_TYPE = ('ndx-holographic-stimulation', 'PatternedOptogeneticSeries')
+
+DEFAULT_CACHE_SIZE = 256
+
+
+def find_series_groups(group, ignore=()):
+    """Paths of the ``PatternedOptogeneticSeries`` groups in an h5py ``group``, without descending into them."""
+    paths = []
+    stack = [group]
+    while stack:
+        current = stack.pop()
+        for name in current:
+            if not isinstance(current.get(name, getlink=True), h5py.HardLink):
+                continue  # links are read with the object they link to
+            child = current[name]
+            if child.name in ignore or not isinstance(child, h5py.Group):
+                continue
+            attrs = child.attrs
+            if (decode_attr(attrs.get('namespace')), decode_attr(attrs.get('neurodata_type'))) == SERIES_TYPE:
+                paths.append(child.name)
+            else:
+                stack.append(child)
+    return sorted(paths)
+
+
+def _decode(value):
+    return value.decode('UTF-8') if isinstance(value, bytes) else value
+
+
+class _BuilderReader:
+    """Read the groups and datasets of an h5py file into builders, as ``HDF5IO.read_builder`` does.
+
+    ``built`` maps the id of each h5py object read to its builder, so that
+    links and references to an object resolve to the same builder. A reader
+    for one series (see ``series_reader``) adds the builders of the series to
+    a map of its own and looks up the others in the map of the file.
+    """
+
+    def __init__(self, built=None):
+        self.built = dict() if built is None else built
+
+    def series_reader(self):
+        return _BuilderReader(ChainMap(dict(), self.built))
+
+    def get_builder(self, h5obj):
+        """The builder of ``h5obj``, read if needed; resolves the references of the datasets read."""
+        builder = self.built.get(h5obj.id)
+        if builder is None:
+            if isinstance(h5obj, h5py.Dataset):
+                builder = self.read_dataset(h5obj)
+            else:
+                builder = self.read_group(h5obj)
+            self.built[h5obj.id] = builder
+        return builder
+
+    def _read_attributes(self, h5obj):
+        attributes = dict()
+        for key, value in h5obj.attrs.items():
+            if key == SPEC_LOC_ATTR:
+                continue
+            if isinstance(value, h5py.RegionReference):
+                raise ValueError("cannot read region reference attributes")
+            attributes[key] = self.get_builder(h5obj.file[value]) if isinstance(value, h5py.Reference) \
+                else _decode(value)
+        return attributes
+
+    def read_group(self, h5obj, name=None, ignore=frozenset()):
+        groups, datasets, links = dict(), dict(), dict()
+        for key in h5obj:
+            child = h5obj.get(key)
+            if child is None:
+                warnings.warn('Path to Group altered/broken at ' + os.path.join(h5obj.name, key), BrokenLinkWarning)
+                datasets[key] = None
+                continue
+            if child.name in ignore:
+                continue
+            link = h5obj.get(key, getlink=True)
+            if isinstance(link, (h5py.SoftLink, h5py.ExternalLink)):
+                target = child.file[link.path]
+                link_builder = LinkBuilder(builder=self.get_builder(target), name=key,
+                                           source=os.path.abspath(h5obj.file.filename))
+                link_builder.location = h5obj.name
+                links[os.path.basename(link.path)] = link_builder
+                continue
+            builder = self.built.get(child.id)
+            if builder is None:
+                if isinstance(child, h5py.Dataset):
+                    builder = self.read_dataset(child)
+                else:
+                    builder = self.read_group(child, ignore=ignore)
+                self.built[child.id] = builder
+            (datasets if isinstance(child, h5py.Dataset) else groups)[builder.name] = builder
+        builder = GroupBuilder(name or os.path.basename(h5obj.name), attributes=self._read_attributes(h5obj),
+                               groups=groups, datasets=datasets, links=links,
+                               source=os.path.abspath(h5obj.file.filename))
+        builder.location = os.path.dirname(h5obj.name)
+        return builder
+
+    def read_dataset(self, h5obj, name=None):
+        kwargs = dict(attributes=self._read_attributes(h5obj), dtype=h5obj.dtype, maxshape=h5obj.maxshape)
+        if h5obj.ndim == 0:
+            data = _decode(h5obj[()])
+            if isinstance(data, h5py.Reference):
+                target = self.get_builder(h5obj.file[data])
+                data = RegionBuilder(data, target) if isinstance(data, h5py.RegionReference) \
+                    else ReferenceBuilder(target)
+                kwargs['dtype'] = data.dtype
+        elif h5obj.dtype.kind == 'O' and len(h5obj) > 0:
+            first = h5obj[(0,) * h5obj.ndim]
+            if isinstance(first, h5py.RegionReference):
+                data = BuilderH5RegionDataset(h5obj, self)
+                kwargs['dtype'] = data.dtype
+            elif isinstance(first, h5py.Reference):
+                data = BuilderH5ReferenceDataset(h5obj, self)
+                kwargs['dtype'] = data.dtype
+            elif h5py.check_string_dtype(h5obj.dtype) is not None and h5obj.dtype.metadata.get('vlen') is str:
+                data = StrDataset(h5obj, None)
+            else:
+                data = h5obj
+        elif h5obj.dtype.kind == 'V':  # compound data type
+            fields = h5obj.dtype
+            references = [h5py.check_dtype(ref=fields[i]) or h5py.check_dtype(vlen=fields[i])
+                          for i in range(len(fields))]
+            data = BuilderH5TableDataset(h5obj, self, references)
+            kwargs['dtype'] = [{'name': field, 'dtype': dtype} for field, dtype in zip(fields.fields, data.dtype)]
+        else:
+            data = h5obj
+        builder = DatasetBuilder(name or os.path.basename(h5obj.name), data=data,
+                                 source=os.path.abspath(h5obj.file.filename), **kwargs)
+        builder.location = os.path.dirname(h5obj.name)
+        return builder
+
+
+class _SeriesBuildManager(BuildManager):
+    """Construct one series with its own ``BuildManager``, resolving the builders of the file with the file's.
+
+    The builders read with the series, including those of objects of other
+    series that it links to, are constructed here: the file's manager keeps
+    every container it constructs, and would keep the series alive.
+    """
+
+    def __init__(self, manager, file_builder):
+        super().__init__(manager.type_map)
+        self._file_manager = manager
+        self._file_builder = file_builder
+
+    def _in_file(self, builder):
+        while builder.parent is not None:
+            builder = builder.parent
+        return builder is self._file_builder
+
+    def construct(self, builder):
+        target = builder.target if isinstance(builder, LinkBuilder) else builder
+        if self._in_file(target):
+            return self._file_manager.construct(target)
+        return super().construct(target)
+
+
+class LazySeries(Mapping):
+    """Read-only mapping from the path of each series of a ``LazyNWBHDF5IO`` to the series.
+
+    A series is read and constructed the first time it is accessed, and the
+    ``cache_size`` most recently accessed series are kept. A series name may be
+    used instead of its path when no other series has the same name.
+    """
+
+    def __init__(self, io, paths, cache_size=DEFAULT_CACHE_SIZE):
+        self._io = io
+        self._paths = list(paths)
+        self._path_set = set(self._paths)
+        self._by_name = dict()
+        for path in self._paths:
+            name = path.rsplit('/', 1)[-1]
+            self._by_name[name] = None if name in self._by_name else path
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self._paths)
+
+    def __iter__(self):
+        return iter(self._paths)
+
+    def __contains__(self, key):
+        return key in self._path_set or self._by_name.get(key) is not None
+
+    def _path(self, key):
+        if key in self._path_set:
+            return key
+        path = self._by_name.get(key)
+        if path is None:
+            if key in self._by_name:
+                raise KeyError("%r names several series, use its path" % key)
+            raise KeyError(key)
+        return path
+
+    def __getitem__(self, key):
+        path = self._path(key)
+        series = self._cache.get(path)
+        if series is not None:
+            self._cache.move_to_end(path)
+            self.hits += 1
+            return series
+        self.misses += 1
+        series = self._io._construct_series(path)
+        self._cache[path] = series
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return series
+
+    def cache_clear(self):
+        self._cache.clear()
+
+
+class LazyNWBHDF5IO(NWBHDF5IO):
+    """``NWBHDF5IO`` for reading files with many ``PatternedOptogeneticSeries``, which are read on first access.
+
+    Only mode ``"r"`` is supported. ``read()`` returns the file without its
+    series; use ``io.series`` to get them.
+    """
+
+    @docval(*get_docval(NWBHDF5IO.__init__),
+            {'name': 'cache_size', 'type': int, 'default': DEFAULT_CACHE_SIZE,
+             'doc': 'number of series kept constructed'})
+    def __init__(self, **kwargs):
+        cache_size = popargs('cache_size', kwargs)
+        if kwargs['mode'] != 'r':
+            raise ValueError("LazyNWBHDF5IO only reads files, got mode %r" % kwargs['mode'])
+        super().__init__(**kwargs)
+        self._reader = _BuilderReader()
+        self._lazy_builder = None
+        self._series = None
+        self._cache_size = cache_size
+
+    def _ignored_groups(self):
+        specloc = self._file.attrs.get(SPEC_LOC_ATTR)
+        return set() if specloc is None else {self._file[specloc].name}
+
+    @property
+    def series(self):
+        """``LazySeries`` mapping of the paths of the series in the file to the series."""
+        if self._series is None:
+            paths = find_series_groups(self._file, ignore=self._ignored_groups())
+            self._series = LazySeries(self, paths, cache_size=self._cache_size)
+        return self._series
+
+    def read_builder(self):
+        """The builder of the file, without the ``PatternedOptogeneticSeries`` groups."""
+        if self._lazy_builder is None:
+            ignore = self._ignored_groups() | set(self.series)
+            self._lazy_builder = self._reader.read_group(self._file, ROOT_NAME, ignore=ignore)
+        return self._lazy_builder
+
+    def _construct_series(self, path):
+        file_builder = self.read_builder()  # the builders of the objects the series links to
+        builder = self._reader.series_reader().read_group(self._file[path])
+        return _SeriesBuildManager(self.manager, file_builder).construct(builder)
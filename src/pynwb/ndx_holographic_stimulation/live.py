@@ -0,0 +1,265 @@
+"""Live recording of a PatternedOptogeneticSeries while the stimulation is running.
+
+In closed-loop experiments the power commands (and the SLM pattern switches,
+which change the power of the targeted ROIs) are logged as they are issued.
+The series is first written with empty, resizable ``data`` and ``timestamps``
+(see ``live_data_io``); ``LiveSeriesWriter`` then keeps the file open and
+appends rows to both datasets:
+
+* ``append`` / ``append_rows`` copy the rows into a bounded buffer of
+  ``buffer_rows`` rows and return. When the buffer is full they wait for it to
+  drain, so a writer that cannot keep up slows the producer down instead of
+  growing memory.
+* A background thread takes the buffer (double buffered, so producers keep
+  appending while it writes) at least every ``flush_interval`` seconds, or as
+  soon as it is half full, appends it to the datasets and flushes the file.
+* Every write is a durability point: the HDF5 file is flushed and, with
+  ``fsync=True``, synced to disk. ``flush`` blocks until all the rows
+  appended before it are durable.
+
+The file is created with the latest HDF5 file format and kept open in
+single-writer/multiple-reader (SWMR) mode, in which the HDF5 library writes
+its metadata in an order that leaves the file consistent at all times: if the
+writing process dies, the file is readable and holds every row up to the last
+durability point (and possibly some later ones). Without SWMR, a file that is
+not closed can have corrupt metadata. Durability across a crash of the
+operating system or a power loss also needs ``fsync=True`` and a disk that
+honours it. Other processes can read the file while it is written by opening
+it with ``h5py.File(path, "r", libver="latest", swmr=True)`` and refreshing
+the datasets (see the h5py documentation on SWMR); the file needs HDF5 1.10 or
+later to be read. A file left by a writer that died is still marked as open
+for writing: open it with ``swmr=True`` as well, or clear the mark with
+``h5clear -s``.
+
+``stats`` reports the rows appended and written, the number of writes, the
+time spent writing and the lag between the append of a row and the moment it
+is durable.
+"""
+import os
+import threading
+import time
+from collections import namedtuple
+
+import h5py
+import numpy as np
+from hdmf.backends.hdf5 import H5DataIO
+from pynwb import NWBHDF5IO
+
+from .streaming import compression_filters, roi_aware_chunk_shape
+
+DEFAULT_BUFFER_ROWS = 8192
+DEFAULT_FLUSH_INTERVAL = 0.5  # s
+# smaller chunks than for offline writing: every durability point rewrites the chunk being filled
+DEFAULT_LIVE_CHUNK_BYTES = 64 * 1024
+
+RecordingStats = namedtuple(
+    "RecordingStats", ["rows_appended", "rows_written", "writes", "write_seconds", "max_lag", "last_lag"]
+)
+RecordingStats.__doc__ = """Progress of a ``LiveSeriesWriter``. ``write_seconds`` is the total time spent writing
+and flushing, ``max_lag`` and ``last_lag`` the longest and the latest time from the append of a row to the end of
+the write that made it durable, in s."""
+
+
+def live_data_io(num_rois=None, dtype=np.float32, chunk_shape=None, compression="none",
+                 chunk_bytes=DEFAULT_LIVE_CHUNK_BYTES):
+    """Empty, resizable ``data`` (``num_times x num_rois``) or, with ``num_rois=None``, ``timestamps``.
+
+    Pass them as ``data`` and ``timestamps`` of the ``PatternedOptogeneticSeries``
+    given to ``LiveSeriesWriter``. ``compression`` is a preset name in
+    ``streaming.COMPRESSION_PRESETS`` or a dict of ``H5DataIO`` filter arguments.
+    """
+    shape = (0,) if num_rois is None else (0, num_rois)
+    chunk_shape = chunk_shape or roi_aware_chunk_shape(num_rois, dtype, chunk_bytes=chunk_bytes)
+    return H5DataIO(np.empty(shape, dtype=dtype), maxshape=(None,) + shape[1:], chunks=chunk_shape,
+                    **compression_filters(compression))
+
+
+class LiveSeriesWriter:
+    """Append the rows of a ``PatternedOptogeneticSeries`` to its file as they are recorded.
+
+    Parameters
+    ----------
+    path : str
+        File to create. ``nwbfile`` is written to it first.
+    nwbfile : NWBFile
+        File holding ``series``.
+    series : PatternedOptogeneticSeries
+        Series whose ``data`` and ``timestamps`` are ``live_data_io`` datasets.
+    buffer_rows : int
+        Capacity of the in-memory buffer, in rows.
+    flush_interval : float
+        Longest time a row stays in the buffer before it is written, in s.
+    fsync : bool
+        Sync the file to disk at every durability point, not only hand it to the operating system.
+    """
+
+    def __init__(self, path, nwbfile, series, buffer_rows=DEFAULT_BUFFER_ROWS, flush_interval=DEFAULT_FLUSH_INTERVAL,
+                 fsync=True):
+        if series.timestamps is None:
+            raise ValueError("series '%s' needs timestamps to be recorded live" % series.name)
+        # SWMR needs the latest file format, set when the file is created
+        with NWBHDF5IO(mode="w", file=h5py.File(path, "w", libver="latest")) as io:
+            io.write(nwbfile)
+        self._io = NWBHDF5IO(mode="a", file=h5py.File(path, "a", libver="latest"))
+        try:
+            series_in = self._io.read().objects[series.object_id]
+            self._data, self._timestamps = series_in.data, series_in.timestamps
+            for dataset in (self._data, self._timestamps):
+                if dataset.maxshape[0] is not None:
+                    raise ValueError("%s of series '%s' is not resizable, create it with live_data_io"
+                                     % (dataset.name, series.name))
+            # from here on, no object or attribute can be added to the file: only the datasets grow
+            self._data.file.swmr_mode = True
+        except Exception:
+            self._io.close()
+            raise
+        self.name = series.name
+        self.row_shape = self._data.shape[1:]
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self._num_written = len(self._timestamps)
+        self._last_timestamp = -np.inf
+
+        self._buffers = [
+            (np.empty(buffer_rows, dtype=self._timestamps.dtype), np.empty((buffer_rows,) + self.row_shape,
+                                                                           dtype=self._data.dtype))
+            for _ in range(2)
+        ]
+        self._count = 0
+        self._oldest = None  # time of the first append into the current buffer
+        self._appended = 0
+        self._durable = 0
+        self._writes = 0
+        self._write_seconds = 0.0
+        self._max_lag = 0.0
+        self._last_lag = 0.0
+        self._flush_requested = False
+        self._closing = False
+        self._error = None
+        self._condition = threading.Condition()
+        self._append_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="LiveSeriesWriter-%s" % self.name, daemon=True)
+        self._thread.start()
+
+    @property
+    def buffer_rows(self):
+        return len(self._buffers[0][0])
+
+    def append(self, timestamp, power):
+        """Record one row: the power of every ROI from ``timestamp`` on."""
+        self.append_rows(np.array([timestamp], dtype=float), np.asarray(power)[np.newaxis])
+
+    def append_rows(self, timestamps, power):
+        """Record several rows at once; ``power`` is ``len(timestamps) x num_rois``."""
+        timestamps = np.atleast_1d(np.asarray(timestamps, dtype=float))
+        power = np.asarray(power)
+        if power.shape != (len(timestamps),) + self.row_shape:
+            raise ValueError("expected power of shape %s for %d timestamps, got %s"
+                             % ((len(timestamps),) + self.row_shape, len(timestamps), power.shape))
+        if len(timestamps) == 0:
+            return
+        start = 0
+        # one append at a time: a producer waiting for the buffer to drain must not be overtaken by another one
+        with self._append_lock, self._condition:
+            if timestamps[0] <= self._last_timestamp or np.any(np.diff(timestamps) <= 0):
+                raise ValueError("timestamps of series '%s' must be strictly increasing, got %r after %r"
+                                 % (self.name, timestamps[0], self._last_timestamp))
+            self._last_timestamp = timestamps[-1]
+            while start < len(timestamps):
+                self._condition.wait_for(lambda: self._count < self.buffer_rows or self._error or self._closing)
+                self._raise_if_failed()
+                if self._closing:
+                    raise ValueError("live recording of series '%s' is closed" % self.name)
+                buffer_times, buffer_power = self._buffers[0]
+                n = min(len(timestamps) - start, self.buffer_rows - self._count)
+                buffer_times[self._count:self._count + n] = timestamps[start:start + n]
+                buffer_power[self._count:self._count + n] = power[start:start + n]
+                if self._count == 0:
+                    self._oldest = time.perf_counter()
+                self._count += n
+                self._appended += n
+                start += n
+                if self._count >= self.buffer_rows // 2:
+                    self._condition.notify_all()
+
+    def flush(self, timeout=None):
+        """Durability point: wait until every row appended so far is written and flushed to the file.
+
+        Returns False if ``timeout`` (in s) expired first.
+        """
+        with self._condition:
+            target = self._appended
+            self._flush_requested = True
+            self._condition.notify_all()
+            done = self._condition.wait_for(lambda: self._durable >= target or self._error, timeout=timeout)
+            self._raise_if_failed()
+            return done
+
+    def stats(self):
+        with self._condition:
+            return RecordingStats(self._appended, self._durable, self._writes, self._write_seconds,
+                                  self._max_lag, self._last_lag)
+
+    def close(self):
+        """Write the remaining rows, stop the background thread and close the file."""
+        with self._condition:
+            self._closing = True
+            self._condition.notify_all()
+        self._thread.join()
+        self._io.close()
+        self._raise_if_failed()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _raise_if_failed(self):
+        if self._error is not None:
+            raise RuntimeError("live recording of series '%s' failed" % self.name) from self._error
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: self._closing or self._flush_requested or self._count >= self.buffer_rows // 2,
+                    timeout=self.flush_interval,
+                )
+                count, oldest, closing = self._count, self._oldest, self._closing
+                # swap the buffers: producers fill the other one while this one is written
+                self._buffers.reverse()
+                self._count, self._oldest = 0, None
+                self._flush_requested = False
+                self._condition.notify_all()
+            if count:
+                try:
+                    seconds = self._write(*(buffer[:count] for buffer in self._buffers[1]))
+                except Exception as error:
+                    with self._condition:
+                        self._error = error
+                        self._condition.notify_all()
+                    return
+                with self._condition:
+                    self._durable += count
+                    self._writes += 1
+                    self._write_seconds += seconds
+                    self._last_lag = time.perf_counter() - oldest
+                    self._max_lag = max(self._max_lag, self._last_lag)
+                    self._condition.notify_all()
+            if closing:
+                return
+
+    def _write(self, timestamps, power):
+        start = time.perf_counter()
+        stop = self._num_written + len(timestamps)
+        self._timestamps.resize((stop,))
+        self._data.resize((stop,) + self._data.shape[1:])
+        self._timestamps[self._num_written:stop] = timestamps
+        self._data[self._num_written:stop] = power
+        self._num_written = stop
+        h5_file = self._data.file
+        h5_file.flush()
+        if self.fsync:
+            os.fsync(h5_file.id.get_vfd_handle())
+        return time.perf_counter() - start
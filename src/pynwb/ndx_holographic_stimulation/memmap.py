@@ -0,0 +1,86 @@
+"""Zero-copy reads of contiguous, uncompressed PatternedOptogeneticSeries data.
+
+An HDF5 dataset stored contiguous (not chunked, so not compressed) is a single
+run of bytes in the file: its element ``i`` is at a fixed offset from the start
+of the dataset. ``memmap_dataset`` maps those bytes as a read-only
+``numpy.memmap``, so reads are served from the operating system's page cache
+without going through h5py's selection and type-conversion machinery, which
+dominates the cost of many small or strided reads (single rows, single ROIs).
+
+``memmap_series`` (or ``PatternedOptogeneticSeries.use_memmap``) replaces the
+``data`` and ``timestamps`` of a series read from a file by such views, and
+``memmap_nwbfile`` does it for every series of a file. It is opt-in, and
+datasets that cannot be mapped are left as h5py datasets, with the reason
+returned: chunked or compressed datasets, external or compact storage,
+non-numeric types, empty datasets, files not on disk, and files opened for
+writing, whose recent writes may still be buffered by HDF5.
+
+The maps stay valid after the file is closed, but must not be used once the
+file is modified or replaced.
+"""
+import h5py
+import numpy as np
+
+SERIES_FIELDS = ('data', 'timestamps')
+
+_MAPPABLE_DRIVERS = ('sec2', 'stdio')
+
+
+def memmap_dataset(dataset):
+    """Read-only ``numpy.memmap`` of the bytes of ``dataset`` in its file.
+
+    Raises ValueError, with the reason, if ``dataset`` is not a contiguous,
+    allocated, numeric h5py dataset of a file on disk opened read-only.
+    """
+    if not isinstance(dataset, h5py.Dataset):
+        raise ValueError("not an HDF5 dataset")
+    if dataset.file.mode != 'r':
+        raise ValueError("the file is open for writing")
+    if dataset.file.driver not in _MAPPABLE_DRIVERS:
+        raise ValueError("the file driver %r does not store the file on disk" % dataset.file.driver)
+    layout = dataset.id.get_create_plist().get_layout()
+    if layout != h5py.h5d.CONTIGUOUS:
+        raise ValueError("the dataset is %s" % ("chunked" if layout == h5py.h5d.CHUNKED else "not contiguous"))
+    if dataset.external:
+        raise ValueError("the dataset is stored in external files")
+    if dataset.dtype.kind not in 'biufc':
+        raise ValueError("the dataset type %s is not numeric" % dataset.dtype)
+    offset = dataset.id.get_offset()
+    if offset is None or dataset.size == 0:
+        raise ValueError("the dataset has no data in the file")
+    return np.memmap(dataset.file.filename, dtype=dataset.dtype, mode='r', offset=offset, shape=dataset.shape)
+
+
+def memmap_series(series, fields=SERIES_FIELDS):
+    """Replace ``fields`` of ``series`` read from a file by read-only ``numpy.memmap`` views where possible.
+
+    Returns a dict from each field to None if it is now memory-mapped, or to
+    the reason it was left as it is. Fields that are None are skipped.
+    """
+    status = dict()
+    for field in fields:
+        dataset = getattr(series, field)
+        if dataset is None:
+            continue
+        if isinstance(dataset, np.memmap):
+            status[field] = None
+            continue
+        try:
+            series.fields[field] = memmap_dataset(dataset)
+            status[field] = None
+        except ValueError as e:
+            status[field] = str(e)
+    if status.get('timestamps', 'unchanged') is None:
+        series._timestamp_index = None  # rebuild it over the map
+    return status
+
+
+def memmap_nwbfile(nwbfile, fields=SERIES_FIELDS):
+    """``memmap_series`` on every ``PatternedOptogeneticSeries`` of ``nwbfile``; returns the status by object id."""
+    from .series import PatternedOptogeneticSeries
+
+    return {
+        object_id: memmap_series(container, fields)
+        for object_id, container in nwbfile.objects.items()
+        if isinstance(container, PatternedOptogeneticSeries)
+    }
@@ -0,0 +1,138 @@
+"""A single table of the stimulus patterns used in a session.
+
+Storing each ``OptogeneticStimulusPattern`` as its own ``LabMetaData`` group
+costs one HDF5 group (plus its attributes) per pattern, which dominates write
+and read time for sessions with thousands of patterns. The
+``OptogeneticStimulusPatternTable`` stores one row per *unique* parameter set
+instead: patterns are interned by their content, so adding a pattern whose
+parameters are already in the table returns the existing row.
+"""
+import numpy as np
+from hdmf.utils import docval, get_docval, popargs
+from pynwb import get_class, register_class
+
+_OptogeneticStimulusPatternTable = get_class('OptogeneticStimulusPatternTable', 'ndx-holographic-stimulation')
+_OptogeneticStimulusPatternLibrary = get_class('OptogeneticStimulusPatternLibrary', 'ndx-holographic-stimulation')
+
+# column name -> (pattern attribute, kind); parameters that do not apply to a pattern type are stored as the
+# fill value of their kind and read back as None
+_COLUMNS = {
+    'pattern_description': ('description', 'text'),
+    'duration': ('duration', 'float'),
+    'number_of_stimulus_presentation': ('number_of_stimulus_presentation', 'int'),
+    'inter_stimulus_interval': ('inter_stimulus_interval', 'float'),
+    'diameter': ('diameter', 'float'),
+    'height': ('height', 'float'),
+    'number_of_revolutions': ('number_of_revolutions', 'int'),
+    'lateral_point_spread_function': ('lateral_point_spread_function', 'text'),
+    'axial_point_spread_function': ('axial_point_spread_function', 'text'),
+    'lateral_point_spread_function_mean': ('lateral_point_spread_function_mean', 'double'),
+    'lateral_point_spread_function_sd': ('lateral_point_spread_function_sd', 'double'),
+    'axial_point_spread_function_mean': ('axial_point_spread_function_mean', 'double'),
+    'axial_point_spread_function_sd': ('axial_point_spread_function_sd', 'double'),
+}
+_FILL_VALUES = {'float': np.nan, 'double': np.nan, 'int': -1, 'text': ''}
+
+
+def _normalize(value, kind):
+    """Value as stored in the table (float32/float64/int32/str), or None if it is missing or the fill value."""
+    if value is None:
+        return None
+    if kind in ('float', 'double'):
+        value = float(np.float32(value)) if kind == 'float' else float(value)
+        return None if np.isnan(value) else value
+    if kind == 'int':
+        value = int(value)
+        return None if value == _FILL_VALUES['int'] else value
+    value = str(value)
+    return value or None
+
+
+@register_class('OptogeneticStimulusPatternTable', 'ndx-holographic-stimulation')
+class OptogeneticStimulusPatternTable(_OptogeneticStimulusPatternTable):
+
+    @docval(
+        {'name': 'name', 'type': str, 'doc': 'name of this table', 'default': 'patterns'},
+        {'name': 'description', 'type': str, 'doc': 'description of this table',
+         'default': 'unique stimulus pattern parameter sets'},
+        *get_docval(_OptogeneticStimulusPatternTable.__init__, 'id', 'columns', 'colnames', 'target_tables'),
+    )
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._rows_by_key = None
+        self._patterns = dict()
+
+    @staticmethod
+    def pattern_key(pattern):
+        """Hashable content of ``pattern``: its neurodata type followed by its normalized parameters."""
+        return (pattern.neurodata_type,) + tuple(
+            _normalize(getattr(pattern, attribute, None), kind) for attribute, kind in _COLUMNS.values()
+        )
+
+    def _row_lookup(self):
+        """Map from pattern key to row, built from the columns the first time it is needed."""
+        if self._rows_by_key is None:
+            columns = [self['pattern_type'].data[:]]
+            for column, (_, kind) in _COLUMNS.items():
+                columns.append([_normalize(value, kind) for value in self[column].data[:]])
+            self._rows_by_key = dict()
+            for row, key in enumerate(zip(*columns)):
+                self._rows_by_key.setdefault(key, row)
+        return self._rows_by_key
+
+    @docval({'name': 'pattern', 'type': 'OptogeneticStimulusPattern',
+             'doc': 'the pattern to add; it does not need to be added to the file'},
+            returns='the row of the table that holds the parameters of the pattern', rtype=int)
+    def add_pattern(self, **kwargs):
+        """Add the parameters of ``pattern`` to the table, unless an identical parameter set is already in it."""
+        pattern = popargs('pattern', kwargs)
+        key = self.pattern_key(pattern)
+        lookup = self._row_lookup()
+        if key not in lookup:
+            row = dict(pattern_type=pattern.neurodata_type)
+            for (column, (_, kind)), value in zip(_COLUMNS.items(), key[1:]):
+                row[column] = _FILL_VALUES[kind] if value is None else value
+            self.add_row(**row)
+            lookup[key] = len(self) - 1
+        return lookup[key]
+
+    def get_pattern(self, row):
+        """The pattern stored in ``row``, as an instance of its ``OptogeneticStimulusPattern`` type.
+
+        The object is built on first access and cached; it is not part of the file.
+        """
+        row = int(row)
+        if row not in self._patterns:
+            pattern_type = self['pattern_type'].data[row]
+            cls = get_class(pattern_type, 'ndx-holographic-stimulation')
+            kwargs = dict(name='%s_%d' % (self.name, row))
+            for column, (attribute, kind) in _COLUMNS.items():
+                value = _normalize(self[column].data[row], kind)
+                if value is not None:
+                    kwargs[attribute] = value
+            self._patterns[row] = cls(**kwargs)
+        return self._patterns[row]
+
+    def create_pattern_region(self, row, name='stimulus_pattern_index'):
+        """``DynamicTableRegion`` selecting ``row``, to pass as ``stimulus_pattern_index`` of a series."""
+        return self.create_region(name=name, region=[int(row)], description='stimulus pattern of the series')
+
+
+@register_class('OptogeneticStimulusPatternLibrary', 'ndx-holographic-stimulation')
+class OptogeneticStimulusPatternLibrary(_OptogeneticStimulusPatternLibrary):
+
+    @docval(
+        {'name': 'patterns', 'type': OptogeneticStimulusPatternTable, 'default': None,
+         'doc': 'the unique stimulus pattern parameter sets; an empty table is created if not provided'},
+        *get_docval(_OptogeneticStimulusPatternLibrary.__init__, 'name'),
+    )
+    def __init__(self, **kwargs):
+        if kwargs['patterns'] is None:
+            kwargs['patterns'] = OptogeneticStimulusPatternTable()
+        super().__init__(**kwargs)
+
+    @docval(*get_docval(OptogeneticStimulusPatternTable.add_pattern),
+            returns='the row of the table that holds the parameters of the pattern', rtype=int)
+    def add_pattern(self, **kwargs):
+        """Add a pattern to the ``patterns`` table. See ``OptogeneticStimulusPatternTable.add_pattern``."""
+        return self.patterns.add_pattern(**kwargs)
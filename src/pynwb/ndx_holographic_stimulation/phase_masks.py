@@ -0,0 +1,156 @@
+"""Deduplicated storage of the phase masks displayed on a SpatialLightModulator.
+
+Phase masks are large (a 1920 x 1152 SLM takes 2.2 MB per 8-bit mask) and the
+same few masks are usually displayed over and over, once per trial or per
+target group. ``SLMPhaseMasks`` stores each distinct mask once, under a
+BLAKE2b hash of its content, and records every display as a timestamp and an
+index into the distinct masks.
+
+``PhaseMaskBuilder`` deduplicates masks as they are displayed: ``add`` hashes
+the mask and only keeps it if its hash is new. ``finish`` returns the
+``SLMPhaseMasks`` to add to the ``SpatialLightModulator``, with the masks
+chunked one mask per chunk, so that reading any mask decompresses exactly one
+chunk, and compressed with the ``"balanced"`` preset (gzip level 4) by
+default: smooth masks (lenses, gratings, few targets) compress about 4x, the
+speckle-like masks of many-target holograms about 1.2x, so a stronger level
+costs write time for little gain.
+"""
+import hashlib
+
+import numpy as np
+from hdmf.backends.hdf5 import H5DataIO
+from hdmf.utils import docval, get_docval
+from pynwb import get_class, register_class
+
+from .streaming import compression_filters
+
+HASH_DIGEST_SIZE = 16
+
+_SLMPhaseMasks = get_class('SLMPhaseMasks', 'ndx-holographic-stimulation')
+
+
+def mask_hash(mask):
+    """Hexadecimal BLAKE2b digest of the content of ``mask``, as stored in ``SLMPhaseMasks.mask_hash``."""
+    return hashlib.blake2b(np.ascontiguousarray(mask).tobytes(), digest_size=HASH_DIGEST_SIZE).hexdigest()
+
+
+@register_class('SLMPhaseMasks', 'ndx-holographic-stimulation')
+class SLMPhaseMasks(_SLMPhaseMasks):
+
+    @docval(*get_docval(_SLMPhaseMasks.__init__))
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._hash_index = None
+        self._display_times = None
+
+    @property
+    def num_masks(self):
+        return len(self.masks)
+
+    @property
+    def num_displays(self):
+        return len(self.timestamps)
+
+    def get_mask(self, index):
+        """The distinct mask ``index`` (``height x width``); reads one chunk from a file."""
+        return np.asarray(self.masks[int(index)])
+
+    def find_mask(self, mask):
+        """Index of the distinct mask with the content of ``mask``, or None if it is not stored."""
+        if self._hash_index is None:
+            self._hash_index = {digest: i for i, digest in enumerate(self.mask_hash[:])}
+        return self._hash_index.get(mask_hash(mask))
+
+    def displayed_at(self, times):
+        """Index into ``masks`` of the mask displayed at each of ``times``, -1 before the first display."""
+        if self._display_times is None:
+            self._display_times = np.asarray(self.timestamps[:])
+        displays = np.searchsorted(self._display_times, np.asarray(times, dtype=float), side="right") - 1
+        mask_index = np.asarray(self.mask_index[:]).astype(np.int64)
+        return np.where(displays >= 0, mask_index[np.maximum(displays, 0)], -1)
+
+    def get_displayed_mask(self, time):
+        """The mask displayed at ``time``, or None before the first display."""
+        index = int(self.displayed_at([time])[0])
+        return None if index < 0 else self.get_mask(index)
+
+
+class PhaseMaskBuilder:
+    """Collect the masks displayed on an SLM, keeping one copy of each distinct mask.
+
+    Parameters
+    ----------
+    unit : str
+        Unit of the mask values, e.g. ``"gray levels"`` or ``"radians"``.
+    compression : str or dict or None
+        Compression preset (see ``streaming.COMPRESSION_PRESETS``) or ``H5DataIO``
+        filter arguments for ``masks``. With None, ``masks`` is a plain array,
+        e.g. to be wrapped for another backend.
+    """
+
+    def __init__(self, unit="gray levels", compression="balanced"):
+        self.unit = unit
+        self.compression = compression
+        self._masks = []
+        self._hashes = []
+        self._hash_index = dict()
+        self._timestamps = []
+        self._mask_index = []
+
+    @property
+    def num_masks(self):
+        return len(self._masks)
+
+    @property
+    def num_displays(self):
+        return len(self._timestamps)
+
+    def add(self, timestamp, mask):
+        """Record the display of ``mask`` (``height x width``) from ``timestamp`` on; return its index into the
+        distinct masks."""
+        mask = np.asarray(mask)
+        if mask.ndim != 2:
+            raise ValueError("a phase mask must be height x width, got shape %s" % (mask.shape,))
+        if self._masks and (mask.shape != self._masks[0].shape or mask.dtype != self._masks[0].dtype):
+            raise ValueError("mask of shape %s and dtype %s does not match the previous masks (%s, %s)"
+                             % (mask.shape, mask.dtype, self._masks[0].shape, self._masks[0].dtype))
+        if self._timestamps and timestamp <= self._timestamps[-1]:
+            raise ValueError("timestamps must be strictly increasing, got %r after %r"
+                             % (timestamp, self._timestamps[-1]))
+        digest = mask_hash(mask)
+        index = self._hash_index.get(digest)
+        if index is None:
+            index = self._hash_index[digest] = len(self._masks)
+            self._masks.append(mask.copy())
+            self._hashes.append(digest)
+        self._timestamps.append(float(timestamp))
+        self._mask_index.append(index)
+        return index
+
+    def finish(self, name="phase_masks"):
+        """Return the ``SLMPhaseMasks`` of all the displays added so far."""
+        if not self._masks:
+            raise ValueError("no phase masks were added")
+        masks = np.stack(self._masks)
+        if self.compression is not None:
+            masks = H5DataIO(masks, chunks=(1,) + masks.shape[1:], **compression_filters(self.compression))
+        return SLMPhaseMasks(
+            name=name,
+            unit=self.unit,
+            masks=masks,
+            mask_hash=list(self._hashes),
+            timestamps=np.array(self._timestamps, dtype=np.float64),
+            mask_index=np.array(self._mask_index, dtype=np.uint32),
+        )
+
+
+def deduplicate_phase_masks(timestamps, masks, unit="gray levels", compression="balanced", name="phase_masks"):
+    """Return the ``SLMPhaseMasks`` of the ``masks`` displayed at ``timestamps``.
+
+    ``masks`` is any iterable of ``height x width`` arrays, e.g. an array of
+    ``num_displays x height x width`` or a generator reading them one at a time.
+    """
+    builder = PhaseMaskBuilder(unit=unit, compression=compression)
+    for timestamp, mask in zip(timestamps, masks):
+        builder.add(timestamp, mask)
+    return builder.finish(name=name)
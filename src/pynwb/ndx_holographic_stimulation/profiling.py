@@ -0,0 +1,311 @@
+"""Time, counts and bytes per neurodata type and phase of the life of NWB objects.
+
+``profile`` is a context manager that yields a ``ProfileReport``, filled in as
+the code in the ``with`` block runs::
+
+    with profile() as report:
+        series = PatternedOptogeneticSeries(...)
+        with NWBHDF5IO("session.nwb", mode="w") as io:
+            io.write(nwbfile)
+    print(report)
+
+The phases are
+
+``init``
+    ``__init__`` of the classes of this extension, docval checks excluded, also
+    when a container is constructed on read
+``validate``
+    docval argument checks, attributed to the type being initialized, built,
+    constructed, written or read when they run
+``build``
+    building a container into a builder, before writing (``ObjectMapper.build``)
+``resolve``
+    looking up the builder of a container already built, or the container of
+    a builder already constructed: links and references
+``write``
+    writing a builder to HDF5, with the bytes stored for each dataset.
+    Datasets and untyped groups are counted for their nearest typed parent.
+``read``
+    reading the builder of a group or dataset from HDF5, with the bytes stored
+    for each dataset. Only scalars are loaded on read, arrays are read when
+    they are accessed, which is not measured.
+``construct``
+    constructing a container from a builder after reading
+    (``ObjectMapper.construct``)
+
+Times are exclusive: the time of a nested phase (e.g. the build of the series
+of an ``NWBFile``) is only counted for that phase, so the times of a report add
+up to at most its wall time. Only the thread that entered ``profile`` is
+measured, and only HDF5 I/O.
+
+The hooks are installed on entering ``profile`` and removed on exit, by
+replacing methods of hdmf and of the classes of this extension, some of them
+private to hdmf. Outside of ``profile``, or with ``profile(enabled=False)``,
+nothing is replaced and nothing is measured.
+"""
+import sys
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from functools import wraps
+
+import h5py
+import hdmf.utils
+from hdmf.backends.hdf5 import HDF5IO
+from hdmf.build import BuildManager, DatasetBuilder, LinkBuilder, ObjectMapper
+
+from .utils import decode_attr
+
+PHASES = ("init", "validate", "build", "resolve", "write", "read", "construct")
+
+PhaseStats = namedtuple("PhaseStats", ["count", "bytes", "seconds"])
+PhaseStats.__doc__ = """Number of calls, bytes written or read, and exclusive wall time in s, of a phase."""
+
+
+class ProfileReport:
+    """Measurements of a ``profile`` block, by phase and neurodata type."""
+
+    def __init__(self):
+        self.seconds = 0.0
+        self._stats = dict()  # (phase, neurodata_type) -> [count, bytes, seconds]
+
+    def _add(self, phase, neurodata_type, count, nbytes, seconds):
+        stats = self._stats.get((phase, neurodata_type))
+        if stats is None:
+            stats = self._stats[(phase, neurodata_type)] = [0, 0, 0.0]
+        stats[0] += count
+        stats[1] += nbytes
+        stats[2] += seconds
+
+    @property
+    def stats(self):
+        """``PhaseStats`` by ``(phase, neurodata_type)``, in the order of ``PHASES`` then by decreasing time."""
+        keys = sorted(self._stats, key=lambda key: (PHASES.index(key[0]), -self._stats[key][2], key[1]))
+        return {key: PhaseStats(*self._stats[key]) for key in keys}
+
+    def _totals(self, position):
+        totals = dict()
+        for key, (count, nbytes, seconds) in self._stats.items():
+            total = totals.setdefault(key[position], [0, 0, 0.0])
+            total[0] += count
+            total[1] += nbytes
+            total[2] += seconds
+        return {key: PhaseStats(*total) for key, total in sorted(totals.items(), key=lambda item: -item[1][2])}
+
+    def by_phase(self):
+        """``PhaseStats`` summed over neurodata types, by phase, by decreasing time."""
+        return self._totals(0)
+
+    def by_type(self):
+        """``PhaseStats`` summed over phases, by neurodata type, by decreasing time."""
+        return self._totals(1)
+
+    def to_dataframe(self):
+        """The ``stats`` as a ``pandas.DataFrame`` with one row per phase and neurodata type."""
+        import pandas as pd
+
+        return pd.DataFrame(
+            [(phase, neurodata_type, *stats) for (phase, neurodata_type), stats in self.stats.items()],
+            columns=["phase", "neurodata_type", *PhaseStats._fields],
+        )
+
+    def __str__(self):
+        lines = ["%-10s %-40s %10s %12s %10s" % ("phase", "neurodata_type", "count", "MB", "s")]
+        for (phase, neurodata_type), stats in self.stats.items():
+            lines.append("%-10s %-40s %10d %12.3f %10.4f"
+                         % (phase, neurodata_type, stats.count, stats.bytes / 1e6, stats.seconds))
+        lines.append("%-10s %-40s %10s %12s %10.4f" % ("total", "(wall time)", "", "", self.seconds))
+        return "\n".join(lines)
+
+
+def _arg(args, kwargs, index, name):
+    return args[index] if len(args) > index else kwargs[name]
+
+
+def _builder_type(builder):
+    """Neurodata type of a builder, or of its nearest typed parent."""
+    while builder is not None:
+        neurodata_type = builder.attributes.get('neurodata_type') or builder.attributes.get('data_type')
+        if neurodata_type is not None:
+            return decode_attr(neurodata_type)
+        builder = builder.parent
+    return None
+
+
+def _storage_size(parent, name):
+    link = parent.get(name, getlink=True)
+    return parent[name].id.get_storage_size() if isinstance(link, h5py.HardLink) else 0
+
+
+# Each hook takes the profiler and the original function, and returns its replacement
+
+
+def _init_hook(profiler, original):
+    def __init__(obj, *args, **kwargs):
+        return profiler.timed('init', obj, type(obj).__name__, original, (obj,) + args, kwargs)
+    return __init__
+
+
+def _validate_hook(profiler, original):
+    def __parse_args(*args, **kwargs):
+        if not profiler._stack:
+            return original(*args, **kwargs)
+        return profiler.timed('validate', None, profiler.current_type(), original, args, kwargs)
+    return __parse_args
+
+
+def _build_hook(profiler, original):
+    def build(mapper, *args, **kwargs):
+        container = _arg(args, kwargs, 0, 'container')
+        return profiler.timed('build', container, type(container).__name__, original, (mapper,) + args, kwargs)
+    return build
+
+
+def _construct_hook(profiler, original):
+    def construct(mapper, *args, **kwargs):
+        builder = _arg(args, kwargs, 0, 'builder')
+        return profiler.timed('construct', builder, _builder_type(builder), original, (mapper,) + args, kwargs)
+    return construct
+
+
+def _resolve_builder_hook(profiler, original):
+    def build(manager, *args, **kwargs):
+        container = _arg(args, kwargs, 0, 'container')
+        if manager._BuildManager__builders.get(manager.__conthash__(container)) is None:
+            return original(manager, *args, **kwargs)  # built by ObjectMapper.build
+        return profiler.timed('resolve', container, type(container).__name__, original, (manager,) + args, kwargs)
+    return build
+
+
+def _resolve_container_hook(profiler, original):
+    def construct(manager, *args, **kwargs):
+        builder = _arg(args, kwargs, 0, 'builder')
+        target = builder.target if isinstance(builder, LinkBuilder) else builder
+        if manager._BuildManager__containers.get(manager.__bldrhash__(target)) is None:
+            return original(manager, *args, **kwargs)  # constructed by ObjectMapper.construct
+        return profiler.timed('resolve', target, _builder_type(target), original, (manager,) + args, kwargs)
+    return construct
+
+
+def _write_hook(profiler, original):
+    def write(io, *args, **kwargs):
+        parent, builder = _arg(args, kwargs, 0, 'parent'), _arg(args, kwargs, 1, 'builder')
+        neurodata_type = _builder_type(builder)
+        result = profiler.timed('write', builder, neurodata_type, original, (io,) + args, kwargs)
+        if isinstance(builder, DatasetBuilder) and profiler.measuring():
+            profiler.report._add('write', neurodata_type, 0, _storage_size(parent, builder.name), 0.0)
+        return result
+    return write
+
+
+def _read_hook(profiler, original):
+    def read(io, h5obj, *args, **kwargs):
+        neurodata_type = decode_attr(h5obj.attrs.get('neurodata_type')) or profiler.current_type()
+        result = profiler.timed('read', h5obj.id, neurodata_type, original, (io, h5obj) + args, kwargs)
+        if isinstance(h5obj, h5py.Dataset) and profiler.measuring():
+            profiler.report._add('read', neurodata_type, 0, h5obj.id.get_storage_size(), 0.0)
+        return result
+    return read
+
+
+_HOOKS = (
+    (hdmf.utils, '__parse_args', _validate_hook),
+    (ObjectMapper, 'build', _build_hook),
+    (ObjectMapper, 'construct', _construct_hook),
+    (BuildManager, 'build', _resolve_builder_hook),
+    (BuildManager, 'construct', _resolve_container_hook),
+    (HDF5IO, 'write_group', _write_hook),
+    (HDF5IO, 'write_dataset', _write_hook),
+    (HDF5IO, '_HDF5IO__read_group', _read_hook),
+    (HDF5IO, '_HDF5IO__read_dataset', _read_hook),
+)
+
+
+class _Profiler:
+    """The hooks of a ``profile`` block, and the stack of the phases being measured."""
+
+    def __init__(self, report):
+        self.report = report
+        self._thread = threading.get_ident()
+        self._stack = []  # [phase, key, neurodata_type, seconds of nested phases]
+        self._patched = []
+
+    def measuring(self):
+        return threading.get_ident() == self._thread
+
+    def current_type(self):
+        return self._stack[-1][2] if self._stack else None
+
+    def timed(self, phase, key, neurodata_type, func, args, kwargs):
+        """Call ``func``, measured as ``phase`` of ``neurodata_type`` unless it continues the phase of ``key``."""
+        stack = self._stack
+        if not self.measuring() or (stack and stack[-1][0] == phase and stack[-1][1] is key):
+            return func(*args, **kwargs)  # another thread, or e.g. the __init__ of a base class
+        frame = [phase, key, neurodata_type, 0.0]
+        stack.append(frame)
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            stack.pop()
+            if stack:
+                stack[-1][3] += elapsed
+            self.report._add(phase, neurodata_type, 1, 0, elapsed - frame[3])
+
+    def _patch(self, owner, name, hook):
+        original = vars(owner)[name]
+        self._patched.append((owner, name, original))
+        setattr(owner, name, wraps(original)(hook(self, original)))
+
+    def install(self, classes):
+        try:
+            for cls in classes:
+                if '__init__' in vars(cls):
+                    self._patch(cls, '__init__', _init_hook)
+            for owner, name, hook in _HOOKS:
+                self._patch(owner, name, hook)
+        except Exception:
+            self.uninstall()
+            raise
+
+    def uninstall(self):
+        while self._patched:
+            owner, name, original = self._patched.pop()
+            setattr(owner, name, original)
+
+
+_active = None
+
+
+def _extension_classes():
+    package = sys.modules[__package__]
+    # with NDX_HOLOGRAPHIC_STIMULATION_LAZY_IMPORT=1, only the classes already resolved
+    return [vars(package)[name] for name in package.__all__ if name in vars(package)]
+
+
+@contextmanager
+def profile(enabled=True):
+    """Measure the phases of the NWB objects handled in the ``with`` block; yields the ``ProfileReport``.
+
+    With ``enabled=False`` the report stays empty and nothing is instrumented.
+    Profiles cannot be nested.
+    """
+    global _active
+    report = ProfileReport()
+    if not enabled:
+        yield report
+        return
+    if _active is not None:
+        raise RuntimeError("a profile is already active")
+    profiler = _Profiler(report)
+    profiler.install(_extension_classes())
+    _active = profiler
+    start = time.perf_counter()
+    try:
+        yield report
+    finally:
+        report.seconds = time.perf_counter() - start
+        profiler.uninstall()
+        _active = None
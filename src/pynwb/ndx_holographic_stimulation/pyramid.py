@@ -0,0 +1,257 @@
+"""Min/max/mean pyramid of PatternedOptogeneticSeries.data for plotting long sessions.
+
+Drawing hours of power for hundreds of ROIs only needs a few thousand values per
+ROI, but reading them from ``data`` means reading every sample. A
+``PowerPyramid`` stores downsampled copies of ``data`` at increasing decimation
+factors (by default 16, 128, 1024, ... samples per bin), each bin summarized by
+the minimum, maximum and mean of its samples, so that pulses stay visible at
+any zoom level. The levels together take about ``3 / (first decimation - 1)``
+of the size of ``data``.
+
+``PyramidBuilder`` computes the levels from blocks of samples in a single pass:
+``compute_power_pyramid`` runs it over the data of a series (e.g. read from a
+file), and ``PyramidBuilder.tap`` runs it over the blocks streamed into a file
+by ``streaming.stream_data_io``, so the pyramid is built while the data is
+written. ``PatternedOptogeneticSeries.get_downsampled`` then reads the coarsest
+level that still resolves a time range at the requested width in pixels, or
+the samples themselves when no level does.
+"""
+from collections import namedtuple
+
+import numpy as np
+from pynwb import get_class, register_class
+
+from .query import TimestampIndex, _roi_columns, _time_slice, get_window
+from .schedule import _sample_times
+
+DEFAULT_FIRST_DECIMATION = 16
+DEFAULT_FACTOR = 8
+# levels with fewer bins than this are not kept, except the first one
+DEFAULT_MIN_BINS = 256
+
+DownsampledTrace = namedtuple("DownsampledTrace", ["timestamps", "min", "max", "mean", "rois", "decimation"])
+DownsampledTrace.__doc__ = """Power summarized over consecutive bins of ``decimation`` samples.
+
+``timestamps`` are the times of the first sample of each bin; ``min``, ``max``
+and ``mean`` are ``num_bins x len(rois)``. With ``decimation == 1`` the bins are
+the samples themselves.
+"""
+
+PowerPyramidLevel = get_class('PowerPyramidLevel', 'ndx-holographic-stimulation')
+_PowerPyramid = get_class('PowerPyramid', 'ndx-holographic-stimulation')
+
+
+@register_class('PowerPyramid', 'ndx-holographic-stimulation')
+class PowerPyramid(_PowerPyramid):
+
+    # MultiContainerInterface replaces a missing __init__ with one that only takes the levels and the name
+    __init__ = _PowerPyramid.__init__
+
+    @property
+    def levels(self):
+        """The levels, from the finest to the coarsest."""
+        return sorted(self.power_pyramid_levels.values(), key=lambda level: int(level.decimation))
+
+    def select_level(self, num_samples, width):
+        """The coarsest level with at least ``width`` bins over ``num_samples`` samples, or None if there is none."""
+        selected = None
+        for level in self.levels:
+            if num_samples / int(level.decimation) >= width:
+                selected = level
+        return selected
+
+    def is_current(self, series):
+        """Whether the pyramid covers all the samples of ``series``."""
+        return len(series.data) == int(self.source_num_times)
+
+
+class PyramidBuilder:
+    """Compute the levels of a ``PowerPyramid`` from the blocks of samples of a series, in time order.
+
+    Parameters
+    ----------
+    first_decimation : int
+        Number of samples per bin of the finest level.
+    factor : int
+        Ratio of the decimation of each level to the previous one.
+    min_bins : int
+        Levels with fewer bins are dropped, except the finest.
+    """
+
+    def __init__(self, first_decimation=DEFAULT_FIRST_DECIMATION, factor=DEFAULT_FACTOR,
+                 min_bins=DEFAULT_MIN_BINS):
+        if first_decimation < 2 or factor < 2:
+            raise ValueError("first_decimation and factor must be at least 2")
+        self.first_decimation = first_decimation
+        self.factor = factor
+        self.min_bins = min_bins
+        self.num_times = 0
+        self._pending_power = self._pending_times = None
+        self._bins = []  # (start time, min, max, sum, count) of the finest level, one tuple of arrays per block
+
+    def update(self, block, times):
+        """Add the samples ``block`` (``n x num_rois``, or ``n`` for a single ROI) taken at ``times``."""
+        block = np.asarray(block)
+        block = block.reshape(len(block), -1)
+        times = np.asarray(times, dtype=float)
+        if len(block) != len(times):
+            raise ValueError("block has %d samples but times has %d" % (len(block), len(times)))
+        self.num_times += len(block)
+        if self._pending_power is not None:
+            block = np.concatenate([self._pending_power, block])
+            times = np.concatenate([self._pending_times, times])
+        num_full = len(block) // self.first_decimation * self.first_decimation
+        if num_full:
+            self._add_bins(block[:num_full], times[:num_full], self.first_decimation)
+        self._pending_power, self._pending_times = block[num_full:], times[num_full:]
+
+    def _add_bins(self, block, times, size):
+        bins = block.reshape(-1, size, block.shape[1])
+        self._bins.append((
+            times[::size],
+            bins.min(axis=1),
+            bins.max(axis=1),
+            bins.sum(axis=1, dtype=np.float64),
+            np.full(len(bins), size, dtype=np.int64),
+        ))
+
+    def tap(self, blocks, times):
+        """Yield ``blocks`` unchanged while adding them to the pyramid.
+
+        ``times`` is an iterable of the sample times of each block, or a
+        ``(starting_time, rate)`` tuple for regularly sampled data. Pass the
+        result to ``stream_data_io`` to build the pyramid while writing.
+        """
+        offset = 0
+        times = iter(times) if not isinstance(times, tuple) else times
+        for block in blocks:
+            if isinstance(times, tuple):
+                starting_time, rate = times
+                block_times = starting_time + np.arange(offset, offset + len(block)) / rate
+            else:
+                block_times = next(times)
+            offset += len(block)
+            self.update(block, block_times)
+            yield block
+
+    def finish(self, name="power_pyramid"):
+        """Return the ``PowerPyramid`` of all the samples added so far."""
+        if self._pending_power is not None and len(self._pending_power):
+            self._add_bins(self._pending_power, self._pending_times, len(self._pending_power))
+            self._pending_power = self._pending_times = None
+        if not self._bins:
+            raise ValueError("no samples were added to the pyramid")
+        start, low, high, total, count = (np.concatenate(field) for field in zip(*self._bins))
+        self._bins = [(start, low, high, total, count)]
+
+        levels = []
+        decimation = self.first_decimation
+        while True:
+            levels.append(PowerPyramidLevel(
+                name="level_%d" % decimation,
+                decimation=np.int64(decimation),
+                bin_start_time=start,
+                min=low,
+                max=high,
+                mean=(total / count[:, np.newaxis]).astype(np.float32),
+            ))
+            num_bins = -(-len(start) // self.factor)
+            if num_bins < self.min_bins:
+                break
+            # the next level merges every `factor` bins of this one; pad the last group with neutral values
+            padding = num_bins * self.factor - len(start)
+            start = start[::self.factor]
+            low = _merge(low, padding, np.minimum, self.factor)
+            high = _merge(high, padding, np.maximum, self.factor)
+            total = _merge(total, padding, np.add, self.factor)
+            count = _merge(count, padding, np.add, self.factor)
+            decimation *= self.factor
+        return PowerPyramid(name=name, source_num_times=np.int64(self.num_times), power_pyramid_levels=levels)
+
+
+def _merge(values, padding, ufunc, factor):
+    if padding:
+        values = np.concatenate([values, np.repeat(values[-1:], padding, axis=0)])
+        if ufunc is np.add:
+            values[-padding:] = 0
+    return ufunc.reduce(values.reshape(-1, factor, *values.shape[1:]), axis=1)
+
+
+def compute_power_pyramid(series, first_decimation=DEFAULT_FIRST_DECIMATION, factor=DEFAULT_FACTOR,
+                          min_bins=DEFAULT_MIN_BINS, block_rows=65536, name="power_pyramid"):
+    """Return the ``PowerPyramid`` of ``series``, computed in one pass over ``data``.
+
+    ``block_rows`` samples are read at a time; see ``PyramidBuilder`` for the other parameters.
+    """
+    builder = PyramidBuilder(first_decimation=first_decimation, factor=factor, min_bins=min_bins)
+    num_times = len(series.data)
+    if num_times == 0:
+        raise ValueError("series '%s' has no data to downsample" % series.name)
+    block_rows = max(block_rows // first_decimation, 1) * first_decimation
+    for start in range(0, num_times, block_rows):
+        stop = min(start + block_rows, num_times)
+        builder.update(series.data[start:stop], _sample_times(series, start, stop))
+    return builder.finish(name=name)
+
+
+def get_downsampled(series, start_time, stop_time, width, rois=None, timestamp_index=None):
+    """Read the power of ``series`` with ``start_time <= t < stop_time`` at a resolution of about ``width`` bins.
+
+    Parameters
+    ----------
+    series : PatternedOptogeneticSeries
+    start_time, stop_time : float
+        Time range, in seconds, on the same clock as the series.
+    width : int
+        Number of bins wanted over the range, e.g. the width of the plot in pixels.
+    rois : array-like of int, optional
+        Rows of the ROI table referenced by ``series.rois`` to read. Defaults to all stimulated ROIs.
+    timestamp_index : TimestampIndex, optional
+        Index over ``series.timestamps`` to reuse across queries.
+
+    Returns
+    -------
+    DownsampledTrace
+        From the coarsest level of ``series.power_pyramid`` with at least
+        ``width`` bins over the range, or the samples themselves if the series
+        has no (current) pyramid or none of its levels is fine enough. Bins
+        overlapping the bounds of the range are included.
+    """
+    if stop_time < start_time:
+        raise ValueError("stop_time (%s) must not be before start_time (%s)" % (stop_time, start_time))
+    pyramid = series.power_pyramid
+    level = None
+    if pyramid is not None and pyramid.is_current(series):
+        window = _time_slice(series, start_time, stop_time, timestamp_index)
+        level = pyramid.select_level(window.stop - window.start, width)
+    if level is None:
+        raw = get_window(series, start_time, stop_time, rois=rois, timestamp_index=timestamp_index)
+        data = raw.data.reshape(len(raw.data), -1)
+        return DownsampledTrace(raw.timestamps, data, data, data, raw.rois, 1)
+
+    bin_index = TimestampIndex(level.bin_start_time)
+    first = max(bin_index.searchsorted(start_time, side="right") - 1, 0)
+    bins = slice(first, bin_index.searchsorted(stop_time, side="left"))
+    if rois is None:
+        rois = np.asarray(series.rois.data[:])
+        columns = slice(None)
+    else:
+        rois, columns = _roi_columns(series, rois)
+        # h5py point selection needs increasing, unique indices; read those and reorder in memory
+        unique_columns, inverse = np.unique(columns, return_inverse=True)
+        columns = unique_columns.tolist()
+
+    def read(dataset):
+        if bins.start >= bins.stop:
+            return np.empty((0, len(rois)), dtype=dataset.dtype)
+        values = np.asarray(dataset[bins, columns])
+        return values if isinstance(columns, slice) else values[:, inverse]
+
+    return DownsampledTrace(
+        timestamps=np.asarray(level.bin_start_time[bins]),
+        min=read(level.min),
+        max=read(level.max),
+        mean=read(level.mean),
+        rois=rois,
+        decimation=int(level.decimation),
+    )
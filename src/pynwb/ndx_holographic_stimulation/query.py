@@ -0,0 +1,113 @@
+"""Time-window queries on PatternedOptogeneticSeries.
+
+``get_window`` answers "what power was delivered to which ROIs between t0 and
+t1" by reading only the matching hyperslab of ``data``. Sample positions are
+computed from ``starting_time``/``rate`` when the series is regularly sampled,
+and otherwise looked up in a ``TimestampIndex``, a two-level index over
+``timestamps`` that keeps every ``block_size``-th timestamp in memory and
+reads a single block from the file per lookup.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+StimulationWindow = namedtuple("StimulationWindow", ["timestamps", "data", "rois"])
+
+DEFAULT_INDEX_BLOCK_SIZE = 4096
+
+
+class TimestampIndex:
+    """Binary-search index over a (possibly on-disk) sorted timestamps array.
+
+    Building the index reads every ``block_size``-th timestamp; each lookup
+    afterwards is a search of that in-memory sample plus a read of at most
+    ``block_size`` timestamps, so repeated queries cost O(log n).
+    """
+
+    def __init__(self, timestamps, block_size=DEFAULT_INDEX_BLOCK_SIZE):
+        self.timestamps = timestamps
+        self.block_size = block_size
+        self._num_times = len(timestamps)
+        self._coarse = np.asarray(timestamps[::block_size])
+
+    def __len__(self):
+        return self._num_times
+
+    def searchsorted(self, value, side="left"):
+        """Return the insertion index of ``value`` in the timestamps, like ``numpy.searchsorted``."""
+        block = int(np.searchsorted(self._coarse, value, side=side))
+        if block == 0:
+            return 0
+        start = (block - 1) * self.block_size
+        stop = min(block * self.block_size, self._num_times)
+        return start + int(np.searchsorted(np.asarray(self.timestamps[start:stop]), value, side=side))
+
+
+def _time_slice(series, start_time, stop_time, timestamp_index=None):
+    """Return the half-open sample slice covering ``start_time <= t < stop_time``."""
+    num_times = len(series.data)
+    if series.timestamps is None:
+        starting_time = series.starting_time or 0.0
+        # round before taking the ceiling so that times on the sampling grid map to their own sample
+        start = int(np.ceil(np.round((start_time - starting_time) * series.rate, 9)))
+        stop = int(np.ceil(np.round((stop_time - starting_time) * series.rate, 9)))
+        return slice(min(max(start, 0), num_times), min(max(stop, 0), num_times))
+    if timestamp_index is None:
+        timestamp_index = TimestampIndex(series.timestamps)
+    return slice(timestamp_index.searchsorted(start_time), timestamp_index.searchsorted(stop_time))
+
+
+def _roi_columns(series, rois):
+    """Map ROI table row indices to the columns of ``series.data`` that hold them."""
+    region = np.asarray(series.rois.data[:])
+    rois = np.atleast_1d(np.asarray(rois))
+    columns = np.empty(len(rois), dtype=np.int64)
+    for i, roi in enumerate(rois):
+        matches = np.flatnonzero(region == roi)
+        if len(matches) == 0:
+            raise ValueError("ROI %d is not stimulated by series '%s'" % (roi, series.name))
+        columns[i] = matches[0]
+    return rois, columns
+
+
+def get_window(series, start_time, stop_time, rois=None, timestamp_index=None):
+    """Read the samples of ``series`` with ``start_time <= t < stop_time``.
+
+    Parameters
+    ----------
+    series : PatternedOptogeneticSeries
+    start_time, stop_time : float
+        Window bounds, in seconds, on the same clock as the series.
+    rois : array-like of int, optional
+        Rows of the ROI table referenced by ``series.rois`` to restrict the
+        read to. Defaults to all stimulated ROIs.
+    timestamp_index : TimestampIndex, optional
+        Index to reuse across queries. ``PatternedOptogeneticSeries.get_window``
+        caches one per series.
+
+    Returns
+    -------
+    StimulationWindow
+        ``timestamps`` (``n``), ``data`` (``n x len(rois)``) and ``rois``.
+    """
+    if stop_time < start_time:
+        raise ValueError("stop_time (%s) must not be before start_time (%s)" % (stop_time, start_time))
+    window = _time_slice(series, start_time, stop_time, timestamp_index)
+    if series.timestamps is None:
+        starting_time = series.starting_time or 0.0
+        timestamps = starting_time + np.arange(window.start, window.stop) / series.rate
+    else:
+        timestamps = np.asarray(series.timestamps[window])
+
+    if rois is None:
+        return StimulationWindow(timestamps, np.asarray(series.data[window]), np.asarray(series.rois.data[:]))
+
+    rois, columns = _roi_columns(series, rois)
+    source = series.data if hasattr(series.data, "shape") else np.asarray(series.data)
+    # h5py point selection needs increasing, unique indices; read those and reorder in memory
+    unique_columns, inverse = np.unique(columns, return_inverse=True)
+    if window.start == window.stop:
+        data = np.empty((0, len(unique_columns)), dtype=source.dtype)
+    else:
+        data = np.asarray(source[window, unique_columns.tolist()])
+    return StimulationWindow(timestamps, data[:, inverse], rois)
@@ -0,0 +1,169 @@
+"""Run-length encoded storage for piecewise-constant stimulation power.
+
+Holographic stimulation power is almost always piecewise constant, so a dense
+``num_times x num_rois`` matrix is mostly zeros or repeated rows. The encoding
+used here keeps only the rows at which the power of at least one ROI changes
+(plus the last sample, so the encoded series spans the original time range)
+and stores them as a regular ``PatternedOptogeneticSeries`` whose
+``continuity`` is ``"step"``: each row of ``data`` holds until the next
+timestamp, and the file stays readable by any NWB reader. The optional
+``dense_rate`` attribute of the series records the sampling rate of the
+original grid.
+
+``StepwiseDenseView`` re-expands such a series lazily on the original sampling
+grid, by default the one of ``dense_rate``; slicing it only reads the runs
+covering the requested samples.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+RunLengthEncoding = namedtuple("RunLengthEncoding", ["values", "change_times"])
+
+STEP_CONTINUITY = "step"
+
+
+def encode_run_length(data, timestamps, block_rows=65536):
+    """Encode a dense ``num_times x num_rois`` power matrix as change-points.
+
+    ``data`` and ``timestamps`` may be any array-likes that support slicing
+    along the first axis (e.g. ``h5py`` datasets); they are scanned in blocks
+    of ``block_rows`` samples so memory stays bounded.
+
+    Returns
+    -------
+    RunLengthEncoding
+        ``values`` (``num_runs x num_rois``) and ``change_times`` (``num_runs``).
+        Pass them as ``data`` and ``timestamps`` of a ``PatternedOptogeneticSeries``
+        with ``continuity="step"``, with the sampling rate of ``timestamps`` as
+        ``dense_rate`` if it is regular.
+    """
+    num_times = len(timestamps)
+    if len(data) != num_times:
+        raise ValueError("data has %d samples but timestamps has %d" % (len(data), num_times))
+    if num_times == 0:
+        raise ValueError("cannot encode an empty series")
+
+    values, change_times = [], []
+    previous = None
+    for start in range(0, num_times, block_rows):
+        block = np.asarray(data[start:start + block_rows])
+        block_times = np.asarray(timestamps[start:start + block_rows])
+        if block.ndim == 1:
+            block = block[:, np.newaxis]
+        if previous is None:
+            changed = np.ones(len(block), dtype=bool)
+            changed[1:] = np.any(block[1:] != block[:-1], axis=1)
+        else:
+            changed = np.any(block != np.vstack([previous, block[:-1]]), axis=1)
+        values.append(block[changed])
+        change_times.append(block_times[changed])
+        previous = block[-1:]
+        last_value, last_time = block[-1:], block_times[-1:]
+
+    values, change_times = np.concatenate(values), np.concatenate(change_times)
+    if change_times[-1] != last_time[0]:
+        values = np.concatenate([values, last_value])
+        change_times = np.concatenate([change_times, last_time])
+    return RunLengthEncoding(values=values, change_times=change_times)
+
+
+class StepwiseDenseView:
+    """Lazy dense view of a run-length encoded power matrix.
+
+    Parameters
+    ----------
+    values : array-like
+        ``num_runs x num_rois`` values, e.g. the ``data`` dataset of a series
+        with ``continuity="step"``. Only the rows touched by a read are loaded.
+    change_times : array-like
+        ``num_runs`` times at which each row takes effect. Loaded once, as it
+        is small compared to the dense matrix.
+    rate : float, optional
+        Sampling rate of the dense grid, in Hz. The grid starts at the first
+        change time and ends at the last one.
+    sample_times : array-like, optional
+        Explicit dense sample times, for irregular grids. Exactly one of
+        ``rate`` and ``sample_times`` must be given.
+    """
+
+    def __init__(self, values, change_times, rate=None, sample_times=None):
+        if (rate is None) == (sample_times is None):
+            raise ValueError("exactly one of 'rate' and 'sample_times' must be given")
+        self._values = values
+        self._change_times = np.asarray(change_times[:])
+        if len(self._change_times) != len(values):
+            raise ValueError("values has %d runs but change_times has %d" % (len(values), len(self._change_times)))
+        self.rate = rate
+        self._sample_times = None if sample_times is None else np.asarray(sample_times)
+        if sample_times is None:
+            # snap change times to the regular grid so float round-off cannot shift a run by one sample
+            self._run_starts = np.rint((self._change_times - self._change_times[0]) * rate).astype(np.int64)
+            num_times = int(self._run_starts[-1]) + 1
+        else:
+            self._run_starts = self._change_times
+            num_times = len(self._sample_times)
+        self.shape = (num_times,) + tuple(np.shape(values)[1:])
+        self.dtype = np.dtype(values.dtype) if hasattr(values, "dtype") else np.asarray(values[:1]).dtype
+
+    @classmethod
+    def from_series(cls, series, rate=None, sample_times=None):
+        """Build a view over the ``data``/``timestamps`` of a step-continuity series.
+
+        Without ``rate`` or ``sample_times``, the grid is the one of the
+        ``dense_rate`` stored with the series.
+        """
+        if series.continuity != STEP_CONTINUITY:
+            raise ValueError("series '%s' is not run-length encoded (continuity is %r, expected %r)"
+                             % (series.name, series.continuity, STEP_CONTINUITY))
+        if rate is None and sample_times is None:
+            if series.dense_rate is None:
+                raise ValueError("series '%s' has no dense_rate, pass 'rate' or 'sample_times'" % series.name)
+            rate = float(series.dense_rate)
+        return cls(series.data, series.timestamps, rate=rate, sample_times=sample_times)
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def sample_times(self, index=slice(None)):
+        """Return the dense sample times selected by ``index``."""
+        if self._sample_times is not None:
+            return self._sample_times[index]
+        return self._change_times[0] + self._time_indices(index) / self.rate
+
+    def _time_indices(self, time_key):
+        if isinstance(time_key, slice):
+            return np.arange(*time_key.indices(self.shape[0]))
+        indices = np.asarray(time_key)
+        if indices.dtype == bool:
+            return np.flatnonzero(indices)
+        if np.any((indices >= self.shape[0]) | (indices < -self.shape[0])):
+            raise IndexError("index %s is out of bounds for axis 0 with size %d" % (time_key, self.shape[0]))
+        return np.where(indices < 0, indices + self.shape[0], indices)
+
+    def __getitem__(self, key):
+        time_key, roi_key = (key[0], key[1:]) if isinstance(key, tuple) else (key, ())
+        indices = self._time_indices(time_key)
+        flat = np.atleast_1d(indices)
+        if len(flat) == 0:
+            dense = np.empty((0,) + self.shape[1:], dtype=self.dtype)
+        else:
+            positions = flat if self._sample_times is None else self._sample_times[flat]
+            runs = np.searchsorted(self._run_starts, positions, side="right") - 1
+            runs = np.clip(runs, 0, len(self._run_starts) - 1)
+            first_run, last_run = runs.min(), runs.max()
+            # only the runs spanned by the requested samples are read from the values dataset
+            touched = np.asarray(self._values[first_run:last_run + 1])
+            dense = touched[runs - first_run]
+        dense = dense.reshape(indices.shape + dense.shape[1:])
+        if roi_key:
+            dense = dense[(slice(None),) * indices.ndim + roi_key]
+        return dense
+
+    def __array__(self, dtype=None):
+        dense = self[:]
+        return dense if dtype is None else dense.astype(dtype)
@@ -0,0 +1,155 @@
+"""Expansion of an OptogeneticStimulusPattern into concrete presentation times.
+
+A pattern describes one stimulation interval: ``number_of_stimulus_presentation``
+presentations of ``duration`` seconds, separated by ``inter_stimulus_interval``
+seconds (offset to next onset). ``expand_stimulus_schedule`` finds where each
+interval starts for each ROI from the power in ``data`` and expands every
+interval into its presentations in a single broadcast, without a Python loop
+over presentations.
+
+Interval starts are the rising edges of ``data > threshold`` that follow at
+least ``inter_stimulus_interval + tolerance`` seconds without power, and that
+do not fall inside the span of the preceding interval. This handles both
+densely sampled power traces, where each presentation shows up as its own
+pulse, and coarsely sampled or run-length encoded ones, where a whole interval
+can be a single sample.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+StimulusSchedule = namedtuple("StimulusSchedule", ["rois", "interval", "presentation", "onset", "offset"])
+StimulusSchedule.__doc__ = """One entry per presentation, sorted by onset.
+
+``rois`` are rows of the ROI table referenced by ``series.rois``, ``interval``
+numbers the stimulation intervals of each ROI from 0 and ``presentation``
+numbers the presentations within an interval.
+"""
+
+
+def _sample_times(series, start, stop):
+    if series.timestamps is not None:
+        return np.asarray(series.timestamps[start:stop], dtype=float)
+    return (series.starting_time or 0.0) + np.arange(start, stop) / series.rate
+
+
+def _edges(series, threshold, block_rows):
+    """Return (roi_column, time) of rising and falling edges of ``data > threshold``, scanning in blocks."""
+    num_times = len(series.data)
+    rise_cols, rise_times, fall_cols, fall_times = [], [], [], []
+    previous = None
+    for start in range(0, num_times, block_rows):
+        stop = min(start + block_rows, num_times)
+        above = np.asarray(series.data[start:stop]) > threshold
+        if above.ndim == 1:
+            above = above[:, np.newaxis]
+        if previous is None:
+            previous = np.zeros((1, above.shape[1]), dtype=bool)
+        stacked = np.vstack([previous, above])
+        times = _sample_times(series, start, stop)
+        rows, cols = np.nonzero(stacked[1:] & ~stacked[:-1])
+        rise_cols.append(cols)
+        rise_times.append(times[rows])
+        rows, cols = np.nonzero(~stacked[1:] & stacked[:-1])
+        fall_cols.append(cols)
+        fall_times.append(times[rows])
+        previous = above[-1:]
+    if not rise_cols:  # no data
+        empty_cols, empty_times = np.zeros(0, dtype=np.intp), np.zeros(0)
+        return empty_cols, empty_times, empty_cols, empty_times
+    return (np.concatenate(rise_cols), np.concatenate(rise_times),
+            np.concatenate(fall_cols), np.concatenate(fall_times))
+
+
+def _accepted_starts(cols, times, span):
+    """Mask of the candidate interval starts, sorted by (column, time), that do not fall inside the span of the
+    previous accepted start of their ROI, i.e. a rise inside an interval is a presentation of that interval."""
+    num = len(cols)
+    # index of the first candidate of the same or a later column at or after time + span, by merging the queries
+    # (time + span) with the candidates; a query sorts before a candidate at the same time
+    is_candidate = np.repeat([False, True], num)
+    merged_cols = np.concatenate([cols, cols])
+    merged_times = np.concatenate([times + span, times])
+    order = np.lexsort((is_candidate, merged_times, merged_cols))
+    candidates_before = np.cumsum(is_candidate[order])
+    next_start = np.empty(num, dtype=np.intp)
+    query_positions = np.flatnonzero(~is_candidate[order])
+    next_start[order[query_positions]] = candidates_before[query_positions]
+
+    # follow the chain of accepted starts from the first candidate of every ROI, all ROIs at once
+    accepted = np.zeros(num, dtype=bool)
+    frontier = np.flatnonzero(np.concatenate([[True], cols[1:] != cols[:-1]])) if num else np.zeros(0, np.intp)
+    while len(frontier):
+        accepted[frontier] = True
+        following = next_start[frontier]
+        in_roi = following < num
+        in_roi[in_roi] = cols[following[in_roi]] == cols[frontier[in_roi]]
+        frontier = following[in_roi]
+    return accepted
+
+
+def expand_stimulus_schedule(series, pattern=None, threshold=0.0, tolerance=None, block_rows=65536):
+    """Return the onset and offset of every presentation of ``pattern`` to every ROI of ``series``.
+
+    Parameters
+    ----------
+    series : PatternedOptogeneticSeries
+    pattern : OptogeneticStimulusPattern, optional
+        Defaults to ``series.get_stimulus_pattern()``: the linked ``stimulus_pattern``,
+        or the pattern-table row referenced by ``stimulus_pattern_index``.
+    threshold : float
+        Power above which a ROI counts as stimulated.
+    tolerance : float, optional
+        Extra silence, beyond ``inter_stimulus_interval``, that separates two
+        stimulation intervals. Defaults to one pattern period
+        (``duration + inter_stimulus_interval``).
+    block_rows : int
+        Number of samples of ``data`` read at a time.
+
+    Returns
+    -------
+    StimulusSchedule
+    """
+    pattern = pattern if pattern is not None else series.get_stimulus_pattern()
+    if pattern is None:
+        raise ValueError("series '%s' has no stimulus_pattern to expand" % series.name)
+    duration = float(pattern.duration)
+    isi = float(pattern.inter_stimulus_interval)
+    n_presentations = int(pattern.number_of_stimulus_presentation)
+    period = duration + isi
+    span = n_presentations * period - isi
+    tolerance = period if tolerance is None else tolerance
+
+    rise_cols, rise_times, fall_cols, fall_times = _edges(series, threshold, block_rows)
+    rise_order = np.lexsort((rise_times, rise_cols))
+    rise_cols, rise_times = rise_cols[rise_order], rise_times[rise_order]
+    fall_order = np.lexsort((fall_times, fall_cols))
+    fall_cols, fall_times = fall_cols[fall_order], fall_times[fall_order]
+
+    # rises and falls alternate for each ROI, so the k-th rise of a ROI pairs with the (k-1)-th fall
+    first_of_roi = np.ones(len(rise_cols), dtype=bool)
+    first_of_roi[1:] = rise_cols[1:] != rise_cols[:-1]
+    rank = np.arange(len(rise_cols)) - np.flatnonzero(first_of_roi)[np.cumsum(first_of_roi) - 1]
+    fall_start = np.searchsorted(fall_cols, rise_cols, side="left")
+    previous_fall = np.full(len(rise_cols), -np.inf)
+    previous_fall[~first_of_roi] = fall_times[(fall_start + rank - 1)[~first_of_roi]]
+    is_start = first_of_roi | (rise_times - previous_fall > isi + tolerance)
+    candidate_cols, candidate_times = rise_cols[is_start], rise_times[is_start]
+    accepted = _accepted_starts(candidate_cols, candidate_times, span)
+    start_cols, start_times = candidate_cols[accepted], candidate_times[accepted]
+
+    first_interval = np.ones(len(start_cols), dtype=bool)
+    first_interval[1:] = start_cols[1:] != start_cols[:-1]
+    interval = np.arange(len(start_cols)) - np.flatnonzero(first_interval)[np.cumsum(first_interval) - 1]
+
+    onsets = start_times[:, np.newaxis] + np.arange(n_presentations) * period
+    region = np.asarray(series.rois.data[:])
+    schedule = StimulusSchedule(
+        rois=np.repeat(region[start_cols], n_presentations),
+        interval=np.repeat(interval, n_presentations),
+        presentation=np.tile(np.arange(n_presentations), len(start_cols)),
+        onset=onsets.ravel(),
+        offset=(onsets + duration).ravel(),
+    )
+    order = np.lexsort((schedule.rois, schedule.onset))
+    return StimulusSchedule(*(field[order] for field in schedule))
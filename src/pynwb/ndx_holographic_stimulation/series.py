@@ -0,0 +1,169 @@
+"""Python API for PatternedOptogeneticSeries, on top of the class generated from the spec."""
+from hdmf.utils import docval, get_docval
+from pynwb import get_class, register_class
+
+from .alignment import align_responses
+from .dose import compute_delivered_dose
+from .memmap import memmap_series
+from .pyramid import compute_power_pyramid, get_downsampled
+from .query import TimestampIndex, get_window
+from .schedule import expand_stimulus_schedule
+from .utils import compact_indices
+
+_PatternedOptogeneticSeries = get_class('PatternedOptogeneticSeries', 'ndx-holographic-stimulation')
+
+# The class generated from the spec requires the object of each link to have the name of the link (the site to be
+# named "site", ...), but the spec only names the links. The link fields of the defined class accept any object name,
+# so that a file can hold the series of several sessions, each with its own site and devices.
+_LINK_FIELDS = tuple(
+    {key: value for key, value in field.items() if key != 'required_name'}
+    for field in _PatternedOptogeneticSeries.get_fields_conf()
+    if field['name'] in ('site', 'stimulus_pattern', 'device', 'spatial_light_modulator', 'light_source')
+)
+
+
+def _link_property(name):
+    field = next(field for field in _LINK_FIELDS if field['name'] == name)
+    return property(_PatternedOptogeneticSeries._getter(field), _PatternedOptogeneticSeries._setter(field))
+
+
+@register_class('PatternedOptogeneticSeries', 'ndx-holographic-stimulation')
+class PatternedOptogeneticSeries(_PatternedOptogeneticSeries):
+
+    __nwbfields__ = _LINK_FIELDS  # redefined without the required names, see _LINK_FIELDS
+    site = _link_property('site')
+    stimulus_pattern = _link_property('stimulus_pattern')
+    device = _link_property('device')
+    spatial_light_modulator = _link_property('spatial_light_modulator')
+    light_source = _link_property('light_source')
+
+    @docval(*get_docval(_PatternedOptogeneticSeries.__init__))
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._normalize()
+
+    def _normalize(self):
+        """Normalization run on every new series, after its fields are set (also by ``build_series_batch``)."""
+        # store the ROI indices with the smallest integer type that holds them (the spec dtype is a minimum)
+        self.rois.transform(compact_indices)
+
+    def get_stimulus_pattern(self):
+        """The linked ``stimulus_pattern`` or, if there is none, the pattern-table row referenced by
+        ``stimulus_pattern_index``. Returns None if the series has neither."""
+        if self.stimulus_pattern is not None:
+            return self.stimulus_pattern
+        if self.stimulus_pattern_index is not None:
+            return self.stimulus_pattern_index.table.get_pattern(self.stimulus_pattern_index.data[0])
+        return None
+
+    def get_window(self, start_time, stop_time, rois=None):
+        """Read the samples with ``start_time <= t < stop_time``, optionally for a subset of ``rois``.
+
+        ``rois`` are rows of the ROI table referenced by ``self.rois``. The
+        timestamp index is built on the first query and reused afterwards, so
+        repeated queries on the same open file cost O(log n) plus the read of
+        the selected hyperslab. See ``ndx_holographic_stimulation.query.get_window``.
+        """
+        return get_window(self, start_time, stop_time, rois=rois, timestamp_index=self.timestamp_index)
+
+    @property
+    def timestamp_index(self):
+        """Cached ``TimestampIndex`` over ``timestamps``, or None if the series uses ``rate``."""
+        if self.timestamps is None:
+            return None
+        if getattr(self, '_timestamp_index', None) is None:
+            self._timestamp_index = TimestampIndex(self.timestamps)
+        return self._timestamp_index
+
+    def get_stimulus_schedule(self, threshold=0.0, tolerance=None, memoize=True):
+        """Onset and offset of every presentation of ``stimulus_pattern`` to every ROI.
+
+        Computed in one chunked pass over ``data`` on the first call and memoized
+        on the series for each ``threshold``/``tolerance``; with ``memoize=False``
+        a schedule that is not memoized yet is computed without being kept. See
+        ``ndx_holographic_stimulation.schedule.expand_stimulus_schedule``.
+        """
+        if getattr(self, '_stimulus_schedules', None) is None:
+            self._stimulus_schedules = dict()
+        key = (threshold, tolerance)
+        schedule = self._stimulus_schedules.get(key)
+        if schedule is None:
+            schedule = expand_stimulus_schedule(self, threshold=threshold, tolerance=tolerance)
+            if memoize:
+                self._stimulus_schedules[key] = schedule
+        return schedule
+
+    def get_delivered_dose(self, threshold=0.0, verify=False, store=False):
+        """Energy and power delivered to each ROI, as a ``DeliveredDose``.
+
+        The stored ``delivered_dose`` is returned if it was computed with the
+        same ``threshold`` and is still current (see ``DeliveredDose.is_current``),
+        so repeated queries on a file read only O(num_rois) values. Otherwise the
+        aggregates are computed in one chunked pass over ``data`` and memoized.
+        With ``store=True``, the result is added to a series that has no
+        ``delivered_dose`` yet, so that it is written with the file; stored
+        aggregates are never replaced. See
+        ``ndx_holographic_stimulation.dose.compute_delivered_dose``.
+        """
+        stored = self.delivered_dose
+        if stored is not None and float(stored.threshold) == threshold and stored.is_current(self, verify=verify):
+            return stored
+        if getattr(self, '_delivered_doses', None) is None:
+            self._delivered_doses = dict()
+        dose = self._delivered_doses.get(threshold)
+        if dose is None or not dose.is_current(self, verify=verify):
+            dose = compute_delivered_dose(self, threshold=threshold)
+            self._delivered_doses[threshold] = dose
+        if store and stored is None:
+            self.delivered_dose = dose
+        return dose
+
+    def get_power_pyramid(self, store=False, **kwargs):
+        """The min/max/mean ``PowerPyramid`` of ``data``.
+
+        The stored ``power_pyramid`` is returned if it covers all the samples;
+        otherwise the pyramid is computed in one chunked pass over ``data`` and
+        memoized. With ``store=True``, the result is added to a series that has
+        no ``power_pyramid`` yet, so that ``get_downsampled`` uses it and it is
+        written with the file. Other keyword arguments are passed to
+        ``ndx_holographic_stimulation.pyramid.compute_power_pyramid``.
+        """
+        stored = self.power_pyramid
+        if stored is not None and stored.is_current(self):
+            return stored
+        pyramid = getattr(self, '_power_pyramid', None)
+        if pyramid is None or not pyramid.is_current(self):
+            pyramid = self._power_pyramid = compute_power_pyramid(self, **kwargs)
+        if store and stored is None:
+            self.power_pyramid = pyramid
+        return pyramid
+
+    def get_downsampled(self, start_time, stop_time, width, rois=None):
+        """Read the samples with ``start_time <= t < stop_time`` at a resolution of about ``width`` bins.
+
+        Reads the coarsest level of the stored ``power_pyramid`` that still has
+        ``width`` bins over the range, or the samples themselves. See
+        ``ndx_holographic_stimulation.pyramid.get_downsampled``.
+        """
+        return get_downsampled(self, start_time, stop_time, width, rois=rois, timestamp_index=self.timestamp_index)
+
+    def get_peri_stimulus_responses(self, response, window, **kwargs):
+        """Responses of ``response`` around each trial, as a ``trial x roi x window`` tensor.
+
+        ``window`` is ``(pre, post)`` in seconds around each onset; trials
+        default to the stimulation intervals of the stimulus schedule. Keyword
+        arguments are those of
+        ``ndx_holographic_stimulation.alignment.iter_peri_stimulus_responses``,
+        which reads batches of trials lazily when the tensor does not fit in memory.
+        """
+        return align_responses(self, response, window, **kwargs)
+
+    def use_memmap(self):
+        """Read ``data`` and ``timestamps`` through read-only ``numpy.memmap`` views of the file, where possible.
+
+        Only contiguous, uncompressed datasets of a file opened read-only are
+        mapped; the others are left as they are. Returns a dict from each field
+        to None if it is mapped, or the reason it is not. See
+        ``ndx_holographic_stimulation.memmap.memmap_series``.
+        """
+        return memmap_series(self)
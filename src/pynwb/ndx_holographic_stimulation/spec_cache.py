@@ -0,0 +1,108 @@
+"""On-disk cache of the parsed extension spec.
+
+Parsing the namespace and extension YAML files with the pure-Python YAML
+loader used by hdmf is a large share of the time spent importing this
+package. ``CachedYAMLSpecReader`` stores the parsed documents as JSON, keyed by
+the SHA-256 of each spec file, so later imports skip the YAML parser
+entirely. Editing a spec file changes its hash, which invalidates the entry.
+
+The cache is off unless ``NDX_HOLOGRAPHIC_STIMULATION_SPEC_CACHE=1`` is set,
+so importing the package does not write outside of it by default. It lives in
+``$NDX_HOLOGRAPHIC_STIMULATION_CACHE_DIR`` (default
+``$XDG_CACHE_HOME/ndx-holographic-stimulation``). Any failure to read or write
+it falls back to parsing the YAML.
+"""
+import hashlib
+import json
+import os
+import tempfile
+
+import pynwb
+from hdmf.spec.namespace import YAMLSpecReader
+
+CACHE_DIR_ENV = "NDX_HOLOGRAPHIC_STIMULATION_CACHE_DIR"
+CACHE_ENABLED_ENV = "NDX_HOLOGRAPHIC_STIMULATION_SPEC_CACHE"
+
+
+def default_cache_dir():
+    if os.environ.get(CACHE_DIR_ENV):
+        return os.environ[CACHE_DIR_ENV]
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_home, "ndx-holographic-stimulation")
+
+
+def cache_enabled():
+    """Whether ``$NDX_HOLOGRAPHIC_STIMULATION_SPEC_CACHE`` turns the spec cache on."""
+    return os.environ.get(CACHE_ENABLED_ENV, "0").lower() in ("1", "true", "yes", "on")
+
+
+class CachedYAMLSpecReader(YAMLSpecReader):
+    """``YAMLSpecReader`` that caches parsed spec documents as JSON keyed by file hash."""
+
+    def __init__(self, indir=".", cache_dir=None):
+        super().__init__(indir=indir)
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.hits = 0
+        self.misses = 0
+
+    def read_namespace(self, namespace_path):
+        return self._read_cached("namespace", namespace_path, super().read_namespace)
+
+    def read_spec(self, spec_path):
+        return self._read_cached("spec", spec_path, super().read_spec)
+
+    def cache_path(self, kind, path):
+        """Return the cache file for the spec file at ``path``, or None if it cannot be read."""
+        full_path = path if os.path.isabs(path) else os.path.join(self.source, path)
+        try:
+            with open(full_path, "rb") as f:
+                digest = hashlib.sha256(f.read()).hexdigest()
+        except OSError:
+            return None
+        return os.path.join(self.cache_dir, "%s-%s.json" % (kind, digest))
+
+    def _read_cached(self, kind, path, parse):
+        cache_path = self.cache_path(kind, path)
+        if cache_path is not None:
+            try:
+                with open(cache_path, "r") as f:
+                    parsed = json.load(f)
+                self.hits += 1
+                return parsed
+            except (OSError, ValueError):
+                pass
+        self.misses += 1
+        parsed = parse(path)
+        if cache_path is not None:
+            self._write(cache_path, parsed)
+        return parsed
+
+    def _write(self, cache_path, parsed):
+        # write to a temporary file and rename so concurrent imports never see a partial entry
+        tmp_path = None
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(parsed, f)
+            os.replace(tmp_path, cache_path)
+        except (OSError, TypeError, ValueError):
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+def load_namespaces(namespace_path, cache_dir=None):
+    """Load a namespace into pynwb's global type map, reading the spec through the cache.
+
+    Unless the cache is enabled (see ``cache_enabled``), this is plain
+    ``pynwb.load_namespaces``. ``pynwb.load_namespaces`` does not take a spec
+    reader, so the cached reader is passed to pynwb's private global ``TypeMap``
+    directly; if that is not available, the cache is not used.
+    """
+    if not cache_enabled():
+        return pynwb.load_namespaces(namespace_path)
+    type_map = getattr(pynwb, "__TYPE_MAP", None)
+    if type_map is None:
+        return pynwb.load_namespaces(namespace_path)
+    reader = CachedYAMLSpecReader(indir=os.path.dirname(namespace_path), cache_dir=cache_dir)
+    return type_map.load_namespaces(namespace_path=namespace_path, reader=reader)
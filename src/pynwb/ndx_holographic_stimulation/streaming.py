@@ -0,0 +1,190 @@
+"""Streaming construction of PatternedOptogeneticSeries datasets.
+
+The helpers in this module let ``data`` (``num_times x num_rois``) and
+``timestamps`` be fed from generators of row blocks so that a series can be
+written with ``NWBHDF5IO.write`` without ever materializing the full matrix.
+"""
+import numpy as np
+from hdmf.backends.hdf5 import H5DataIO
+from hdmf.data_utils import AbstractDataChunkIterator, DataChunk
+
+# Target size of a single HDF5 chunk. ~1 MiB is the sweet spot for the default
+# HDF5 chunk cache and for remote (e.g. S3) access.
+DEFAULT_CHUNK_BYTES = 1024 ** 2
+
+# Named filter settings that can be passed as ``compression`` to ``stream_data_io``.
+COMPRESSION_PRESETS = {
+    "none": dict(),
+    "fast": dict(compression="lzf", shuffle=True),
+    "balanced": dict(compression="gzip", compression_opts=4, shuffle=True),
+    "max": dict(compression="gzip", compression_opts=9, shuffle=True),
+}
+
+
+def roi_aware_chunk_shape(num_rois, dtype, chunk_bytes=DEFAULT_CHUNK_BYTES):
+    """Return a chunk shape for a ``num_times x num_rois`` dataset.
+
+    Chunks span all ROIs (up to the byte budget) so that reading a time window
+    of the whole population touches as few chunks as possible, and are as long
+    in time as the remaining budget allows. For 1D data (timestamps) pass
+    ``num_rois=None``.
+    """
+    itemsize = np.dtype(dtype).itemsize
+    max_items = max(chunk_bytes // itemsize, 1)
+    if num_rois is None:
+        return (int(max_items),)
+    roi_cols = int(min(max(num_rois, 1), max_items))
+    time_rows = int(max(max_items // roi_cols, 1))
+    return (time_rows, roi_cols)
+
+
+class BlockDataChunkIterator(AbstractDataChunkIterator):
+    """Re-chunk an iterable of row blocks into time-aligned ``DataChunk`` objects.
+
+    ``blocks`` yields arrays whose first axis is time, either 2D
+    ``(n, num_rois)`` blocks for ``data`` or 1D ``(n,)`` blocks for
+    ``timestamps``. Blocks may have any length; they are buffered and emitted
+    as chunks of exactly ``chunk_shape[0]`` rows (except the last one) so every
+    write lands on whole HDF5 chunks. At most one chunk plus one incoming block
+    is held in memory at any time.
+    """
+
+    def __init__(self, blocks, dtype=None, num_times=None, chunk_shape=None, chunk_bytes=DEFAULT_CHUNK_BYTES):
+        self._blocks = iter(blocks)
+        first = self._next_block()
+        if first is None:
+            raise ValueError("'blocks' must yield at least one non-empty block")
+        self._dtype = np.dtype(dtype) if dtype is not None else first.dtype
+        self._row_shape = first.shape[1:]
+        if len(self._row_shape) > 1:
+            raise ValueError("blocks must be 1D (timestamps) or 2D (num_times x num_rois), got %dD"
+                             % first.ndim)
+        num_rois = self._row_shape[0] if self._row_shape else None
+        if chunk_shape is None:
+            chunk_shape = roi_aware_chunk_shape(num_rois, self._dtype, chunk_bytes)
+            if num_times is not None:
+                chunk_shape = (min(chunk_shape[0], max(num_times, 1)),) + chunk_shape[1:]
+        self._chunk_shape = tuple(chunk_shape)
+        self._chunk_rows = self._chunk_shape[0]
+        self._num_times = num_times
+        self._pending = [first]
+        self._pending_rows = len(first)
+        self._offset = 0
+        # Pull the first chunk eagerly so the initial dataset shape is known before writing
+        self._first_chunk = self._read_chunk()
+
+    def _next_block(self):
+        for block in self._blocks:
+            block = np.asarray(block)
+            if block.ndim == 0:
+                block = block.reshape(1)
+            if len(block):
+                return block
+        return None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._first_chunk is not None:
+            chunk, self._first_chunk = self._first_chunk, None
+            return chunk
+        chunk = self._read_chunk()
+        if chunk is None:
+            raise StopIteration
+        return chunk
+
+    next = __next__
+
+    def _read_chunk(self):
+        while self._pending_rows < self._chunk_rows:
+            block = self._next_block()
+            if block is None:
+                break
+            if block.shape[1:] != self._row_shape:
+                raise ValueError("block of shape %s does not match row shape %s"
+                                 % (block.shape, self._row_shape))
+            self._pending.append(block)
+            self._pending_rows += len(block)
+        if self._pending_rows == 0:
+            return None
+
+        buffer = self._pending[0] if len(self._pending) == 1 else np.concatenate(self._pending)
+        n_rows = min(self._chunk_rows, len(buffer))
+        chunk_data, rest = buffer[:n_rows], buffer[n_rows:]
+        self._pending = [rest] if len(rest) else []
+        self._pending_rows = len(rest)
+
+        selection = (slice(self._offset, self._offset + n_rows),) + (slice(None),) * len(self._row_shape)
+        self._offset += n_rows
+        return DataChunk(data=np.ascontiguousarray(chunk_data, dtype=self._dtype), selection=selection)
+
+    def recommended_chunk_shape(self):
+        return self._chunk_shape
+
+    def recommended_data_shape(self):
+        if self._num_times is not None:
+            num_times = self._num_times
+        else:
+            num_times = len(self._first_chunk.data) if self._first_chunk is not None else self._offset
+        return (num_times,) + self._row_shape
+
+    @property
+    def dtype(self):
+        return self._dtype
+
+    @property
+    def maxshape(self):
+        return (self._num_times,) + self._row_shape
+
+
+def compression_filters(compression):
+    """Return the ``H5DataIO`` filter arguments of a preset name in ``COMPRESSION_PRESETS``, or of a dict of them."""
+    if isinstance(compression, str):
+        if compression not in COMPRESSION_PRESETS:
+            raise ValueError("unknown compression preset '%s', expected one of %s"
+                             % (compression, sorted(COMPRESSION_PRESETS)))
+        return COMPRESSION_PRESETS[compression]
+    return dict(compression or {})
+
+
+def stream_data_io(blocks, dtype=None, num_times=None, chunk_shape=None, compression="balanced",
+                   chunk_bytes=DEFAULT_CHUNK_BYTES):
+    """Wrap an iterable of row blocks for incremental writing by ``NWBHDF5IO``.
+
+    Parameters
+    ----------
+    blocks : iterable of numpy.ndarray
+        Row blocks of ``data`` (2D) or ``timestamps`` (1D), in time order.
+    dtype : numpy dtype, optional
+        dtype of the stored dataset. Defaults to the dtype of the first block.
+    num_times : int, optional
+        Total number of samples, if known. Lets the dataset be allocated up
+        front; otherwise it grows as chunks are written.
+    chunk_shape : tuple, optional
+        Explicit HDF5 chunk shape. Defaults to ``roi_aware_chunk_shape``.
+    compression : str or dict
+        Name of a preset in ``COMPRESSION_PRESETS`` or a dict of ``H5DataIO``
+        filter arguments.
+
+    Returns
+    -------
+    H5DataIO
+        Can be passed directly as ``data`` or ``timestamps`` of a
+        ``PatternedOptogeneticSeries``.
+    """
+    filters = compression_filters(compression)
+    iterator = BlockDataChunkIterator(
+        blocks, dtype=dtype, num_times=num_times, chunk_shape=chunk_shape, chunk_bytes=chunk_bytes
+    )
+    return H5DataIO(iterator, chunks=iterator.recommended_chunk_shape(), **filters)
+
+
+def iter_blocks(array, block_rows):
+    """Yield consecutive ``block_rows``-long slices along the first axis of an array-like.
+
+    Convenience for streaming from an already open source (e.g. an ``h5py``
+    dataset or ``numpy.memmap``) without loading it whole.
+    """
+    for start in range(0, len(array), block_rows):
+        yield array[start:start + block_rows]
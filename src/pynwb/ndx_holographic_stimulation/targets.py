@@ -0,0 +1,202 @@
+"""Positions of the stimulation targets of a site, with spatial queries.
+
+The ``StimulationTargetTable`` of a ``PatternedOptogeneticStimulusSite``
+stores one row per target: its ``x``, ``y`` and ``z`` coordinates in meters
+and, optionally, the row of the ROI table (e.g. the ``PlaneSegmentation``)
+of the cell it targets.
+
+Questions such as "which targets are within 20 um of this cell" or "what
+are the 5 nearest targets of each ROI" are answered with a KD-tree over the
+coordinates (``scipy.spatial.cKDTree``, ``pip install
+ndx-holographic-stimulation[spatial]``). The tree is built the first time
+the table is queried and cached on the table, so on the object read from an
+open file, and rebuilt if rows are added. All the queries take a batch of
+points, so a whole ROI table is queried in one call.
+"""
+import numpy as np
+from hdmf.common import DynamicTable, DynamicTableRegion, VectorData
+from hdmf.utils import docval, get_docval, popargs
+from pynwb import get_class, register_class
+
+_StimulationTargetTable = get_class('StimulationTargetTable', 'ndx-holographic-stimulation')
+
+# Number of points per leaf of the KD-tree; the scipy default.
+DEFAULT_LEAF_SIZE = 16
+
+
+def _cKDTree():
+    try:
+        from scipy.spatial import cKDTree
+    except ImportError as e:  # pragma: no cover
+        raise ImportError("spatial queries of stimulation targets require scipy: "
+                          "pip install ndx-holographic-stimulation[spatial]") from e
+    return cKDTree
+
+
+def _points(points):
+    """``points`` as a ``num_points x 3`` float64 array, and whether a single point was given."""
+    points = np.asarray(points, dtype=np.float64)
+    single = points.ndim == 1
+    points = np.atleast_2d(points)
+    if points.ndim != 2 or points.shape[1] != 3:
+        raise ValueError("points must be (x, y, z) or num_points x 3, got shape %s" % (points.shape,))
+    return points, single
+
+
+class TargetIndex:
+    """KD-tree over the coordinates of stimulation targets.
+
+    Parameters
+    ----------
+    coordinates : array_like
+        ``num_targets x 3`` (x, y, z) coordinates, in meters.
+    roi : array_like, optional
+        Row of the ROI table of each target, returned by the ``*_roi`` queries.
+    leafsize : int
+        Number of points per leaf of the tree.
+    """
+
+    def __init__(self, coordinates, roi=None, leafsize=DEFAULT_LEAF_SIZE):
+        self.coordinates, _ = _points(coordinates)
+        self.roi = None if roi is None else np.asarray(roi, dtype=np.int64)
+        if self.roi is not None and len(self.roi) != len(self.coordinates):
+            raise ValueError("got %d ROIs for %d targets" % (len(self.roi), len(self.coordinates)))
+        self.tree = _cKDTree()(self.coordinates, leafsize=leafsize)
+
+    def __len__(self):
+        return len(self.coordinates)
+
+    def query_radius(self, points, radius):
+        """Rows of the targets within ``radius`` (m) of each of ``points``, sorted by row.
+
+        Returns an array of rows for a single ``(x, y, z)`` point, and a list of
+        arrays, one per point, for ``num_points x 3`` points.
+        """
+        points, single = _points(points)
+        neighbours = self.tree.query_ball_point(points, r=radius, return_sorted=True)
+        rows = [np.asarray(found, dtype=np.int64) for found in neighbours]
+        return rows[0] if single else rows
+
+    def query_nearest(self, points, k=1, max_distance=np.inf):
+        """Distances (m) to, and rows of, the ``k`` nearest targets of each of ``points``.
+
+        Both are ``num_points x k`` arrays, nearest first (``k`` values for a
+        single point). Missing neighbours, beyond ``max_distance`` or when there
+        are fewer than ``k`` targets, have an infinite distance and row -1.
+        """
+        points, single = _points(points)
+        distances, rows = self.tree.query(points, k=[*range(1, k + 1)], distance_upper_bound=max_distance)
+        rows = np.where(np.isfinite(distances), rows, -1).astype(np.int64)
+        return (distances[0], rows[0]) if single else (distances, rows)
+
+    def query_pairs(self, radius):
+        """``num_pairs x 2`` rows ``(i, j)``, ``i < j``, of the pairs of targets closer than ``radius`` (m)."""
+        pairs = self.tree.query_pairs(r=radius, output_type='ndarray').astype(np.int64)
+        return pairs[np.lexsort((pairs[:, 1], pairs[:, 0]))]
+
+    def neighbours(self, rows, radius):
+        """Rows of the targets within ``radius`` (m) of each target of ``rows``, excluding the target itself."""
+        rows = np.atleast_1d(np.asarray(rows, dtype=np.int64))
+        found = self.query_radius(self.coordinates[rows], radius)
+        return [neighbours[neighbours != row] for row, neighbours in zip(rows, found)]
+
+    def to_roi(self, rows):
+        """ROI of each target of ``rows`` (an array, or a list of arrays as returned by the queries); -1 stays."""
+        if self.roi is None:
+            raise ValueError("the targets are not linked to ROIs")
+        if isinstance(rows, list):
+            return [self.to_roi(found) for found in rows]
+        rows = np.asarray(rows, dtype=np.int64)
+        return np.where(rows >= 0, self.roi[np.maximum(rows, 0)], -1) if rows.size else rows.copy()
+
+
+@register_class('StimulationTargetTable', 'ndx-holographic-stimulation')
+class StimulationTargetTable(_StimulationTargetTable):
+
+    @docval(
+        {'name': 'name', 'type': str, 'doc': 'name of this table', 'default': 'targets'},
+        {'name': 'description', 'type': str, 'doc': 'description of this table',
+         'default': 'positions of the stimulation targets'},
+        {'name': 'roi_table', 'type': DynamicTable, 'default': None,
+         'doc': 'the ROI table (e.g. a PlaneSegmentation) that the roi column refers to'},
+        *get_docval(_StimulationTargetTable.__init__, 'id', 'columns', 'colnames', 'target_tables'),
+    )
+    def __init__(self, **kwargs):
+        roi_table = popargs('roi_table', kwargs)
+        if roi_table is not None:
+            kwargs['target_tables'] = dict(kwargs['target_tables'] or {}, roi=roi_table)
+        super().__init__(**kwargs)
+        self._index = None
+
+    @classmethod
+    @docval(
+        {'name': 'coordinates', 'type': 'array_data', 'doc': 'num_targets x 3 (x, y, z) coordinates, in m'},
+        {'name': 'roi', 'type': 'array_data', 'default': None, 'doc': 'row of roi_table of each target'},
+        {'name': 'roi_table', 'type': DynamicTable, 'default': None,
+         'doc': 'the ROI table that roi refers to; required with roi'},
+        {'name': 'name', 'type': str, 'doc': 'name of this table', 'default': 'targets'},
+        {'name': 'description', 'type': str, 'doc': 'description of this table',
+         'default': 'positions of the stimulation targets'},
+    )
+    def from_coordinates(cls, **kwargs):
+        """Build the table from all the coordinates at once, instead of one ``add_target`` per target."""
+        coordinates, roi, roi_table = popargs('coordinates', 'roi', 'roi_table', kwargs)
+        coordinates, _ = _points(coordinates)
+        columns = [
+            VectorData(name=axis, description=cls.__columns__[i]['description'], data=coordinates[:, i].copy())
+            for i, axis in enumerate('xyz')
+        ]
+        if roi is not None:
+            if roi_table is None:
+                raise ValueError("roi_table is required with roi")
+            roi = np.asarray(roi, dtype=np.int64)
+            if len(roi) != len(coordinates):
+                raise ValueError("got %d ROIs for %d targets" % (len(roi), len(coordinates)))
+            columns.append(DynamicTableRegion(name='roi', description=cls.__columns__[3]['description'],
+                                              data=roi, table=roi_table))
+        return cls(columns=columns, **kwargs)
+
+    @docval({'name': 'x', 'type': float, 'doc': 'x coordinate of the target, in m'},
+            {'name': 'y', 'type': float, 'doc': 'y coordinate of the target, in m'},
+            {'name': 'z', 'type': float, 'doc': 'z coordinate (depth) of the target, in m'},
+            {'name': 'roi', 'type': int, 'doc': 'row of the ROI table of the target', 'default': None},
+            returns='the row of the target', rtype=int)
+    def add_target(self, **kwargs):
+        """Add a target. ``roi`` requires the table to be created with a ``roi_table``."""
+        if kwargs['roi'] is None:
+            kwargs.pop('roi')
+        self.add_row(**kwargs)
+        return len(self) - 1
+
+    @property
+    def coordinates(self):
+        """``num_targets x 3`` (x, y, z) coordinates, in m."""
+        return np.column_stack([np.asarray(self[axis].data[:], dtype=np.float64) for axis in 'xyz'])
+
+    @property
+    def index(self):
+        """The ``TargetIndex`` of the table, built on first access and rebuilt when rows were added."""
+        if self._index is None or len(self._index) != len(self):
+            roi = self['roi'].data[:] if 'roi' in self.colnames else None
+            self._index = TargetIndex(self.coordinates, roi=roi)
+        return self._index
+
+    def query_radius(self, points, radius):
+        """Rows of the targets within ``radius`` (m) of ``points``. See ``TargetIndex.query_radius``."""
+        return self.index.query_radius(points, radius)
+
+    def query_nearest(self, points, k=1, max_distance=np.inf):
+        """Distances to and rows of the ``k`` nearest targets of ``points``. See ``TargetIndex.query_nearest``."""
+        return self.index.query_nearest(points, k=k, max_distance=max_distance)
+
+    def query_pairs(self, radius):
+        """Pairs of targets closer than ``radius`` (m). See ``TargetIndex.query_pairs``."""
+        return self.index.query_pairs(radius)
+
+    def neighbours(self, rows, radius):
+        """Targets within ``radius`` (m) of each target of ``rows``. See ``TargetIndex.neighbours``."""
+        return self.index.neighbours(rows, radius)
+
+    def to_roi(self, rows):
+        """ROI of each target of ``rows``. See ``TargetIndex.to_roi``."""
+        return self.index.to_roi(rows)
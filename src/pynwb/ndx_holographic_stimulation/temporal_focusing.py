@@ -0,0 +1,113 @@
+"""Numeric point spread function of TemporalFocusing patterns.
+
+``lateral_point_spread_function`` and ``axial_point_spread_function`` are text
+such as ``"9e-6 m ± 0.7e-6 m"`` or ``"9 ± 0.7 um"``. ``TemporalFocusing``
+also stores them as numbers, the mean and standard deviation of the full width
+at half maximum of the PSF, in m (``*_point_spread_function_mean`` and
+``*_sd``). Either form can be given: numbers are parsed from the text, and
+text is formatted from the numbers. Text that cannot be parsed, e.g. in files
+written before the numeric attributes existed, is kept as it is and only
+``point_spread_function`` raises.
+"""
+import re
+from collections import namedtuple
+
+from hdmf.utils import docval, get_docval, popargs
+from pynwb import get_class, register_class
+
+PointSpreadFunction = namedtuple("PointSpreadFunction", ["lateral", "axial"])
+PointSpreadFunction.__doc__ = """Full width at half maximum of the point spread function, laterally and axially,
+in m."""
+
+# Length units, in m. Text without a unit is in um, as in the spec.
+LENGTH_UNITS = {
+    'm': 1.0, 'meter': 1.0, 'meters': 1.0,
+    'mm': 1e-3, 'millimeter': 1e-3, 'millimeters': 1e-3,
+    'um': 1e-6, 'µm': 1e-6, 'μm': 1e-6, 'micron': 1e-6, 'microns': 1e-6, 'micrometer': 1e-6, 'micrometers': 1e-6,
+    'nm': 1e-9, 'nanometer': 1e-9, 'nanometers': 1e-9,
+}
+DEFAULT_UNIT = 'um'
+
+_NUMBER = r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?'
+_UNIT = r'[a-zA-Zµμ]+'
+_PSF_TEXT = re.compile(
+    r'^\s*(?P<mean>%s)\s*(?P<mean_unit>%s)?\s*(?:(?:±|\+/-|\+-)\s*(?P<sd>%s)\s*(?P<sd_unit>%s)?)?\s*$'
+    % (_NUMBER, _UNIT, _NUMBER, _UNIT)
+)
+
+_TemporalFocusing = get_class('TemporalFocusing', 'ndx-holographic-stimulation')
+
+
+def _unit_scale(unit):
+    try:
+        return LENGTH_UNITS[unit]
+    except KeyError:
+        raise ValueError("unknown length unit %r" % unit) from None
+
+
+def parse_point_spread_function(text):
+    """Mean and standard deviation, in m, of a PSF size given as text.
+
+    Accepts ``"<mean> [unit] ± <sd> [unit]"``, with ``+/-`` for ``±``. A single
+    unit after the standard deviation applies to both numbers, and numbers
+    without a unit are in um. The standard deviation is None if not given.
+    """
+    match = _PSF_TEXT.match(text)
+    if match is None:
+        raise ValueError("cannot parse point spread function %r, expected e.g. '9e-6 m ± 0.7e-6 m'" % text)
+    mean_unit = match['mean_unit'] or match['sd_unit'] or DEFAULT_UNIT
+    mean = float(match['mean']) * _unit_scale(mean_unit)
+    if match['sd'] is None:
+        return mean, None
+    return mean, float(match['sd']) * _unit_scale(match['sd_unit'] or mean_unit)
+
+
+def format_point_spread_function(mean, sd=None):
+    """Text of a PSF size of ``mean`` ± ``sd`` m, that ``parse_point_spread_function`` reads back exactly."""
+    text = '%r m' % float(mean)
+    return text if sd is None else text + ' ± %r m' % float(sd)
+
+
+@register_class('TemporalFocusing', 'ndx-holographic-stimulation')
+class TemporalFocusing(_TemporalFocusing):
+
+    @docval(
+        *get_docval(_TemporalFocusing.__init__, 'name', 'description', 'duration', 'number_of_stimulus_presentation',
+                    'inter_stimulus_interval'),
+        {'name': 'lateral_point_spread_function', 'type': str, 'default': None,
+         'doc': 'estimated lateral spatial profile or point spread function, expressed as mean [um] ± s.d [um]; '
+                'formatted from lateral_point_spread_function_mean and _sd if not given'},
+        {'name': 'axial_point_spread_function', 'type': str, 'default': None,
+         'doc': 'estimated axial spatial profile or point spread function, expressed as mean [um] ± s.d [um]; '
+                'formatted from axial_point_spread_function_mean and _sd if not given'},
+        *get_docval(_TemporalFocusing.__init__, 'lateral_point_spread_function_mean',
+                    'lateral_point_spread_function_sd', 'axial_point_spread_function_mean',
+                    'axial_point_spread_function_sd'),
+    )
+    def __init__(self, **kwargs):
+        for axis in ('lateral', 'axial'):
+            text_key = '%s_point_spread_function' % axis
+            text = kwargs[text_key]
+            mean, sd = popargs(text_key + '_mean', text_key + '_sd', kwargs)
+            if text is None:
+                if mean is None:
+                    raise ValueError("%s or %s_mean is required" % (text_key, text_key))
+                kwargs[text_key] = format_point_spread_function(mean, sd)
+            elif mean is None:
+                try:
+                    mean, sd = parse_point_spread_function(text)
+                except ValueError:
+                    pass
+            if mean is not None:
+                kwargs[text_key + '_mean'] = float(mean)
+            if sd is not None:
+                kwargs[text_key + '_sd'] = float(sd)
+        super().__init__(**kwargs)
+
+    @property
+    def point_spread_function(self):
+        """The mean lateral and axial ``PointSpreadFunction``, in m."""
+        if self.lateral_point_spread_function_mean is None or self.axial_point_spread_function_mean is None:
+            raise ValueError("the point spread function of %r is not numeric: %r, %r"
+                             % (self.name, self.lateral_point_spread_function, self.axial_point_spread_function))
+        return PointSpreadFunction(self.lateral_point_spread_function_mean, self.axial_point_spread_function_mean)
@@ -0,0 +1,81 @@
+"""Beam trajectories of SpiralScanning patterns.
+
+The beam traces an Archimedean spiral from the target center out to
+``diameter / 2`` while making ``number_of_revolutions`` turns over
+``duration`` seconds, and moves axially across ``height`` (from ``-height/2``
+to ``+height/2`` around the target) at constant speed.
+
+The path relative to the target only depends on the pattern parameters and the
+sample rate, so it is computed once per parameter set and kept in an LRU
+cache; trajectories for many targets are a single broadcast of that path over
+the target centers.
+"""
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+
+SpiralTrajectory = namedtuple("SpiralTrajectory", ["x", "y", "z", "t"])
+SpiralTrajectory.__doc__ = """Sampled beam path. ``x``, ``y`` and ``z`` are ``num_targets x num_samples``, in m,
+and ``t`` is the ``num_samples`` sample times, in s, from the start of the presentation."""
+
+SPIRAL_CACHE_SIZE = 1024
+
+
+@lru_cache(maxsize=SPIRAL_CACHE_SIZE)
+def _unit_spiral(diameter, height, number_of_revolutions, duration, rate):
+    """Return the (read-only) ``4 x num_samples`` path of a spiral centered on the origin."""
+    num_samples = max(int(round(duration * rate)), 1)
+    t = np.arange(num_samples) / rate
+    progress = t / duration
+    radius = 0.5 * diameter * progress
+    angle = 2 * np.pi * number_of_revolutions * progress
+    path = np.stack([radius * np.cos(angle), radius * np.sin(angle), height * (progress - 0.5), t])
+    path.setflags(write=False)
+    return path
+
+
+def spiral_path(diameter, height, number_of_revolutions, duration, rate):
+    """Cached path of one spiral around the origin, as a read-only ``SpiralTrajectory`` of 1D arrays."""
+    path = _unit_spiral(float(diameter), float(height), int(number_of_revolutions), float(duration), float(rate))
+    return SpiralTrajectory(*path)
+
+
+def spiral_trajectory(pattern, rate, centers=None, duration=None):
+    """Sample the beam path of a ``SpiralScanning`` pattern for one or many targets.
+
+    Parameters
+    ----------
+    pattern : SpiralScanning
+    rate : float
+        Sample rate of the trajectory, in Hz.
+    centers : array-like, optional
+        ``num_targets x 3`` target centers (x, y, z), in m. Defaults to a single
+        target at the origin.
+    duration : float, optional
+        Duration of the presentation, in s. Defaults to ``pattern.duration``.
+
+    Returns
+    -------
+    SpiralTrajectory
+    """
+    duration = pattern.duration if duration is None else duration
+    dx, dy, dz, t = spiral_path(pattern.diameter, pattern.height, pattern.number_of_revolutions, duration, rate)
+    centers = np.zeros((1, 3)) if centers is None else np.atleast_2d(np.asarray(centers, dtype=float))
+    if centers.shape[1] != 3:
+        raise ValueError("centers must be num_targets x 3, got shape %s" % (centers.shape,))
+    return SpiralTrajectory(
+        x=centers[:, 0:1] + dx,
+        y=centers[:, 1:2] + dy,
+        z=centers[:, 2:3] + dz,
+        t=t,
+    )
+
+
+def spiral_cache_info():
+    """Hit/miss statistics of the spiral path cache (see ``functools.lru_cache``)."""
+    return _unit_spiral.cache_info()
+
+
+def clear_spiral_cache():
+    _unit_spiral.cache_clear()
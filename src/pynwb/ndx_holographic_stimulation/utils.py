@@ -0,0 +1,73 @@
+"""Small helpers shared across the extension's modules."""
+import os
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+_SIGNED_INT_DTYPES = (np.int8, np.int16, np.int32, np.int64)
+
+
+def smallest_int_dtype(values, min_dtype=np.int8):
+    """Return the smallest signed integer dtype, at least ``min_dtype``, that holds all of ``values``."""
+    values = np.asarray(values)
+    low, high = (int(values.min()), int(values.max())) if values.size else (0, 0)
+    for dtype in _SIGNED_INT_DTYPES:
+        if np.dtype(dtype).itemsize < np.dtype(min_dtype).itemsize:
+            continue
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return np.dtype(dtype)
+    raise OverflowError("values in [%d, %d] do not fit in a 64-bit signed integer" % (low, high))
+
+
+def compact_indices(values, min_dtype=np.int8):
+    """Return in-memory integer indices as an array of the smallest sufficient signed integer dtype.
+
+    Data that is not held in memory (e.g. an ``h5py.Dataset`` or a ``DataIO``) is returned unchanged.
+    """
+    if not isinstance(values, (list, tuple, np.ndarray)):
+        return values
+    values = np.asarray(values)
+    if values.dtype.kind not in "iu":
+        return values
+    return values.astype(smallest_int_dtype(values, min_dtype), copy=False)
+
+
+def decode_attr(value):
+    """An HDF5 attribute value, with ``bytes`` decoded as UTF-8."""
+    return value.decode('utf-8') if isinstance(value, bytes) else value
+
+
+def _call_in_own_process(function, args):
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        return executor.submit(function, *args).result()
+
+
+def imap_processes(function, jobs, max_workers=None):
+    """Call ``function(*job)`` for each of ``jobs`` in a pool of ``max_workers`` worker processes.
+
+    Yields ``(job, result, error)`` as the jobs complete, with ``error`` the traceback of a call that failed (and
+    ``result`` None). A worker that dies (e.g. killed for lack of memory) breaks the whole pool, so the jobs it left
+    unfinished are run again, each in a process of its own: only the job that kills its process fails, with a
+    ``BrokenProcessPool`` error.
+    """
+    unfinished = []
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(function, *job): job for job in jobs}
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result(), None
+            except BrokenProcessPool:
+                unfinished.append(futures[future])
+            except Exception:
+                yield futures[future], None, traceback.format_exc()
+    if unfinished:
+        with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count()) as executor:
+            futures = {executor.submit(_call_in_own_process, function, job): job for job in unfinished}
+            for future in as_completed(futures):
+                try:
+                    yield futures[future], future.result(), None
+                except Exception:
+                    yield futures[future], None, traceback.format_exc()
@@ -0,0 +1,323 @@
+"""Out-of-core consistency checks of PatternedOptogeneticSeries, e.g. before archival.
+
+``validate_series`` scans ``data`` and ``timestamps`` once, ``block_rows``
+samples at a time, carrying the little state that spans blocks (the last
+timestamp, and whether each ROI is on and since when), so memory does not
+depend on the length of the series. It checks that
+
+* ``data`` has one column per ROI of ``rois`` (``shape``),
+* ``timestamps`` has one entry per sample (``timestamps_length``), is finite
+  (``timestamps_finite``) and strictly increasing (``timestamps_order``),
+* the power is finite (``power_finite``), non-negative (``negative_power``)
+  and does not exceed the ``peak_power`` of the linked ``LightSource``
+  (``peak_power``),
+* the stimulation timing agrees with the stimulus pattern: every period with
+  power above ``threshold`` lasts at least the pattern ``duration`` and at most
+  one whole interval of presentations (``pulse_duration``), and the power is
+  off for at least ``inter_stimulus_interval`` between two such periods
+  (``inter_stimulus_interval``).
+
+Each failed check is reported once per series as a ``Finding``, with the number
+of offending samples or periods and the first of them. ``validate_files`` runs
+the series of one or more files in a pool of worker processes. The series of a
+file are listed from the attributes of its HDF5 groups, and each worker reads
+only its series, and the objects it links to, from its own handle on the file
+(see ``lazy_io.LazyNWBHDF5IO``). A series that cannot be read, or whose worker
+process dies, is reported as a ``read`` or ``worker`` error finding; the other
+series are still validated.
+"""
+import argparse
+import functools
+import json
+import traceback
+from collections import OrderedDict, namedtuple
+
+import h5py
+import numpy as np
+from hdmf.backends.hdf5.h5tools import SPEC_LOC_ATTR
+
+from .lazy_io import LazyNWBHDF5IO, find_series_groups
+from .utils import imap_processes
+
+DEFAULT_BLOCK_ROWS = 65536
+
+ERROR = "error"
+WARNING = "warning"
+
+Finding = namedtuple("Finding", ["path", "series", "check", "severity", "message", "index", "count"])
+Finding.__doc__ = """One failed check of a series.
+
+``path`` is the file of the series (None for a series that is not read from a
+file), ``index`` the first offending sample (None if the check is not about
+samples) and ``count`` the number of offending samples or periods.
+"""
+
+
+class _Findings:
+    """Count the failures of each check, keeping the message of the first one."""
+
+    def __init__(self, path, series):
+        self.path = path
+        self.series = series
+        self._found = OrderedDict()
+
+    def add(self, check, message, index=None, count=1, severity=ERROR):
+        if check in self._found:
+            self._found[check][3] += count
+        else:
+            self._found[check] = [severity, message, index, count]
+
+    def add_mask(self, check, mask, offset, describe):
+        """Record the samples where ``mask`` is set; ``describe(i)`` formats the first, at block row ``i``."""
+        count = int(np.count_nonzero(mask))
+        if count:
+            first = int(np.flatnonzero(mask.reshape(len(mask), -1).any(axis=1))[0])
+            self.add(check, describe(first), index=offset + first, count=count)
+
+    def to_list(self):
+        return [Finding(self.path, self.series, check, severity, message, index, count)
+                for check, (severity, message, index, count) in self._found.items()]
+
+
+class _TimingState:
+    """Per-ROI on/off state carried across blocks, and the checks of the on and off periods against a pattern."""
+
+    def __init__(self, num_columns, min_pulse, max_pulse, min_gap):
+        self.on = np.zeros(num_columns, dtype=bool)
+        self.last_edge_time = np.full(num_columns, np.nan)
+        self.last_edge_index = np.zeros(num_columns, dtype=np.int64)
+        self.min_pulse, self.max_pulse, self.min_gap = min_pulse, max_pulse, min_gap
+
+    def update(self, above, times, offset, findings):
+        stacked = np.vstack([self.on[np.newaxis], above])
+        rise_rows, rise_cols = np.nonzero(stacked[1:] & ~stacked[:-1])
+        fall_rows, fall_cols = np.nonzero(~stacked[1:] & stacked[:-1])
+        # the last edge of each ROI before this block, then the edges of the block, ordered by ROI and time
+        carried = np.flatnonzero(~np.isnan(self.last_edge_time))
+        cols = np.concatenate([carried, rise_cols, fall_cols])
+        index = np.concatenate([self.last_edge_index[carried], offset + rise_rows, offset + fall_rows])
+        edge_times = np.concatenate([self.last_edge_time[carried], times[rise_rows], times[fall_rows]])
+        is_rise = np.concatenate([self.on[carried], np.ones(len(rise_rows), bool), np.zeros(len(fall_rows), bool)])
+        order = np.lexsort((index, cols))
+        cols, index, edge_times, is_rise = cols[order], index[order], edge_times[order], is_rise[order]
+
+        same_roi = cols[1:] == cols[:-1]
+        lengths = edge_times[1:] - edge_times[:-1]
+        pulse = same_roi & is_rise[:-1]
+        gap = same_roi & ~is_rise[:-1]
+        bad_pulse = pulse & ((lengths < self.min_pulse) | (lengths > self.max_pulse))
+        bad_gap = gap & (lengths < self.min_gap)
+        for check, bad, label, bound in (
+            ("pulse_duration", bad_pulse, "stimulation lasting", "expected %g to %g s" % (self.min_pulse,
+                                                                                          self.max_pulse)),
+            ("inter_stimulus_interval", bad_gap, "pause of", "expected at least %g s" % self.min_gap),
+        ):
+            if bad.any():
+                first = np.flatnonzero(bad)[0]
+                findings.add(check, "%s %g s on ROI column %d at sample %d, %s"
+                             % (label, lengths[first], cols[first], index[first], bound),
+                             index=int(index[first]), count=int(np.count_nonzero(bad)))
+
+        last = np.ones(len(cols), dtype=bool)
+        last[:-1] = ~same_roi
+        self.last_edge_time[cols[last]] = edge_times[last]
+        self.last_edge_index[cols[last]] = index[last]
+        self.on = above[-1]
+
+
+def _default_tolerance(series, head):
+    if series.continuity == "step":
+        return 1e-6  # step edges are exact change times
+    if series.timestamps is None:
+        return 1.0 / float(series.rate)
+    steps = np.diff(head)
+    steps = steps[np.isfinite(steps) & (steps > 0)]
+    return float(np.median(steps)) if len(steps) else 0.0
+
+
+def validate_series(series, threshold=0.0, tolerance=None, block_rows=DEFAULT_BLOCK_ROWS, path=None):
+    """Check a ``PatternedOptogeneticSeries`` in one pass over its samples, see the module documentation.
+
+    Parameters
+    ----------
+    series : PatternedOptogeneticSeries
+    threshold : float
+        Power above which a ROI counts as stimulated, for the timing checks.
+    tolerance : float, optional
+        Slack on the pattern timings, in s. Defaults to one sampling period
+        (``1 / rate`` or the median step of the first timestamps), or 1 us for
+        run-length encoded (``continuity="step"``) series.
+    block_rows : int
+        Number of samples read at a time.
+    path : str, optional
+        File of the series, copied into the findings.
+
+    Returns
+    -------
+    list of Finding
+        Empty if the series passes every check.
+    """
+    findings = _Findings(path, series.name)
+    data = series.data
+    num_times = len(data)
+    num_rois = len(series.rois.data)
+    shape = tuple(getattr(data, "shape", np.shape(data)))
+    if len(shape) > 2 or (len(shape) == 2 and shape[1] != num_rois) or (len(shape) == 1 and num_rois != 1):
+        findings.add("shape", "data has shape %s but rois references %d ROIs" % (shape, num_rois))
+    num_columns = shape[1] if len(shape) == 2 else 1
+
+    timestamps = series.timestamps
+    if timestamps is not None and len(timestamps) != num_times:
+        findings.add("timestamps_length", "timestamps has %d entries but data has %d samples"
+                     % (len(timestamps), num_times))
+    num_samples = num_times if timestamps is None else min(num_times, len(timestamps))
+
+    peak_power = None
+    if series.light_source is not None and series.light_source.peak_power is not None:
+        if series.unit in ("watts", "W"):
+            # peak_power is stored as float32, allow for its rounding
+            peak_power = float(series.light_source.peak_power) * (1 + 1e-6)
+        else:
+            findings.add("peak_power", "cannot compare power in '%s' to the peak power of light source '%s' in W"
+                         % (series.unit, series.light_source.name), severity=WARNING)
+    conversion = float(series.conversion)
+    power_offset = float(getattr(series, "offset", 0.0) or 0.0)
+
+    pattern = series.get_stimulus_pattern()
+    timing = None
+    if pattern is None:
+        findings.add("pulse_duration", "series has no stimulus pattern to check the timing against", severity=WARNING)
+
+    previous_timestamp = -np.inf
+    for start in range(0, num_samples, block_rows):
+        stop = min(start + block_rows, num_samples)
+        block = np.asarray(data[start:stop])
+        block = block.reshape(len(block), -1)
+        if timestamps is None:
+            times = (series.starting_time or 0.0) + np.arange(start, stop) / series.rate
+        else:
+            times = np.asarray(timestamps[start:stop], dtype=float)
+            findings.add_mask("timestamps_finite", ~np.isfinite(times), start,
+                              lambda i: "timestamp %d is %g" % (start + i, times[i]))
+            steps = np.diff(times, prepend=previous_timestamp)
+            findings.add_mask("timestamps_order", steps <= 0, start,
+                              lambda i: "timestamp %d (%r s) does not follow the previous one"
+                                        % (start + i, times[i]))
+            previous_timestamp = times[-1]
+
+        power = block * conversion + power_offset if (conversion != 1.0 or power_offset) else block
+        findings.add_mask("power_finite", ~np.isfinite(power), start,
+                          lambda i: "non-finite power at sample %d" % (start + i))
+        findings.add_mask("negative_power", power < 0, start,
+                          lambda i: "negative power %g W at sample %d" % (power[i].min(), start + i))
+        if peak_power is not None:
+            findings.add_mask("peak_power", power > peak_power, start,
+                              lambda i: "power %g W at sample %d exceeds the peak power %g W of light source '%s'"
+                                        % (power[i].max(), start + i, series.light_source.peak_power,
+                                           series.light_source.name))
+
+        if pattern is not None:
+            if timing is None:
+                slack = _default_tolerance(series, times) if tolerance is None else tolerance
+                duration, isi = float(pattern.duration), float(pattern.inter_stimulus_interval)
+                span = int(pattern.number_of_stimulus_presentation) * (duration + isi) - isi
+                timing = _TimingState(num_columns, duration - slack, span + slack, isi - slack)
+            timing.update(power > threshold, times, start, findings)
+    return findings.to_list()
+
+
+def _validate_in_file(path, name, series_path, **kwargs):
+    try:
+        # reads the series and the objects it links to, not the other series of the file
+        with LazyNWBHDF5IO(path, mode="r", load_namespaces=True, cache_size=1) as io:
+            return validate_series(io.series[series_path], path=path, **kwargs)
+    except Exception:
+        return [Finding(path, name, "read", ERROR, traceback.format_exc(), None, 1)]
+
+
+def find_series(path):
+    """Return ``(name, path in the file)`` of every ``PatternedOptogeneticSeries`` in the file at ``path``.
+
+    Only the attributes of the groups of the file are read; no series is constructed.
+    """
+    with h5py.File(path, mode="r") as f:
+        specloc = f.attrs.get(SPEC_LOC_ATTR)
+        ignore = set() if specloc is None else {f[specloc].name}
+        return [(series_path.rsplit("/", 1)[-1], series_path) for series_path in find_series_groups(f, ignore=ignore)]
+
+
+def validate_files(paths, max_workers=None, callback=None, **kwargs):
+    """Validate every ``PatternedOptogeneticSeries`` of the files at ``paths``, in parallel.
+
+    Parameters
+    ----------
+    paths : list of str
+    max_workers : int, optional
+        Number of worker processes; defaults to the number of CPUs. With
+        ``max_workers=0`` the series are validated in the calling process.
+    callback : callable, optional
+        Called with ``(path, series name, findings)`` as soon as a series is done.
+    **kwargs
+        Passed to ``validate_series``.
+
+    Returns
+    -------
+    list of Finding
+        Grouped by file and series, in the order of ``paths`` and of the series in each file.
+    """
+    jobs = [(path, name, series_path) for path in paths for name, series_path in find_series(path)]
+    results = dict()
+    if max_workers == 0:
+        for path, name, series_path in jobs:
+            results[path, series_path] = _validate_in_file(path, name, series_path, **kwargs)
+            if callback is not None:
+                callback(path, name, results[path, series_path])
+    else:
+        function = functools.partial(_validate_in_file, **kwargs)
+        for (path, name, series_path), findings, error in imap_processes(function, jobs, max_workers):
+            if error is not None:
+                # the worker died, or the findings could not be sent back
+                findings = [Finding(path, name, "worker", ERROR, error, None, 1)]
+            results[path, series_path] = findings
+            if callback is not None:
+                callback(path, name, findings)
+    return [finding for path, _, series_path in jobs for finding in results[path, series_path]]
+
+
+def validate_file(path, **kwargs):
+    """Validate every ``PatternedOptogeneticSeries`` of one file, see ``validate_files``."""
+    return validate_files([path], **kwargs)
+
+
+def format_finding(finding):
+    location = "%s sample %d" % (finding.check, finding.index) if finding.index is not None else finding.check
+    count = " (%d times)" % finding.count if finding.count > 1 else ""
+    return "%-7s %s: %s: %s%s" % (finding.severity.upper(), finding.series, location,
+                                  finding.message.strip().splitlines()[-1], count)
+
+
+def main(argv=None):
+    """Command line entry point, see ``--help``."""
+    arg_parser = argparse.ArgumentParser(description="Check the PatternedOptogeneticSeries of NWB files.")
+    arg_parser.add_argument("paths", nargs="+", help="NWB files")
+    arg_parser.add_argument("--workers", type=int, default=None, help="number of worker processes")
+    arg_parser.add_argument("--threshold", type=float, default=0.0, help="power above which a ROI is stimulated")
+    arg_parser.add_argument("--tolerance", type=float, default=None, help="slack on the pattern timings, in s")
+    arg_parser.add_argument("--report", default=None, help="write the findings to this JSON file")
+    args = arg_parser.parse_args(argv)
+
+    def print_findings(path, name, findings):
+        print("%-7s %s %s" % ("FAILED" if findings else "ok", path, name), flush=True)
+        for finding in findings:
+            print("    " + format_finding(finding), flush=True)
+
+    findings = validate_files(args.paths, max_workers=args.workers, callback=print_findings,
+                              threshold=args.threshold, tolerance=args.tolerance)
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump([finding._asdict() for finding in findings], f, indent=2)
+    return 1 if any(finding.severity == ERROR for finding in findings) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,86 @@
+"""Zarr storage of PatternedOptogeneticSeries, with parallel chunk writes.
+
+Requires hdmf-zarr (``pip install ndx-holographic-stimulation[zarr]``). Files
+are written and read with ``hdmf_zarr.nwb.NWBZarrIO`` like with ``NWBHDF5IO``.
+
+``NWBZarrIO.write(nwbfile, number_of_jobs=n)`` writes the buffers of
+picklable ``GenericDataChunkIterator`` datasets from a pool of ``n`` processes,
+each opening the Zarr store and writing whole chunks, so there is no single
+writer as with HDF5. ``MemmapDataChunkIterator`` is such an iterator over a
+``.npy`` file: workers re-open the file memory-mapped instead of receiving a
+copy of the data, and buffers are aligned to ROI-aware chunks.
+"""
+import numpy as np
+from hdmf.data_utils import GenericDataChunkIterator
+from hdmf_zarr import ZarrDataIO
+from numcodecs import Blosc
+
+from .streaming import DEFAULT_CHUNK_BYTES, roi_aware_chunk_shape
+
+# Size of the buffer each worker reads from the source and writes in one go; a multiple of the chunk size.
+DEFAULT_BUFFER_BYTES = 16 * 1024 ** 2
+
+# Named compressor settings, matching the names of ``streaming.COMPRESSION_PRESETS``.
+ZARR_COMPRESSION_PRESETS = {
+    "none": False,
+    "fast": Blosc(cname="lz4", clevel=1, shuffle=Blosc.SHUFFLE),
+    "balanced": Blosc(cname="zstd", clevel=4, shuffle=Blosc.SHUFFLE),
+    "max": Blosc(cname="zstd", clevel=9, shuffle=Blosc.BITSHUFFLE),
+}
+
+
+class MemmapDataChunkIterator(GenericDataChunkIterator):
+    """Iterate over the ``num_times x num_rois`` (or 1D) array stored in a ``.npy`` file.
+
+    The iterator pickles to its path and shapes, so it can be sent to the worker
+    processes of a parallel ``NWBZarrIO`` write.
+    """
+
+    def __init__(self, path, chunk_shape=None, buffer_shape=None, chunk_bytes=DEFAULT_CHUNK_BYTES,
+                 buffer_bytes=DEFAULT_BUFFER_BYTES):
+        self.path = str(path)
+        self._array = np.load(self.path, mmap_mode="r")
+        shape = self._array.shape
+        if chunk_shape is None:
+            chunk_shape = roi_aware_chunk_shape(shape[1] if len(shape) > 1 else None, self._array.dtype, chunk_bytes)
+            chunk_shape = (min(chunk_shape[0], shape[0]),) + tuple(chunk_shape[1:])
+        if buffer_shape is None:
+            chunk_nbytes = int(np.prod(chunk_shape)) * self._array.dtype.itemsize
+            rows = chunk_shape[0] * max(buffer_bytes // chunk_nbytes, 1)
+            buffer_shape = (min(rows, shape[0]),) + tuple(chunk_shape[1:])
+        super().__init__(chunk_shape=tuple(map(int, chunk_shape)), buffer_shape=tuple(map(int, buffer_shape)))
+
+    def _get_data(self, selection):
+        return np.array(self._array[selection])
+
+    def _get_maxshape(self):
+        return self._array.shape
+
+    def _get_dtype(self):
+        return self._array.dtype
+
+    def _to_dict(self):
+        return dict(path=self.path, chunk_shape=self.chunk_shape, buffer_shape=self.buffer_shape)
+
+    @staticmethod
+    def _from_dict(dictionary):
+        return MemmapDataChunkIterator(**dictionary)
+
+
+def zarr_data_io(data, compression="balanced", chunk_shape=None, chunk_bytes=DEFAULT_CHUNK_BYTES):
+    """Wrap ``data`` for ``NWBZarrIO`` with a named ``compression`` preset and ROI-aware chunks.
+
+    ``data`` can be an array, or the path of a ``.npy`` file, which is read
+    through a ``MemmapDataChunkIterator`` so it can be written in parallel.
+    """
+    if compression not in ZARR_COMPRESSION_PRESETS:
+        raise ValueError("unknown compression preset '%s', expected one of %s"
+                         % (compression, sorted(ZARR_COMPRESSION_PRESETS)))
+    if isinstance(data, (str, bytes)) or hasattr(data, "__fspath__"):
+        data = MemmapDataChunkIterator(data, chunk_shape=chunk_shape, chunk_bytes=chunk_bytes)
+        chunk_shape = data.chunk_shape
+    elif chunk_shape is None:
+        data = np.asarray(data)
+        chunk_shape = roi_aware_chunk_shape(data.shape[1] if data.ndim > 1 else None, data.dtype, chunk_bytes)
+        chunk_shape = (min(chunk_shape[0], max(len(data), 1)),) + tuple(chunk_shape[1:])
+    return ZarrDataIO(data=data, chunks=list(chunk_shape), compressor=ZARR_COMPRESSION_PRESETS[compression])
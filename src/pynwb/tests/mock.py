@@ -0,0 +1,150 @@
+"""Mock objects for the ndx-holographic-stimulation tests, in the style of ``pynwb.testing.mock``.
+
+Objects linked from a ``PatternedOptogeneticSeries`` default to the names the spec requires for its links.
+"""
+from typing import Optional
+
+import numpy as np
+from pynwb import NWBFile
+from pynwb.testing.mock.device import mock_Device
+from pynwb.testing.mock.ophys import mock_ImagingPlane, mock_OpticalChannel, mock_PlaneSegmentation
+from pynwb.testing.mock.utils import name_generator
+
+from ndx_holographic_stimulation import (
+    LightSource,
+    PatternedOptogeneticSeries,
+    PatternedOptogeneticStimulusSite,
+    SpatialLightModulator,
+    SpiralScanning,
+)
+
+
+def mock_SpiralScanning(
+    name: Optional[str] = None,
+    duration: float = 10e-3,
+    number_of_stimulus_presentation: int = 10,
+    inter_stimulus_interval: float = 0.02,
+    nwbfile: Optional[NWBFile] = None,
+) -> SpiralScanning:
+    spiral_scanning = SpiralScanning(
+        name=name or "stimulus_pattern",
+        description="spiral scanning pattern",
+        diameter=15e-6,
+        height=10e-6,
+        number_of_revolutions=5,
+        duration=duration,
+        number_of_stimulus_presentation=number_of_stimulus_presentation,
+        inter_stimulus_interval=inter_stimulus_interval,
+    )
+    if nwbfile is not None:
+        nwbfile.add_lab_meta_data(spiral_scanning)
+    return spiral_scanning
+
+
+def mock_SpatialLightModulator(
+    name: Optional[str] = None, phase_masks=None, nwbfile: Optional[NWBFile] = None
+) -> SpatialLightModulator:
+    spatial_light_modulator = SpatialLightModulator(
+        name=name or "spatial_light_modulator",
+        description="spatial light modulator",
+        model="model",
+        resolution=1.0,
+        phase_masks=phase_masks,
+    )
+    if nwbfile is not None:
+        nwbfile.add_device(spatial_light_modulator)
+    return spatial_light_modulator
+
+
+def mock_LightSource(
+    name: Optional[str] = None, peak_power: float = 8.0, nwbfile: Optional[NWBFile] = None
+) -> LightSource:
+    light_source = LightSource(
+        name=name or "light_source",
+        description="laser",
+        stimulation_wavelength=600.0,
+        peak_power=peak_power,
+    )
+    if nwbfile is not None:
+        nwbfile.add_device(light_source)
+    return light_source
+
+
+def mock_PatternedOptogeneticStimulusSite(
+    name: Optional[str] = None, device=None, targets=None, nwbfile: Optional[NWBFile] = None
+) -> PatternedOptogeneticStimulusSite:
+    site = PatternedOptogeneticStimulusSite(
+        name=name or "site",
+        device=device or mock_Device(nwbfile=nwbfile),
+        description="patterned site",
+        excitation_lambda=600.0,
+        effector="ChR2",
+        location="VISrl",
+        targets=targets,
+    )
+    if nwbfile is not None:
+        nwbfile.add_ogen_site(site)
+    return site
+
+
+def mock_PatternedOptogeneticSeries(
+    name: Optional[str] = None,
+    data=None,
+    timestamps=None,
+    starting_time: Optional[float] = None,
+    rate: Optional[float] = None,
+    n_rois: Optional[int] = None,
+    rois=None,
+    site=None,
+    device=None,
+    stimulus_pattern=None,
+    stimulus_pattern_index=None,
+    spatial_light_modulator=None,
+    light_source=None,
+    continuity: Optional[str] = None,
+    dense_rate: Optional[float] = None,
+    delivered_dose=None,
+    power_pyramid=None,
+    nwbfile: Optional[NWBFile] = None,
+) -> PatternedOptogeneticSeries:
+    """Create a series with all of its links; missing pieces are mocked and added to ``nwbfile``.
+
+    A ``stimulus_pattern`` is only mocked if no ``stimulus_pattern_index`` is given.
+    """
+    if data is None:
+        data = np.random.rand(100, n_rois or 2)
+    if timestamps is None and rate is None:
+        timestamps = np.arange(len(data)) / 1000.0
+    device = device or mock_Device(name="device", nwbfile=nwbfile)
+    if rois is None:
+        n_rois = n_rois or data.shape[1]
+        imaging_plane = mock_ImagingPlane(
+            optical_channel=mock_OpticalChannel(nwbfile=nwbfile), device=device, nwbfile=nwbfile
+        )
+        plane_segmentation = mock_PlaneSegmentation(imaging_plane=imaging_plane, n_rois=n_rois, nwbfile=nwbfile)
+        rois = plane_segmentation.create_roi_table_region(region=list(range(n_rois)), description="all rois")
+    series = PatternedOptogeneticSeries(
+        name=name or name_generator("PatternedOptogeneticSeries"),
+        description="patterned stimulus",
+        data=data,
+        unit="watts",
+        timestamps=timestamps,
+        starting_time=starting_time,
+        rate=rate,
+        rois=rois,
+        site=site or mock_PatternedOptogeneticStimulusSite(device=device, nwbfile=nwbfile),
+        device=device,
+        stimulus_pattern=stimulus_pattern or (
+            mock_SpiralScanning(nwbfile=nwbfile) if stimulus_pattern_index is None else None
+        ),
+        stimulus_pattern_index=stimulus_pattern_index,
+        spatial_light_modulator=spatial_light_modulator or mock_SpatialLightModulator(nwbfile=nwbfile),
+        light_source=light_source or mock_LightSource(nwbfile=nwbfile),
+        continuity=continuity,
+        dense_rate=dense_rate,
+        delivered_dose=delivered_dose,
+        power_pyramid=power_pyramid,
+    )
+    if nwbfile is not None:
+        nwbfile.add_stimulus(series)
+    return series
@@ -0,0 +1,172 @@
+from pathlib import Path
+from shutil import rmtree
+from tempfile import mkdtemp
+from warnings import warn
+
+import numpy as np
+from hdmf.testing import TestCase
+from numpy.testing import assert_allclose, assert_array_equal
+from pynwb import NWBHDF5IO
+from pynwb.testing.mock.device import mock_Device
+from pynwb.testing.mock.file import mock_NWBFile
+from pynwb.testing.mock.ophys import mock_ImagingPlane, mock_PlaneSegmentation, mock_RoiResponseSeries
+
+from ndx_holographic_stimulation.alignment import align_responses, iter_peri_stimulus_responses
+
+from .mock import mock_PatternedOptogeneticSeries, mock_SpiralScanning
+from .test_schedule import DURATION, INTERVAL_STARTS, ISI, N_PRESENTATIONS, RATE, _dense_pulses
+
+IMAGING_RATE = 30.0
+NUM_FRAMES = 180  # 6 s
+
+
+def _reference(response_data, onsets, columns, pre, post):
+    """Per-trial loop over the windows, NaN outside the data."""
+    num_samples = int(round((pre + post) * IMAGING_RATE))
+    out = np.full((len(onsets), len(columns), num_samples), np.nan)
+    for trial, onset in enumerate(onsets):
+        start = int(np.ceil(np.round((onset - pre) * IMAGING_RATE, 9)))
+        for k in range(num_samples):
+            if 0 <= start + k < len(response_data):
+                out[trial, :, k] = response_data[start + k, columns]
+    return out
+
+
+class TestAlignResponses(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.test_dir = Path(mkdtemp())
+
+    @classmethod
+    def tearDownClass(cls):
+        try:
+            rmtree(cls.test_dir)
+        except PermissionError:  # Windows CI bug
+            warn(f"Unable to fully clean the temporary directory: {cls.test_dir}\n\nPlease remove it manually.")
+
+    def setUp(self):
+        self.nwbfile = mock_NWBFile()
+        device = mock_Device(name="device", nwbfile=self.nwbfile)
+        self.plane_segmentation = mock_PlaneSegmentation(
+            imaging_plane=mock_ImagingPlane(device=device, nwbfile=self.nwbfile), n_rois=6, nwbfile=self.nwbfile
+        )
+        # stimulate ROIs 0, 1 and 2 of the table; image all 6
+        self.series = mock_PatternedOptogeneticSeries(
+            name="PatternedOptogeneticSeries",
+            data=_dense_pulses(),
+            rate=RATE,
+            rois=self.plane_segmentation.create_roi_table_region(region=[0, 1, 2], description="targets"),
+            device=device,
+            stimulus_pattern=mock_SpiralScanning(
+                duration=DURATION, number_of_stimulus_presentation=N_PRESENTATIONS, inter_stimulus_interval=ISI,
+                nwbfile=self.nwbfile,
+            ),
+            nwbfile=self.nwbfile,
+        )
+        # each response value encodes its frame and ROI column
+        self.response_data = np.arange(NUM_FRAMES)[:, np.newaxis] * 10.0 + np.arange(6)
+        self.response = mock_RoiResponseSeries(
+            name="RoiResponseSeries",
+            data=self.response_data,
+            rate=IMAGING_RATE,
+            rois=self.plane_segmentation.create_roi_table_region(region=list(range(6)), description="all"),
+        )
+        self.nwbfile.processing["ophys"].add(self.response)
+
+    def test_schedule_intervals(self):
+        aligned = self.series.get_peri_stimulus_responses(self.response, window=(0.5, 1.0))
+        expected_onsets = sorted(start for starts in INTERVAL_STARTS.values() for start in starts)
+        assert_allclose(aligned.onset, expected_onsets)
+        assert_array_equal(aligned.stimulated_rois, [0, 1, 0])
+        assert_array_equal(aligned.rois, np.arange(6))
+        self.assertEqual(aligned.data.shape, (3, 6, 45))
+        assert_allclose(aligned.times, np.arange(45) / IMAGING_RATE - 0.5)
+        assert_array_equal(aligned.data, _reference(self.response_data, aligned.onset, np.arange(6), 0.5, 1.0))
+
+    def test_presentations(self):
+        aligned = align_responses(self.series, self.response, (0.0, 0.1), event="presentation")
+        self.assertEqual(len(aligned.onset), 3 * N_PRESENTATIONS)
+        self.assertEqual(aligned.data.shape, (3 * N_PRESENTATIONS, 6, 3))
+
+    def test_batches_and_rois(self):
+        onsets = np.array([5.9, 0.05, 1.0, 1.01, 3.0, 3.5])
+        rois = [4, 1, 1]
+        batches = list(iter_peri_stimulus_responses(
+            self.series, self.response, (0.1, 0.3), rois=rois, onsets=onsets, batch_size=4
+        ))
+        self.assertEqual([len(batch.onset) for batch in batches], [4, 2])
+        aligned = align_responses(self.series, self.response, (0.1, 0.3), rois=rois, onsets=onsets)
+        assert_array_equal(aligned.onset, np.sort(onsets))
+        assert_array_equal(aligned.stimulated_rois, -1)
+        assert_array_equal(np.concatenate([batch.data for batch in batches]), aligned.data)
+        expected = _reference(self.response_data, np.sort(onsets), [4, 1, 1], 0.1, 0.3)
+        assert_array_equal(aligned.data, expected)
+        self.assertTrue(np.isnan(aligned.data[0, :, 0]).all())  # window starts before the first frame
+        self.assertTrue(np.isnan(aligned.data[-1, :, -1]).all())  # and ends after the last one
+
+    def test_no_trials(self):
+        aligned = align_responses(self.series, self.response, (0.1, 0.2), onsets=[])
+        self.assertEqual(aligned.data.shape, (0, 6, 9))
+
+    def test_from_file_with_timestamps(self):
+        response = mock_RoiResponseSeries(
+            name="RoiResponseSeriesTimestamps",
+            data=self.response_data[:, [5, 2]],
+            timestamps=np.arange(NUM_FRAMES) / IMAGING_RATE,
+            rate=None,
+            rois=self.plane_segmentation.create_roi_table_region(region=[5, 2], description="two"),
+        )
+        self.nwbfile.processing["ophys"].add(response)
+        path = self.test_dir / "alignment.nwb"
+        with NWBHDF5IO(path, mode="w") as io:
+            io.write(self.nwbfile)
+
+        with NWBHDF5IO(path, mode="r") as io:
+            nwbfile = io.read()
+            series = nwbfile.stimulus["PatternedOptogeneticSeries"]
+            response_in = nwbfile.processing["ophys"]["RoiResponseSeriesTimestamps"]
+            aligned = series.get_peri_stimulus_responses(response_in, window=(0.5, 1.0), rois=[2])
+            assert_array_equal(aligned.rois, [2])
+            assert_array_equal(aligned.data, _reference(self.response_data, aligned.onset, [2], 0.5, 1.0))
+
+    def test_timestamps_around_the_recording(self):
+        # the recording starts at 10 s: windows reaching before its first or after its last sample are NaN-padded
+        response = mock_RoiResponseSeries(
+            name="RoiResponseSeriesLate",
+            data=np.arange(100.0)[:, np.newaxis],
+            timestamps=10.0 + np.arange(100) / 10.0,
+            rate=None,
+            rois=self.plane_segmentation.create_roi_table_region(region=[0], description="one"),
+        )
+        self.nwbfile.processing["ophys"].add(response)
+        path = self.test_dir / "alignment_late.nwb"
+        with NWBHDF5IO(path, mode="w") as io:
+            io.write(self.nwbfile)
+
+        with NWBHDF5IO(path, mode="r") as io:
+            nwbfile = io.read()
+            series = nwbfile.stimulus["PatternedOptogeneticSeries"]
+            response_in = nwbfile.processing["ophys"]["RoiResponseSeriesLate"]
+            for name, series, response in (("in memory", self.series, response), ("from file", series, response_in)):
+                with self.subTest(name):
+                    aligned = align_responses(series, response, (0.5, 0.5), onsets=[10.0, 19.9])
+                    assert_allclose(aligned.times, np.arange(10) / 10.0 - 0.5, atol=1e-12)
+                    assert_array_equal(aligned.data[0, 0], [np.nan] * 5 + [0, 1, 2, 3, 4])
+                    assert_array_equal(aligned.data[1, 0], [94, 95, 96, 97, 98, 99] + [np.nan] * 4)
+
+    def test_different_roi_tables(self):
+        other = mock_PlaneSegmentation(imaging_plane=self.plane_segmentation.imaging_plane, n_rois=6)
+        response = mock_RoiResponseSeries(
+            data=self.response_data, rois=other.create_roi_table_region(region=list(range(6)), description="all")
+        )
+        with self.assertRaisesWith(ValueError, "series 'PatternedOptogeneticSeries' and response '%s' do not "
+                                   "reference the same ROI table" % response.name):
+            align_responses(self.series, response, (0.1, 0.2))
+
+    def test_missing_roi(self):
+        response = mock_RoiResponseSeries(
+            data=self.response_data[:, :2],
+            rois=self.plane_segmentation.create_roi_table_region(region=[0, 1], description="two"),
+        )
+        with self.assertRaises(ValueError):
+            align_responses(self.series, response, (0.1, 0.2), rois=[3])
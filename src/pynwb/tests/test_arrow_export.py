@@ -0,0 +1,157 @@
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+from shutil import rmtree
+from tempfile import mkdtemp
+from warnings import warn
+
+import numpy as np
+from hdmf.testing import TestCase
+from numpy.testing import assert_allclose, assert_array_equal
+from pynwb import NWBHDF5IO
+from pynwb.testing.mock.file import mock_NWBFile
+
+from ndx_holographic_stimulation import TemporalFocusing
+from ndx_holographic_stimulation.dose import compute_delivered_dose
+from ndx_holographic_stimulation.schedule import expand_stimulus_schedule
+
+from .mock import mock_PatternedOptogeneticSeries, mock_SpiralScanning
+from .test_schedule import DURATION, ISI, N_PRESENTATIONS, RATE, _dense_pulses
+
+try:
+    import pyarrow.dataset as ds
+
+    from ndx_holographic_stimulation.arrow_export import (
+        EVENT_SCHEMA,
+        get_events_table,
+        series_event_batch,
+        write_events_parquet,
+    )
+
+    HAVE_PYARROW = True
+except ImportError:
+    HAVE_PYARROW = False
+
+
+def _add_series(nwbfile):
+    data = _dense_pulses()
+    spiral = mock_PatternedOptogeneticSeries(
+        name="spiral", data=data, timestamps=np.arange(len(data)) / RATE, nwbfile=nwbfile,
+        stimulus_pattern=mock_SpiralScanning(
+            duration=DURATION, number_of_stimulus_presentation=N_PRESENTATIONS, inter_stimulus_interval=ISI,
+            nwbfile=nwbfile,
+        ),
+    )
+    temporal_focusing = TemporalFocusing(
+        name="temporal_focusing", description="temporal focusing",
+        lateral_point_spread_function="9e-6 m ± 0.7e-6 m", axial_point_spread_function="32e-6 m ± 1.6e-6 m",
+        duration=DURATION, number_of_stimulus_presentation=N_PRESENTATIONS, inter_stimulus_interval=ISI,
+    )
+    nwbfile.add_lab_meta_data(temporal_focusing)
+    mock_PatternedOptogeneticSeries(
+        name="temporal", data=data * 2, timestamps=np.arange(len(data)) / RATE, nwbfile=nwbfile, rois=spiral.rois,
+        site=spiral.site, device=spiral.device, stimulus_pattern=temporal_focusing,
+        spatial_light_modulator=spiral.spatial_light_modulator, light_source=spiral.light_source,
+    )
+    return spiral
+
+
+@unittest.skipIf(not HAVE_PYARROW, "pyarrow is not installed")
+class TestSeriesEvents(TestCase):
+    def test_batch(self):
+        nwbfile = mock_NWBFile()
+        series = _add_series(nwbfile)
+        schedule = series.get_stimulus_schedule()
+        batch = series_event_batch(series, session="day1")
+        self.assertEqual(batch.schema, EVENT_SCHEMA)
+
+        self.assertEqual(batch.num_rows, len(schedule.onset))
+        assert_array_equal(batch.column("roi").to_numpy(), schedule.rois)
+        assert_array_equal(batch.column("roi_id").to_numpy(), np.asarray(series.rois.table.id.data)[schedule.rois])
+        assert_array_equal(batch.column("interval").to_numpy(), schedule.interval)
+        assert_array_equal(batch.column("presentation").to_numpy(), schedule.presentation)
+        assert_array_equal(batch.column("offset").to_numpy(), schedule.offset)
+        energy = compute_delivered_dose(series).presentation_energy
+        assert_allclose(batch.column("energy").to_numpy(), energy)
+        assert_allclose(batch.column("mean_power").to_numpy(), energy / DURATION)
+        # the onsets of the schedule are not copied
+        self.assertEqual(batch.column("onset").buffers()[1].address, schedule.onset.ctypes.data)
+
+        row = batch.slice(0, 1).to_pylist()[0]
+        self.assertEqual(row["session"], "day1")
+        self.assertEqual(row["series"], "spiral")
+        self.assertEqual(row["pattern_type"], "SpiralScanning")
+        self.assertEqual(row["number_of_revolutions"], 5)
+        self.assertEqual(row["diameter"], 15e-6)
+        self.assertIsNone(row["lateral_point_spread_function_mean"])
+        self.assertEqual(row["stimulation_wavelength"], 600.0)
+
+    def test_no_pattern(self):
+        series = mock_PatternedOptogeneticSeries()
+        series.fields.pop("stimulus_pattern")
+        self.assertIsNone(series_event_batch(series))
+
+    def test_schedules_not_memoized(self):
+        nwbfile = mock_NWBFile(session_id="session")
+        _add_series(nwbfile)
+        with patch("ndx_holographic_stimulation.series.expand_stimulus_schedule",
+                   side_effect=expand_stimulus_schedule) as expand:
+            table = get_events_table(nwbfile)
+            self.assertEqual(expand.call_count, 2)
+            for series in (nwbfile.stimulus["spiral"], nwbfile.stimulus["temporal"]):
+                series.get_stimulus_schedule()
+            self.assertEqual(expand.call_count, 4)
+            # memoized schedules are used
+            self.assertEqual(get_events_table(nwbfile), table)
+            self.assertEqual(expand.call_count, 4)
+
+    def test_table(self):
+        nwbfile = mock_NWBFile(session_id="session")
+        _add_series(nwbfile)
+        table = get_events_table(nwbfile)
+        self.assertEqual(table.column("series").unique().to_pylist(), ["spiral", "temporal"])
+        self.assertEqual(table.column("session").unique().to_pylist(), ["session"])
+        temporal = next(row for row in table.to_pylist() if row["series"] == "temporal")
+        self.assertEqual(temporal["pattern_type"], "TemporalFocusing")
+        self.assertAlmostEqual(temporal["lateral_point_spread_function_mean"], 9e-6)
+        self.assertEqual(temporal["axial_point_spread_function"], "32e-6 m ± 1.6e-6 m")
+        self.assertIsNone(temporal["diameter"])
+
+
+@unittest.skipIf(not HAVE_PYARROW, "pyarrow is not installed")
+class TestWriteEventsParquet(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.test_dir = Path(mkdtemp())
+        cls.paths = [cls.test_dir / "day1.nwb", cls.test_dir / "day 2.nwb"]
+        for path in cls.paths:
+            nwbfile = mock_NWBFile()
+            _add_series(nwbfile)
+            with NWBHDF5IO(path, mode="w") as io:
+                io.write(nwbfile)
+
+    @classmethod
+    def tearDownClass(cls):
+        try:
+            rmtree(cls.test_dir)
+        except PermissionError:  # Windows CI bug
+            warn(f"Unable to fully clean the temporary directory: {cls.test_dir}\n\nPlease remove it manually.")
+
+    def test_partitioned(self):
+        root = self.test_dir / "events"
+        num_events = write_events_parquet(self.paths, root)
+        self.assertEqual(num_events, {"day1": 60, "day 2": 60})
+        self.assertTrue((root / "session=day%202" / "events.parquet").exists())
+
+        table = ds.dataset(root, partitioning="hive").to_table()
+        self.assertEqual(table.num_rows, 120)
+        self.assertEqual(sorted(table.column("session").unique().to_pylist()), ["day 2", "day1"])
+        with NWBHDF5IO(self.paths[0], mode="r") as io:
+            expected = get_events_table(io.read(), session="day1")
+        day1 = table.filter(ds.field("session") == "day1")
+        assert_allclose(day1.column("onset").to_numpy(), expected.column("onset").to_numpy())
+        assert_allclose(day1.column("energy").to_numpy(), expected.column("energy").to_numpy())
+
+    def test_session_names(self):
+        with self.assertRaisesWith(ValueError, "session names must be unique, got ['a', 'a']"):
+            write_events_parquet(self.paths, self.test_dir / "unused", session_names=["a", "a"])
@@ -0,0 +1,120 @@
+from datetime import datetime
+from pathlib import Path
+from shutil import rmtree
+from tempfile import mkdtemp
+from warnings import warn
+
+import numpy as np
+from hdmf.testing import TestCase
+from numpy.testing import assert_array_equal
+from pynwb import NWBHDF5IO
+from pynwb.testing.mock.file import mock_NWBFile
+
+from ndx_holographic_stimulation import OptogeneticStimulusPatternLibrary, PatternedOptogeneticSeries
+from ndx_holographic_stimulation.batch import build_series_batch
+
+from .mock import mock_PatternedOptogeneticSeries, mock_SpiralScanning
+
+
+class TestBuildSeriesBatch(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.test_dir = Path(mkdtemp())
+
+    @classmethod
+    def tearDownClass(cls):
+        try:
+            rmtree(cls.test_dir)
+        except PermissionError:  # Windows CI bug
+            warn(f"Unable to fully clean the temporary directory: {cls.test_dir}\n\nPlease remove it manually.")
+
+    def setUp(self):
+        self.nwbfile = mock_NWBFile(session_start_time=datetime.now().astimezone())
+        # a first series, built the usual way, provides the shared links and ROI region
+        self.template = mock_PatternedOptogeneticSeries(name="template", n_rois=4, nwbfile=self.nwbfile)
+        self.links = dict(
+            site=self.template.site,
+            device=self.template.device,
+            stimulus_pattern=self.template.stimulus_pattern,
+            spatial_light_modulator=self.template.spatial_light_modulator,
+            light_source=self.template.light_source,
+        )
+
+    def test_stacked_roundtrip(self):
+        data = np.random.default_rng(0).random((50, 20, 4))
+        series = build_series_batch(
+            data, self.template.rois, rate=1000.0, starting_time=np.arange(50) * 2.0, nwbfile=self.nwbfile,
+            description="trial", **self.links,
+        )
+        self.assertEqual(len(series), 50)
+        self.assertIsInstance(series[0], PatternedOptogeneticSeries)
+        self.assertIs(series[7].site, self.template.site)
+        self.assertEqual(series[7].starting_time, 14.0)
+        self.assertEqual(series[7].rois.data.dtype, np.int8)
+
+        path = self.test_dir / "batch.nwb"
+        with NWBHDF5IO(path, mode="w") as io:
+            io.write(self.nwbfile, cache_spec=False)
+        with NWBHDF5IO(path, mode="r") as io:
+            stimulus = io.read().stimulus
+            self.assertEqual(len(stimulus), 51)
+            read = stimulus["PatternedOptogeneticSeries_49"]
+            assert_array_equal(read.data[:], data[49])
+            assert_array_equal(read.rois.data[:], np.arange(4))
+            self.assertEqual(read.stimulus_pattern.name, "stimulus_pattern")
+            self.assertEqual(read.light_source.name, "light_source")
+
+    def test_ragged_timestamps(self):
+        lengths = [5, 12, 1]
+        data = [np.ones((n, 4)) for n in lengths]
+        timestamps = [np.arange(n) / 100.0 + trial for trial, n in enumerate(lengths)]
+        series = build_series_batch(data, self.template.rois, timestamps=timestamps,
+                                    names=["a", "b", "c"], **self.links)
+        self.assertEqual([len(s.timestamps) for s in series], lengths)
+        self.assertEqual(series[2].name, "c")
+
+        timestamps[1] = timestamps[1][::-1]
+        with self.assertRaisesWith(ValueError, "timestamps of trial 1 are not sorted"):
+            build_series_batch(data, self.template.rois, timestamps=timestamps, **self.links)
+
+    def test_validation(self):
+        rois = self.template.rois
+        with self.assertRaisesWith(ValueError, "data of every trial must be time x roi with 4 rois"):
+            build_series_batch(np.zeros((3, 10, 5)), rois, rate=10.0, **self.links)
+        with self.assertRaisesWith(ValueError, "timestamps and data of trial 0 have different lengths"):
+            build_series_batch(np.zeros((3, 10, 4)), rois, timestamps=np.zeros((3, 9)), **self.links)
+        with self.assertRaisesWith(TypeError, "site must be a PatternedOptogeneticStimulusSite, got Device"):
+            build_series_batch(np.zeros((3, 10, 4)), rois, rate=10.0, **dict(self.links, site=self.links["device"]))
+        with self.assertRaises(ValueError):
+            build_series_batch(np.zeros((1, 10, 4)), rois, rate=10.0, names=["template"], nwbfile=self.nwbfile,
+                               **self.links)
+        # site and device are required links
+        with self.assertRaisesWith(TypeError, "device must be a Device, got NoneType"):
+            build_series_batch(np.zeros((3, 10, 4)), rois, rate=10.0, **dict(self.links, device=None))
+        with self.assertRaisesWith(TypeError, "build_series_batch: unrecognized arguments: ['delivered_dose']"):
+            build_series_batch(np.zeros((3, 10, 4)), rois, rate=10.0, delivered_dose=None, **self.links)
+
+    def test_same_as_constructor(self):
+        series = build_series_batch(np.zeros((2, 10, 4)), self.template.rois, rate=10.0, continuity="step",
+                                    dense_rate=100.0, **self.links)[0]
+        single = PatternedOptogeneticSeries(
+            name="single", description="no description", data=np.zeros((10, 4)), unit="watts", rate=10.0,
+            continuity="step",
+            dense_rate=100.0, rois=self.template.rois, **self.links,
+        )
+        # the ROI indices are compacted like PatternedOptogeneticSeries.__init__ does
+        self.assertEqual(series.rois.data.dtype, single.rois.data.dtype)
+        self.assertEqual(series.rois.data.dtype, np.int8)
+        for field in ("unit", "continuity", "dense_rate", "site", "device", "stimulus_pattern",
+                      "spatial_light_modulator", "light_source"):
+            self.assertEqual(getattr(series, field), getattr(single, field), field)
+
+    def test_stimulus_pattern_index(self):
+        library = OptogeneticStimulusPatternLibrary()
+        self.nwbfile.add_lab_meta_data(library)
+        row = library.add_pattern(mock_SpiralScanning(duration=5e-3))
+        links = dict(self.links, stimulus_pattern=None)
+        series = build_series_batch(np.zeros((3, 10, 4)), self.template.rois, rate=10.0,
+                                    stimulus_pattern_index=library.patterns.create_pattern_region(row), **links)
+        self.assertIsNot(series[0].stimulus_pattern_index, series[1].stimulus_pattern_index)
+        self.assertAlmostEqual(series[2].get_stimulus_pattern().duration, 5e-3)
@@ -0,0 +1,94 @@
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from shutil import rmtree
+from tempfile import mkdtemp
+from warnings import warn
+
+import h5py
+import numpy as np
+from hdmf.testing import TestCase
+from numpy.testing import assert_array_equal
+from pynwb import NWBHDF5IO
+from pynwb.testing.mock.file import mock_NWBFile
+
+from ndx_holographic_stimulation import PatternedOptogeneticSeries
+from ndx_holographic_stimulation.consolidate import consolidate_sessions, main
+
+from .mock import mock_PatternedOptogeneticSeries
+
+START = datetime(2024, 3, 1, 10, tzinfo=timezone.utc)
+
+
+class TestConsolidate(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.test_dir = Path(mkdtemp())
+        cls.paths = [cls.test_dir / "day1.nwb", cls.test_dir / "day2.nwb"]
+        cls.data = dict()
+        for day, path in enumerate(cls.paths):
+            nwbfile = mock_NWBFile(session_start_time=START + timedelta(days=day))
+            data = np.random.default_rng(day).random((1000, 3), dtype=np.float32)
+            first = mock_PatternedOptogeneticSeries(name="series_a", data=data, nwbfile=nwbfile)
+            mock_PatternedOptogeneticSeries(
+                name="series_b", data=data[:10] * 2, nwbfile=nwbfile, rois=first.rois, site=first.site,
+                device=first.device, stimulus_pattern=first.stimulus_pattern,
+                spatial_light_modulator=first.spatial_light_modulator, light_source=first.light_source,
+            )
+            with NWBHDF5IO(path, mode="w") as io:
+                io.write(nwbfile)
+            cls.data[path.stem] = data
+
+    @classmethod
+    def tearDownClass(cls):
+        try:
+            rmtree(cls.test_dir)
+        except PermissionError:  # Windows CI bug
+            warn(f"Unable to fully clean the temporary directory: {cls.test_dir}\n\nPlease remove it manually.")
+
+    def _check_summary(self, path):
+        with NWBHDF5IO(path, mode="r") as io:
+            summary = io.read()
+            self.assertEqual(summary.session_start_time, START)
+            self.assertEqual(sorted(summary.stimulus),
+                             ["day1_series_a", "day1_series_b", "day2_series_a", "day2_series_b"])
+            for day in ("day1", "day2"):
+                series = summary.stimulus["%s_series_a" % day]
+                self.assertIsInstance(series, PatternedOptogeneticSeries)
+                assert_array_equal(series.data[:], self.data[day])
+                assert_array_equal(summary.stimulus["%s_series_b" % day].data[:], self.data[day][:10] * 2)
+                self.assertIs(series.site, summary.ogen_sites["%s_site" % day])
+                self.assertIs(series.site.device, summary.devices["%s_device" % day])
+                self.assertIs(series.light_source, summary.devices["%s_light_source" % day])
+                self.assertIs(series.stimulus_pattern, summary.lab_meta_data["%s_stimulus_pattern" % day])
+                self.assertEqual(series.stimulus_pattern.number_of_revolutions, 5)
+                self.assertIs(series.rois.table.parent, summary.processing["ophys"])
+                assert_array_equal(series.rois.data[:], [0, 1, 2])
+                self.assertEqual(len(series.rois.table), 3)
+            sessions = summary.scratch["sessions"].to_dataframe()
+            self.assertEqual(list(sessions["session"]), ["day1", "day2"])
+            self.assertEqual(list(sessions["source"]), ["day1.nwb", "day2.nwb"])
+            assert_array_equal(sessions["time_offset"], [0.0, 86400.0])
+
+    def test_external_links(self):
+        path = self.test_dir / "summary.nwb"
+        names = consolidate_sessions(self.paths, path)
+        self.assertEqual(names, {"day1": ["day1_series_a", "day1_series_b"],
+                                 "day2": ["day2_series_a", "day2_series_b"]})
+        self._check_summary(path)
+        with h5py.File(path, "r") as file:
+            link = file["/stimulus/presentation/day2_series_a"].get("data", getlink=True)
+            self.assertIsInstance(link, h5py.ExternalLink)
+            self.assertEqual((link.filename, link.path), ("day2.nwb", "/stimulus/presentation/series_a/data"))
+
+    def test_virtual(self):
+        path = self.test_dir / "virtual.nwb"
+        main([str(path), *map(str, self.paths), "--virtual"])
+        self._check_summary(path)
+        with h5py.File(path, "r") as file:
+            data = file["/stimulus/presentation/day1_series_a/data"]
+            self.assertTrue(data.is_virtual)
+            self.assertEqual(data.attrs["unit"], "watts")
+
+    def test_session_names(self):
+        with self.assertRaisesWith(ValueError, "session names must be unique, got ['a', 'a']"):
+            consolidate_sessions(self.paths, self.test_dir / "unused.nwb", session_names=["a", "a"])
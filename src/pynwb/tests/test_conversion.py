@@ -0,0 +1,205 @@
+import json
+import os
+from pathlib import Path
+from shutil import rmtree
+from tempfile import mkdtemp
+from warnings import warn
+
+import numpy as np
+from hdmf.testing import TestCase
+from numpy.testing import assert_array_almost_equal, assert_array_equal
+from pynwb import NWBHDF5IO
+
+from ndx_holographic_stimulation import SpiralScanning
+from ndx_holographic_stimulation.conversion import LogDirectoryParser, convert_session, convert_sessions, main
+
+METADATA = {
+    "session_description": "holographic stimulation",
+    "identifier": "session",
+    "session_start_time": "2024-03-01T10:00:00+00:00",
+    "roi_centers": [[10, 20], [30, 40], [50, 60]],
+    "spatial_light_modulator": {"description": "SLM", "model": "model", "resolution": 1.0},
+    "light_source": {"description": "laser", "stimulation_wavelength": 1030.0, "peak_power": 8.0},
+    "site": {"description": "site", "excitation_lambda": 1030.0, "effector": "ChRmine", "location": "V1"},
+    "pattern": {"type": "SpiralScanning", "description": "spiral", "duration": 0.01,
+                "number_of_stimulus_presentation": 10, "inter_stimulus_interval": 0.02,
+                "diameter": 15e-6, "height": 10e-6, "number_of_revolutions": 5},
+}
+
+
+def write_session(root, name, timestamps, power, log_format):
+    session = root / name
+    session.mkdir()
+    with open(session / "session.json", "w") as f:
+        json.dump(dict(METADATA, identifier=name), f)
+    if log_format == "npz":
+        np.savez(session / "stimulation.npz", timestamps=timestamps, power=power)
+    else:
+        header = "time," + ",".join("roi_%d" % i for i in range(power.shape[1]))
+        np.savetxt(session / "stimulation.csv", np.column_stack([timestamps, power]), delimiter=",",
+                   header=header, comments="")
+
+
+class CountingParser(LogDirectoryParser):
+    """Counts the passes over each log."""
+
+    def __init__(self):
+        self.passes = 0
+
+    def iter_log(self, session, block_rows):
+        self.passes += 1
+        yield from super().iter_log(session, block_rows)
+
+
+class CrashingParser(LogDirectoryParser):
+    """Kills the worker process converting the session named ``crash``."""
+
+    def __init__(self, crash):
+        self.crash = crash
+
+    def iter_log(self, session, block_rows):
+        if Path(session).name == self.crash:
+            os._exit(1)
+        yield from super().iter_log(session, block_rows)
+
+
+class TestLogDirectoryParser(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.test_dir = Path(mkdtemp())
+        cls.timestamps = np.arange(1000) / 1000.0
+        cls.power = np.random.default_rng(0).random((1000, 3))
+
+    @classmethod
+    def tearDownClass(cls):
+        try:
+            rmtree(cls.test_dir)
+        except PermissionError:  # Windows CI bug
+            warn(f"Unable to fully clean the temporary directory: {cls.test_dir}\n\nPlease remove it manually.")
+
+    def test_npz_blocks(self):
+        write_session(self.test_dir, "npz", self.timestamps, self.power, "npz")
+        blocks = list(LogDirectoryParser().iter_log(self.test_dir / "npz", 128))
+        self.assertEqual([len(power) for _, power in blocks], [128] * 7 + [104])
+        assert_array_equal(np.concatenate([timestamps for timestamps, _ in blocks]), self.timestamps)
+        assert_array_equal(np.concatenate([power for _, power in blocks]), self.power)
+
+    def test_npz_compressed_fortran_order(self):
+        session = self.test_dir / "npz_compressed"
+        session.mkdir()
+        power = np.asfortranarray(self.power)
+        np.savez_compressed(session / "stimulation.npz", timestamps=self.timestamps, power=power)
+        blocks = list(LogDirectoryParser().iter_log(session, 256))
+        self.assertEqual(len(blocks), 4)
+        assert_array_equal(np.concatenate([power for _, power in blocks]), self.power)
+
+    def test_csv_blocks(self):
+        write_session(self.test_dir, "csv", self.timestamps, self.power, "csv")
+        blocks = list(LogDirectoryParser().iter_log(self.test_dir / "csv", 300))
+        self.assertEqual([len(timestamps) for timestamps, _ in blocks], [300, 300, 300, 100])
+        assert_array_almost_equal(np.concatenate([power for _, power in blocks]), self.power, decimal=12)
+
+    def test_parsed_once(self):
+        write_session(self.test_dir, "once", self.timestamps, self.power, "csv")
+        parser = CountingParser()
+        report = convert_session(self.test_dir / "once", self.test_dir, parser=parser, block_rows=100)
+        self.assertIsNone(report.error)
+        self.assertEqual(parser.passes, 1)
+
+    def test_different_lengths(self):
+        for log_format in ("npz", "csv"):
+            name = "uneven_" + log_format
+            if log_format == "npz":
+                write_session(self.test_dir, name, self.timestamps[:-1], self.power, "npz")
+            else:
+                write_session(self.test_dir, name, self.timestamps, self.power, "csv")
+                with open(self.test_dir / name / "stimulation.csv", "a") as f:
+                    f.write("1.0,0.5\n")
+            report = convert_session(self.test_dir / name, self.test_dir, block_rows=128)
+            self.assertFalse(report.succeeded)
+            self.assertIn("ValueError", report.error)
+            self.assertFalse((self.test_dir / (name + ".nwb")).exists())
+
+
+class TestConvertSessions(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.test_dir = Path(mkdtemp())
+        cls.root = cls.test_dir / "logs"
+        cls.root.mkdir()
+        rng = np.random.default_rng(0)
+        cls.timestamps = np.arange(1000) / 1000.0
+        cls.power = {name: rng.random((1000, 3)) for name in ("session_csv", "session_npz")}
+        write_session(cls.root, "session_csv", cls.timestamps, cls.power["session_csv"], "csv")
+        write_session(cls.root, "session_npz", cls.timestamps, cls.power["session_npz"], "npz")
+        broken = cls.root / "session_broken"
+        broken.mkdir()
+        with open(broken / "session.json", "w") as f:
+            json.dump(dict(METADATA, identifier="broken"), f)  # no stimulation log
+        (cls.root / "not_a_session").mkdir()
+
+    @classmethod
+    def tearDownClass(cls):
+        try:
+            rmtree(cls.test_dir)
+        except PermissionError:  # Windows CI bug
+            warn(f"Unable to fully clean the temporary directory: {cls.test_dir}\n\nPlease remove it manually.")
+
+    def test_discover(self):
+        sessions = LogDirectoryParser().discover(self.root)
+        self.assertEqual([Path(s).name for s in sessions], ["session_broken", "session_csv", "session_npz"])
+
+    def test_process_pool(self):
+        output_dir = self.test_dir / "pool"
+        reports = convert_sessions(self.root, output_dir, max_workers=2, block_rows=128)
+        self.assertEqual([report.succeeded for report in reports], [False, True, True])
+        self.assertIn("FileNotFoundError", reports[0].error)
+        self.assertFalse((output_dir / "session_broken.nwb").exists())
+
+        for report in reports[1:]:
+            self.assertIsNone(report.error)
+            self.assertEqual(report.num_samples, 1000)
+            self.assertEqual(report.num_bytes, 1000 * 3 * 8)
+            self.assertGreater(report.throughput, 0)
+            with NWBHDF5IO(report.output, mode="r") as io:
+                nwbfile = io.read()
+                series = nwbfile.stimulus["PatternedOptogeneticSeries"]
+                expected = self.power[Path(report.session).name]
+                assert_array_almost_equal(series.data[:], expected, decimal=12)
+                assert_array_almost_equal(series.timestamps[:], self.timestamps, decimal=12)
+                assert_array_equal(series.rois.data[:], [0, 1, 2])
+                self.assertIsInstance(series.stimulus_pattern, SpiralScanning)
+                self.assertEqual(series.light_source.peak_power, 8.0)
+                self.assertEqual(len(series.rois.table), 3)
+
+    def test_crashed_worker(self):
+        output_dir = self.test_dir / "crashed"
+        for crash in ("session_csv", "session_npz"):
+            with self.subTest(crash=crash):
+                reports = convert_sessions(self.root, output_dir / crash, parser=CrashingParser(crash), max_workers=2)
+                reports = {Path(report.session).name: report for report in reports}
+                self.assertEqual(sorted(reports), ["session_broken", "session_csv", "session_npz"])
+                self.assertIn("FileNotFoundError", reports.pop("session_broken").error)
+                report = reports.pop(crash)
+                self.assertFalse(report.succeeded)
+                self.assertIn("BrokenProcessPool", report.error)
+                self.assertEqual(report.output, str(output_dir / crash / (crash + ".nwb")))
+                for report in reports.values():
+                    self.assertTrue(report.succeeded, report.error)
+                    self.assertEqual(report.num_samples, 1000)
+
+    def test_existing_files(self):
+        output_dir = self.test_dir / "existing"
+        convert_sessions(self.root, output_dir, max_workers=0)
+        reports = convert_sessions(self.root, output_dir, max_workers=0)
+        self.assertIn("FileExistsError", reports[1].error)
+        reports = convert_sessions(self.root, output_dir, max_workers=0, overwrite=True)
+        self.assertEqual([report.succeeded for report in reports], [False, True, True])
+
+    def test_main(self):
+        report_path = self.test_dir / "report.json"
+        status = main([str(self.root), str(self.test_dir / "cli"), "--workers", "0", "--report", str(report_path)])
+        self.assertEqual(status, 1)
+        with open(report_path) as f:
+            reports = json.load(f)
+        self.assertEqual([report["succeeded"] for report in reports], [False, True, True])
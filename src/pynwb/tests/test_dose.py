@@ -0,0 +1,170 @@
+from pathlib import Path
+from shutil import rmtree
+from tempfile import mkdtemp
+from warnings import warn
+
+import numpy as np
+from hdmf.testing import TestCase
+from numpy.testing import assert_allclose, assert_array_equal
+from pynwb import NWBHDF5IO
+from pynwb.testing.mock.file import mock_NWBFile
+
+from ndx_holographic_stimulation import DeliveredDose
+from ndx_holographic_stimulation.dose import compute_delivered_dose, data_checksum
+from ndx_holographic_stimulation.run_length import encode_run_length
+
+from .mock import mock_PatternedOptogeneticSeries, mock_SpiralScanning
+from .test_schedule import DURATION, ISI, N_PRESENTATIONS, RATE, _dense_pulses
+
+
+def _reference_presentation_energy(times, data, schedule, region):
+    """Trapezoidal energy of each presentation, integrating the linear interpolation of the power."""
+    energy = []
+    for roi, onset, offset in zip(schedule.rois, schedule.onset, schedule.offset):
+        column = list(region).index(roi)
+        t = np.union1d(times[(times > onset) & (times < offset)], [onset, offset])
+        energy.append(np.trapz(np.interp(t, times, data[:, column]), t))
+    return np.array(energy)
+
+
+class TestComputeDeliveredDose(TestCase):
+    def setUp(self):
+        self.pattern = mock_SpiralScanning(
+            duration=DURATION, number_of_stimulus_presentation=N_PRESENTATIONS, inter_stimulus_interval=ISI
+        )
+        self.data = _dense_pulses()
+        self.timestamps = np.arange(len(self.data)) / RATE
+
+    def test_per_roi(self):
+        data = np.zeros((101, 3))
+        data[:, 0] = 2.0
+        data[:, 1] = np.linspace(0.0, 1.0, 101)  # ramp, integrated exactly by the trapezoidal rule
+        series = mock_PatternedOptogeneticSeries(data=data, timestamps=np.linspace(0.0, 10.0, 101))
+        dose = compute_delivered_dose(series)
+        self.assertIsInstance(dose, DeliveredDose)
+        self.assertEqual(dose.integration, "trapezoid")
+        assert_allclose(dose.energy, [20.0, 5.0, 0.0])
+        assert_allclose(dose.peak_power, [2.0, 1.0, 0.0])
+        assert_allclose(dose.mean_power, [2.0, 0.5, 0.0])
+        assert_allclose(dose.stimulated_time, [10.0, 9.9, 0.0])
+        self.assertAlmostEqual(dose.total_energy, 25.0)
+        self.assertEqual(dose.source_num_times, 101)
+        self.assertEqual(dose.source_checksum, data_checksum(data))
+
+    def test_blocks_match_single_pass(self):
+        series = mock_PatternedOptogeneticSeries(
+            data=self.data, timestamps=self.timestamps, stimulus_pattern=self.pattern
+        )
+        whole = compute_delivered_dose(series, block_rows=len(self.data))
+        blocks = compute_delivered_dose(series, block_rows=97)
+        for field in ("energy", "peak_power", "mean_power", "stimulated_time"):
+            assert_allclose(getattr(blocks, field), getattr(whole, field))
+        assert_allclose(blocks.presentation_energy, whole.presentation_energy)
+        self.assertEqual(blocks.source_checksum, whole.source_checksum)
+
+    def test_presentations(self):
+        series = mock_PatternedOptogeneticSeries(data=self.data, rate=RATE, stimulus_pattern=self.pattern)
+        dose = compute_delivered_dose(series, block_rows=333)
+        schedule = series.get_stimulus_schedule()
+        presentations = dose.get_presentation_dose()
+        assert_array_equal(presentations.rois, schedule.rois)
+        assert_allclose(presentations.onset, schedule.onset)
+        assert_allclose(
+            presentations.energy,
+            _reference_presentation_energy(self.timestamps, self.data, schedule, series.rois.data[:]),
+        )
+        # every presentation ends one sample before its offset: 9 samples at 1 W plus half a sample
+        assert_allclose(presentations.energy, 9.5 / RATE)
+        assert_allclose(dose.energy, [20 * DURATION, 10 * DURATION, 0.0])
+
+    def test_step_continuity(self):
+        encoding = encode_run_length(self.data, self.timestamps)
+        series = mock_PatternedOptogeneticSeries(
+            data=encoding.values, timestamps=encoding.change_times, continuity="step", stimulus_pattern=self.pattern
+        )
+        dose = compute_delivered_dose(series, block_rows=7)
+        self.assertEqual(dose.integration, "step")
+        assert_allclose(dose.get_presentation_dose().energy, DURATION)
+        assert_allclose(dose.energy, [20 * DURATION, 10 * DURATION, 0.0])
+        assert_allclose(dose.stimulated_time, [20 * DURATION, 10 * DURATION, 0.0])
+
+
+class TestDeliveredDoseCache(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.test_dir = Path(mkdtemp())
+
+    @classmethod
+    def tearDownClass(cls):
+        try:
+            rmtree(cls.test_dir)
+        except PermissionError:  # Windows CI bug
+            warn(f"Unable to fully clean the temporary directory: {cls.test_dir}\n\nPlease remove it manually.")
+
+    def setUp(self):
+        self.nwbfile = mock_NWBFile()
+        self.data = _dense_pulses()
+        self.series = mock_PatternedOptogeneticSeries(
+            name="PatternedOptogeneticSeries",
+            data=self.data,
+            rate=RATE,
+            stimulus_pattern=mock_SpiralScanning(
+                duration=DURATION, number_of_stimulus_presentation=N_PRESENTATIONS, inter_stimulus_interval=ISI,
+                nwbfile=self.nwbfile,
+            ),
+            nwbfile=self.nwbfile,
+        )
+
+    def test_memoized(self):
+        dose = self.series.get_delivered_dose()
+        self.assertIsNone(self.series.delivered_dose)
+        self.assertIs(self.series.get_delivered_dose(), dose)
+        other = self.series.get_delivered_dose(threshold=0.5)
+        self.assertIsNot(other, dose)
+        self.assertIs(self.series.get_delivered_dose(threshold=0.5), other)
+
+    def test_store(self):
+        dose = self.series.get_delivered_dose()
+        self.assertIs(self.series.get_delivered_dose(store=True), dose)
+        self.assertIs(self.series.delivered_dose, dose)
+        other = self.series.get_delivered_dose(threshold=0.5, store=True)
+        self.assertIsNot(other, dose)
+        self.assertIs(self.series.delivered_dose, dose)  # stored aggregates are not replaced
+
+    def test_roundtrip(self):
+        dose = self.series.get_delivered_dose(store=True)
+        path = self.test_dir / "dose.nwb"
+        with NWBHDF5IO(path, mode="w") as io:
+            io.write(self.nwbfile)
+
+        with NWBHDF5IO(path, mode="r") as io:
+            series_in = io.read().stimulus["PatternedOptogeneticSeries"]
+            stored = series_in.delivered_dose
+            self.assertIsInstance(stored, DeliveredDose)
+            self.assertContainerEqual(stored, dose, ignore_hdmf_attrs=True)
+            self.assertTrue(stored.is_current(series_in, verify=True))
+            self.assertIs(series_in.get_delivered_dose(verify=True), stored)
+            assert_allclose(stored.get_presentation_dose().energy, 9.5 / RATE)
+
+    def test_stale(self):
+        dose = self.series.get_delivered_dose()
+        longer = mock_PatternedOptogeneticSeries(
+            data=np.vstack([self.data, self.data]),
+            rate=RATE,
+            stimulus_pattern=self.series.stimulus_pattern,
+            delivered_dose=compute_delivered_dose(self.series),
+        )
+        stored = longer.delivered_dose
+        self.assertFalse(stored.is_current(longer))
+        refreshed = longer.get_delivered_dose(store=True)
+        self.assertIsNot(refreshed, stored)
+        self.assertIs(longer.delivered_dose, stored)  # stored aggregates are not replaced
+        assert_allclose(refreshed.energy, 2 * dose.energy)
+
+        changed = self.data.copy()
+        changed[0, 0] = 5.0
+        same_length = mock_PatternedOptogeneticSeries(
+            data=changed, rate=RATE, delivered_dose=compute_delivered_dose(self.series)
+        )
+        self.assertTrue(same_length.delivered_dose.is_current(same_length))
+        self.assertFalse(same_length.delivered_dose.is_current(same_length, verify=True))
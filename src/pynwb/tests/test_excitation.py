@@ -0,0 +1,213 @@
+from pathlib import Path
+from shutil import rmtree
+from tempfile import mkdtemp
+from warnings import warn
+
+import h5py
+import numpy as np
+from hdmf.testing import TestCase
+from numpy.testing import assert_allclose, assert_array_equal
+from pynwb import NWBHDF5IO
+from pynwb.ophys import PlaneSegmentation
+from pynwb.testing.mock.file import mock_NWBFile
+from pynwb.testing.mock.ophys import mock_ImagingPlane
+
+from ndx_holographic_stimulation import TemporalFocusing
+from ndx_holographic_stimulation.excitation import ExcitationModel
+from ndx_holographic_stimulation.temporal_focusing import (
+    PointSpreadFunction,
+    format_point_spread_function,
+    parse_point_spread_function,
+)
+
+PSF = PointSpreadFunction(lateral=9e-6, axial=32e-6)
+PIXEL_SIZE = 1e-6
+# ROI centers, in pixels, on a 100 x 100 plane
+CENTERS = [(20, 20), (30, 22), (70, 70), (90, 15)]
+
+
+def _temporal_focusing(**kwargs):
+    return TemporalFocusing(
+        name="temporal_focusing",
+        description="temporal focusing pattern",
+        duration=0.01,
+        number_of_stimulus_presentation=5,
+        inter_stimulus_interval=0.05,
+        **kwargs,
+    )
+
+
+def _plane_segmentation(masks="pixel_mask", **kwargs):
+    plane_segmentation = PlaneSegmentation(
+        name="PlaneSegmentation", description="rois", imaging_plane=mock_ImagingPlane(**kwargs)
+    )
+    for cx, cy in CENTERS:
+        x, y = np.mgrid[cx - 2:cx + 3, cy - 2:cy + 3]
+        weight = np.linspace(0.5, 1.0, x.size)
+        if masks == "pixel_mask":
+            plane_segmentation.add_roi(pixel_mask=list(zip(x.ravel().tolist(), y.ravel().tolist(), weight)))
+        else:
+            image_mask = np.zeros((100, 100))
+            image_mask[x.ravel(), y.ravel()] = weight
+            plane_segmentation.add_roi(image_mask=image_mask)
+    return plane_segmentation
+
+
+def _brute_force(targets, origin=(0.0, 0.0, 0.0)):
+    """Excitation of each ROI of _plane_segmentation by each target, summing the profile over every mask pixel."""
+    result = np.zeros((len(targets), len(CENTERS)))
+    for j, (cx, cy) in enumerate(CENTERS):
+        x, y = np.mgrid[cx - 2:cx + 3, cy - 2:cy + 3]
+        weight = np.linspace(0.5, 1.0, x.size)
+        px, py = origin[0] + x.ravel() * PIXEL_SIZE, origin[1] + y.ravel() * PIXEL_SIZE
+        for i, (tx, ty, tz) in enumerate(targets):
+            d2 = ((px - tx) ** 2 + (py - ty) ** 2) / PSF.lateral ** 2 + ((tz - origin[2]) / PSF.axial) ** 2
+            result[i, j] = np.sum(weight * np.exp(-4 * np.log(2) * d2)) / weight.sum()
+    return result
+
+
+class TestPointSpreadFunction(TestCase):
+    def test_parse(self):
+        for text, expected in [
+            ("9e-6 m ± 0.7e-6 m", (9e-6, 0.7e-6)),
+            ("9 um ± 0.7 um", (9e-6, 0.7e-6)),
+            ("9 ± 0.7 µm", (9e-6, 0.7e-6)),
+            ("9um +/- 700nm", (9e-6, 0.7e-6)),
+            (" 32 ", (32e-6, None)),
+            ("0.032 mm", (32e-6, None)),
+        ]:
+            with self.subTest(text=text):
+                mean, sd = parse_point_spread_function(text)
+                self.assertAlmostEqual(mean, expected[0], places=15)
+                if expected[1] is None:
+                    self.assertIsNone(sd)
+                else:
+                    self.assertAlmostEqual(sd, expected[1], places=15)
+        with self.assertRaisesWith(ValueError, "cannot parse point spread function 'about 9 um', expected e.g. "
+                                               "'9e-6 m ± 0.7e-6 m'"):
+            parse_point_spread_function("about 9 um")
+        with self.assertRaisesWith(ValueError, "unknown length unit 'ft'"):
+            parse_point_spread_function("9 ft")
+
+    def test_format(self):
+        for mean, sd in [(9e-6, 7e-7), (3.2e-05, None), (1.23456789e-5, 1e-7)]:
+            self.assertEqual(parse_point_spread_function(format_point_spread_function(mean, sd)), (mean, sd))
+
+    def test_temporal_focusing(self):
+        pattern = _temporal_focusing(lateral_point_spread_function="9e-6 m ± 0.7e-6 m",
+                                     axial_point_spread_function="32 um ± 1.6 um")
+        self.assertEqual(pattern.lateral_point_spread_function_mean, 9e-6)
+        self.assertEqual(pattern.lateral_point_spread_function_sd, 0.7e-6)
+        self.assertAlmostEqual(pattern.axial_point_spread_function_mean, 32e-6, places=15)
+        self.assertAlmostEqual(pattern.axial_point_spread_function_sd, 1.6e-6, places=15)
+        self.assertEqual(pattern.point_spread_function.lateral, 9e-6)
+
+        pattern = _temporal_focusing(lateral_point_spread_function_mean=9e-6, axial_point_spread_function_mean=32e-6,
+                                     axial_point_spread_function_sd=1.6e-6)
+        self.assertEqual(pattern.lateral_point_spread_function, "9e-06 m")
+        self.assertEqual(pattern.axial_point_spread_function, "3.2e-05 m ± 1.6e-06 m")
+        self.assertEqual(pattern.point_spread_function, PSF)
+
+        # free text is kept, but has no numeric point spread function
+        pattern = _temporal_focusing(lateral_point_spread_function="about 9 um", axial_point_spread_function="32 um")
+        self.assertIsNone(pattern.lateral_point_spread_function_mean)
+        with self.assertRaisesWith(ValueError, "the point spread function of 'temporal_focusing' is not numeric: "
+                                               "'about 9 um', '32 um'"):
+            pattern.point_spread_function
+        with self.assertRaisesWith(ValueError, "axial_point_spread_function or axial_point_spread_function_mean "
+                                               "is required"):
+            _temporal_focusing(lateral_point_spread_function="9 um")
+
+
+class TestExcitationModel(TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.targets = np.column_stack([rng.uniform(0, 100e-6, (50, 2)), rng.uniform(-20e-6, 20e-6, 50)])
+        self.targets[:4, :2] = np.array(CENTERS) * PIXEL_SIZE  # targets on the ROI centers, in the plane
+        self.targets[:4, 2] = 0
+
+    def test_excitation(self):
+        for masks in ("pixel_mask", "image_mask"):
+            with self.subTest(masks=masks):
+                model = ExcitationModel(_plane_segmentation(masks), PSF, pixel_size=PIXEL_SIZE)
+                excitation = model.excitation(self.targets)
+                self.assertEqual(excitation.shape, (50, len(CENTERS)))
+                self.assertEqual(excitation.dtype, np.float32)
+                assert_allclose(excitation, _brute_force(self.targets), atol=1e-6)
+                self.assertTrue(np.all(np.diag(excitation[:4]) > 0.8))
+
+    def test_imaging_plane_geometry(self):
+        origin = (10e-6, -5e-6, 15e-6)
+        plane_segmentation = _plane_segmentation(grid_spacing=[1.0, 1.0], grid_spacing_unit="micrometers",
+                                                 origin_coords=[1e-2, -5e-3, 1.5e-2], origin_coords_unit="mm")
+        model = ExcitationModel(plane_segmentation, _temporal_focusing(lateral_point_spread_function="9 um",
+                                                                       axial_point_spread_function="32 um"))
+        assert_allclose(model.pixel_size, [PIXEL_SIZE, PIXEL_SIZE])
+        assert_allclose(model.origin, origin)
+        targets = self.targets + origin
+        assert_allclose(model.excitation(targets), _brute_force(targets, origin), atol=1e-6)
+
+        with self.assertRaisesWith(ValueError, "pixel_size is required when the imaging plane has no grid_spacing"):
+            ExcitationModel(_plane_segmentation(), PSF)
+
+    def test_cutoff(self):
+        model = ExcitationModel(_plane_segmentation(), PSF, pixel_size=PIXEL_SIZE)
+        far = [[20e-6, 20e-6, 3 * PSF.axial], [1e-3, 1e-3, 0.0]]
+        assert_array_equal(model.excitation(far), np.zeros((2, len(CENTERS))))
+
+    def test_cache(self):
+        model = ExcitationModel(_plane_segmentation(), PSF, pixel_size=PIXEL_SIZE, batch_size=4, cache_size=30)
+        session = self.targets[np.random.default_rng(1).integers(0, 50, 1000)]
+        excitation = model.excitation(session)
+        info = model.cache_info()
+        self.assertEqual(info.misses, len(np.unique(session, axis=0)))
+        self.assertEqual(info.size, 30)
+        assert_allclose(excitation, _brute_force(session), atol=1e-6)
+
+        assert_array_equal(model.excitation(session), excitation)
+        self.assertEqual(model.cache_info().hits, 30)
+        model.cache_clear()
+        self.assertEqual(model.cache_info(), (0, 0, 0, 30))
+
+    def test_off_target(self):
+        model = ExcitationModel(_plane_segmentation(), PSF, pixel_size=PIXEL_SIZE)
+        targets = self.targets[:4]
+        excitation = model.excitation(targets)
+        off_target = model.off_target(targets, [0, 1, 2, -1], threshold=0.01)
+        assert_array_equal(off_target.on_target[:3], np.diag(excitation)[:3])
+        self.assertTrue(np.isnan(off_target.on_target[3]))
+        # the ROIs at (20, 20) and (30, 22) excite each other, the two others are isolated
+        assert_array_equal(off_target.max_off_target, [excitation[0, 1], excitation[1, 0], 0, excitation[3, 3]])
+        assert_array_equal(off_target.num_off_target, [1, 1, 0, 1])
+
+
+class TestTemporalFocusingIO(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.test_dir = Path(mkdtemp())
+
+    @classmethod
+    def tearDownClass(cls):
+        try:
+            rmtree(cls.test_dir)
+        except PermissionError:  # Windows CI bug
+            warn(f"Unable to fully clean the temporary directory: {cls.test_dir}\n\nPlease remove it manually.")
+
+    def test_roundtrip(self):
+        nwbfile = mock_NWBFile()
+        nwbfile.add_lab_meta_data(_temporal_focusing(lateral_point_spread_function="9 um ± 0.7 um",
+                                                     axial_point_spread_function="32 um ± 1.6 um"))
+        path = self.test_dir / "temporal_focusing.nwb"
+        with NWBHDF5IO(path, mode="w") as io:
+            io.write(nwbfile)
+
+        with NWBHDF5IO(path, mode="r") as io:
+            pattern = io.read().lab_meta_data["temporal_focusing"]
+            self.assertIsInstance(pattern, TemporalFocusing)
+            self.assertEqual(pattern.lateral_point_spread_function, "9 um ± 0.7 um")
+            self.assertAlmostEqual(pattern.lateral_point_spread_function_sd, 0.7e-6, places=15)
+            self.assertAlmostEqual(pattern.point_spread_function.axial, 32e-6, places=15)
+
+        with h5py.File(path, "r") as file:  # the numbers are stored, not only parsed on read
+            attributes = file["general/temporal_focusing"].attrs
+            self.assertAlmostEqual(attributes["axial_point_spread_function_mean"], 32e-6, places=15)
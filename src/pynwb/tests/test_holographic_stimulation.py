@@ -24,6 +24,14 @@ from shutil import rmtree
 from tempfile import mkdtemp
 from warnings import warn
 
+from .mock import (
+    mock_LightSource,
+    mock_PatternedOptogeneticSeries,
+    mock_PatternedOptogeneticStimulusSite,
+    mock_SpatialLightModulator,
+    mock_SpiralScanning,
+)
+
 
 class TestPatternedOptogeneticSeries(TestCase):
     @classmethod
@@ -399,4 +407,69 @@ class TestPatternedOptogeneticSeries(TestCase):
             assert_array_equal(nwbfile_in.stimulus[self.series_name].data, data)
 
             assert self.site_name in nwbfile_in.ogen_sites.keys()
-            assert self.temporal_focusing_name in nwbfile_in.lab_meta_data.keys()
\ No newline at end of file
+            assert self.temporal_focusing_name in nwbfile_in.lab_meta_data.keys()
+
+
+class TestLinkNames(TestCase):
+    """The spec names the links of a series, not the objects they link to."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.test_dir = Path(mkdtemp())
+
+    @classmethod
+    def tearDownClass(cls):
+        try:
+            rmtree(cls.test_dir)
+        except PermissionError:  # Windows CI bug
+            warn(f"Unable to fully clean the temporary directory: {cls.test_dir}\n\nPlease remove it manually.")
+
+    def _series(self, nwbfile, session):
+        return mock_PatternedOptogeneticSeries(
+            name=session + "_series",
+            site=mock_PatternedOptogeneticStimulusSite(
+                name=session + "_site", device=mock_Device(name=session + "_device", nwbfile=nwbfile), nwbfile=nwbfile
+            ),
+            device=nwbfile.devices[session + "_device"],
+            stimulus_pattern=mock_SpiralScanning(name=session + "_pattern", nwbfile=nwbfile),
+            spatial_light_modulator=mock_SpatialLightModulator(name=session + "_slm", nwbfile=nwbfile),
+            light_source=mock_LightSource(name=session + "_laser", nwbfile=nwbfile),
+            nwbfile=nwbfile,
+        )
+
+    def test_any_object_name(self):
+        nwbfile = mock_NWBFile()
+        series = self._series(nwbfile, "day1")
+        self.assertEqual(series.site.name, "day1_site")
+        self.assertEqual(series.light_source.name, "day1_laser")
+
+    def test_roundtrip_several_sessions(self):
+        nwbfile = mock_NWBFile()
+        for session in ("day1", "day2"):
+            self._series(nwbfile, session)
+        path = self.test_dir / "sessions.nwb"
+        with NWBHDF5IO(path, mode="w") as io:
+            io.write(nwbfile)
+
+        with NWBHDF5IO(path, mode="r") as io:
+            nwbfile_in = io.read()
+            for session in ("day1", "day2"):
+                series = nwbfile_in.stimulus[session + "_series"]
+                self.assertIs(series.site, nwbfile_in.ogen_sites[session + "_site"])
+                self.assertIs(series.device, nwbfile_in.devices[session + "_device"])
+                self.assertIs(series.stimulus_pattern, nwbfile_in.lab_meta_data[session + "_pattern"])
+                self.assertIs(series.spatial_light_modulator, nwbfile_in.devices[session + "_slm"])
+                self.assertIs(series.light_source, nwbfile_in.devices[session + "_laser"])
+                # the links keep the names of the spec
+                self.assertEqual(
+                    sorted(io._file["stimulus/presentation/%s_series" % session].keys()),
+                    ["data", "device", "light_source", "rois", "site", "spatial_light_modulator",
+                     "stimulus_pattern", "timestamps"],
+                )
+
+    def test_child_names(self):
+        # groups and datasets of the series still have the name of the spec
+        series = mock_PatternedOptogeneticSeries()
+        with self.assertRaisesWith(ValueError, "Field 'rois' on PatternedOptogeneticSeries must be named 'rois'."):
+            mock_PatternedOptogeneticSeries(rois=series.rois.table.create_roi_table_region(
+                region=[0], description="first roi", name="first_roi"))
@@ -0,0 +1,120 @@
+import gc
+import weakref
+from pathlib import Path
+from shutil import rmtree
+from tempfile import mkdtemp
+from warnings import warn
+
+import numpy as np
+from hdmf.testing import TestCase
+from numpy.testing import assert_array_equal
+from pynwb import NWBHDF5IO
+from pynwb.testing.mock.file import mock_NWBFile
+
+from ndx_holographic_stimulation import PatternedOptogeneticSeries
+from ndx_holographic_stimulation.lazy_io import LazyNWBHDF5IO
+
+from .mock import mock_PatternedOptogeneticSeries
+
+NUM_SERIES = 5
+
+
+class TestLazyNWBHDF5IO(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.test_dir = Path(mkdtemp())
+        cls.path = cls.test_dir / "many_series.nwb"
+        nwbfile = mock_NWBFile()
+        first = mock_PatternedOptogeneticSeries(name="series_0", data=np.zeros((10, 2)), nwbfile=nwbfile)
+        links = dict(
+            rois=first.rois,
+            site=first.site,
+            device=first.device,
+            stimulus_pattern=first.stimulus_pattern,
+            spatial_light_modulator=first.spatial_light_modulator,
+            light_source=first.light_source,
+        )
+        for i in range(1, NUM_SERIES):
+            mock_PatternedOptogeneticSeries(name="series_%d" % i, data=np.full((10, 2), float(i)), nwbfile=nwbfile,
+                                            **links)
+        # a series with the same name as one in stimulus
+        nwbfile.add_acquisition(mock_PatternedOptogeneticSeries(name="series_1", data=np.ones((5, 2)), **links))
+        with NWBHDF5IO(cls.path, mode="w") as io:
+            io.write(nwbfile)
+
+    @classmethod
+    def tearDownClass(cls):
+        try:
+            rmtree(cls.test_dir)
+        except PermissionError:  # Windows CI bug
+            warn(f"Unable to fully clean the temporary directory: {cls.test_dir}\n\nPlease remove it manually.")
+
+    def test_read(self):
+        with LazyNWBHDF5IO(self.path, mode="r") as io:
+            nwbfile = io.read()
+            self.assertEqual(len(nwbfile.stimulus), 0)
+            self.assertEqual(len(nwbfile.acquisition), 0)
+            self.assertIn("site", nwbfile.ogen_sites)
+            self.assertEqual(
+                list(io.series),
+                ["/acquisition/series_1"] + ["/stimulus/presentation/series_%d" % i for i in range(NUM_SERIES)],
+            )
+
+            series = io.series["series_3"]
+            self.assertIsInstance(series, PatternedOptogeneticSeries)
+            self.assertIs(io.series["/stimulus/presentation/series_3"], series)
+            assert_array_equal(series.data[:], np.full((10, 2), 3.0))
+            self.assertIs(series.site, nwbfile.ogen_sites["site"])
+            self.assertIs(series.device, nwbfile.devices["device"])
+            self.assertIs(series.light_source, nwbfile.devices["light_source"])
+            self.assertIs(series.stimulus_pattern, nwbfile.lab_meta_data["stimulus_pattern"])
+            self.assertIs(series.rois.table, nwbfile.processing["ophys"][series.rois.table.name])
+            self.assertIs(series.rois.table.parent, nwbfile.processing["ophys"])
+            self.assertIs(series.rois.parent, series)
+            assert_array_equal(io.series["/acquisition/series_1"].data[:], np.ones((5, 2)))
+
+            self.assertIn("series_0", io.series)
+            self.assertNotIn("series_1", io.series)  # ambiguous
+            with self.assertRaisesWith(KeyError, "\"'series_1' names several series, use its path\""):
+                io.series["series_1"]
+            with self.assertRaisesWith(KeyError, "'missing'"):
+                io.series["missing"]
+
+    def test_cache(self):
+        with LazyNWBHDF5IO(self.path, mode="r", cache_size=2) as io:
+            io.read()
+            first = io.series["series_0"]
+            io.series["series_2"]
+            self.assertIs(io.series["series_0"], first)
+            self.assertEqual((io.series.hits, io.series.misses), (1, 2))
+            io.series["series_3"]  # evicts series_2, the least recently used
+            io.series["series_0"]
+            io.series["series_2"]
+            self.assertEqual((io.series.hits, io.series.misses), (2, 4))
+            # a series read again resolves its links to the same objects
+            self.assertIs(io.series["series_4"].site, first.site)
+
+    def test_evicted_series_are_freed(self):
+        paths = ["/stimulus/presentation/series_%d" % i for i in range(NUM_SERIES)]
+        with LazyNWBHDF5IO(self.path, mode="r", cache_size=2) as io:
+            nwbfile = io.read()
+            alive = []
+            for _ in range(3):
+                for path in paths:
+                    alive.append(weakref.ref(io.series[path]))
+            gc.collect()
+            self.assertEqual(sum(ref() is not None for ref in alive), 2)
+            # the series are not read through HDF5IO, whose builders live as long as the file is open
+            for path in paths:
+                with self.assertRaises(ValueError):
+                    io.get_builder(io._file[path])
+            self.assertIs(io.series[paths[0]].site, nwbfile.ogen_sites["site"])
+
+    def test_series_without_read(self):
+        with LazyNWBHDF5IO(self.path, mode="r") as io:
+            series = io.series["series_2"]
+            self.assertIs(series.site, io.read().ogen_sites["site"])
+
+    def test_read_only(self):
+        with self.assertRaisesWith(ValueError, "LazyNWBHDF5IO only reads files, got mode 'a'"):
+            LazyNWBHDF5IO(self.path, mode="a")
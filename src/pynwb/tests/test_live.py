@@ -0,0 +1,150 @@
+import os
+import subprocess
+import sys
+import textwrap
+import time
+from pathlib import Path
+from shutil import rmtree
+from tempfile import mkdtemp
+from warnings import warn
+
+import h5py
+import numpy as np
+from hdmf.testing import TestCase
+from numpy.testing import assert_array_equal
+from pynwb import NWBHDF5IO
+from pynwb.testing.mock.file import mock_NWBFile
+
+import ndx_holographic_stimulation
+from ndx_holographic_stimulation.live import LiveSeriesWriter, live_data_io
+
+from .mock import mock_PatternedOptogeneticSeries
+
+NUM_ROIS = 4
+
+
+def _live_nwbfile():
+    nwbfile = mock_NWBFile()
+    series = mock_PatternedOptogeneticSeries(
+        name="PatternedOptogeneticSeries", data=live_data_io(NUM_ROIS), timestamps=live_data_io(dtype=np.float64),
+        n_rois=NUM_ROIS, nwbfile=nwbfile,
+    )
+    return nwbfile, series
+
+
+def _rows(num_rows):
+    return np.arange(num_rows) * 1e-3, np.arange(num_rows * NUM_ROIS, dtype=np.float32).reshape(-1, NUM_ROIS)
+
+
+class TestLiveSeriesWriter(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.test_dir = Path(mkdtemp())
+
+    @classmethod
+    def tearDownClass(cls):
+        try:
+            rmtree(cls.test_dir)
+        except PermissionError:  # Windows CI bug
+            warn(f"Unable to fully clean the temporary directory: {cls.test_dir}\n\nPlease remove it manually.")
+
+    def _read(self, path, swmr=False):
+        h5_file = h5py.File(path, "r", libver="latest", swmr=swmr)
+        with NWBHDF5IO(mode="r", file=h5_file) as io:
+            series = io.read().stimulus["PatternedOptogeneticSeries"]
+            return series.timestamps[:], series.data[:]
+
+    def test_append(self):
+        path = self.test_dir / "append.nwb"
+        timestamps, power = _rows(5000)
+        nwbfile, series = _live_nwbfile()
+        # a buffer much smaller than the recording: producers wait for the background writes
+        with LiveSeriesWriter(path, nwbfile, series, buffer_rows=64, flush_interval=0.01) as writer:
+            for t, row in zip(timestamps[:3000], power[:3000]):
+                writer.append(t, row)
+            writer.append_rows(timestamps[3000:], power[3000:])
+        stats = writer.stats()
+        self.assertEqual((stats.rows_appended, stats.rows_written), (5000, 5000))
+        self.assertGreater(stats.writes, 5000 // 64)
+        timestamps_in, power_in = self._read(path)
+        assert_array_equal(timestamps_in, timestamps)
+        assert_array_equal(power_in, power)
+
+    def test_flush_is_a_durability_point(self):
+        path = self.test_dir / "flush.nwb"
+        timestamps, power = _rows(100)
+        nwbfile, series = _live_nwbfile()
+        with LiveSeriesWriter(path, nwbfile, series, flush_interval=60.0) as writer:
+            writer.append_rows(timestamps[:60], power[:60])
+            self.assertTrue(writer.flush(timeout=10.0))
+            self.assertEqual(writer.stats().rows_written, 60)
+            writer.append_rows(timestamps[60:], power[60:])
+        self.assertEqual(writer.stats().rows_written, 100)
+
+    def test_crash_keeps_flushed_rows(self):
+        """A process killed without closing the file leaves every row up to the last durability point."""
+        path = self.test_dir / "crash.nwb"
+        script = textwrap.dedent("""
+            import os, sys
+            import numpy as np
+            sys.path.insert(0, %r)
+            from tests.test_live import _live_nwbfile, _rows
+            from ndx_holographic_stimulation.live import LiveSeriesWriter
+
+            timestamps, power = _rows(1000)
+            nwbfile, series = _live_nwbfile()
+            writer = LiveSeriesWriter(%r, nwbfile, series, flush_interval=60.0)
+            writer.append_rows(timestamps[:700], power[:700])
+            writer.flush()
+            writer.append_rows(timestamps[700:], power[700:])  # never flushed
+            os._exit(0)
+        """) % (str(Path(ndx_holographic_stimulation.__file__).parents[1]), str(path))
+        subprocess.run([sys.executable, "-c", script], check=True, cwd=self.test_dir)
+        timestamps, power = _rows(700)
+        # the file is still marked as open by a SWMR writer: a SWMR reader opens it
+        timestamps_in, power_in = self._read(path, swmr=True)
+        assert_array_equal(timestamps_in, timestamps)
+        assert_array_equal(power_in, power)
+
+    def test_latency_and_throughput(self):
+        path = self.test_dir / "latency.nwb"
+        num_rows, flush_interval = 20000, 0.05
+        timestamps, power = _rows(num_rows)
+        nwbfile, series = _live_nwbfile()
+        latencies = np.empty(num_rows)
+        with LiveSeriesWriter(path, nwbfile, series, flush_interval=flush_interval) as writer:
+            start = time.perf_counter()
+            for i in range(num_rows):
+                t0 = time.perf_counter()
+                writer.append(timestamps[i], power[i])
+                latencies[i] = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            writer.flush()
+            flush_latency = time.perf_counter() - t0
+            throughput = num_rows / (time.perf_counter() - start)
+        stats = writer.stats()
+        # appends only copy into the buffer; the bounds are loose so that slow CI machines pass
+        self.assertLess(np.median(latencies), 1e-3)
+        self.assertGreater(throughput, 2000)
+        self.assertLess(flush_latency, 1.0)
+        self.assertEqual(stats.rows_written, num_rows)
+        self.assertLess(stats.max_lag, flush_interval + 1.0)
+        self.assertLess(stats.write_seconds, time.perf_counter() - start)
+
+    def test_errors(self):
+        nwbfile, series = _live_nwbfile()
+        with LiveSeriesWriter(self.test_dir / "errors.nwb", nwbfile, series) as writer:
+            writer.append(1.0, np.zeros(NUM_ROIS))
+            with self.assertRaisesWith(ValueError, "timestamps of series 'PatternedOptogeneticSeries' must be "
+                                                   "strictly increasing, got 1.0 after 1.0"):
+                writer.append(1.0, np.zeros(NUM_ROIS))
+            with self.assertRaisesWith(ValueError, "expected power of shape (1, 4) for 1 timestamps, got (1, 3)"):
+                writer.append(2.0, np.zeros(3))
+        with self.assertRaisesWith(ValueError, "live recording of series 'PatternedOptogeneticSeries' is closed"):
+            writer.append(3.0, np.zeros(NUM_ROIS))
+
+        nwbfile = mock_NWBFile()
+        series = mock_PatternedOptogeneticSeries(name="fixed", nwbfile=nwbfile)
+        with self.assertRaisesWith(ValueError, "/stimulus/presentation/fixed/data of series 'fixed' is not "
+                                               "resizable, create it with live_data_io"):
+            LiveSeriesWriter(os.path.join(self.test_dir, "fixed.nwb"), nwbfile, series)
@@ -0,0 +1,100 @@
+from pathlib import Path
+from shutil import rmtree
+from tempfile import mkdtemp
+from warnings import warn
+
+import h5py
+import numpy as np
+from hdmf.backends.hdf5 import H5DataIO
+from hdmf.testing import TestCase
+from numpy.testing import assert_array_equal
+from pynwb import NWBHDF5IO
+from pynwb.testing.mock.file import mock_NWBFile
+
+from ndx_holographic_stimulation.memmap import memmap_dataset, memmap_nwbfile
+
+from .mock import mock_PatternedOptogeneticSeries
+
+NUM_TIMES, NUM_ROIS = 1000, 6
+
+
+class TestMemmap(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.test_dir = Path(mkdtemp())
+        rng = np.random.default_rng(0)
+        cls.data = rng.random((NUM_TIMES, NUM_ROIS), dtype=np.float32)
+        cls.timestamps = np.cumsum(rng.uniform(1e-3, 2e-3, NUM_TIMES))
+
+        # contiguous data and timestamps
+        cls.contiguous_path = cls.test_dir / "contiguous.nwb"
+        nwbfile = mock_NWBFile()
+        mock_PatternedOptogeneticSeries(name="series", data=cls.data, timestamps=cls.timestamps, nwbfile=nwbfile)
+        with NWBHDF5IO(cls.contiguous_path, mode="w") as io:
+            io.write(nwbfile)
+
+        # compressed data, contiguous timestamps
+        cls.chunked_path = cls.test_dir / "chunked.nwb"
+        nwbfile = mock_NWBFile()
+        mock_PatternedOptogeneticSeries(
+            name="series",
+            data=H5DataIO(cls.data, chunks=(100, NUM_ROIS), compression="gzip"),
+            timestamps=cls.timestamps,
+            nwbfile=nwbfile,
+        )
+        with NWBHDF5IO(cls.chunked_path, mode="w") as io:
+            io.write(nwbfile)
+
+    @classmethod
+    def tearDownClass(cls):
+        try:
+            rmtree(cls.test_dir)
+        except PermissionError:  # Windows CI bug
+            warn(f"Unable to fully clean the temporary directory: {cls.test_dir}\n\nPlease remove it manually.")
+
+    def test_contiguous(self):
+        with NWBHDF5IO(self.contiguous_path, mode="r") as io:
+            series = io.read().stimulus["series"]
+            window = series.get_window(0.5, 0.6, rois=[4, 1])  # builds the timestamp index over the dataset
+            self.assertEqual(series.use_memmap(), {"data": None, "timestamps": None})
+            self.assertIsInstance(series.data, np.memmap)
+            self.assertIsInstance(series.timestamps, np.memmap)
+            assert_array_equal(series.data, self.data)
+            assert_array_equal(series.timestamps, self.timestamps)
+            with self.assertRaises(ValueError):  # read-only
+                series.data[0, 0] = 1.0
+
+            memmap_window = series.get_window(0.5, 0.6, rois=[4, 1])
+            self.assertIs(series.timestamp_index.timestamps, series.timestamps)
+            assert_array_equal(memmap_window.data, window.data)
+            assert_array_equal(memmap_window.timestamps, window.timestamps)
+            # mapping again is a no-op
+            self.assertEqual(series.use_memmap(), {"data": None, "timestamps": None})
+        # the map outlives the file
+        assert_array_equal(series.data[-10:], self.data[-10:])
+
+    def test_fallback(self):
+        with NWBHDF5IO(self.chunked_path, mode="r") as io:
+            nwbfile = io.read()
+            series = nwbfile.stimulus["series"]
+            status = memmap_nwbfile(nwbfile)
+            self.assertEqual(status, {series.object_id: {"data": "the dataset is chunked", "timestamps": None}})
+            self.assertNotIsInstance(series.data, np.memmap)
+            self.assertIsInstance(series.timestamps, np.memmap)
+            assert_array_equal(series.data[:], self.data)
+
+        with NWBHDF5IO(self.contiguous_path, mode="a") as io:
+            series = io.read().stimulus["series"]
+            self.assertEqual(series.use_memmap(), {"data": "the file is open for writing",
+                                                   "timestamps": "the file is open for writing"})
+
+        series = mock_PatternedOptogeneticSeries(rate=10.0)
+        self.assertEqual(series.use_memmap(), {"data": "not an HDF5 dataset"})
+
+    def test_memmap_dataset(self):
+        with h5py.File(self.contiguous_path, "r") as file:
+            assert_array_equal(memmap_dataset(file["/stimulus/presentation/series/data"]), self.data)
+            with self.assertRaisesWith(ValueError, "the dataset type object is not numeric"):
+                memmap_dataset(file["/session_description"])
+            with self.assertRaisesWith(ValueError, "not an HDF5 dataset"):
+                memmap_dataset(self.data)
@@ -0,0 +1,129 @@
+from datetime import datetime
+from pathlib import Path
+from shutil import rmtree
+from tempfile import mkdtemp
+from warnings import warn
+
+import numpy as np
+from hdmf.testing import TestCase
+from pynwb import NWBHDF5IO
+from pynwb.testing.mock.file import mock_NWBFile
+
+from ndx_holographic_stimulation import (
+    OptogeneticStimulusPattern,
+    OptogeneticStimulusPatternLibrary,
+    OptogeneticStimulusPatternTable,
+    SpiralScanning,
+    TemporalFocusing,
+)
+
+from .mock import mock_PatternedOptogeneticSeries, mock_SpiralScanning
+
+
+def _temporal_focusing(name="temporal_focusing", duration=10e-3):
+    return TemporalFocusing(
+        name=name,
+        description="temporal focusing",
+        lateral_point_spread_function="9e-6 m ± 0.7e-6 m",
+        axial_point_spread_function="32e-6 m ± 1.6e-6 m",
+        duration=duration,
+        number_of_stimulus_presentation=10,
+        inter_stimulus_interval=0.02,
+    )
+
+
+class TestOptogeneticStimulusPatternTable(TestCase):
+    def test_interning(self):
+        table = OptogeneticStimulusPatternTable()
+        rows = [table.add_pattern(mock_SpiralScanning(name="spiral_%d" % i, duration=(i % 3 + 1) * 1e-3))
+                for i in range(30)]
+        self.assertEqual(len(table), 3)
+        self.assertEqual(rows[:6], [0, 1, 2, 0, 1, 2])
+        self.assertEqual(table.add_pattern(_temporal_focusing()), 3)
+        # same timing as a spiral, but a different pattern type
+        self.assertEqual(table.add_pattern(mock_SpiralScanning(duration=10e-3)), 4)
+        self.assertEqual(table.add_pattern(_temporal_focusing(name="other")), 3)
+
+    def test_interning_point_spread_function(self):
+        # same text, different measured sizes
+        table = OptogeneticStimulusPatternTable()
+        patterns = [
+            TemporalFocusing(name="tf_%d" % i, description="temporal focusing", duration=10e-3,
+                             number_of_stimulus_presentation=10, inter_stimulus_interval=0.02,
+                             lateral_point_spread_function="see notes", axial_point_spread_function="see notes",
+                             lateral_point_spread_function_mean=mean, lateral_point_spread_function_sd=0.7e-6,
+                             axial_point_spread_function_mean=32e-6, axial_point_spread_function_sd=sd)
+            for i, (mean, sd) in enumerate([(9e-6, 1.6e-6), (9.5e-6, 1.6e-6), (9e-6, 2e-6), (9e-6, 1.6e-6)])
+        ]
+        self.assertEqual([table.add_pattern(pattern) for pattern in patterns], [0, 1, 2, 0])
+        pattern = table.get_pattern(1)
+        self.assertEqual(pattern.lateral_point_spread_function, "see notes")
+        self.assertEqual(pattern.lateral_point_spread_function_mean, 9.5e-6)
+        self.assertEqual(pattern.lateral_point_spread_function_sd, 0.7e-6)
+        self.assertEqual(pattern.axial_point_spread_function_sd, 1.6e-6)
+
+    def test_get_pattern(self):
+        table = OptogeneticStimulusPatternTable()
+        table.add_pattern(OptogeneticStimulusPattern(
+            name="generic", description="generic", duration=5e-3, number_of_stimulus_presentation=200,
+            inter_stimulus_interval=0.01,
+        ))
+        table.add_pattern(mock_SpiralScanning())
+
+        generic = table.get_pattern(0)
+        self.assertIs(type(generic), OptogeneticStimulusPattern)
+        self.assertEqual(generic.number_of_stimulus_presentation, 200)
+        spiral = table.get_pattern(1)
+        self.assertIsInstance(spiral, SpiralScanning)
+        self.assertAlmostEqual(spiral.diameter, 15e-6)
+        self.assertEqual(spiral.number_of_revolutions, 5)
+        self.assertIs(table.get_pattern(1), spiral)
+
+
+class TestPatternLibraryRoundtrip(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.test_dir = Path(mkdtemp())
+
+    @classmethod
+    def tearDownClass(cls):
+        try:
+            rmtree(cls.test_dir)
+        except PermissionError:  # Windows CI bug
+            warn(f"Unable to fully clean the temporary directory: {cls.test_dir}\n\nPlease remove it manually.")
+
+    def test_roundtrip(self):
+        path = self.test_dir / "pattern_library.nwb"
+        nwbfile = mock_NWBFile(session_start_time=datetime.now().astimezone())
+        library = OptogeneticStimulusPatternLibrary()
+        nwbfile.add_lab_meta_data(library)
+        library.add_pattern(_temporal_focusing())
+        row = library.add_pattern(mock_SpiralScanning(duration=20e-3))
+        series = mock_PatternedOptogeneticSeries(
+            name="PatternedOptogeneticSeries",
+            stimulus_pattern_index=library.patterns.create_pattern_region(row),
+            nwbfile=nwbfile,
+        )
+        self.assertIsNone(series.stimulus_pattern)
+        self.assertAlmostEqual(series.get_stimulus_pattern().duration, 20e-3)
+
+        with NWBHDF5IO(path, mode="w") as io:
+            io.write(nwbfile, cache_spec=False)
+
+        with NWBHDF5IO(path, mode="r") as io:
+            nwbfile_in = io.read()
+            library_in = nwbfile_in.lab_meta_data["stimulus_pattern_library"]
+            self.assertIsInstance(library_in, OptogeneticStimulusPatternLibrary)
+            self.assertEqual(len(library_in.patterns), 2)
+            series_in = nwbfile_in.stimulus["PatternedOptogeneticSeries"]
+            self.assertIs(series_in.stimulus_pattern_index.table, library_in.patterns)
+            pattern = series_in.get_stimulus_pattern()
+            self.assertIsInstance(pattern, SpiralScanning)
+            self.assertAlmostEqual(pattern.duration, 20e-3)
+            self.assertTrue(np.isnan(library_in.patterns["diameter"].data[0]))
+            temporal_focusing = library_in.patterns.get_pattern(0)
+            self.assertEqual(temporal_focusing.lateral_point_spread_function_mean, 9e-6)
+            self.assertEqual(temporal_focusing.axial_point_spread_function_sd, 1.6e-6)
+            self.assertTrue(np.isnan(library_in.patterns["lateral_point_spread_function_mean"].data[1]))
+            # tables read from a file intern against their existing rows
+            self.assertEqual(library_in.add_pattern(_temporal_focusing()), 0)
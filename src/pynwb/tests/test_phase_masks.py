@@ -0,0 +1,107 @@
+from pathlib import Path
+from shutil import rmtree
+from tempfile import mkdtemp
+from warnings import warn
+
+import numpy as np
+from hdmf.testing import TestCase
+from numpy.testing import assert_array_equal
+from pynwb import NWBHDF5IO
+from pynwb.testing.mock.file import mock_NWBFile
+
+from ndx_holographic_stimulation import SLMPhaseMasks
+from ndx_holographic_stimulation.phase_masks import PhaseMaskBuilder, deduplicate_phase_masks, mask_hash
+
+from .mock import mock_SpatialLightModulator
+
+HEIGHT, WIDTH = 24, 32
+# the mask shown at each display: three distinct masks, each shown many times
+SEQUENCE = [0, 1, 0, 2, 2, 1, 0, 0, 1, 2] * 3
+
+
+def _masks():
+    y, x = np.mgrid[:HEIGHT, :WIDTH]
+    return [((k + 1) * (x + 2 * y) % 256).astype(np.uint8) for k in range(3)]
+
+
+class TestPhaseMaskBuilder(TestCase):
+    def test_deduplicate(self):
+        masks = _masks()
+        timestamps = np.arange(len(SEQUENCE)) * 0.5 + 1.0
+        phase_masks = deduplicate_phase_masks(timestamps, (masks[k] for k in SEQUENCE))
+        self.assertIsInstance(phase_masks, SLMPhaseMasks)
+        self.assertEqual((phase_masks.num_masks, phase_masks.num_displays), (3, len(SEQUENCE)))
+        assert_array_equal(phase_masks.mask_index, SEQUENCE)  # masks are numbered in order of first display
+        self.assertEqual(phase_masks.mask_hash, [mask_hash(mask) for mask in masks])
+        for k, mask in enumerate(masks):
+            assert_array_equal(phase_masks.get_mask(k), mask)
+            self.assertEqual(phase_masks.find_mask(mask.copy()), k)
+        self.assertIsNone(phase_masks.find_mask(np.zeros((HEIGHT, WIDTH), dtype=np.uint8)))
+
+        assert_array_equal(phase_masks.displayed_at([0.0, 1.0, 1.4, 2.6, 100.0]),
+                           [-1, SEQUENCE[0], SEQUENCE[0], SEQUENCE[3], SEQUENCE[-1]])
+        self.assertIsNone(phase_masks.get_displayed_mask(0.5))
+        assert_array_equal(phase_masks.get_displayed_mask(2.6), masks[SEQUENCE[3]])
+
+    def test_compression(self):
+        builder = PhaseMaskBuilder(unit="radians", compression=dict(compression="gzip", compression_opts=9))
+        builder.add(0.0, np.zeros((HEIGHT, WIDTH), dtype=np.float32))
+        phase_masks = builder.finish()
+        self.assertEqual(phase_masks.masks.io_settings["chunks"], (1, HEIGHT, WIDTH))
+        self.assertEqual(phase_masks.masks.io_settings["compression_opts"], 9)
+        self.assertEqual(phase_masks.unit, "radians")
+
+        builder = PhaseMaskBuilder(compression=None)
+        builder.add(0.0, _masks()[0])
+        self.assertIsInstance(builder.finish().masks, np.ndarray)
+
+    def test_errors(self):
+        builder = PhaseMaskBuilder()
+        with self.assertRaisesWith(ValueError, "no phase masks were added"):
+            builder.finish()
+        with self.assertRaisesWith(ValueError, "a phase mask must be height x width, got shape (24,)"):
+            builder.add(0.0, np.zeros(HEIGHT))
+        builder.add(1.0, _masks()[0])
+        with self.assertRaisesWith(ValueError, "timestamps must be strictly increasing, got 1.0 after 1.0"):
+            builder.add(1.0, _masks()[1])
+        with self.assertRaisesWith(ValueError, "mask of shape (24, 32) and dtype uint16 does not match the previous "
+                                               "masks ((24, 32), uint8)"):
+            builder.add(2.0, _masks()[1].astype(np.uint16))
+
+
+class TestPhaseMasksIO(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.test_dir = Path(mkdtemp())
+
+    @classmethod
+    def tearDownClass(cls):
+        try:
+            rmtree(cls.test_dir)
+        except PermissionError:  # Windows CI bug
+            warn(f"Unable to fully clean the temporary directory: {cls.test_dir}\n\nPlease remove it manually.")
+
+    def test_roundtrip(self):
+        masks = _masks()
+        timestamps = np.arange(len(SEQUENCE)) * 0.5
+        nwbfile = mock_NWBFile()
+        mock_SpatialLightModulator(
+            phase_masks=deduplicate_phase_masks(timestamps, [masks[k] for k in SEQUENCE]), nwbfile=nwbfile
+        )
+        path = self.test_dir / "phase_masks.nwb"
+        with NWBHDF5IO(path, mode="w") as io:
+            io.write(nwbfile)
+
+        with NWBHDF5IO(path, mode="r") as io:
+            phase_masks = io.read().devices["spatial_light_modulator"].phase_masks
+            self.assertIsInstance(phase_masks, SLMPhaseMasks)
+            self.assertEqual(phase_masks.masks.shape, (3, HEIGHT, WIDTH))
+            self.assertEqual(phase_masks.masks.chunks, (1, HEIGHT, WIDTH))
+            self.assertEqual(phase_masks.masks.compression, "gzip")
+            self.assertEqual(phase_masks.unit, "gray levels")
+            for k, mask in enumerate(masks):
+                assert_array_equal(phase_masks.get_mask(k), mask)
+                self.assertEqual(mask_hash(phase_masks.get_mask(k)), phase_masks.mask_hash[k])
+                self.assertEqual(phase_masks.find_mask(mask), k)
+            assert_array_equal(phase_masks.timestamps[:], timestamps)
+            assert_array_equal(phase_masks.displayed_at(timestamps), SEQUENCE)
@@ -0,0 +1,86 @@
+from pathlib import Path
+from shutil import rmtree
+from tempfile import mkdtemp
+from warnings import warn
+
+import numpy as np
+from hdmf.backends.hdf5 import HDF5IO
+from hdmf.build import ObjectMapper
+from hdmf.testing import TestCase
+from pynwb import NWBHDF5IO
+from pynwb.testing.mock.file import mock_NWBFile
+
+from ndx_holographic_stimulation import PatternedOptogeneticSeries
+from ndx_holographic_stimulation.profiling import PHASES, profile
+
+from .mock import mock_PatternedOptogeneticSeries
+
+
+class TestProfile(TestCase):
+    def setUp(self):
+        self.test_dir = Path(mkdtemp())
+        self.path = self.test_dir / "profile.nwb"
+
+    def tearDown(self):
+        try:
+            rmtree(self.test_dir)
+        except PermissionError:  # Windows CI bug
+            warn(f"Unable to fully clean the temporary directory: {self.test_dir}\n\nPlease remove it manually.")
+
+    def test_report(self):
+        data = np.zeros((100, 2), dtype=np.float32)
+        timestamps = np.arange(100) / 1000.0
+        with profile() as report:
+            nwbfile = mock_NWBFile()
+            mock_PatternedOptogeneticSeries(name="series", data=data, timestamps=timestamps, nwbfile=nwbfile)
+            with NWBHDF5IO(self.path, mode="w") as io:
+                io.write(nwbfile)
+            with NWBHDF5IO(self.path, mode="r") as io:
+                self.assertIsInstance(io.read().stimulus["series"], PatternedOptogeneticSeries)
+
+        stats = report.stats
+        self.assertEqual(stats[("build", "PatternedOptogeneticSeries")].count, 1)
+        self.assertEqual(stats[("construct", "PatternedOptogeneticSeries")].count, 1)
+        # created, then constructed on read
+        self.assertEqual(stats[("init", "PatternedOptogeneticSeries")].count, 2)
+        # the group, data and timestamps
+        self.assertEqual(stats[("write", "PatternedOptogeneticSeries")].count, 3)
+        self.assertEqual(stats[("read", "PatternedOptogeneticSeries")].count, 3)
+        self.assertEqual(stats[("write", "PatternedOptogeneticSeries")].bytes, data.nbytes + timestamps.nbytes)
+        self.assertEqual(stats[("read", "PatternedOptogeneticSeries")].bytes, data.nbytes + timestamps.nbytes)
+        # the series links to its site, device, pattern, SLM and light source
+        self.assertGreaterEqual(stats[("resolve", "PatternedOptogeneticStimulusSite")].count, 1)
+        self.assertGreater(stats[("validate", "PatternedOptogeneticSeries")].count, 0)
+
+        self.assertEqual(set(report.by_phase()), set(PHASES))
+        self.assertLessEqual(sum(s.seconds for s in report.by_phase().values()), report.seconds)
+        self.assertEqual(report.by_type()["PatternedOptogeneticSeries"].bytes, 2 * (data.nbytes + timestamps.nbytes))
+        df = report.to_dataframe()
+        self.assertEqual(list(df.columns), ["phase", "neurodata_type", "count", "bytes", "seconds"])
+        self.assertEqual(len(df), len(stats))
+        self.assertIn("PatternedOptogeneticSeries", str(report))
+
+    def test_hooks_removed(self):
+        build, read_group = ObjectMapper.build, HDF5IO._HDF5IO__read_group
+        init = PatternedOptogeneticSeries.__init__
+        with profile():
+            self.assertIsNot(ObjectMapper.build, build)
+            self.assertIsNot(PatternedOptogeneticSeries.__init__, init)
+            with self.assertRaisesWith(RuntimeError, "a profile is already active"):
+                with profile():
+                    pass
+        self.assertIs(ObjectMapper.build, build)
+        self.assertIs(HDF5IO._HDF5IO__read_group, read_group)
+        self.assertIs(PatternedOptogeneticSeries.__init__, init)
+
+        with self.assertRaises(ValueError):
+            with profile():
+                raise ValueError
+        self.assertIs(ObjectMapper.build, build)
+
+    def test_disabled(self):
+        build = ObjectMapper.build
+        with profile(enabled=False) as report:
+            self.assertIs(ObjectMapper.build, build)
+            mock_PatternedOptogeneticSeries()
+        self.assertEqual(report.stats, {})
@@ -0,0 +1,146 @@
+from pathlib import Path
+from shutil import rmtree
+from tempfile import mkdtemp
+from warnings import warn
+
+import numpy as np
+from hdmf.testing import TestCase
+from numpy.testing import assert_allclose, assert_array_equal
+from pynwb import NWBHDF5IO
+from pynwb.testing.mock.file import mock_NWBFile
+
+from ndx_holographic_stimulation import PowerPyramid
+from ndx_holographic_stimulation.pyramid import PyramidBuilder, compute_power_pyramid
+from ndx_holographic_stimulation.streaming import iter_blocks, stream_data_io
+
+from .mock import mock_PatternedOptogeneticSeries
+
+RATE = 1000.0
+
+
+def _bins(data, size):
+    """Reference min, max and mean over consecutive bins of ``size`` samples."""
+    edges = range(0, len(data), size)
+    return (np.array([data[i:i + size].min(axis=0) for i in edges]),
+            np.array([data[i:i + size].max(axis=0) for i in edges]),
+            np.array([data[i:i + size].mean(axis=0) for i in edges]))
+
+
+class TestPyramidBuilder(TestCase):
+    def setUp(self):
+        self.data = np.random.default_rng(0).random((1000, 3))
+        self.series = mock_PatternedOptogeneticSeries(data=self.data, rate=RATE)
+
+    def test_levels(self):
+        pyramid = compute_power_pyramid(self.series, first_decimation=16, factor=4, min_bins=4, block_rows=100)
+        self.assertIsInstance(pyramid, PowerPyramid)
+        self.assertEqual(pyramid.source_num_times, 1000)
+        self.assertEqual([level.decimation for level in pyramid.levels], [16, 64, 256])
+        for level in pyramid.levels:
+            size = int(level.decimation)
+            low, high, mean = _bins(self.data, size)
+            assert_array_equal(level.min, low)
+            assert_array_equal(level.max, high)
+            assert_allclose(level.mean, mean, rtol=1e-6)
+            assert_allclose(level.bin_start_time, np.arange(0, 1000, size) / RATE)
+
+    def test_tap(self):
+        builder = PyramidBuilder(first_decimation=16, factor=4, min_bins=4)
+        blocks = list(builder.tap(iter_blocks(self.data, 37), (0.0, RATE)))
+        assert_array_equal(np.concatenate(blocks), self.data)
+        tapped = builder.finish()
+        computed = compute_power_pyramid(self.series, first_decimation=16, factor=4, min_bins=4)
+        for level, expected in zip(tapped.levels, computed.levels):
+            assert_array_equal(level.min, expected.min)
+            assert_array_equal(level.max, expected.max)
+            assert_allclose(level.mean, expected.mean)
+
+    def test_min_bins(self):
+        pyramid = compute_power_pyramid(self.series, first_decimation=16, factor=8, min_bins=1000)
+        self.assertEqual([level.decimation for level in pyramid.levels], [16])
+
+
+class TestDownsampled(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.test_dir = Path(mkdtemp())
+
+    @classmethod
+    def tearDownClass(cls):
+        try:
+            rmtree(cls.test_dir)
+        except PermissionError:  # Windows CI bug
+            warn(f"Unable to fully clean the temporary directory: {cls.test_dir}\n\nPlease remove it manually.")
+
+    def setUp(self):
+        self.data = np.random.default_rng(1).random((100_000, 4)).astype(np.float32)
+        self.timestamps = np.arange(len(self.data)) / RATE
+
+    def test_level_selection(self):
+        series = mock_PatternedOptogeneticSeries(data=self.data, timestamps=self.timestamps)
+        pyramid = series.get_power_pyramid()
+        self.assertIsNone(series.power_pyramid)
+        self.assertEqual(series.get_downsampled(0.0, 100.0, width=500).decimation, 1)
+        self.assertIs(series.get_power_pyramid(store=True), pyramid)
+        self.assertIsInstance(series.power_pyramid, PowerPyramid)
+        self.assertEqual([level.decimation for level in series.power_pyramid.levels], [16, 128])
+
+        trace = series.get_downsampled(0.0, 100.0, width=500)
+        self.assertEqual(trace.decimation, 128)
+        self.assertEqual(len(trace.timestamps), 782)
+        trace = series.get_downsampled(10.0, 20.0, width=500)
+        self.assertEqual(trace.decimation, 16)
+        low, high, _ = _bins(self.data[16 * 625:16 * 1250], 16)
+        assert_array_equal(trace.min, low)
+        assert_array_equal(trace.max, high)
+        trace = series.get_downsampled(10.0, 11.0, width=500)
+        self.assertEqual(trace.decimation, 1)
+        assert_array_equal(trace.max, self.data[10_000:11_000])
+
+    def test_rois(self):
+        series = mock_PatternedOptogeneticSeries(data=self.data, rate=RATE)
+        series.get_power_pyramid(store=True)
+        trace = series.get_downsampled(0.0, 100.0, width=100, rois=[3, 1])
+        assert_array_equal(trace.rois, [3, 1])
+        assert_array_equal(trace.max, series.power_pyramid.levels[-1].max[:, [3, 1]])
+
+    def test_built_while_streaming(self):
+        nwbfile = mock_NWBFile()
+        builder = PyramidBuilder()
+        mock_PatternedOptogeneticSeries(
+            name="PatternedOptogeneticSeries",
+            data=stream_data_io(builder.tap(iter_blocks(self.data, 4096), iter_blocks(self.timestamps, 4096))),
+            timestamps=self.timestamps,
+            n_rois=4,
+            nwbfile=nwbfile,
+        )
+        path = self.test_dir / "streamed.nwb"
+        with NWBHDF5IO(path, mode="w") as io:
+            io.write(nwbfile)
+        # the pyramid is complete once the data is written, and is added to the file without reading the data
+        with NWBHDF5IO(path, mode="a") as io:
+            nwbfile_in = io.read()
+            nwbfile_in.stimulus["PatternedOptogeneticSeries"].power_pyramid = builder.finish()
+            io.write(nwbfile_in)
+
+        with NWBHDF5IO(path, mode="r") as io:
+            series = io.read().stimulus["PatternedOptogeneticSeries"]
+            self.assertIsInstance(series.power_pyramid, PowerPyramid)
+            self.assertIs(series.get_power_pyramid(), series.power_pyramid)
+            trace = series.get_downsampled(0.0, 100.0, width=500)
+            self.assertEqual(trace.decimation, 128)
+            low, high, mean = _bins(self.data, 128)
+            assert_array_equal(trace.min, low)
+            assert_array_equal(trace.max, high)
+            assert_allclose(trace.mean, mean, rtol=1e-5)
+
+    def test_stale_pyramid(self):
+        series = mock_PatternedOptogeneticSeries(
+            data=self.data, rate=RATE, power_pyramid=compute_power_pyramid(
+                mock_PatternedOptogeneticSeries(data=self.data[:50_000], rate=RATE))
+        )
+        self.assertFalse(series.power_pyramid.is_current(series))
+        self.assertEqual(series.get_downsampled(0.0, 100.0, width=500).decimation, 1)
+        stored = series.power_pyramid
+        self.assertEqual(series.get_power_pyramid(store=True).source_num_times, 100_000)
+        self.assertIs(series.power_pyramid, stored)  # stored pyramids are not replaced
@@ -0,0 +1,85 @@
+from datetime import datetime
+from pathlib import Path
+from shutil import rmtree
+from tempfile import mkdtemp
+from warnings import warn
+
+import numpy as np
+from hdmf.testing import TestCase
+from numpy.testing import assert_array_equal
+from pynwb import NWBHDF5IO
+from pynwb.testing.mock.file import mock_NWBFile
+
+from ndx_holographic_stimulation import PatternedOptogeneticSeries
+from ndx_holographic_stimulation.query import TimestampIndex
+
+from .mock import mock_PatternedOptogeneticSeries
+
+
+class TestTimestampIndex(TestCase):
+    def test_searchsorted_matches_numpy(self):
+        timestamps = np.cumsum(np.random.default_rng(0).uniform(0.5, 1.5, size=10_007))
+        index = TimestampIndex(timestamps, block_size=64)
+        queries = np.concatenate([[-1.0, timestamps[0], timestamps[-1], timestamps[-1] + 1], timestamps[::97]])
+        queries = np.concatenate([queries, queries + 1e-3])
+        for side in ("left", "right"):
+            expected = np.searchsorted(timestamps, queries, side=side)
+            assert_array_equal([index.searchsorted(q, side=side) for q in queries], expected)
+
+
+class TestGetWindow(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.session_start_time = datetime.now().astimezone()
+        cls.test_dir = Path(mkdtemp())
+
+    @classmethod
+    def tearDownClass(cls):
+        try:
+            rmtree(cls.test_dir)
+        except PermissionError:  # Windows CI bug
+            warn(f"Unable to fully clean the temporary directory: {cls.test_dir}\n\nPlease remove it manually.")
+
+    def setUp(self):
+        self.data = np.random.rand(20_000, 4)
+        self.timestamps = np.arange(20_000) / 1000.0
+        self.nwbfile = mock_NWBFile(session_start_time=self.session_start_time)
+
+    def test_window_in_memory(self):
+        series = mock_PatternedOptogeneticSeries(data=self.data, timestamps=self.timestamps, nwbfile=self.nwbfile)
+        self.assertIsInstance(series, PatternedOptogeneticSeries)
+        window = series.get_window(1.0, 2.5)
+        assert_array_equal(window.timestamps, self.timestamps[1000:2500])
+        assert_array_equal(window.data, self.data[1000:2500])
+        assert_array_equal(window.rois, [0, 1, 2, 3])
+
+        window = series.get_window(1.0, 2.5, rois=[3, 1])
+        assert_array_equal(window.data, self.data[1000:2500][:, [3, 1]])
+        assert_array_equal(window.rois, [3, 1])
+
+        self.assertEqual(len(series.get_window(100.0, 200.0).data), 0)
+        with self.assertRaises(ValueError):
+            series.get_window(1.0, 2.0, rois=[7])
+
+    def test_window_from_rate(self):
+        series = mock_PatternedOptogeneticSeries(data=self.data, starting_time=2.0, rate=1000.0)
+        self.assertIsNone(series.timestamp_index)
+        window = series.get_window(3.0, 3.01, rois=[2])
+        assert_array_equal(window.data, self.data[1000:1010, [2]])
+        assert_array_equal(window.timestamps, 2.0 + np.arange(1000, 1010) / 1000.0)
+
+    def test_window_from_file_reuses_index(self):
+        mock_PatternedOptogeneticSeries(
+            name="series", data=self.data, timestamps=self.timestamps, nwbfile=self.nwbfile
+        )
+        path = self.test_dir / "window.nwb"
+        with NWBHDF5IO(path, mode="w") as io:
+            io.write(self.nwbfile)
+
+        with NWBHDF5IO(path, mode="r") as io:
+            series = io.read().stimulus["series"]
+            window = series.get_window(12.3456, 12.5, rois=[0, 2])
+            assert_array_equal(window.data, self.data[12346:12500][:, [0, 2]])
+            index = series.timestamp_index
+            series.get_window(0.0, 0.5)
+            self.assertIs(series.timestamp_index, index)
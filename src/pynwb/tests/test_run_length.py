@@ -0,0 +1,131 @@
+from datetime import datetime
+from pathlib import Path
+from shutil import rmtree
+from tempfile import mkdtemp
+from warnings import warn
+
+import numpy as np
+from hdmf.testing import TestCase
+from numpy.testing import assert_array_equal
+from pynwb import NWBHDF5IO
+from pynwb.testing.mock.file import mock_NWBFile
+
+from ndx_holographic_stimulation.run_length import StepwiseDenseView, encode_run_length
+
+from .mock import mock_PatternedOptogeneticSeries
+
+
+def _pulse_train(num_times=20_000, num_rois=3, rate=1000.0):
+    """Piecewise-constant power: each ROI is driven at its own power for 10 ms every 200 ms."""
+    data = np.zeros((num_times, num_rois))
+    for roi in range(num_rois):
+        for onset in range(50 * roi, num_times, 200):
+            data[onset:onset + 10, roi] = 0.5 + roi
+    return data, np.arange(num_times) / rate
+
+
+class _CountingArray:
+    """Array wrapper that records the number of rows read through slicing."""
+
+    def __init__(self, array):
+        self.array = array
+        self.shape, self.dtype = array.shape, array.dtype
+        self.rows_read = 0
+
+    def __len__(self):
+        return len(self.array)
+
+    def __getitem__(self, key):
+        out = self.array[key]
+        self.rows_read += len(out)
+        return out
+
+
+class TestRunLength(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.session_start_time = datetime.now().astimezone()
+        cls.test_dir = Path(mkdtemp())
+
+    @classmethod
+    def tearDownClass(cls):
+        try:
+            rmtree(cls.test_dir)
+        except PermissionError:  # Windows CI bug
+            warn(f"Unable to fully clean the temporary directory: {cls.test_dir}\n\nPlease remove it manually.")
+
+    def setUp(self):
+        self.data, self.timestamps = _pulse_train()
+
+    def test_encode_keeps_only_change_points(self):
+        encoding = encode_run_length(self.data, self.timestamps)
+        self.assertLess(len(encoding.values), len(self.data) / 20)
+        self.assertEqual(encoding.change_times[0], self.timestamps[0])
+        self.assertEqual(encoding.change_times[-1], self.timestamps[-1])
+        # block boundaries must not introduce or drop runs
+        blocked = encode_run_length(self.data, self.timestamps, block_rows=77)
+        assert_array_equal(blocked.values, encoding.values)
+        assert_array_equal(blocked.change_times, encoding.change_times)
+
+    def test_dense_view_matches_original(self):
+        encoding = encode_run_length(self.data, self.timestamps)
+        view = StepwiseDenseView(encoding.values, encoding.change_times, rate=1000.0)
+        self.assertEqual(view.shape, self.data.shape)
+        assert_array_equal(np.asarray(view), self.data)
+        assert_array_equal(view[1234], self.data[1234])
+        assert_array_equal(view[-1], self.data[-1])
+        assert_array_equal(view[100:5000:7, 1:], self.data[100:5000:7, 1:])
+        assert_array_equal(view[[5, 3, 999], 2], self.data[[5, 3, 999], 2])
+        assert_array_equal(view[10:10], self.data[10:10])
+
+        irregular = StepwiseDenseView(encoding.values, encoding.change_times, sample_times=self.timestamps)
+        assert_array_equal(irregular[::3], self.data[::3])
+
+    def test_window_reads_only_touched_runs(self):
+        encoding = encode_run_length(self.data, self.timestamps)
+        values = _CountingArray(encoding.values)
+        view = StepwiseDenseView(values, encoding.change_times, rate=1000.0)
+        assert_array_equal(view[10_000:10_400], self.data[10_000:10_400])
+        self.assertLessEqual(values.rows_read, 13)
+
+    def test_hdf5_roundtrip(self):
+        encoding = encode_run_length(self.data, self.timestamps)
+        paths = dict(dense=self.test_dir / "dense.nwb", encoded=self.test_dir / "encoded.nwb")
+        for kind, path in paths.items():
+            nwbfile = mock_NWBFile(session_start_time=self.session_start_time)
+            if kind == "dense":
+                mock_PatternedOptogeneticSeries(
+                    name="series", data=self.data, timestamps=self.timestamps, nwbfile=nwbfile
+                )
+            else:
+                mock_PatternedOptogeneticSeries(
+                    name="series",
+                    data=encoding.values,
+                    timestamps=encoding.change_times,
+                    continuity="step",
+                    dense_rate=1000.0,
+                    nwbfile=nwbfile,
+                )
+            with NWBHDF5IO(path, mode="w") as io:
+                io.write(nwbfile)
+        self.assertLess(paths["encoded"].stat().st_size, paths["dense"].stat().st_size)
+
+        with NWBHDF5IO(paths["encoded"], mode="r") as io:
+            series = io.read().stimulus["series"]
+            self.assertEqual(series.dense_rate, 1000.0)
+            view = StepwiseDenseView.from_series(series)  # on the grid of the stored dense_rate
+            assert_array_equal(view[:], self.data)
+            assert_array_equal(view[7000:7300, [0, 2]], self.data[7000:7300, [0, 2]])
+
+        with NWBHDF5IO(paths["dense"], mode="r") as io:
+            with self.assertRaises(ValueError):
+                StepwiseDenseView.from_series(io.read().stimulus["series"], rate=1000.0)
+
+    def test_from_series_without_dense_rate(self):
+        encoding = encode_run_length(self.data, self.timestamps)
+        series = mock_PatternedOptogeneticSeries(
+            name="series", data=encoding.values, timestamps=encoding.change_times, continuity="step"
+        )
+        with self.assertRaisesWith(ValueError, "series 'series' has no dense_rate, pass 'rate' or 'sample_times'"):
+            StepwiseDenseView.from_series(series)
+        assert_array_equal(StepwiseDenseView.from_series(series, rate=1000.0)[:], self.data)
@@ -0,0 +1,79 @@
+from datetime import datetime
+from pathlib import Path
+from shutil import rmtree
+from tempfile import mkdtemp
+from warnings import warn
+
+import numpy as np
+from hdmf.testing import TestCase
+from numpy.testing import assert_array_equal
+from pynwb import NWBHDF5IO
+from pynwb.testing.mock.file import mock_NWBFile
+
+from ndx_holographic_stimulation.utils import compact_indices, smallest_int_dtype
+
+from .mock import mock_PatternedOptogeneticSeries, mock_SpiralScanning
+
+N_ROIS = 12_000
+N_PRESENTATIONS = 1_000
+
+
+class TestSmallestIntDtype(TestCase):
+    def test_boundaries(self):
+        self.assertEqual(smallest_int_dtype([0, 127]), np.int8)
+        self.assertEqual(smallest_int_dtype([0, 128]), np.int16)
+        self.assertEqual(smallest_int_dtype([-32_769]), np.int32)
+        self.assertEqual(smallest_int_dtype([2**31]), np.int64)
+        self.assertEqual(smallest_int_dtype([]), np.int8)
+        self.assertEqual(smallest_int_dtype([1], min_dtype=np.int32), np.int32)
+        with self.assertRaises(OverflowError):
+            smallest_int_dtype(np.array([2**63], dtype=np.uint64))
+
+    def test_compact_indices(self):
+        compacted = compact_indices(list(range(300)))
+        self.assertEqual(compacted.dtype, np.int16)
+        assert_array_equal(compacted, np.arange(300))
+        floats = np.zeros(3)
+        self.assertIs(compact_indices(floats), floats)
+
+
+class TestScaling(TestCase):
+    """Round trip of a series that references more ROIs and presentations than fit in int8."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.test_dir = Path(mkdtemp())
+
+    @classmethod
+    def tearDownClass(cls):
+        try:
+            rmtree(cls.test_dir)
+        except PermissionError:  # Windows CI bug
+            warn(f"Unable to fully clean the temporary directory: {cls.test_dir}\n\nPlease remove it manually.")
+
+    def test_many_rois_roundtrip(self):
+        path = self.test_dir / "many_rois.nwb"
+        nwbfile = mock_NWBFile(session_start_time=datetime.now().astimezone())
+        pattern = mock_SpiralScanning(number_of_stimulus_presentation=N_PRESENTATIONS, nwbfile=nwbfile)
+        data = np.zeros((10, N_ROIS), dtype=np.float32)
+        data[np.arange(10), np.arange(10) * 1000 + 999] = 1.0
+        series = mock_PatternedOptogeneticSeries(
+            name="PatternedOptogeneticSeries", data=data, stimulus_pattern=pattern, nwbfile=nwbfile
+        )
+        self.assertEqual(series.rois.data.dtype, np.int16)
+
+        with NWBHDF5IO(path, mode="w") as io:
+            io.write(nwbfile, cache_spec=False)
+
+        with NWBHDF5IO(path, mode="r", load_namespaces=False) as io:
+            read_series = io.read().stimulus["PatternedOptogeneticSeries"]
+            self.assertEqual(read_series.rois.data.dtype, np.int16)
+            assert_array_equal(read_series.rois.data[:], np.arange(N_ROIS))
+            self.assertEqual(read_series.stimulus_pattern.number_of_stimulus_presentation, N_PRESENTATIONS)
+            # the last ROI of the table is reachable through the region
+            self.assertEqual(len(read_series.rois.table), N_ROIS)
+            assert_array_equal(read_series.data[:, N_ROIS - 1], data[:, N_ROIS - 1])
+
+    def test_small_region_stays_int8(self):
+        series = mock_PatternedOptogeneticSeries(n_rois=3)
+        self.assertEqual(series.rois.data.dtype, np.int8)
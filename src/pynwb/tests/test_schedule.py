@@ -0,0 +1,105 @@
+import numpy as np
+from hdmf.testing import TestCase
+from numpy.testing import assert_allclose, assert_array_equal
+
+from ndx_holographic_stimulation.run_length import encode_run_length
+from ndx_holographic_stimulation.schedule import expand_stimulus_schedule
+
+from .mock import mock_PatternedOptogeneticSeries, mock_SpiralScanning
+
+RATE = 1000.0
+DURATION, ISI, N_PRESENTATIONS = 10e-3, 20e-3, 10
+# interval start times for each of the three ROIs; ROI 2 is never stimulated
+INTERVAL_STARTS = {0: [1.0, 3.0], 1: [2.0], 2: []}
+
+
+def _dense_pulses(num_times=5000):
+    data = np.zeros((num_times, len(INTERVAL_STARTS)))
+    for roi, starts in INTERVAL_STARTS.items():
+        for start in starts:
+            for k in range(N_PRESENTATIONS):
+                onset = int(round((start + k * (DURATION + ISI)) * RATE))
+                data[onset:onset + int(round(DURATION * RATE)), roi] = 1.0
+    return data
+
+
+class TestStimulusSchedule(TestCase):
+    def setUp(self):
+        self.pattern = mock_SpiralScanning(
+            duration=DURATION, number_of_stimulus_presentation=N_PRESENTATIONS, inter_stimulus_interval=ISI
+        )
+
+    def _assert_expected(self, schedule):
+        expected = sorted(
+            (start + k * (DURATION + ISI), roi, interval, k)
+            for roi, starts in INTERVAL_STARTS.items()
+            for interval, start in enumerate(starts)
+            for k in range(N_PRESENTATIONS)
+        )
+        onset, rois, interval, presentation = map(np.array, zip(*expected))
+        assert_allclose(schedule.onset, onset)
+        assert_allclose(schedule.offset, onset + DURATION)
+        assert_array_equal(schedule.rois, rois)
+        assert_array_equal(schedule.interval, interval)
+        assert_array_equal(schedule.presentation, presentation)
+
+    def test_dense_pulses(self):
+        data = _dense_pulses()
+        series = mock_PatternedOptogeneticSeries(
+            data=data, timestamps=np.arange(len(data)) / RATE, stimulus_pattern=self.pattern
+        )
+        self._assert_expected(expand_stimulus_schedule(series, block_rows=333))
+
+    def test_one_sample_per_interval(self):
+        # coarse sampling: each interval is a single sample with power
+        data = np.zeros((50, 3))
+        for roi, starts in INTERVAL_STARTS.items():
+            data[[int(start * 10) for start in starts], roi] = 1.0
+        series = mock_PatternedOptogeneticSeries(data=data, rate=10.0, stimulus_pattern=self.pattern)
+        self._assert_expected(expand_stimulus_schedule(series))
+
+    def test_run_length_encoded_series(self):
+        data = _dense_pulses()
+        encoding = encode_run_length(data, np.arange(len(data)) / RATE)
+        series = mock_PatternedOptogeneticSeries(
+            data=encoding.values,
+            timestamps=encoding.change_times,
+            continuity="step",
+            stimulus_pattern=self.pattern,
+        )
+        self._assert_expected(expand_stimulus_schedule(series))
+
+    def test_memoized_on_series(self):
+        data = _dense_pulses()
+        series = mock_PatternedOptogeneticSeries(data=data, rate=RATE, stimulus_pattern=self.pattern)
+        schedule = series.get_stimulus_schedule()
+        self.assertIs(series.get_stimulus_schedule(), schedule)
+        self.assertIsNot(series.get_stimulus_schedule(threshold=0.5), schedule)
+        self._assert_expected(schedule)
+
+    def test_power_never_falls(self):
+        data = np.zeros((100, 2))
+        data[10:, 0] = 1.0  # switched on and never off
+        series = mock_PatternedOptogeneticSeries(data=data, rate=RATE, stimulus_pattern=self.pattern)
+        schedule = expand_stimulus_schedule(series)
+        assert_array_equal(schedule.rois, np.zeros(N_PRESENTATIONS))
+        assert_allclose(schedule.onset[0], 10 / RATE)
+
+    def test_empty_data(self):
+        series = mock_PatternedOptogeneticSeries(data=np.zeros((0, 2)), rate=RATE, stimulus_pattern=self.pattern)
+        schedule = expand_stimulus_schedule(series)
+        for field in schedule:
+            self.assertEqual(len(field), 0)
+
+    def test_glitches_within_interval(self):
+        # isolated glitches 0.2 s apart: each follows enough silence to be a candidate start, but the second lies
+        # inside the span (0.28 s) of the first and the third is measured from the first, not from the second
+        data = np.zeros((1000, 2))
+        data[[100, 300, 500], 0] = 1.0
+        data[[100, 390], 1] = 1.0  # just after the span of the first start: a new interval
+        series = mock_PatternedOptogeneticSeries(data=data, rate=RATE, stimulus_pattern=self.pattern)
+        schedule = expand_stimulus_schedule(series)
+        starts = schedule.presentation == 0
+        assert_allclose(schedule.onset[starts & (schedule.rois == 0)], [0.1, 0.5])
+        assert_array_equal(schedule.interval[starts & (schedule.rois == 0)], [0, 1])
+        assert_allclose(schedule.onset[starts & (schedule.rois == 1)], [0.1, 0.39])
@@ -0,0 +1,114 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+from shutil import copy2, rmtree
+from tempfile import mkdtemp
+
+from hdmf.spec.namespace import YAMLSpecReader
+from hdmf.testing import TestCase
+
+import ndx_holographic_stimulation
+from ndx_holographic_stimulation.spec_cache import CachedYAMLSpecReader
+
+SPEC_DIR = Path(ndx_holographic_stimulation.ndx_holographic_stimulation_specpath).parent
+NAMESPACE = "ndx-holographic-stimulation.namespace.yaml"
+EXTENSIONS = "ndx-holographic-stimulation.extensions.yaml"
+
+
+class TestCachedYAMLSpecReader(TestCase):
+    def setUp(self):
+        self.spec_dir = Path(mkdtemp())
+        self.cache_dir = Path(mkdtemp())
+        copy2(SPEC_DIR / NAMESPACE, self.spec_dir)
+        copy2(SPEC_DIR / EXTENSIONS, self.spec_dir)
+
+    def tearDown(self):
+        rmtree(self.spec_dir)
+        rmtree(self.cache_dir)
+
+    def _read(self):
+        reader = CachedYAMLSpecReader(indir=str(self.spec_dir), cache_dir=str(self.cache_dir))
+        namespace = reader.read_namespace(str(self.spec_dir / NAMESPACE))
+        spec = reader.read_spec(EXTENSIONS)
+        return reader, namespace, spec
+
+    def test_cache_hit_matches_yaml(self):
+        reader, namespace, spec = self._read()
+        self.assertEqual((reader.hits, reader.misses), (0, 2))
+        reader, cached_namespace, cached_spec = self._read()
+        self.assertEqual((reader.hits, reader.misses), (2, 0))
+
+        yaml_reader = YAMLSpecReader(indir=str(self.spec_dir))
+        self.assertEqual(cached_namespace, yaml_reader.read_namespace(str(self.spec_dir / NAMESPACE)))
+        self.assertEqual(cached_spec, yaml_reader.read_spec(EXTENSIONS))
+
+    def test_editing_spec_invalidates_cache(self):
+        self._read()
+        with open(self.spec_dir / EXTENSIONS, "a") as f:
+            f.write("\n# edited\n")
+        reader, _, _ = self._read()
+        self.assertEqual((reader.hits, reader.misses), (1, 1))
+
+    def test_unwritable_cache_falls_back_to_yaml(self):
+        blocker = self.cache_dir / "not_a_directory"
+        blocker.write_text("")
+        reader = CachedYAMLSpecReader(indir=str(self.spec_dir), cache_dir=str(blocker))
+        self.assertIn("groups", reader.read_spec(EXTENSIONS))
+
+
+class TestLoadNamespaces(TestCase):
+    def setUp(self):
+        self.cache_dir = Path(mkdtemp())
+
+    def tearDown(self):
+        rmtree(self.cache_dir)
+
+    def _import(self, **env):
+        env = dict(
+            {key: value for key, value in os.environ.items() if key != "NDX_HOLOGRAPHIC_STIMULATION_SPEC_CACHE"},
+            NDX_HOLOGRAPHIC_STIMULATION_CACHE_DIR=str(self.cache_dir),
+            PYTHONPATH=os.pathsep.join([str(Path(ndx_holographic_stimulation.__file__).parents[1]),
+                                        os.environ.get("PYTHONPATH", "")]),
+            **env,
+        )
+        code = "import ndx_holographic_stimulation as ndx; print(ndx.PatternedOptogeneticSeries.__name__)"
+        result = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.strip(), "PatternedOptogeneticSeries")
+
+    def test_cache_off_by_default(self):
+        self._import()
+        self.assertEqual(list(self.cache_dir.iterdir()), [])
+
+    def test_cache_enabled(self):
+        self._import(NDX_HOLOGRAPHIC_STIMULATION_SPEC_CACHE="1")
+        self.assertEqual(len(list(self.cache_dir.glob("*.json"))), 2)
+        self._import(NDX_HOLOGRAPHIC_STIMULATION_SPEC_CACHE="1")  # read back from the cache
+
+
+class TestLazyImport(TestCase):
+    def _run(self, code):
+        env = dict(
+            os.environ,
+            NDX_HOLOGRAPHIC_STIMULATION_LAZY_IMPORT="1",
+            PYTHONPATH=os.pathsep.join([str(Path(ndx_holographic_stimulation.__file__).parents[1]),
+                                        os.environ.get("PYTHONPATH", "")]),
+        )
+        result = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        return result.stdout.split()
+
+    def test_namespace_loaded_on_first_access(self):
+        loaded_before, loaded_after, registered = self._run(
+            "import pynwb, ndx_holographic_stimulation as ndx\n"
+            "print('ndx-holographic-stimulation' in pynwb.available_namespaces())\n"
+            "cls = ndx.PatternedOptogeneticSeries\n"
+            "print('ndx-holographic-stimulation' in pynwb.available_namespaces())\n"
+            "print(pynwb.get_class('PatternedOptogeneticSeries', 'ndx-holographic-stimulation') is cls)\n"
+        )
+        self.assertEqual((loaded_before, loaded_after, registered), ("False", "True", "True"))
+
+    def test_unknown_attribute(self):
+        with self.assertRaises(AttributeError):
+            ndx_holographic_stimulation.NotAType
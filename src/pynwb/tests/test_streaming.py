@@ -0,0 +1,108 @@
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from shutil import rmtree
+from tempfile import mkdtemp
+from warnings import warn
+
+import numpy as np
+from hdmf.testing import TestCase
+from numpy.testing import assert_array_equal
+from pynwb import NWBHDF5IO
+from pynwb.testing.mock.file import mock_NWBFile
+
+from ndx_holographic_stimulation.streaming import (
+    BlockDataChunkIterator,
+    iter_blocks,
+    roi_aware_chunk_shape,
+    stream_data_io,
+)
+
+from .mock import mock_PatternedOptogeneticSeries
+
+
+def _data_blocks(num_times, num_rois, block_rows):
+    rng = np.random.default_rng(0)
+    for start in range(0, num_times, block_rows):
+        yield rng.random((min(block_rows, num_times - start), num_rois))
+
+
+def _timestamp_blocks(num_times, block_rows, rate=1000.0):
+    for start in range(0, num_times, block_rows):
+        yield np.arange(start, min(start + block_rows, num_times)) / rate
+
+
+class TestStreaming(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.session_start_time = datetime.now().astimezone()
+        cls.test_dir = Path(mkdtemp())
+
+    @classmethod
+    def tearDownClass(cls):
+        try:
+            rmtree(cls.test_dir)
+        except PermissionError:  # Windows CI bug
+            warn(f"Unable to fully clean the temporary directory: {cls.test_dir}\n\nPlease remove it manually.")
+
+    def _write_streamed(self, path, num_times, num_rois, block_rows=1000, compression="balanced", trace=False):
+        """Write a streamed series to ``path``; with ``trace=True`` return the peak traced memory of the write."""
+        nwbfile = mock_NWBFile(session_start_time=self.session_start_time)
+        mock_PatternedOptogeneticSeries(
+            name="PatternedOptogeneticSeries",
+            data=stream_data_io(_data_blocks(num_times, num_rois, block_rows), compression=compression),
+            timestamps=stream_data_io(_timestamp_blocks(num_times, block_rows), compression=compression),
+            n_rois=num_rois,
+            nwbfile=nwbfile,
+        )
+        if trace:
+            tracemalloc.start()
+        try:
+            with NWBHDF5IO(path, mode="w") as io:
+                # caching the spec is a fixed, session-length independent cost that is slow under tracemalloc
+                io.write(nwbfile, cache_spec=not trace)
+            if trace:
+                return tracemalloc.get_traced_memory()[1]
+        finally:
+            if trace:
+                tracemalloc.stop()
+
+    def test_roi_aware_chunk_shape(self):
+        self.assertEqual(roi_aware_chunk_shape(16, "float64", chunk_bytes=1024 * 8 * 16), (1024, 16))
+        self.assertEqual(roi_aware_chunk_shape(None, "float64", chunk_bytes=8 * 100), (100,))
+        # more ROIs than fit in the budget: split across ROIs, keep at least one sample per chunk
+        self.assertEqual(roi_aware_chunk_shape(1000, "float64", chunk_bytes=8 * 10), (1, 10))
+
+    def test_iterator_rechunks_irregular_blocks(self):
+        blocks = [np.ones((n, 3)) * i for i, n in enumerate([5, 1, 7, 2])]
+        iterator = BlockDataChunkIterator(blocks, chunk_shape=(4, 3))
+        chunks = list(iterator)
+        self.assertEqual([len(chunk.data) for chunk in chunks], [4, 4, 4, 3])
+        assert_array_equal(np.concatenate([chunk.data for chunk in chunks]), np.concatenate(blocks))
+        self.assertEqual(chunks[-1].selection[0], slice(12, 15))
+
+    def test_streaming_roundtrip(self):
+        path = self.test_dir / "streamed.nwb"
+        num_times, num_rois = 5003, 4
+        self._write_streamed(path, num_times, num_rois, block_rows=333, compression="balanced")
+
+        with NWBHDF5IO(path, mode="r") as io:
+            series = io.read().stimulus["PatternedOptogeneticSeries"]
+            assert_array_equal(series.data[:], np.concatenate(list(_data_blocks(num_times, num_rois, 333))))
+            assert_array_equal(series.timestamps[:], np.arange(num_times) / 1000.0)
+            self.assertEqual(series.data.compression, "gzip")
+            self.assertEqual(series.data.chunks[1], num_rois)
+
+    def test_peak_memory_is_flat_in_session_length(self):
+        num_rois = 16
+        peaks = []
+        for num_times in (25_000, 200_000):
+            path = self.test_dir / f"memory_{num_times}.nwb"
+            peaks.append(self._write_streamed(path, num_times, num_rois, compression="none", trace=True))
+        dense_bytes = 200_000 * num_rois * 8
+        self.assertLess(peaks[1], dense_bytes / 4)
+        self.assertLess(peaks[1], 1.5 * peaks[0])
+
+    def test_iter_blocks(self):
+        array = np.arange(10)
+        self.assertEqual([len(block) for block in iter_blocks(array, 4)], [4, 4, 2])
@@ -0,0 +1,159 @@
+from pathlib import Path
+from shutil import rmtree
+from tempfile import mkdtemp
+from unittest import skipIf
+from warnings import warn
+
+import numpy as np
+from hdmf.testing import TestCase
+from numpy.testing import assert_allclose, assert_array_equal
+from pynwb import NWBHDF5IO
+from pynwb.testing.mock.file import mock_NWBFile
+from pynwb.testing.mock.ophys import mock_PlaneSegmentation
+
+from ndx_holographic_stimulation import StimulationTargetTable
+
+from .mock import mock_PatternedOptogeneticStimulusSite
+
+try:
+    import scipy.spatial  # noqa: F401
+
+    HAVE_SCIPY = True
+except ImportError:
+    HAVE_SCIPY = False
+
+NUM_TARGETS = 200
+
+
+def _coordinates():
+    # targets in a 200 x 200 x 100 um volume
+    return np.random.default_rng(0).random((NUM_TARGETS, 3)) * [200e-6, 200e-6, 100e-6]
+
+
+def _brute_force_radius(coordinates, point, radius):
+    return np.flatnonzero(np.linalg.norm(coordinates - point, axis=1) <= radius)
+
+
+class TestStimulationTargetTable(TestCase):
+    def test_add_target(self):
+        table = StimulationTargetTable()
+        self.assertEqual(table.name, "targets")
+        self.assertEqual(table.add_target(x=1e-6, y=2e-6, z=3e-6), 0)
+        self.assertEqual(table.add_target(x=4e-6, y=5e-6, z=6e-6), 1)
+        assert_array_equal(table.coordinates, [[1e-6, 2e-6, 3e-6], [4e-6, 5e-6, 6e-6]])
+        self.assertNotIn("roi", table.colnames)
+
+    def test_from_coordinates(self):
+        plane_segmentation = mock_PlaneSegmentation(n_rois=NUM_TARGETS)
+        coordinates = _coordinates()
+        roi = np.arange(NUM_TARGETS)[::-1]
+        table = StimulationTargetTable.from_coordinates(coordinates, roi=roi, roi_table=plane_segmentation)
+        assert_array_equal(table.coordinates, coordinates)
+        assert_array_equal(table["roi"].data, roi)
+        self.assertIs(table["roi"].table, plane_segmentation)
+
+        with self.assertRaisesWith(ValueError, "roi_table is required with roi"):
+            StimulationTargetTable.from_coordinates(coordinates, roi=roi)
+        with self.assertRaisesWith(ValueError, "points must be (x, y, z) or num_points x 3, got shape (200, 2)"):
+            StimulationTargetTable.from_coordinates(coordinates[:, :2])
+
+    def test_add_target_roi(self):
+        plane_segmentation = mock_PlaneSegmentation(n_rois=3)
+        table = StimulationTargetTable(roi_table=plane_segmentation)
+        table.add_target(x=0.0, y=0.0, z=0.0, roi=2)
+        assert_array_equal(table["roi"].data, [2])
+        self.assertIs(table["roi"].table, plane_segmentation)
+
+
+@skipIf(not HAVE_SCIPY, "scipy not installed")
+class TestTargetQueries(TestCase):
+    def setUp(self):
+        self.coordinates = _coordinates()
+        self.roi = np.arange(NUM_TARGETS) + 1000
+        self.table = StimulationTargetTable.from_coordinates(
+            self.coordinates, roi=self.roi, roi_table=mock_PlaneSegmentation(n_rois=NUM_TARGETS)
+        )
+
+    def test_query_radius(self):
+        points = np.random.default_rng(1).random((20, 3)) * [200e-6, 200e-6, 100e-6]
+        found = self.table.query_radius(points, 30e-6)
+        self.assertEqual(len(found), len(points))
+        for point, rows in zip(points, found):
+            assert_array_equal(rows, _brute_force_radius(self.coordinates, point, 30e-6))
+        assert_array_equal(self.table.query_radius(points[0], 30e-6), found[0])
+        assert_array_equal(self.table.to_roi(found[0]), self.roi[found[0]])
+
+    def test_query_nearest(self):
+        points = np.random.default_rng(1).random((20, 3)) * [200e-6, 200e-6, 100e-6]
+        distances, rows = self.table.query_nearest(points, k=3)
+        self.assertEqual(rows.shape, (20, 3))
+        for point, point_distances, point_rows in zip(points, distances, rows):
+            expected = np.linalg.norm(self.coordinates - point, axis=1)
+            assert_array_equal(point_rows, np.argsort(expected)[:3])
+            assert_allclose(point_distances, np.sort(expected)[:3])
+
+        distances, rows = self.table.query_nearest([1.0, 1.0, 1.0], k=2, max_distance=1e-3)
+        assert_array_equal(rows, [-1, -1])
+        self.assertTrue(np.all(np.isinf(distances)))
+        assert_array_equal(self.table.to_roi(rows), [-1, -1])
+
+    def test_pairs_and_neighbours(self):
+        pairs = self.table.query_pairs(10e-6)
+        distances = np.linalg.norm(self.coordinates[:, None] - self.coordinates[None], axis=-1)
+        expected = np.argwhere(np.triu(distances <= 10e-6, k=1))
+        assert_array_equal(pairs, expected)
+
+        neighbours = self.table.neighbours([0, 5], 25e-6)
+        for row, found in zip([0, 5], neighbours):
+            expected = _brute_force_radius(self.coordinates, self.coordinates[row], 25e-6)
+            assert_array_equal(found, expected[expected != row])
+
+    def test_index_cached(self):
+        table = StimulationTargetTable()
+        table.add_target(x=0.0, y=0.0, z=0.0)
+        index = table.index
+        self.assertIs(table.index, index)
+        with self.assertRaisesWith(ValueError, "the targets are not linked to ROIs"):
+            table.to_roi([0])
+
+        table.add_target(x=1e-6, y=0.0, z=0.0)
+        self.assertIsNot(table.index, index)
+        assert_array_equal(table.query_radius([0.0, 0.0, 0.0], 2e-6), [0, 1])
+
+
+class TestStimulationTargetTableIO(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.test_dir = Path(mkdtemp())
+
+    @classmethod
+    def tearDownClass(cls):
+        try:
+            rmtree(cls.test_dir)
+        except PermissionError:  # Windows CI bug
+            warn(f"Unable to fully clean the temporary directory: {cls.test_dir}\n\nPlease remove it manually.")
+
+    def test_roundtrip(self):
+        nwbfile = mock_NWBFile()
+        plane_segmentation = mock_PlaneSegmentation(n_rois=NUM_TARGETS, nwbfile=nwbfile)
+        site = mock_PatternedOptogeneticStimulusSite(nwbfile=nwbfile)
+        coordinates = _coordinates()
+        # added to a site already in the file, the targets share an ancestor with the ROI table they link to
+        site.targets = StimulationTargetTable.from_coordinates(
+            coordinates, roi=np.arange(NUM_TARGETS), roi_table=plane_segmentation
+        )
+        path = self.test_dir / "targets.nwb"
+        with NWBHDF5IO(path, mode="w") as io:
+            io.write(nwbfile)
+
+        with NWBHDF5IO(path, mode="r") as io:
+            read_nwbfile = io.read()
+            targets = read_nwbfile.ogen_sites["site"].targets
+            self.assertIsInstance(targets, StimulationTargetTable)
+            assert_array_equal(targets.coordinates, coordinates)
+            self.assertIs(targets["roi"].table, read_nwbfile.processing["ophys"][plane_segmentation.name])
+            if HAVE_SCIPY:
+                self.assertIs(targets.index, targets.index)
+                rows = targets.query_radius(coordinates[7], 15e-6)
+                assert_array_equal(rows, _brute_force_radius(coordinates, coordinates[7], 15e-6))
+                assert_array_equal(targets.to_roi(rows), rows)
@@ -0,0 +1,47 @@
+import numpy as np
+from hdmf.testing import TestCase
+from numpy.testing import assert_allclose
+
+from ndx_holographic_stimulation.trajectory import clear_spiral_cache, spiral_cache_info, spiral_trajectory
+
+from .mock import mock_SpiralScanning
+
+
+class TestSpiralTrajectory(TestCase):
+    def setUp(self):
+        clear_spiral_cache()
+        self.pattern = mock_SpiralScanning()  # 15 um diameter, 10 um height, 5 revolutions, 10 ms
+
+    def test_single_spiral_geometry(self):
+        trajectory = spiral_trajectory(self.pattern, rate=100_000.0)
+        self.assertEqual(trajectory.x.shape, (1, 1000))
+        assert_allclose(trajectory.t[[0, -1]], [0.0, 999e-5])
+        radius = np.hypot(trajectory.x, trajectory.y)[0]
+        self.assertTrue(np.all(np.diff(radius) >= 0))
+        self.assertAlmostEqual(radius.max(), self.pattern.diameter / 2, delta=1e-8)
+        assert_allclose(trajectory.z[0, [0, -1]], [-self.pattern.height / 2, self.pattern.height / 2], atol=1e-8)
+        # number of turns from the unwrapped polar angle
+        angle = np.unwrap(np.arctan2(trajectory.y[0], trajectory.x[0]))
+        self.assertAlmostEqual(angle[-1] / (2 * np.pi), self.pattern.number_of_revolutions, delta=0.01)
+
+    def test_batched_targets_share_cached_path(self):
+        centers = np.random.default_rng(0).uniform(-1e-3, 1e-3, size=(5000, 3))
+        trajectory = spiral_trajectory(self.pattern, rate=50_000.0, centers=centers)
+        self.assertEqual(trajectory.x.shape, (5000, 500))
+        single = spiral_trajectory(self.pattern, rate=50_000.0, centers=centers[123])
+        assert_allclose(trajectory.x[123], single.x[0])
+        assert_allclose(trajectory.z[123], single.z[0])
+
+        other = mock_SpiralScanning()
+        spiral_trajectory(other, rate=50_000.0)
+        info = spiral_cache_info()
+        self.assertEqual((info.misses, info.hits), (1, 2))
+
+    def test_cached_path_is_read_only(self):
+        trajectory = spiral_trajectory(self.pattern, rate=10_000.0)
+        with self.assertRaises(ValueError):
+            trajectory.t[0] = 1.0
+
+    def test_bad_centers(self):
+        with self.assertRaises(ValueError):
+            spiral_trajectory(self.pattern, rate=10_000.0, centers=np.zeros((3, 2)))
@@ -0,0 +1,209 @@
+import json
+import multiprocessing
+import os
+import tracemalloc
+from pathlib import Path
+from unittest import skipUnless
+from unittest.mock import patch
+from shutil import rmtree
+from tempfile import mkdtemp
+from warnings import warn
+
+import numpy as np
+from hdmf.testing import TestCase
+from pynwb import NWBHDF5IO
+from pynwb.testing.mock.file import mock_NWBFile
+
+from ndx_holographic_stimulation.run_length import encode_run_length
+from ndx_holographic_stimulation.lazy_io import LazyNWBHDF5IO
+from ndx_holographic_stimulation import validation
+from ndx_holographic_stimulation.validation import find_series, main, validate_file, validate_series
+
+from .mock import mock_LightSource, mock_PatternedOptogeneticSeries, mock_SpiralScanning
+from .test_schedule import DURATION, ISI, N_PRESENTATIONS, RATE, _dense_pulses
+
+
+def _pattern(nwbfile=None):
+    return mock_SpiralScanning(
+        duration=DURATION, number_of_stimulus_presentation=N_PRESENTATIONS, inter_stimulus_interval=ISI,
+        nwbfile=nwbfile,
+    )
+
+
+def _broken_pulses():
+    data = _dense_pulses()
+    data[1003:1006, 0] = 0.0  # cuts a presentation of ROI 0 in two: a short pulse and a short pause
+    data[2000, 1] = 9.0  # above the 8 W of the light source
+    data[4000:4003, 2] = -0.5
+    data[4500, 2] = np.nan
+    return data
+
+
+class TestValidateSeries(TestCase):
+    def test_valid(self):
+        for block_rows in (333, 65536):
+            with self.subTest(block_rows=block_rows):
+                series = mock_PatternedOptogeneticSeries(data=_dense_pulses(), rate=RATE, stimulus_pattern=_pattern())
+                self.assertEqual(validate_series(series, block_rows=block_rows), [])
+
+    def test_run_length_encoded(self):
+        data = _dense_pulses()
+        encoded = encode_run_length(data, np.arange(len(data)) / RATE)
+        series = mock_PatternedOptogeneticSeries(
+            data=encoded.values, timestamps=encoded.change_times, continuity="step", stimulus_pattern=_pattern()
+        )
+        self.assertEqual(validate_series(series), [])
+
+    def test_findings(self):
+        timestamps = np.arange(5000) / RATE
+        timestamps[3000] = timestamps[2999]
+        series = mock_PatternedOptogeneticSeries(data=_broken_pulses(), timestamps=timestamps,
+                                                 stimulus_pattern=_pattern())
+        for block_rows in (333, 65536):
+            with self.subTest(block_rows=block_rows):
+                findings = {finding.check: finding for finding in validate_series(series, block_rows=block_rows)}
+                self.assertEqual(
+                    sorted(findings),
+                    ["inter_stimulus_interval", "negative_power", "peak_power", "power_finite", "pulse_duration",
+                     "timestamps_order"],
+                )
+                self.assertEqual((findings["timestamps_order"].index, findings["timestamps_order"].count), (3000, 1))
+                self.assertEqual((findings["negative_power"].index, findings["negative_power"].count), (4000, 3))
+                self.assertEqual((findings["peak_power"].index, findings["peak_power"].count), (2000, 1))
+                self.assertEqual((findings["power_finite"].index, findings["power_finite"].count), (4500, 1))
+                # the 10 ms pulse at 1.0 s is cut into 3 ms on, 3 ms off and 4 ms on
+                self.assertEqual((findings["pulse_duration"].index, findings["pulse_duration"].count), (1000, 2))
+                self.assertEqual((findings["inter_stimulus_interval"].index,
+                                  findings["inter_stimulus_interval"].count), (1003, 1))
+                self.assertTrue(all(finding.severity == "error" for finding in findings.values()))
+
+    def test_shape_and_timestamps_length(self):
+        with self.assertWarns(UserWarning):  # pynwb warns about the lengths too
+            series = mock_PatternedOptogeneticSeries(data=np.zeros((10, 2)), timestamps=np.arange(12) / RATE,
+                                                     n_rois=3)
+        self.assertEqual([finding.check for finding in validate_series(series)], ["shape", "timestamps_length"])
+
+    def test_unit_not_watts(self):
+        series = mock_PatternedOptogeneticSeries(data=_dense_pulses(), rate=RATE, stimulus_pattern=_pattern())
+        series.fields["unit"] = "mW"
+        [finding] = validate_series(series)
+        self.assertEqual((finding.check, finding.severity), ("peak_power", "warning"))
+
+    def test_multi_gigabyte(self):
+        """A 2 GiB series is checked in bounded memory: the data is a sparse memory-mapped file."""
+        num_times, num_rois = 2 ** 28, 2
+        test_dir = Path(mkdtemp())
+        try:
+            path = test_dir / "power.dat"
+            with open(path, "wb") as f:
+                f.truncate(num_times * num_rois * 4)
+            data = np.memmap(path, dtype=np.float32, mode="r+", shape=(num_times, num_rois))
+            self.assertEqual(data.nbytes, 2 * 1024 ** 3)
+            rate = 1000.0
+            # a valid interval near the start, and one with too short pulses near the end of the session
+            for start, pulse in ((1000, 10), (num_times - 5000, 5)):
+                for k in range(N_PRESENTATIONS):
+                    onset = start + int(round(k * (DURATION + ISI) * rate))
+                    data[onset:onset + pulse, 1] = 2.0
+            data[num_times // 2, 0] = -1.0
+            data.flush()
+            series = mock_PatternedOptogeneticSeries(
+                data=data, rate=rate, stimulus_pattern=_pattern(), light_source=mock_LightSource(peak_power=8.0)
+            )
+            tracemalloc.start()
+            findings = validate_series(series, block_rows=2 ** 21)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            del series, data
+        finally:
+            rmtree(test_dir, ignore_errors=True)
+        findings = {finding.check: finding for finding in findings}
+        self.assertEqual(sorted(findings), ["negative_power", "pulse_duration"])
+        self.assertEqual(findings["negative_power"].index, num_times // 2)
+        self.assertEqual((findings["pulse_duration"].index, findings["pulse_duration"].count),
+                         (num_times - 5000, N_PRESENTATIONS))
+        self.assertLess(peak, 512 * 1024 ** 2)
+
+
+def _crash_on(name):
+    """``validate_series`` that kills the worker process validating the series called ``name``."""
+    def crashing_validate_series(series, **kwargs):
+        if series.name == name:
+            os._exit(1)
+        return validate_series(series, **kwargs)
+    return crashing_validate_series
+
+
+class TestValidateFile(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.test_dir = Path(mkdtemp())
+        cls.path = cls.test_dir / "validation.nwb"
+        nwbfile = mock_NWBFile()
+        pattern = _pattern(nwbfile=nwbfile)
+        mock_PatternedOptogeneticSeries(name="valid", data=_dense_pulses(), rate=RATE, stimulus_pattern=pattern,
+                                        nwbfile=nwbfile)
+        series = nwbfile.stimulus["valid"]
+        mock_PatternedOptogeneticSeries(
+            name="broken", data=_broken_pulses(), rate=RATE, rois=series.rois, site=series.site, device=series.device,
+            stimulus_pattern=pattern, spatial_light_modulator=series.spatial_light_modulator,
+            light_source=series.light_source, nwbfile=nwbfile,
+        )
+        with NWBHDF5IO(cls.path, mode="w") as io:
+            io.write(nwbfile)
+
+    @classmethod
+    def tearDownClass(cls):
+        try:
+            rmtree(cls.test_dir)
+        except PermissionError:  # Windows CI bug
+            warn(f"Unable to fully clean the temporary directory: {cls.test_dir}\n\nPlease remove it manually.")
+
+    def test_parallel(self):
+        findings = validate_file(str(self.path), max_workers=2, block_rows=1000)
+        self.assertEqual({finding.series for finding in findings}, {"broken"})
+        self.assertEqual({finding.path for finding in findings}, {str(self.path)})
+        self.assertEqual(
+            sorted(finding.check for finding in findings),
+            ["inter_stimulus_interval", "negative_power", "peak_power", "power_finite", "pulse_duration"],
+        )
+        self.assertEqual(validate_file(str(self.path), max_workers=0, block_rows=1000), findings)
+
+    @skipUnless(multiprocessing.get_start_method() == "fork", "the workers need to inherit the patch")
+    def test_crashed_worker(self):
+        expected = validate_file(str(self.path), max_workers=0, block_rows=1000)
+        for crash in ("broken", "valid"):
+            with self.subTest(crash=crash):
+                done = dict()
+                with patch.object(validation, "validate_series", _crash_on(crash)):
+                    findings = validate_file(str(self.path), max_workers=2, block_rows=1000,
+                                             callback=lambda path, name, found: done.setdefault(name, found))
+                self.assertEqual(sorted(done), ["broken", "valid"])
+                crashed = done.pop(crash)
+                self.assertEqual([(finding.check, finding.severity) for finding in crashed], [("worker", "error")])
+                self.assertIn("BrokenProcessPool", crashed[0].message)
+                # the series that did not crash are validated as usual
+                for name, found in done.items():
+                    self.assertEqual(found, [finding for finding in expected if finding.series == name])
+                self.assertEqual(findings, [finding for name in ("broken", "valid")
+                                            for finding in (crashed if name == crash else done[name])])
+
+    def test_reads_only_the_series(self):
+        with patch.object(NWBHDF5IO, "read") as read:
+            self.assertEqual(find_series(str(self.path)),
+                             [("broken", "/stimulus/presentation/broken"), ("valid", "/stimulus/presentation/valid")])
+            with patch.object(LazyNWBHDF5IO, "_construct_series", autospec=True,
+                              side_effect=LazyNWBHDF5IO._construct_series) as construct:
+                validate_file(str(self.path), max_workers=0, block_rows=1000)
+        read.assert_not_called()
+        # each series is constructed once, by the job that validates it
+        self.assertEqual([call.args[1] for call in construct.call_args_list],
+                         ["/stimulus/presentation/broken", "/stimulus/presentation/valid"])
+
+    def test_main(self):
+        report = self.test_dir / "report.json"
+        self.assertEqual(main([str(self.path), "--workers", "0", "--report", str(report)]), 1)
+        with open(report) as f:
+            findings = json.load(f)
+        self.assertEqual(len(findings), 5)
+        self.assertEqual(findings[0]["series"], "broken")
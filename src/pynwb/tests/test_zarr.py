@@ -0,0 +1,120 @@
+import pickle
+import unittest
+from datetime import datetime
+from pathlib import Path
+from shutil import rmtree
+from tempfile import mkdtemp
+from warnings import warn
+
+import numpy as np
+from hdmf.testing import TestCase
+from numpy.testing import assert_array_equal
+from pynwb.testing.mock.file import mock_NWBFile
+
+from ndx_holographic_stimulation import (
+    OptogeneticStimulusPattern,
+    OptogeneticStimulusPatternLibrary,
+    SpiralScanning,
+    TemporalFocusing,
+)
+
+from .mock import mock_PatternedOptogeneticSeries, mock_SpiralScanning
+
+try:
+    from hdmf_zarr.nwb import NWBZarrIO
+
+    from ndx_holographic_stimulation.zarr_io import MemmapDataChunkIterator, zarr_data_io
+
+    HAVE_HDMF_ZARR = True
+except ImportError:
+    HAVE_HDMF_ZARR = False
+
+
+@unittest.skipIf(not HAVE_HDMF_ZARR, "hdmf-zarr is not installed")
+class TestZarrRoundtrip(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.test_dir = Path(mkdtemp())
+
+    @classmethod
+    def tearDownClass(cls):
+        try:
+            rmtree(cls.test_dir)
+        except PermissionError:  # Windows CI bug
+            warn(f"Unable to fully clean the temporary directory: {cls.test_dir}\n\nPlease remove it manually.")
+
+    def setUp(self):
+        self.nwbfile = mock_NWBFile(session_start_time=datetime.now().astimezone())
+
+    def test_all_types(self):
+        temporal_focusing = TemporalFocusing(
+            name="temporal_focusing",
+            description="temporal focusing",
+            lateral_point_spread_function="9e-6 m ± 0.7e-6 m",
+            axial_point_spread_function="32e-6 m ± 1.6e-6 m",
+            duration=10e-3,
+            number_of_stimulus_presentation=10,
+            inter_stimulus_interval=0.02,
+        )
+        self.nwbfile.add_lab_meta_data(temporal_focusing)
+        self.nwbfile.add_lab_meta_data(OptogeneticStimulusPattern(
+            name="generic", description="generic", duration=5e-3, number_of_stimulus_presentation=500,
+            inter_stimulus_interval=0.01,
+        ))
+        library = OptogeneticStimulusPatternLibrary()
+        self.nwbfile.add_lab_meta_data(library)
+        library.add_pattern(temporal_focusing)
+        data = np.random.default_rng(0).random((1000, 300))
+        series = mock_PatternedOptogeneticSeries(
+            name="PatternedOptogeneticSeries", data=zarr_data_io(data), nwbfile=self.nwbfile
+        )
+
+        path = self.test_dir / "all_types.nwb.zarr"
+        with NWBZarrIO(str(path), mode="w") as io:
+            io.write(self.nwbfile)
+
+        with NWBZarrIO(str(path), mode="r") as io:
+            nwbfile_in = io.read()
+            series_in = nwbfile_in.stimulus["PatternedOptogeneticSeries"]
+            assert_array_equal(series_in.data[:], data)
+            assert_array_equal(series_in.rois.data[:], np.arange(300))
+            self.assertContainerEqual(series_in.site, series.site, ignore_hdmf_attrs=True)
+            self.assertContainerEqual(series_in.light_source, series.light_source, ignore_hdmf_attrs=True)
+            self.assertContainerEqual(
+                series_in.spatial_light_modulator, series.spatial_light_modulator, ignore_hdmf_attrs=True
+            )
+            self.assertIsInstance(series_in.stimulus_pattern, SpiralScanning)
+            self.assertContainerEqual(
+                nwbfile_in.lab_meta_data["temporal_focusing"], temporal_focusing, ignore_hdmf_attrs=True
+            )
+            self.assertEqual(nwbfile_in.lab_meta_data["generic"].number_of_stimulus_presentation, 500)
+            pattern = nwbfile_in.lab_meta_data["stimulus_pattern_library"].patterns.get_pattern(0)
+            self.assertEqual(pattern.axial_point_spread_function, "32e-6 m ± 1.6e-6 m")
+
+    def test_parallel_write(self):
+        data = np.random.default_rng(1).random((5000, 64)).astype(np.float32)
+        source = self.test_dir / "data.npy"
+        np.save(source, data)
+        iterator = MemmapDataChunkIterator(source, chunk_shape=(250, 64), buffer_shape=(500, 64))
+        self.assertEqual(pickle.loads(pickle.dumps(iterator)).buffer_shape, (500, 64))
+
+        mock_PatternedOptogeneticSeries(
+            name="PatternedOptogeneticSeries",
+            data=zarr_data_io(source, compression="fast", chunk_shape=(250, 64)),
+            n_rois=64,
+            rate=1000.0,
+            stimulus_pattern=mock_SpiralScanning(nwbfile=self.nwbfile),
+            nwbfile=self.nwbfile,
+        )
+        path = self.test_dir / "parallel.nwb.zarr"
+        with NWBZarrIO(str(path), mode="w") as io:
+            io.write(self.nwbfile, number_of_jobs=2)
+
+        with NWBZarrIO(str(path), mode="r") as io:
+            data_in = io.read().stimulus["PatternedOptogeneticSeries"].data
+            self.assertEqual(data_in.chunks, (250, 64))
+            assert_array_equal(data_in[:], data)
+
+    def test_unknown_preset(self):
+        with self.assertRaises(ValueError):
+            zarr_data_io(np.zeros((10, 2)), compression="snappy")